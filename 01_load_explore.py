@@ -4,10 +4,17 @@ import os
 from datetime import datetime
 import sys
 
+from pipeline.schema import enforce_schema, format_memory_report, schema_report
+from pipeline.sql_fingerprint import fingerprint_series
+from pipeline.timeparse import calendar_fields, epoch_seconds, parse_timestamps
+
 # Set UTF-8 encoding for Windows console
 if sys.platform == 'win32':
     sys.stdout.reconfigure(encoding='utf-8')
 
+# Proses untuk tokenisasi SQL (-1 = semua core; hanya dipakai bila query unik >= PARALLEL_MIN_UNIQUES)
+FINGERPRINT_N_JOBS = -1
+
 # ============ LOAD DATA ============
 print("="*60)
 print("TAHAP 1: LOAD & EXPLORATORY DATA ANALYSIS")
@@ -38,15 +45,17 @@ print("="*60)
 
 # 1. Temporal Analysis
 print("\n[A] Temporal Analysis:")
-tracker_df['datetime'] = pd.to_datetime(tracker_df['timestamp'], errors='coerce')
+# Format dideteksi sekali per sumber lalu di-cache; parsing dengan format eksplisit
+tracker_df['datetime'] = parse_timestamps(tracker_df['timestamp'], source='tracker')
 # Remove rows with invalid timestamps
 invalid_timestamps = tracker_df['datetime'].isna().sum()
 if invalid_timestamps > 0:
     print(f"  [WARNING] Found {invalid_timestamps} rows with invalid timestamps, removing them...")
     tracker_df = tracker_df[tracker_df['datetime'].notna()].copy()
+tracker_df['epoch_s'] = epoch_seconds(tracker_df['datetime'])  # int64 detik sejak 1970
 print(f"  Date range: {tracker_df['datetime'].min()} to {tracker_df['datetime'].max()}")
 print(f"  Duration: {(tracker_df['datetime'].max() - tracker_df['datetime'].min()).days} days")
-print(f"  Peak hour: {tracker_df['datetime'].dt.hour.mode()[0]} (hour)")
+print(f"  Peak hour: {calendar_fields(tracker_df['epoch_s'])['hour'].mode()[0]} (hour)")
 
 # 2. User Activity Distribution
 print("\n[B] User Activity Distribution:")
@@ -57,17 +66,32 @@ print(user_activity.head(5))
 
 # 3. Query Type Analysis
 print("\n[C] Query Type Analysis:")
-tracker_df['query_type'] = tracker_df['query_info'].str.extract(r'(insert|update|delete|select)', expand=False, flags=2).fillna('other').str.upper()
+# Satu kali tokenisasi SQL: IP, jenis operasi, tabel target dan fingerprint template
+fingerprints = fingerprint_series(tracker_df['query_info'], n_jobs=FINGERPRINT_N_JOBS)
+tracker_df['query_type'] = fingerprints['query_type']
+tracker_df['sql_table'] = fingerprints['sql_table']
+tracker_df['fingerprint_id'] = fingerprints['fingerprint_id']
 print(f"  Query types detected:")
 print(tracker_df['query_type'].value_counts())
+print(f"  Unique SQL templates: {tracker_df['fingerprint_id'].nunique()}")
+print(f"  Top 5 target tables:")
+print(tracker_df['sql_table'].value_counts().head(5))
 
 # 4. IP Analysis
 print("\n[D] IP Address Analysis:")
-tracker_df['ip'] = tracker_df['query_info'].str.extract(r'(192\.168\.[\d.]+)', expand=False)
+tracker_df['ip'] = fingerprints['ip']
 print(f"  Unique IPs: {tracker_df['ip'].nunique()}")
 print(f"  Top 5 most used IPs:")
 print(tracker_df['ip'].value_counts().head(5))
 
+# 5. Skema ringkas (dtype kompak, timestamp datetime64)
+print("\n[E] Skema & Memori:")
+tracker_typed = enforce_schema(tracker_df)
+staff_typed = enforce_schema(staff_df)
+print(f"  Tracker {format_memory_report(schema_report(tracker_df, tracker_typed))}")
+print(f"  Staff {format_memory_report(schema_report(staff_df, staff_typed))}")
+tracker_df, staff_df = tracker_typed, staff_typed
+
 # Save for next step
 tracker_df.to_csv('data/raw/tracker_raw.csv', index=False)
 staff_df.to_csv('data/raw/staff_raw.csv', index=False)
@@ -3,6 +3,10 @@ import numpy as np
 import re
 import sys
 
+from pipeline.dedup import DigestIndex
+from pipeline.quantile_sketch import IQRFilter
+from pipeline.schema import format_memory_report, load_frame
+
 # Set UTF-8 encoding for Windows console
 if sys.platform == 'win32':
     sys.stdout.reconfigure(encoding='utf-8')
@@ -19,9 +23,10 @@ print("PART 1: PREPROCESSING TRACKER DATA (LOG AKTIVITAS)")
 print("="*60)
 
 # Load raw tracker data
-tracker_df = pd.read_csv('data/raw/tracker_raw.csv')
+tracker_df, tracker_schema = load_frame('data/raw/tracker_raw.csv')
 tracker_initial_count = len(tracker_df)
 print(f"\n[2.1.A] Data tracker awal: {tracker_initial_count} rows")
+print(f"  {format_memory_report(tracker_schema)}")
 
 # 2.1.1 Remove Missing Values
 print("\n[2.1.1.A] Cek Missing Values (Tracker):")
@@ -38,11 +43,29 @@ print(f"  [OK] Data setelah removing missing values: {tracker_after_missing} row
 
 # 2.1.2 Remove Duplicates
 print("\n[2.1.2.A] Cek Duplikasi (Tracker):")
-duplicates = tracker_df[tracker_df.duplicated(subset=['timestamp', 'query_info', 'user_id'], keep=False)]
-duplicate_count = len(duplicates)
+# Dedup streaming: digest 64-bit per baris, index per hari + Bloom filter (persisten antar run)
+DEDUP_INDEX_PATH = 'data/dedup_index/tracker'
+DEDUP_CHUNK_SIZE = 50_000
+# False = pertahankan index dari run sebelumnya (ingestion inkremental)
+RESET_DEDUP_INDEX = True
+
+dedup_index = DigestIndex(DEDUP_INDEX_PATH, key_cols=['timestamp', 'query_info', 'user_id'],
+                          time_col='timestamp', partition_freq='D')
+if RESET_DEDUP_INDEX:
+    dedup_index.reset()
+else:
+    dedup_index.load()
+
+tracker_df = pd.concat([
+    dedup_index.drop_duplicates(tracker_df.iloc[start:start + DEDUP_CHUNK_SIZE])
+    for start in range(0, len(tracker_df), DEDUP_CHUNK_SIZE)
+]) if len(tracker_df) else tracker_df
+dedup_index.save()
+
+duplicate_count = dedup_index.stats['duplicates']
 print(f"  Duplicate rows found: {duplicate_count}")
+print(f"  Digest index: {DEDUP_INDEX_PATH} (Bloom negatives: {dedup_index.stats['bloom_negatives']})")
 
-tracker_df = tracker_df.drop_duplicates(subset=['timestamp', 'query_info', 'user_id'], keep='first')
 tracker_after_duplicates = len(tracker_df)
 print(f"  [OK] Data setelah removing duplicates: {tracker_after_duplicates} rows")
 
@@ -52,21 +75,41 @@ print("\n[2.1.3.A] Identifikasi Extreme Outliers (Tracker):")
 # Extract query length as numeric feature
 tracker_df['query_length'] = tracker_df['query_info'].str.len()
 
-# Find outliers using IQR
-Q1 = tracker_df['query_length'].quantile(0.25)
-Q3 = tracker_df['query_length'].quantile(0.75)
-IQR = Q3 - Q1
-lower_bound = Q1 - 1.5 * IQR
-upper_bound = Q3 + 1.5 * IQR
-
-print(f"  Query length - Q1: {Q1}, Q3: {Q3}, IQR: {IQR}")
-print(f"  Bounds: [{lower_bound:.0f}, {upper_bound:.0f}]")
-
-outlier_rows = tracker_df[(tracker_df['query_length'] < lower_bound) | (tracker_df['query_length'] > upper_bound)]
-outlier_count = len(outlier_rows)
+# Kolom yang difilter dengan IQR (approximate, berbasis KLL quantile sketch)
+OUTLIER_COLUMNS = {
+    'query_length': {'q_low': 0.25, 'q_high': 0.75, 'factor': 1.5},
+}
+OUTLIER_SKETCH_PATH = 'models/outlier_sketch_tracker.json'
+CHUNK_SIZE = 50_000
+# False = lanjutkan sketch dari run sebelumnya (ingestion inkremental); hanya baris
+# dengan timestamp setelah watermark tersimpan yang dimasukkan ke sketch
+RESET_SKETCH = True
+
+iqr_filter = IQRFilter(OUTLIER_COLUMNS, state_path=OUTLIER_SKETCH_PATH, time_col='timestamp')
+if not RESET_SKETCH:
+    iqr_filter.load()
+
+# Pass 1: update sketch per chunk (tanpa sort seluruh data)
+for start in range(0, len(tracker_df), CHUNK_SIZE):
+    iqr_filter.update(tracker_df.iloc[start:start + CHUNK_SIZE])
+iqr_filter.save()
+if iqr_filter.skipped:
+    print(f"  Baris sebelum watermark sketch (sudah dihitung di run sebelumnya): {iqr_filter.skipped}")
+
+for col, (lower_bound, upper_bound, Q1, Q3) in iqr_filter.bounds().items():
+    print(f"  {col} - Q1: {Q1}, Q3: {Q3}, IQR: {Q3 - Q1}")
+    print(f"  Bounds: [{lower_bound:.0f}, {upper_bound:.0f}]")
+print(f"  Sketch tersimpan: {OUTLIER_SKETCH_PATH} (n={iqr_filter.sketches['query_length'].n})")
+
+# Pass 2: terapkan bounds per chunk
+kept_chunks = [
+    iqr_filter.apply(tracker_df.iloc[start:start + CHUNK_SIZE])
+    for start in range(0, len(tracker_df), CHUNK_SIZE)
+]
+outlier_count = len(tracker_df) - sum(len(chunk) for chunk in kept_chunks)
 print(f"  Extreme outliers found: {outlier_count}")
 
-tracker_df = tracker_df[(tracker_df['query_length'] >= lower_bound) & (tracker_df['query_length'] <= upper_bound)]
+tracker_df = pd.concat(kept_chunks) if kept_chunks else tracker_df
 tracker_after_outliers = len(tracker_df)
 print(f"  [OK] Data setelah removing outliers: {tracker_after_outliers} rows")
 
@@ -92,9 +135,10 @@ print("PART 2: PREPROCESSING STAFF DATA (MASTER LOGIN)")
 print("="*60)
 
 # Load raw staff data
-staff_df = pd.read_csv('data/raw/staff_raw.csv')
+staff_df, staff_schema = load_frame('data/raw/staff_raw.csv')
 staff_initial_count = len(staff_df)
 print(f"\n[2.1.B] Data staff awal: {staff_initial_count} rows")
+print(f"  {format_memory_report(staff_schema)}")
 
 # 2.1.1 Remove Missing Values
 print("\n[2.1.1.B] Cek Missing Values (Staff):")
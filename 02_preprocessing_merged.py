@@ -2,6 +2,10 @@ import pandas as pd
 import numpy as np
 import sys
 
+from pipeline.dedup import DigestIndex
+from pipeline.schema import format_memory_report, load_frame
+from pipeline.timeparse import epoch_seconds, parse_timestamps
+
 # Set UTF-8 encoding for Windows console
 if sys.platform == 'win32':
     sys.stdout.reconfigure(encoding='utf-8')
@@ -12,9 +16,10 @@ print("="*60)
 
 # Load merged raw data
 print("\n[2.1] Memuat data merged...")
-merged_df = pd.read_csv('data/raw/merged_raw.csv')
+merged_df, merged_schema = load_frame('data/raw/merged_raw.csv')
 print(f"  Data dimuat: {len(merged_df)} baris, {merged_df.shape[1]} kolom")
 print(f"  Kolom: {merged_df.columns.tolist()}")
+print(f"  {format_memory_report(merged_schema)}")
 
 # Show source distribution
 print(f"\n[2.2] Distribusi berdasarkan source:")
@@ -24,7 +29,7 @@ for source, count in source_counts.items():
 
 # Parse timestamp column
 print(f"\n[2.3] Parsing kolom timestamp...")
-merged_df['datetime'] = pd.to_datetime(merged_df['timestamp'], errors='coerce')
+merged_df['datetime'] = parse_timestamps(merged_df['timestamp'], source='merged')
 
 # Check for invalid timestamps
 invalid_timestamps = merged_df['datetime'].isna().sum()
@@ -33,6 +38,7 @@ if invalid_timestamps > 0:
     print(f"  Menghapus baris dengan timestamp invalid...")
     merged_df = merged_df[merged_df['datetime'].notna()].copy()
     print(f"  Baris tersisa: {len(merged_df)}")
+merged_df['epoch_s'] = epoch_seconds(merged_df['datetime'])  # int64 detik sejak 1970
 
 # Step 1: Handle Missing Values
 print(f"\n[2.4] Menangani missing values...")
@@ -50,12 +56,28 @@ print(f"  Baris setelah drop missing critical cols: {len(merged_df)}")
 # Step 2: Remove Duplicates
 print(f"\n[2.5] Menghapus duplikasi...")
 print(f"  Baris sebelum: {len(merged_df)}")
-duplicates = merged_df.duplicated().sum()
-print(f"  Duplikasi ditemukan: {duplicates}")
+# Dedup streaming berbasis digest seluruh kolom, index per hari + Bloom filter
+DEDUP_INDEX_PATH = 'data/dedup_index/merged'
+DEDUP_CHUNK_SIZE = 50_000
+# False = pertahankan index dari run sebelumnya (ingestion inkremental)
+RESET_DEDUP_INDEX = True
+
+dedup_index = DigestIndex(DEDUP_INDEX_PATH, key_cols=merged_df.columns.tolist(),
+                          time_col='datetime', partition_freq='D')
+if RESET_DEDUP_INDEX:
+    dedup_index.reset()
+else:
+    dedup_index.load()
 
-if duplicates > 0:
-    merged_df = merged_df.drop_duplicates()
-    print(f"  Baris setelah: {len(merged_df)}")
+merged_df = pd.concat([
+    dedup_index.drop_duplicates(merged_df.iloc[start:start + DEDUP_CHUNK_SIZE])
+    for start in range(0, len(merged_df), DEDUP_CHUNK_SIZE)
+]) if len(merged_df) else merged_df
+dedup_index.save()
+
+duplicates = dedup_index.stats['duplicates']
+print(f"  Duplikasi ditemukan: {duplicates}")
+print(f"  Baris setelah: {len(merged_df)}")
 
 # Step 3: Handle Outliers (if applicable)
 # For merged data, we'll skip outlier removal since it might affect legitimate data
@@ -1,13 +1,30 @@
+import joblib
 import pandas as pd
 import numpy as np
 import re
 from datetime import datetime
 import sys
 
+from pipeline.schema import format_memory_report, load_frame
+from pipeline.sessions import SESSION_FEATURE_COLUMNS, sessionize
+from pipeline.sparse_features import BlockProjector, attach_block_features, build_sparse_block, reduce_block
+from pipeline.sql_fingerprint import add_fingerprint_columns
+from pipeline.timeparse import calendar_fields, combine_date_time, epoch_seconds, parse_timestamps
+from pipeline.user_profiles import PROFILE_STORE_PATH, ProfileStore
+from pipeline.window_features import rolling_window_features
+
 # Set UTF-8 encoding for Windows console
 if sys.platform == 'win32':
     sys.stdout.reconfigure(encoding='utf-8')
 
+# Proses untuk tokenisasi SQL bila kolom fingerprint belum ada (-1 = semua core)
+FINGERPRINT_N_JOBS = -1
+# Profil perilaku per user (SQLite, statistik yang bisa digabung antar batch)
+# False = lanjutkan profil dari run sebelumnya (ingestion inkremental)
+RESET_PROFILE_STORE = True
+
+profile_store = ProfileStore(PROFILE_STORE_PATH)
+
 print("\n" + "="*60)
 print("TAHAP 3: FEATURE ENGINEERING & TRANSFORMATION")
 print("="*60)
@@ -19,21 +36,24 @@ print("\n" + "="*60)
 print("PART 1: FEATURE ENGINEERING - TRACKER (LOG AKTIVITAS)")
 print("="*60)
 
-tracker_df = pd.read_csv('data/cleaned/tracker_cleaned.csv')
+tracker_df, tracker_schema = load_frame('data/cleaned/tracker_cleaned.csv')
 print(f"\nData input: {len(tracker_df)} baris")
+print(f"  {format_memory_report(tracker_schema)}")
 
 # ========================================================
 # D. TRANSFORMASI ATRIBUT TEMPORAL
 # ========================================================
 print("\n[D] TRANSFORMASI ATRIBUT TEMPORAL:")
 
-tracker_df['datetime'] = pd.to_datetime(tracker_df['datetime'])
+tracker_df['datetime'] = parse_timestamps(tracker_df['datetime'], source='tracker')
+tracker_df['epoch_s'] = epoch_seconds(tracker_df['datetime'])
 
-# Fitur numerik dari timestamp
-tracker_df['hour'] = tracker_df['datetime'].dt.hour              # 0-23
-tracker_df['day_of_week'] = tracker_df['datetime'].dt.dayofweek  # 0=Senin, 6=Minggu
-tracker_df['month'] = tracker_df['datetime'].dt.month            # 1-12
-tracker_df['day_of_month'] = tracker_df['datetime'].dt.day       # 1-31
+# Fitur numerik dari epoch_s (aritmetika integer, tanpa accessor .dt)
+tracker_calendar = calendar_fields(tracker_df['epoch_s'])
+tracker_df['hour'] = tracker_calendar['hour']                  # 0-23
+tracker_df['day_of_week'] = tracker_calendar['day_of_week']    # 0=Senin, 6=Minggu
+tracker_df['month'] = tracker_calendar['month']                # 1-12
+tracker_df['day_of_month'] = tracker_calendar['day_of_month']  # 1-31
 
 # Binary flags untuk pola temporal anomali
 WORK_START = 8
@@ -54,9 +74,9 @@ print(f"    - Aktivitas malam: {tracker_df['NightShift'].sum()} ({tracker_df['Ni
 # ========================================================
 print("\n[E] ENCODING ATRIBUT KATEGORI (One-Hot Encoding):")
 
-# Pastikan kolom query_type ada
-if 'query_type' not in tracker_df.columns:
-    tracker_df['query_type'] = tracker_df['query_info'].str.extract(r'(insert|update|delete|select)', expand=False, flags=2).fillna('other').str.upper()
+# Pastikan kolom query_type, sql_table dan fingerprint_id ada (fingerprint SQL sekali jalan)
+if not {'query_type', 'sql_table', 'fingerprint_id'}.issubset(tracker_df.columns):
+    tracker_df = add_fingerprint_columns(tracker_df, n_jobs=FINGERPRINT_N_JOBS)
 
 # One-hot encoding untuk jenis operasi
 query_dummies = pd.get_dummies(tracker_df['query_type'], prefix='op')
@@ -75,43 +95,94 @@ for qtype in query_types:
 # ========================================================
 print("\n[F] EKSTRAKSI FITUR-FITUR PERILAKU:")
 
+# Profil per user: batch ini digabung ke store, fitur dibaca per user (bukan groupby seluruh histori)
+if RESET_PROFILE_STORE:
+    profile_store.reset('tracker')
+applied = profile_store.update('tracker', tracker_df[['user_id', 'epoch_s', 'query_info', 'query_type', 'sql_table']])
+tracker_profiles = profile_store.features('tracker', tracker_df['user_id'])
+print(f"  Profil user: {applied} baris baru digabung ke {PROFILE_STORE_PATH} "
+      f"({tracker_df['user_id'].nunique()} user)")
+
 # Fitur 1: Frekuensi aktivitas per pengguna
-user_activity_count = tracker_df.groupby('user_id').size()
-tracker_df['frekuensi_aktivitas_per_user'] = tracker_df['user_id'].map(user_activity_count)
+tracker_df['frekuensi_aktivitas_per_user'] = tracker_profiles['events']
 
 print(f"  ✓ Fitur 1: frekuensi_aktivitas_per_user")
 print(f"    - Min: {tracker_df['frekuensi_aktivitas_per_user'].min():.0f}, Max: {tracker_df['frekuensi_aktivitas_per_user'].max():.0f}")
 
-# Fitur 2: Jumlah tipe operasi unik per pengguna
-user_op_diversity = tracker_df.groupby('user_id')['query_type'].nunique()
-tracker_df['jumlah_tipe_operasi_unik'] = tracker_df['user_id'].map(user_op_diversity)
+# Fitur 2: Jumlah tipe operasi unik per pengguna (HyperLogLog)
+tracker_df['jumlah_tipe_operasi_unik'] = tracker_profiles['distinct_ops']
 
 print(f"  ✓ Fitur 2: jumlah_tipe_operasi_unik")
 print(f"    - Min: {tracker_df['jumlah_tipe_operasi_unik'].min():.0f}, Max: {tracker_df['jumlah_tipe_operasi_unik'].max():.0f}")
 
 # Fitur 3: Rasio operasi modifikasi data (INSERT+UPDATE+DELETE / total)
-modify_ops = tracker_df[tracker_df['query_type'].isin(['INSERT', 'UPDATE', 'DELETE'])].groupby('user_id').size()
-total_ops = tracker_df.groupby('user_id').size()
-mod_ratio = modify_ops / total_ops
-tracker_df['rasio_operasi_modifikasi'] = tracker_df['user_id'].map(mod_ratio).fillna(0)
+tracker_df['rasio_operasi_modifikasi'] = tracker_profiles['modification_ratio']
 
 print(f"  ✓ Fitur 3: rasio_operasi_modifikasi")
 print(f"    - Mean: {tracker_df['rasio_operasi_modifikasi'].mean():.3f}")
 
 # Fitur 4: Pola waktu akses (standar deviasi jam akses per user)
-user_hour_std = tracker_df.groupby('user_id')['hour'].std().fillna(0)
-tracker_df['pola_waktu_akses'] = tracker_df['user_id'].map(user_hour_std)
+tracker_df['pola_waktu_akses'] = tracker_profiles['hour_std']
 
 print(f"  ✓ Fitur 4: pola_waktu_akses (variasi jam akses)")
 print(f"    - Mean std: {tracker_df['pola_waktu_akses'].mean():.2f}")
 
+# Fitur 5: Profil tabel per user per hari (matriks sparse CSR + TF-IDF, direduksi SVD)
+TABLE_PROFILE_WIDTH = 8
+table_block = build_sparse_block(tracker_df, token_col='sql_table', window='1D', weighting='tfidf')
+table_reduced, table_reducer = reduce_block(table_block, n_components=TABLE_PROFILE_WIDTH, method='svd')
+tracker_df, table_profile_cols = attach_block_features(tracker_df, table_block, table_reduced, prefix='profil_tabel_')
+# Vocabulary + TF-IDF + SVD disimpan agar event baru (tail daemon) diproyeksikan ke ruang yang sama
+joblib.dump(BlockProjector.from_block(table_block, table_reducer, TABLE_PROFILE_WIDTH),
+            'models/table_profile_tracker.joblib')
+
+print(f"  ✓ Fitur 5: profil_tabel_0..{TABLE_PROFILE_WIDTH - 1} (TF-IDF tabel per user per hari, SVD)")
+print(f"    - Matriks sparse: {table_block.matrix.shape[0]} (user, hari) x {table_block.matrix.shape[1]} tabel, "
+      f"nnz={table_block.matrix.nnz} ({table_block.matrix.nnz / max(1, np.prod(table_block.matrix.shape)) * 100:.1f}% terisi)")
+print(f"    - Proyektor tersimpan: models/table_profile_tracker.joblib")
+
+# Fitur 6: Jendela waktu bergulir per user (event time: 5 menit, 1 jam, 1 hari)
+window_features = rolling_window_features(tracker_df, user_col='user_id', time_col='datetime')
+tracker_df[window_features.columns] = window_features
+# laju_event_* hanya skala dari jumlah_event_*, jadi tidak ikut modeling
+window_cols = ['jumlah_event_5min', 'jumlah_event_1h', 'jumlah_event_1D',
+               'rata_jeda_1h', 'jeda_event_sebelumnya']
+
+print(f"  ✓ Fitur 6: jendela waktu per user ({', '.join(window_cols)})")
+print(f"    - Maks event per user dalam 5 menit: {tracker_df['jumlah_event_5min'].max():.0f}")
+print(f"    - Median jeda antar event: {tracker_df['jeda_event_sebelumnya'].median():.0f} detik")
+
+# ========================================================
+# G. REKONSTRUKSI SESI LOGIN (STAFF -> TRACKER)
+# ========================================================
+print("\n[G] REKONSTRUKSI SESI LOGIN:")
+
+SESSION_MAX_DURATION = '12h'  # Sesi berakhir saat login berikutnya atau setelah 12 jam
+
+logins_df, _ = load_frame('data/cleaned/staff_cleaned.csv')
+logins_df['datetime'] = combine_date_time(logins_df['date'], logins_df['timestamp'], source='staff')
+
+# As-of join terurut (merge_asof by user_id): setiap event ke sesi login yang aktif
+tracker_df, sessions_df = sessionize(tracker_df, logins_df, max_duration=SESSION_MAX_DURATION)
+session_cols = list(SESSION_FEATURE_COLUMNS)
+
+sessions_df.to_csv('data/transformed/sessions.csv', index=False)
+print(f"  ✓ Sesi login: {len(sessions_df)} sesi dari {logins_df['user_id'].nunique()} user")
+print(f"  ✓ Event dengan sesi aktif: {(tracker_df['session_id'] >= 0).sum()} "
+      f"({(tracker_df['session_id'] >= 0).mean()*100:.1f}%), tanpa login: {tracker_df['aktivitas_tanpa_login'].sum()}")
+active_sessions = sessions_df[sessions_df['jumlah_query_sesi'] > 0]
+print(f"    - Sesi dengan aktivitas: {len(active_sessions)}")
+print(f"    - Query per sesi aktif (median): {active_sessions['jumlah_query_sesi'].median():.0f}")
+print(f"    - Durasi sesi aktif (median): {active_sessions['durasi_sesi'].median()/60:.1f} menit")
+print(f"  ✓ Data sesi tersimpan: data/transformed/sessions.csv")
+
 # ========================================================
 # SIMPAN HASIL - HANYA KOLOM YANG DIPERLUKAN
 # ========================================================
 print("\n[SELEKSI FITUR UNTUK MODELING]:")
 
 # Kolom metadata (untuk referensi, tidak digunakan modeling)
-metadata_cols = ['timestamp', 'user_id', 'query_info', 'query_type']
+metadata_cols = ['timestamp', 'user_id', 'query_info', 'query_type', 'sql_table', 'fingerprint_id', 'session_id']
 
 # Kolom fitur (untuk modeling)
 temporal_cols = ['hour', 'day_of_week', 'month', 'day_of_month',
@@ -121,10 +192,10 @@ temporal_cols = ['hour', 'day_of_week', 'month', 'day_of_month',
 encoding_cols = [col for col in tracker_df.columns if col.startswith('op_')]
 
 behavioral_cols = ['frekuensi_aktivitas_per_user', 'jumlah_tipe_operasi_unik',
-                   'rasio_operasi_modifikasi', 'pola_waktu_akses']
+                   'rasio_operasi_modifikasi', 'pola_waktu_akses'] + table_profile_cols + window_cols
 
 # Gabungkan semua kolom yang akan disimpan
-all_cols = metadata_cols + temporal_cols + encoding_cols + behavioral_cols
+all_cols = metadata_cols + temporal_cols + encoding_cols + behavioral_cols + session_cols
 
 # Filter hanya kolom yang diperlukan
 tracker_transformed = tracker_df[all_cols].copy()
@@ -134,7 +205,8 @@ print(f"    - Metadata: {len(metadata_cols)} kolom")
 print(f"    - Fitur temporal: {len(temporal_cols)} kolom")
 print(f"    - Fitur encoding: {len(encoding_cols)} kolom")
 print(f"    - Fitur behavioral: {len(behavioral_cols)} kolom")
-print(f"  Total fitur untuk modeling: {len(temporal_cols) + len(encoding_cols) + len(behavioral_cols)}")
+print(f"    - Fitur sesi login: {len(session_cols)} kolom")
+print(f"  Total fitur untuk modeling: {len(temporal_cols) + len(encoding_cols) + len(behavioral_cols) + len(session_cols)}")
 
 tracker_transformed.to_csv('data/transformed/tracker_transformed.csv', index=False)
 print(f"\n✓ Data tersimpan: data/transformed/tracker_transformed.csv")
@@ -146,22 +218,25 @@ print("\n\n" + "="*60)
 print("PART 2: FEATURE ENGINEERING - STAFF (MASTER LOGIN)")
 print("="*60)
 
-staff_df = pd.read_csv('data/cleaned/staff_cleaned.csv')
+staff_df, staff_schema = load_frame('data/cleaned/staff_cleaned.csv')
 print(f"\nData input: {len(staff_df)} baris")
+print(f"  {format_memory_report(staff_schema)}")
 
 # ========================================================
 # D. TRANSFORMASI ATRIBUT TEMPORAL
 # ========================================================
 print("\n[D] TRANSFORMASI ATRIBUT TEMPORAL:")
 
-# Gabungkan date dan timestamp
-staff_df['datetime'] = pd.to_datetime(staff_df['date'].astype(str) + ' ' + staff_df['timestamp'].astype(str))
+# Gabungkan date dan timestamp sebagai offset integer (tanpa concat string)
+staff_df['datetime'] = combine_date_time(staff_df['date'], staff_df['timestamp'], source='staff')
+staff_df['epoch_s'] = epoch_seconds(staff_df['datetime'])
 
-# Fitur numerik dari timestamp
-staff_df['hour'] = staff_df['datetime'].dt.hour
-staff_df['day_of_week'] = staff_df['datetime'].dt.dayofweek
-staff_df['month'] = staff_df['datetime'].dt.month
-staff_df['day_of_month'] = staff_df['datetime'].dt.day
+# Fitur numerik dari epoch_s
+staff_calendar = calendar_fields(staff_df['epoch_s'])
+staff_df['hour'] = staff_calendar['hour']
+staff_df['day_of_week'] = staff_calendar['day_of_week']
+staff_df['month'] = staff_calendar['month']
+staff_df['day_of_month'] = staff_calendar['day_of_month']
 
 # Binary flags untuk pola temporal login (jam kerja: 08:00-18:30)
 staff_df['IsEarlyLogin'] = (staff_df['hour'] < 8).astype(int)      # Login sebelum jam 8
@@ -182,25 +257,27 @@ print(f"    - Login weekend: {staff_df['IsWeekend'].sum()} ({staff_df['IsWeekend
 # ========================================================
 print("\n[F] EKSTRAKSI FITUR-FITUR PERILAKU LOGIN:")
 
+if RESET_PROFILE_STORE:
+    profile_store.reset('staff')
+applied = profile_store.update('staff', staff_df[['user_id', 'epoch_s', 'name']], type_col=None, table_col=None)
+staff_profiles = profile_store.features('staff', staff_df['user_id'])
+print(f"  Profil user: {applied} login baru digabung ke {PROFILE_STORE_PATH} "
+      f"({staff_df['user_id'].nunique()} user)")
+
 # Fitur 1: Frekuensi login per pengguna
-user_login_count = staff_df.groupby('user_id').size()
-staff_df['frekuensi_login_per_user'] = staff_df['user_id'].map(user_login_count)
+staff_df['frekuensi_login_per_user'] = staff_profiles['events']
 
 print(f"  ✓ Fitur 1: frekuensi_login_per_user")
 print(f"    - Min: {staff_df['frekuensi_login_per_user'].min():.0f}, Max: {staff_df['frekuensi_login_per_user'].max():.0f}")
 
 # Fitur 2: Pola waktu login (standar deviasi jam login)
-user_login_hour_std = staff_df.groupby('user_id')['hour'].std().fillna(0)
-staff_df['pola_waktu_login'] = staff_df['user_id'].map(user_login_hour_std)
+staff_df['pola_waktu_login'] = staff_profiles['hour_std']
 
 print(f"  ✓ Fitur 2: pola_waktu_login (variasi jam login)")
 print(f"    - Mean std: {staff_df['pola_waktu_login'].mean():.2f}")
 
 # Fitur 3: Rasio login weekend
-weekend_logins = staff_df[staff_df['IsWeekend'] == 1].groupby('user_id').size()
-total_logins = staff_df.groupby('user_id').size()
-weekend_ratio = weekend_logins / total_logins
-staff_df['rasio_login_weekend'] = staff_df['user_id'].map(weekend_ratio).fillna(0)
+staff_df['rasio_login_weekend'] = staff_profiles['weekend_ratio']
 
 print(f"  ✓ Fitur 3: rasio_login_weekend")
 print(f"    - Mean: {staff_df['rasio_login_weekend'].mean():.3f}")
@@ -245,11 +322,12 @@ print(f"\n1. TRACKER (LOG AKTIVITAS):")
 print(f"   File: data/transformed/tracker_transformed.csv")
 print(f"   Baris: {len(tracker_transformed)}")
 print(f"   Total kolom: {len(all_cols)}")
-print(f"   Fitur modeling: {len(temporal_cols) + len(encoding_cols) + len(behavioral_cols)}")
+print(f"   Fitur modeling: {len(temporal_cols) + len(encoding_cols) + len(behavioral_cols) + len(session_cols)}")
 print(f"   Rincian fitur:")
 print(f"     - D. Transformasi Temporal: {len(temporal_cols)} fitur")
 print(f"     - E. Encoding Kategori: {len(encoding_cols)} fitur")
 print(f"     - F. Fitur Perilaku: {len(behavioral_cols)} fitur")
+print(f"     - G. Fitur Sesi Login: {len(session_cols)} fitur")
 
 print(f"\n2. STAFF (MASTER LOGIN):")
 print(f"   File: data/transformed/staff_transformed.csv")
@@ -1,7 +1,9 @@
-import pandas as pd
 import numpy as np
 import sys
 
+from pipeline.schema import format_memory_report, load_frame
+from pipeline.timeparse import calendar_fields, epoch_seconds, parse_timestamps
+
 # Set UTF-8 encoding for Windows console
 if sys.platform == 'win32':
     sys.stdout.reconfigure(encoding='utf-8')
@@ -12,8 +14,9 @@ print("="*80)
 
 # Load cleaned merged data
 print("\n[3.1] Memuat data cleaned...")
-merged_df = pd.read_csv('data/cleaned/merged_cleaned.csv')
+merged_df, merged_schema = load_frame('data/cleaned/merged_cleaned.csv')
 print(f"  Data dimuat: {len(merged_df)} baris, {merged_df.shape[1]} kolom")
+print(f"  {format_memory_report(merged_schema)}")
 
 # Show distribution by source
 source_counts = merged_df['dataset_source'].value_counts()
@@ -23,7 +26,8 @@ for source, count in source_counts.items():
 
 # Parse datetime
 print(f"\n[3.3] Parsing datetime...")
-merged_df['datetime'] = pd.to_datetime(merged_df['timestamp'])
+merged_df['datetime'] = parse_timestamps(merged_df['timestamp'], source='merged')
+merged_df['epoch_s'] = epoch_seconds(merged_df['datetime'])
 print(f"  Datetime parsed: {merged_df['datetime'].notna().sum()} baris")
 
 # ============================================================================
@@ -32,10 +36,11 @@ print(f"  Datetime parsed: {merged_df['datetime'].notna().sum()} baris")
 print(f"\n[3.4] D. Transformasi Atribut Temporal...")
 
 # Extract temporal features
-merged_df['hour'] = merged_df['datetime'].dt.hour
-merged_df['day_of_week'] = merged_df['datetime'].dt.dayofweek  # 0=Monday, 6=Sunday
-merged_df['month'] = merged_df['datetime'].dt.month
-merged_df['day_of_month'] = merged_df['datetime'].dt.day
+merged_calendar = calendar_fields(merged_df['epoch_s'])  # aritmetika integer dari epoch_s
+merged_df['hour'] = merged_calendar['hour']
+merged_df['day_of_week'] = merged_calendar['day_of_week']  # 0=Monday, 6=Sunday
+merged_df['month'] = merged_calendar['month']
+merged_df['day_of_month'] = merged_calendar['day_of_month']
 
 print(f"  ✓ hour, day_of_week, month, day_of_month")
 
@@ -1,10 +1,12 @@
-import pandas as pd
 import numpy as np
 from sklearn.preprocessing import StandardScaler
 import joblib
 import json
 import sys
 
+from pipeline.feature_matrix import ROW_ID_COLUMN, save_feature_matrix
+from pipeline.schema import format_memory_report, load_frame
+
 # Set UTF-8 encoding for Windows console
 if sys.platform == 'win32':
     sys.stdout.reconfigure(encoding='utf-8')
@@ -20,8 +22,9 @@ print("\n" + "="*60)
 print("PART 1: NORMALISASI TRACKER (LOG AKTIVITAS)")
 print("="*60)
 
-tracker_df = pd.read_csv('data/transformed/tracker_transformed.csv')
+tracker_df, tracker_schema = load_frame('data/transformed/tracker_transformed.csv')
 print(f"\n[4.1.A] Data tracker dimuat: {len(tracker_df)} baris")
+print(f"  {format_memory_report(tracker_schema)}")
 
 # Definisi kolom fitur untuk modeling
 tracker_feature_cols = [
@@ -32,8 +35,16 @@ tracker_feature_cols = [
     'op_DELETE', 'op_INSERT', 'op_UPDATE',
     # F. Fitur Perilaku (4 fitur)
     'frekuensi_aktivitas_per_user', 'jumlah_tipe_operasi_unik',
-    'rasio_operasi_modifikasi', 'pola_waktu_akses'
+    'rasio_operasi_modifikasi', 'pola_waktu_akses',
+    # G. Fitur Jendela Waktu per User (5 fitur)
+    'jumlah_event_5min', 'jumlah_event_1h', 'jumlah_event_1D',
+    'rata_jeda_1h', 'jeda_event_sebelumnya',
+    # H. Fitur Sesi Login (5 fitur)
+    'jumlah_query_sesi', 'durasi_sesi', 'waktu_ke_delete_pertama',
+    'detik_sejak_login', 'aktivitas_tanpa_login'
 ]
+# Profil tabel sparse yang sudah direduksi (lebar tetap, dinamis dari tahap 3)
+tracker_feature_cols += [col for col in tracker_df.columns if col.startswith('profil_tabel_')]
 
 print(f"  Fitur untuk normalisasi: {len(tracker_feature_cols)} kolom")
 
@@ -78,10 +89,16 @@ else:
 # Simpan data normalized
 tracker_normalized = tracker_df.copy()
 tracker_normalized[tracker_feature_cols] = X_tracker_normalized
+tracker_normalized[ROW_ID_COLUMN] = np.arange(len(tracker_normalized), dtype=np.int64)
 
 tracker_normalized.to_csv('data/normalized/tracker_normalized.csv', index=False)
 print(f"\n✓ Data tersimpan: data/normalized/tracker_normalized.csv")
 
+# Matriks fitur kontigu (.npy) + indeks row_id, dibuka dengan mmap oleh LOF/K-Means
+save_feature_matrix('tracker', X_tracker_normalized, tracker_feature_cols,
+                    row_ids=tracker_normalized[ROW_ID_COLUMN])
+print(f"✓ Matriks fitur tersimpan: data/matrix/tracker.npy {X_tracker_normalized.shape}")
+
 # Simpan scaler
 joblib.dump(scaler_tracker, 'models/scaler_tracker.pkl')
 print(f"✓ Scaler tersimpan: models/scaler_tracker.pkl")
@@ -109,8 +126,9 @@ print("\n\n" + "="*60)
 print("PART 2: NORMALISASI STAFF (MASTER LOGIN)")
 print("="*60)
 
-staff_df = pd.read_csv('data/transformed/staff_transformed.csv')
+staff_df, staff_schema = load_frame('data/transformed/staff_transformed.csv')
 print(f"\n[4.1.B] Data staff dimuat: {len(staff_df)} baris")
+print(f"  {format_memory_report(staff_schema)}")
 
 # Definisi kolom fitur untuk modeling
 staff_feature_cols = [
@@ -163,10 +181,15 @@ else:
 # Simpan data normalized
 staff_normalized = staff_df.copy()
 staff_normalized[staff_feature_cols] = X_staff_normalized
+staff_normalized[ROW_ID_COLUMN] = np.arange(len(staff_normalized), dtype=np.int64)
 
 staff_normalized.to_csv('data/normalized/staff_normalized.csv', index=False)
 print(f"\n✓ Data tersimpan: data/normalized/staff_normalized.csv")
 
+save_feature_matrix('staff', X_staff_normalized, staff_feature_cols,
+                    row_ids=staff_normalized[ROW_ID_COLUMN])
+print(f"✓ Matriks fitur tersimpan: data/matrix/staff.npy {X_staff_normalized.shape}")
+
 # Simpan scaler
 joblib.dump(scaler_staff, 'models/scaler_staff.pkl')
 print(f"✓ Scaler tersimpan: models/scaler_staff.pkl")
@@ -203,6 +226,7 @@ print(f"   Std (normalized): {stds.mean():.6f}")
 print(f"   File pendukung:")
 print(f"     - models/scaler_tracker.pkl")
 print(f"     - models/feature_info_tracker.json")
+print(f"     - data/matrix/tracker.npy (+ tracker_rows.npy)")
 
 print(f"\n2. STAFF (MASTER LOGIN):")
 print(f"   File normalized: data/normalized/staff_normalized.csv")
@@ -213,5 +237,6 @@ print(f"   Std (normalized): {stds_staff.mean():.6f}")
 print(f"   File pendukung:")
 print(f"     - models/scaler_staff.pkl")
 print(f"     - models/feature_info_staff.json")
+print(f"     - data/matrix/staff.npy (+ staff_rows.npy)")
 
 print("\n" + "="*60)
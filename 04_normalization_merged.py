@@ -1,10 +1,12 @@
-import pandas as pd
 import numpy as np
 from sklearn.preprocessing import StandardScaler
 import joblib
 import json
 import sys
 
+from pipeline.feature_matrix import ROW_ID_COLUMN, save_feature_matrix
+from pipeline.schema import format_memory_report, load_frame
+
 # Set UTF-8 encoding for Windows console
 if sys.platform == 'win32':
     sys.stdout.reconfigure(encoding='utf-8')
@@ -15,8 +17,9 @@ print("="*60)
 
 # Load transformed merged data
 print("\n[4.1] Memuat data transformed...")
-merged_df = pd.read_csv('data/transformed/merged_transformed.csv')
+merged_df, merged_schema = load_frame('data/transformed/merged_transformed.csv')
 print(f"  Data dimuat: {len(merged_df)} baris, {merged_df.shape[1]} kolom")
+print(f"  {format_memory_report(merged_schema)}")
 
 # Show distribution by source
 source_counts = merged_df['dataset_source'].value_counts()
@@ -80,11 +83,16 @@ else:
 # Save normalized data
 merged_normalized = merged_df.copy()
 merged_normalized[feature_cols] = X_merged_normalized
+merged_normalized[ROW_ID_COLUMN] = np.arange(len(merged_normalized), dtype=np.int64)
 
 output_path = 'data/normalized/merged_normalized.csv'
 merged_normalized.to_csv(output_path, index=False)
 print(f"\n✓ Data tersimpan: {output_path}")
 
+# Matriks fitur kontigu (.npy) + indeks row_id untuk LOF & K-Means (mmap)
+save_feature_matrix('merged', X_merged_normalized, feature_cols, row_ids=merged_normalized[ROW_ID_COLUMN])
+print(f"✓ Matriks fitur tersimpan: data/matrix/merged.npy {X_merged_normalized.shape}")
+
 # Save scaler
 joblib.dump(scaler_merged, 'models/scaler_merged.pkl')
 print(f"✓ Scaler tersimpan: models/scaler_merged.pkl")
@@ -128,5 +136,6 @@ for source, count in source_counts.items():
 print(f"\nFile pendukung:")
 print(f"  - models/scaler_merged.pkl")
 print(f"  - models/feature_info_merged.json")
+print(f"  - data/matrix/merged.npy (+ merged_rows.npy)")
 
 print("\n" + "="*60)
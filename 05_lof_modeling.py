@@ -1,14 +1,29 @@
-import pandas as pd
 import numpy as np
-from sklearn.neighbors import LocalOutlierFactor
 import joblib
 import json
 import sys
 
+from pipeline.blocked_knn import fit_lof
+from pipeline.feature_matrix import feature_matrix_for
+from pipeline.schema import format_memory_report, load_frame
+from pipeline.score_threshold import ScoreThreshold
+
 # Set UTF-8 encoding for Windows console
 if sys.platform == 'win32':
     sys.stdout.reconfigure(encoding='utf-8')
 
+# LOF difit sekali; is_anomaly = skor di atas ambang dari distribusi skor tersimpan
+LOF_N_NEIGHBORS = 20         # k (nilai umum 10-50)
+THRESHOLD_PERCENTILE = 95.0  # Tandai skor di atas persentil ini (~5% data)
+THRESHOLD_SCORE = None       # Ambang LOF absolut (mis. 1.5); jika diisi, menimpa persentil
+
+# Backend tetangga LOF: "sklearn" (algorithm='auto') atau "blocked" (kernel BLAS berblok,
+# pipeline/blocked_knn.py). Pilih dari benchmarks/bench_blocked_knn.py.
+NEIGHBOR_BACKEND = "sklearn"
+KNN_BLOCK_ROWS = 256         # Baris query per tile (sesuaikan dengan cache L2/L3)
+KNN_BLOCK_COLS = 4096        # Baris referensi per tile
+KNN_N_THREADS = -1           # Thread (-1 = semua core)
+
 print("\n" + "="*60)
 print("TAHAP 5-6: LOF MODELING & PARAMETER TUNING")
 print("="*60)
@@ -21,8 +36,9 @@ print("PART 1: LOF MODELING - TRACKER (LOG AKTIVITAS)")
 print("="*60)
 
 # Load data normalized
-tracker_df = pd.read_csv('data/normalized/tracker_normalized.csv')
+tracker_df, tracker_schema = load_frame('data/normalized/tracker_normalized.csv')
 print(f"\n[5.1.A] Data tracker dimuat: {len(tracker_df)} baris")
+print(f"  {format_memory_report(tracker_schema)}")
 
 # Load feature info
 with open('models/feature_info_tracker.json', 'r') as f:
@@ -31,65 +47,33 @@ with open('models/feature_info_tracker.json', 'r') as f:
 feature_cols_tracker = feature_info_tracker['feature_columns']
 print(f"  Fitur untuk modeling: {len(feature_cols_tracker)} kolom")
 
-X_tracker = tracker_df[feature_cols_tracker].values
-print(f"  Matriks fitur: {X_tracker.shape}")
-
-# Grid Search untuk k optimal
-print(f"\n[5.2.A] GRID SEARCH UNTUK k OPTIMAL:")
-print(f"  Menguji nilai k: {5, 10, 15, 20, 25, 30}")
-
-k_values = [5, 10, 15, 20, 25, 30]
-grid_results_tracker = []
-
-for k in k_values:
-    print(f"\n  Testing k={k}...")
-
-    lof = LocalOutlierFactor(n_neighbors=k, contamination=0.05)
-    predictions = lof.fit_predict(X_tracker)
-    scores = lof.negative_outlier_factor_
-
-    num_anomalies = (predictions == -1).sum()
-
-    print(f"    Anomali terdeteksi: {num_anomalies} ({num_anomalies/len(X_tracker)*100:.1f}%)")
-    print(f"    LOF score range: [{scores.min():.2f}, {scores.max():.2f}]")
-
-    grid_results_tracker.append({
-        'k': k,
-        'anomalies_detected': int(num_anomalies),
-        'anomaly_percentage': float(num_anomalies/len(X_tracker)*100),
-        'lof_score_min': float(scores.min()),
-        'lof_score_max': float(scores.max()),
-        'lof_score_mean': float(scores.mean())
-    })
-
-# Pilih k optimal
-print(f"\n[5.3.A] HASIL GRID SEARCH:")
-results_df_tracker = pd.DataFrame(grid_results_tracker)
-print(results_df_tracker.to_string(index=False))
+# Matriks fitur dari data/matrix/tracker.npy (mmap, tanpa salinan); fallback ke CSV
+X_tracker, tracker_mmap = feature_matrix_for('tracker', tracker_df, feature_cols_tracker)
+print(f"  Matriks fitur: {X_tracker.shape} ({'mmap data/matrix/tracker.npy' if tracker_mmap else 'dari CSV'})")
 
-# Pilih k terdekat dengan target 5%
-target_pct = 5.0
-results_df_tracker['distance_from_target'] = abs(results_df_tracker['anomaly_percentage'] - target_pct)
-optimal_idx_tracker = results_df_tracker['distance_from_target'].idxmin()
-optimal_k_tracker = int(results_df_tracker.loc[optimal_idx_tracker, 'k'])
+# Fit LOF sekali (tanpa kuota kontaminasi); is_anomaly ditentukan dari distribusi skor
+print(f"\n[5.2.A] FIT LOF (k={LOF_N_NEIGHBORS}, backend={NEIGHBOR_BACKEND}):")
 
-print(f"\n✓ k optimal dipilih: {optimal_k_tracker}")
-print(f"  Alasan: Terdekat dengan target 5% kontaminasi")
-print(f"  Tingkat anomali: {results_df_tracker.loc[optimal_idx_tracker, 'anomaly_percentage']:.2f}%")
+optimal_k_tracker = LOF_N_NEIGHBORS
+lof_model_tracker = fit_lof(X_tracker, optimal_k_tracker, backend=NEIGHBOR_BACKEND, block_rows=KNN_BLOCK_ROWS,
+                        block_cols=KNN_BLOCK_COLS, n_threads=KNN_N_THREADS)
+tracker_scores = -lof_model_tracker.negative_outlier_factor_  # Flip sign: nilai tinggi = lebih anomali
 
-# Fit final model
-print(f"\n[5.4.A] FIT FINAL MODEL dengan k={optimal_k_tracker}:")
+# [5.3.A] Simpan distribusi skor (sketch kuantil) + aturan ambang
+print(f"\n[5.3.A] KALIBRASI AMBANG DARI DISTRIBUSI SKOR:")
+threshold_tracker = ScoreThreshold(percentile=THRESHOLD_PERCENTILE, score=THRESHOLD_SCORE).fit(tracker_scores)
+cutoff_tracker = threshold_tracker.cutoff()
+print(f"  Aturan: {threshold_tracker.rule} -> ambang LOF = {cutoff_tracker:.4f}")
+print(f"  Persentil skor: {threshold_tracker.describe()['score_percentiles']}")
 
-lof_model_tracker = LocalOutlierFactor(n_neighbors=optimal_k_tracker, contamination=0.05)
-predictions_tracker = lof_model_tracker.fit_predict(X_tracker)
-lof_scores_tracker = lof_model_tracker.negative_outlier_factor_
+print(f"\n[5.4.A] PENANDAAN ANOMALI:")
 
 # Simpan hasil ke dataframe
-tracker_df['lof_score'] = -lof_scores_tracker  # Flip sign: nilai tinggi = lebih anomali
-tracker_df['is_anomaly'] = (predictions_tracker == -1).astype(int)
+tracker_df['lof_score'] = tracker_scores
+tracker_df['is_anomaly'] = threshold_tracker.flag(tracker_scores).astype(int)
 
-print(f"  Data normal: {(predictions_tracker == 1).sum()}")
-print(f"  Data anomali: {(predictions_tracker == -1).sum()}")
+print(f"  Data normal: {(tracker_df['is_anomaly'] == 0).sum()}")
+print(f"  Data anomali: {tracker_df['is_anomaly'].sum()}")
 print(f"  Distribusi LOF score:")
 print(f"    Min: {tracker_df['lof_score'].min():.2f}")
 print(f"    Max: {tracker_df['lof_score'].max():.2f}")
@@ -103,16 +87,21 @@ print(f"\n✓ Hasil disimpan: data/anomalies/tracker_with_lof_scores.csv")
 joblib.dump(lof_model_tracker, 'models/lof_model_tracker.pkl')
 print(f"✓ Model disimpan: models/lof_model_tracker.pkl")
 
+threshold_tracker.save('models/lof_threshold_tracker.json')
+print(f"✓ Distribusi skor & ambang disimpan: models/lof_threshold_tracker.json")
+
 # Simpan config
 config_tracker = {
     'optimal_k': optimal_k_tracker,
-    'contamination': 0.05,
+    'contamination': float(tracker_df['is_anomaly'].mean()),  # Fraksi yang ditandai (hasil ambang, bukan parameter model)
+    'threshold': threshold_tracker.describe(),
+    'threshold_path': 'models/lof_threshold_tracker.json',
     'n_features': len(feature_cols_tracker),
     'feature_names': feature_cols_tracker,
     'model_type': 'LocalOutlierFactor',
-    'grid_search_results': grid_results_tracker,
-    'final_anomalies_count': int((predictions_tracker == -1).sum()),
-    'final_anomaly_percentage': float((predictions_tracker == -1).sum() / len(X_tracker) * 100)
+    'neighbor_backend': NEIGHBOR_BACKEND,
+    'final_anomalies_count': int(tracker_df['is_anomaly'].sum()),
+    'final_anomaly_percentage': float(tracker_df['is_anomaly'].mean() * 100)
 }
 
 with open('models/lof_config_tracker.json', 'w') as f:
@@ -143,8 +132,9 @@ print("PART 2: LOF MODELING - STAFF (MASTER LOGIN)")
 print("="*60)
 
 # Load data normalized
-staff_df = pd.read_csv('data/normalized/staff_normalized.csv')
+staff_df, staff_schema = load_frame('data/normalized/staff_normalized.csv')
 print(f"\n[5.1.B] Data staff dimuat: {len(staff_df)} baris")
+print(f"  {format_memory_report(staff_schema)}")
 
 # Load feature info
 with open('models/feature_info_staff.json', 'r') as f:
@@ -153,63 +143,31 @@ with open('models/feature_info_staff.json', 'r') as f:
 feature_cols_staff = feature_info_staff['feature_columns']
 print(f"  Fitur untuk modeling: {len(feature_cols_staff)} kolom")
 
-X_staff = staff_df[feature_cols_staff].values
-print(f"  Matriks fitur: {X_staff.shape}")
-
-# Grid Search untuk k optimal
-print(f"\n[5.2.B] GRID SEARCH UNTUK k OPTIMAL:")
-print(f"  Menguji nilai k: {5, 10, 15, 20, 25, 30}")
-
-grid_results_staff = []
-
-for k in k_values:
-    print(f"\n  Testing k={k}...")
-
-    lof = LocalOutlierFactor(n_neighbors=k, contamination=0.05)
-    predictions = lof.fit_predict(X_staff)
-    scores = lof.negative_outlier_factor_
+X_staff, staff_mmap = feature_matrix_for('staff', staff_df, feature_cols_staff)
+print(f"  Matriks fitur: {X_staff.shape} ({'mmap data/matrix/staff.npy' if staff_mmap else 'dari CSV'})")
 
-    num_anomalies = (predictions == -1).sum()
+# Fit LOF sekali; is_anomaly ditentukan dari distribusi skor
+print(f"\n[5.2.B] FIT LOF (k={LOF_N_NEIGHBORS}, backend={NEIGHBOR_BACKEND}):")
 
-    print(f"    Anomali terdeteksi: {num_anomalies} ({num_anomalies/len(X_staff)*100:.1f}%)")
-    print(f"    LOF score range: [{scores.min():.2f}, {scores.max():.2f}]")
+optimal_k_staff = LOF_N_NEIGHBORS
+lof_model_staff = fit_lof(X_staff, optimal_k_staff, backend=NEIGHBOR_BACKEND, block_rows=KNN_BLOCK_ROWS,
+                        block_cols=KNN_BLOCK_COLS, n_threads=KNN_N_THREADS)
+staff_scores = -lof_model_staff.negative_outlier_factor_
 
-    grid_results_staff.append({
-        'k': k,
-        'anomalies_detected': int(num_anomalies),
-        'anomaly_percentage': float(num_anomalies/len(X_staff)*100),
-        'lof_score_min': float(scores.min()),
-        'lof_score_max': float(scores.max()),
-        'lof_score_mean': float(scores.mean())
-    })
+print(f"\n[5.3.B] KALIBRASI AMBANG DARI DISTRIBUSI SKOR:")
+threshold_staff = ScoreThreshold(percentile=THRESHOLD_PERCENTILE, score=THRESHOLD_SCORE).fit(staff_scores)
+cutoff_staff = threshold_staff.cutoff()
+print(f"  Aturan: {threshold_staff.rule} -> ambang LOF = {cutoff_staff:.4f}")
+print(f"  Persentil skor: {threshold_staff.describe()['score_percentiles']}")
 
-# Pilih k optimal
-print(f"\n[5.3.B] HASIL GRID SEARCH:")
-results_df_staff = pd.DataFrame(grid_results_staff)
-print(results_df_staff.to_string(index=False))
-
-# Pilih k terdekat dengan target 5%
-results_df_staff['distance_from_target'] = abs(results_df_staff['anomaly_percentage'] - target_pct)
-optimal_idx_staff = results_df_staff['distance_from_target'].idxmin()
-optimal_k_staff = int(results_df_staff.loc[optimal_idx_staff, 'k'])
-
-print(f"\n✓ k optimal dipilih: {optimal_k_staff}")
-print(f"  Alasan: Terdekat dengan target 5% kontaminasi")
-print(f"  Tingkat anomali: {results_df_staff.loc[optimal_idx_staff, 'anomaly_percentage']:.2f}%")
-
-# Fit final model
-print(f"\n[5.4.B] FIT FINAL MODEL dengan k={optimal_k_staff}:")
-
-lof_model_staff = LocalOutlierFactor(n_neighbors=optimal_k_staff, contamination=0.05)
-predictions_staff = lof_model_staff.fit_predict(X_staff)
-lof_scores_staff = lof_model_staff.negative_outlier_factor_
+print(f"\n[5.4.B] PENANDAAN ANOMALI:")
 
 # Simpan hasil ke dataframe
-staff_df['lof_score'] = -lof_scores_staff
-staff_df['is_anomaly'] = (predictions_staff == -1).astype(int)
+staff_df['lof_score'] = staff_scores
+staff_df['is_anomaly'] = threshold_staff.flag(staff_scores).astype(int)
 
-print(f"  Data normal: {(predictions_staff == 1).sum()}")
-print(f"  Data anomali: {(predictions_staff == -1).sum()}")
+print(f"  Data normal: {(staff_df['is_anomaly'] == 0).sum()}")
+print(f"  Data anomali: {staff_df['is_anomaly'].sum()}")
 print(f"  Distribusi LOF score:")
 print(f"    Min: {staff_df['lof_score'].min():.2f}")
 print(f"    Max: {staff_df['lof_score'].max():.2f}")
@@ -223,16 +181,21 @@ print(f"\n✓ Hasil disimpan: data/anomalies/staff_with_lof_scores.csv")
 joblib.dump(lof_model_staff, 'models/lof_model_staff.pkl')
 print(f"✓ Model disimpan: models/lof_model_staff.pkl")
 
+threshold_staff.save('models/lof_threshold_staff.json')
+print(f"✓ Distribusi skor & ambang disimpan: models/lof_threshold_staff.json")
+
 # Simpan config
 config_staff = {
     'optimal_k': optimal_k_staff,
-    'contamination': 0.05,
+    'contamination': float(staff_df['is_anomaly'].mean()),  # Fraksi yang ditandai (hasil ambang, bukan parameter model)
+    'threshold': threshold_staff.describe(),
+    'threshold_path': 'models/lof_threshold_staff.json',
     'n_features': len(feature_cols_staff),
     'feature_names': feature_cols_staff,
     'model_type': 'LocalOutlierFactor',
-    'grid_search_results': grid_results_staff,
-    'final_anomalies_count': int((predictions_staff == -1).sum()),
-    'final_anomaly_percentage': float((predictions_staff == -1).sum() / len(X_staff) * 100)
+    'neighbor_backend': NEIGHBOR_BACKEND,
+    'final_anomalies_count': int(staff_df['is_anomaly'].sum()),
+    'final_anomaly_percentage': float(staff_df['is_anomaly'].mean() * 100)
 }
 
 with open('models/lof_config_staff.json', 'w') as f:
@@ -260,8 +223,8 @@ print("TAHAP 5-6 SELESAI - RINGKASAN LOF MODELING")
 print("="*60)
 
 print(f"\n1. TRACKER (LOG AKTIVITAS):")
-print(f"   k optimal: {optimal_k_tracker}")
-print(f"   Kontaminasi: 5%")
+print(f"   k: {optimal_k_tracker}")
+print(f"   Ambang: {threshold_tracker.rule} -> LOF > {cutoff_tracker:.4f}")
 print(f"   Total data: {len(tracker_df)}")
 print(f"   Anomali terdeteksi: {len(anomalies_tracker)} ({len(anomalies_tracker)/len(tracker_df)*100:.1f}%)")
 print(f"   LOF score range: [{tracker_df['lof_score'].min():.2f}, {tracker_df['lof_score'].max():.2f}]")
@@ -269,10 +232,11 @@ print(f"   File hasil:")
 print(f"     - data/anomalies/tracker_with_lof_scores.csv")
 print(f"     - models/lof_model_tracker.pkl")
 print(f"     - models/lof_config_tracker.json")
+print(f"     - models/lof_threshold_tracker.json")
 
 print(f"\n2. STAFF (MASTER LOGIN):")
-print(f"   k optimal: {optimal_k_staff}")
-print(f"   Kontaminasi: 5%")
+print(f"   k: {optimal_k_staff}")
+print(f"   Ambang: {threshold_staff.rule} -> LOF > {cutoff_staff:.4f}")
 print(f"   Total data: {len(staff_df)}")
 print(f"   Anomali terdeteksi: {len(anomalies_staff)} ({len(anomalies_staff)/len(staff_df)*100:.1f}%)")
 print(f"   LOF score range: [{staff_df['lof_score'].min():.2f}, {staff_df['lof_score'].max():.2f}]")
@@ -280,5 +244,6 @@ print(f"   File hasil:")
 print(f"     - data/anomalies/staff_with_lof_scores.csv")
 print(f"     - models/lof_model_staff.pkl")
 print(f"     - models/lof_config_staff.json")
+print(f"     - models/lof_threshold_staff.json")
 
 print("\n" + "="*60)
@@ -1,22 +1,55 @@
-import pandas as pd
 import numpy as np
-from sklearn.neighbors import LocalOutlierFactor
 import joblib
 import json
 import sys
 
+from pipeline.blocked_knn import fit_lof
+from pipeline.ensemble_lof import EnsembleLOF
+from pipeline.feature_matrix import feature_matrix_for
+from pipeline.schema import format_memory_report, load_frame
+from pipeline.score_threshold import ScoreThreshold
+from pipeline.sharded_lof import ShardedLOF
+
 # Set UTF-8 encoding for Windows console
 if sys.platform == 'win32':
     sys.stdout.reconfigure(encoding='utf-8')
 
+# LOF difit sekali; is_anomaly = skor di atas ambang dari distribusi skor tersimpan
+LOF_N_NEIGHBORS = 20             # k untuk LOF penuh
+THRESHOLD_PERCENTILE = 95.0      # Tandai skor di atas persentil ini (~5% data)
+THRESHOLD_SCORE = None           # Ambang LOF absolut (mis. 1.5); jika diisi, menimpa persentil
+
+# Backend tetangga LOF: "sklearn" (algorithm='auto') atau "blocked" (kernel BLAS berblok,
+# pipeline/blocked_knn.py). Pilih dari benchmarks/bench_blocked_knn.py.
+NEIGHBOR_BACKEND = "sklearn"
+KNN_BLOCK_ROWS = 256             # Baris query per tile (sesuaikan dengan cache L2/L3)
+KNN_BLOCK_COLS = 4096            # Baris referensi per tile
+KNN_N_THREADS = -1               # Thread (-1 = semua core)
+
+# Mode LOF per shard: satu LOF per nilai kolom kunci (mis. 'dataset_source', 'month',
+# kohort user), paralel antar proses; skor dinormalisasi antar shard. None = satu LOF global.
+SHARD_KEY = None
+SHARD_NORMALIZE = "rank"         # "rank" (persentil per shard), "robust" (skala LOF, ekor atas), "none"
+SHARD_MIN_ROWS = 200             # Shard lebih kecil digabung ke '__other__'
+SHARD_N_JOBS = -1                # Proses paralel (-1 = semua core)
+
+# Mode ensemble LOF (subsampel) untuk dataset yang terlalu besar bagi satu LOF penuh.
+# Pilih s dan M dari benchmarks/bench_ensemble_lof.py sesuai anggaran throughput.
+ENSEMBLE_MIN_ROWS = 200_000      # Mulai jumlah baris ini, pakai ensemble
+ENSEMBLE_N_ESTIMATORS = 10       # M: jumlah model
+ENSEMBLE_MAX_SAMPLES = 2048      # s: baris referensi per model
+ENSEMBLE_K = 20                  # k setara LOF penuh (diskalakan k*s/n per model)
+ENSEMBLE_N_JOBS = -1             # Proses paralel (-1 = semua core)
+
 print("\n" + "="*80)
 print("TAHAP 5-6: LOF ANOMALY DETECTION - MERGED DATASET")
 print("="*80)
 
 # Load normalized merged data
 print("\n[5.1] Memuat data normalized...")
-merged_df = pd.read_csv('data/normalized/merged_normalized.csv')
+merged_df, merged_schema = load_frame('data/normalized/merged_normalized.csv')
 print(f"  Data dimuat: {len(merged_df)} baris")
+print(f"  {format_memory_report(merged_schema)}")
 
 # Show distribution by source
 source_counts = merged_df['dataset_source'].value_counts()
@@ -33,76 +66,73 @@ print(f"\n[5.2] Fitur untuk modeling: {len(feature_cols)}")
 for i, col in enumerate(feature_cols, 1):
     print(f"  {i:>2}. {col}")
 
-# Extract features
-X = merged_df[feature_cols].values
-print(f"\n  Matriks fitur: {X.shape}")
+# Extract features (mmap dari data/matrix/merged.npy; fallback ke CSV)
+X, merged_mmap = feature_matrix_for('merged', merged_df, feature_cols)
+print(f"\n  Matriks fitur: {X.shape} ({'mmap data/matrix/merged.npy' if merged_mmap else 'dari CSV'})")
 
 # ============================================================================
-# GRID SEARCH FOR OPTIMAL K
+# TRAIN LOF MODEL (sekali, tanpa kuota kontaminasi)
 # ============================================================================
+use_sharded = SHARD_KEY is not None
+use_ensemble = not use_sharded and len(X) >= ENSEMBLE_MIN_ROWS
+best_k = ENSEMBLE_K if use_ensemble else LOF_N_NEIGHBORS
+
 print("\n" + "="*80)
-print("[5.3] GRID SEARCH - Mencari k optimal")
+print(f"[5.3] Training LOF dengan k={best_k}")
 print("="*80)
 
-contamination = 0.05  # 5% expected anomalies
-k_values = [5, 10, 15, 20, 25, 30]
-
-grid_results = []
-
-print(f"\nTarget contamination: {contamination*100}%")
-print(f"Testing k values: {k_values}\n")
-print(f"{'k':<5} {'Anomalies':<12} {'Percentage':<12} {'Diff from Target':<18}")
-print("-" * 50)
-
-best_k = None
-best_diff = float('inf')
-
-for k in k_values:
-    # Train LOF
-    lof = LocalOutlierFactor(n_neighbors=k, contamination=contamination)
-    y_pred = lof.fit_predict(X)
-
-    # Calculate stats
-    anomalies = (y_pred == -1).sum()
-    percentage = (anomalies / len(X)) * 100
-    diff = abs(percentage - (contamination * 100))
-
-    # Store results
-    grid_results.append({
-        'k': k,
-        'anomalies_detected': int(anomalies),
-        'anomaly_percentage': float(percentage),
-        'lof_score_min': float(lof.negative_outlier_factor_.min()),
-        'lof_score_max': float(lof.negative_outlier_factor_.max()),
-        'lof_score_mean': float(lof.negative_outlier_factor_.mean())
-    })
-
-    # Track best k
-    if diff < best_diff:
-        best_diff = diff
-        best_k = k
-
-    print(f"{k:<5} {anomalies:<12} {percentage:<12.2f} {diff:<18.2f}")
-
-print("-" * 50)
-print(f"\n✓ Optimal k dipilih: {best_k} (paling dekat dengan target {contamination*100}%)")
+if use_ensemble:
+    # M model pada subsampel s baris, paralel antar proses; memori O(M*s)
+    print(f"\nData {len(X):,} baris >= {ENSEMBLE_MIN_ROWS:,}: mode ensemble LOF")
+    lof_model = EnsembleLOF(n_estimators=ENSEMBLE_N_ESTIMATORS, max_samples=ENSEMBLE_MAX_SAMPLES,
+                            n_neighbors=best_k, n_jobs=ENSEMBLE_N_JOBS)
+    lof_scores = lof_model.fit_score(X)
+    print(f"  Ensemble: M={len(lof_model.estimators_)}, s={ENSEMBLE_MAX_SAMPLES:,}, "
+          f"k per model={lof_model.member_neighbors_}")
+elif use_sharded:
+    # Satu LOF per shard, shard terbesar lebih dulu; waktu ~ shard terbesar bila core cukup
+    print(f"\nMode LOF per shard: kunci '{SHARD_KEY}', normalisasi '{SHARD_NORMALIZE}'")
+    lof_model = ShardedLOF(n_neighbors=best_k, normalize=SHARD_NORMALIZE, min_shard_rows=SHARD_MIN_ROWS,
+                           backend=NEIGHBOR_BACKEND, n_jobs=SHARD_N_JOBS,
+                           block_rows=KNN_BLOCK_ROWS, block_cols=KNN_BLOCK_COLS)
+    lof_scores = lof_model.fit_score(X, merged_df[SHARD_KEY])
+    merged_df['lof_shard'] = lof_model.shards_
+    merged_df['lof_score_raw'] = lof_model.raw_scores_
+    for shard, stats in lof_model.shard_stats_.items():
+        print(f"  {shard}: {stats['rows']:,} baris, k={stats['n_neighbors']}, "
+              f"median={stats['median']:.4f}, spread={stats['spread']:.4f}")
+else:
+    print(f"  Backend tetangga: {NEIGHBOR_BACKEND}")
+    lof_model = fit_lof(X, best_k, backend=NEIGHBOR_BACKEND, block_rows=KNN_BLOCK_ROWS,
+                        block_cols=KNN_BLOCK_COLS, n_threads=KNN_N_THREADS)
+
+    # Get LOF scores (negative outlier factor)
+    lof_scores = -lof_model.negative_outlier_factor_  # Convert to positive
 
 # ============================================================================
-# TRAIN FINAL LOF MODEL
+# THRESHOLD DARI DISTRIBUSI SKOR
 # ============================================================================
 print("\n" + "="*80)
-print(f"[5.4] Training LOF dengan k={best_k}")
+print("[5.4] Kalibrasi ambang dari distribusi skor")
 print("="*80)
 
-lof_model = LocalOutlierFactor(n_neighbors=best_k, contamination=contamination)
-y_pred = lof_model.fit_predict(X)
+threshold = ScoreThreshold(percentile=THRESHOLD_PERCENTILE, score=THRESHOLD_SCORE).fit(lof_scores)
+cutoff = threshold.cutoff()
+is_anomaly = threshold.flag(lof_scores)
+print(f"  Aturan: {threshold.rule} -> ambang LOF = {cutoff:.4f}")
+print(f"  Persentil skor: {threshold.describe()['score_percentiles']}")
 
-# Get LOF scores (negative outlier factor)
-lof_scores = -lof_model.negative_outlier_factor_  # Convert to positive
+if use_sharded:
+    # Tingkat tandai per shard: normalisasi yang gagal terlihat sebagai shard dengan 0%
+    print(f"\n  Tingkat tandai per shard:")
+    for shard, stats in lof_model.shard_stats_.items():
+        shard_flagged = int(is_anomaly[lof_model.shards_ == shard].sum())
+        stats['flagged'] = shard_flagged
+        print(f"    {shard}: {shard_flagged}/{stats['rows']:,} ({shard_flagged / stats['rows'] * 100:.2f}%)")
 
 # Add LOF scores to dataframe
 merged_df['lof_score'] = lof_scores
-merged_df['is_anomaly'] = (y_pred == -1).astype(int)
+merged_df['is_anomaly'] = is_anomaly.astype(int)
 
 # Statistics
 total_anomalies = merged_df['is_anomaly'].sum()
@@ -127,7 +157,7 @@ top_anomalies = merged_df[merged_df['is_anomaly']==1].nlargest(10, 'lof_score')
 print(f"{'User':<8} {'Source':<10} {'LOF Score':<15} {'Timestamp':<20}")
 print("-" * 60)
 for idx, row in top_anomalies.iterrows():
-    print(f"{row['user_id']:<8} {row['dataset_source']:<10} {row['lof_score']:<15.2e} {row['timestamp'][:19]}")
+    print(f"{row['user_id']:<8} {row['dataset_source']:<10} {row['lof_score']:<15.2e} {str(row['timestamp'])[:19]}")
 
 # ============================================================================
 # SAVE RESULTS
@@ -145,14 +175,27 @@ print(f"✓ Data dengan LOF scores tersimpan: {output_path}")
 joblib.dump(lof_model, 'models/lof_model_merged.pkl')
 print(f"✓ Model LOF tersimpan: models/lof_model_merged.pkl")
 
+# Save score distribution + threshold rule (dashboard menggeser ambang tanpa refit)
+threshold.save('models/lof_threshold_merged.json')
+print(f"✓ Distribusi skor & ambang tersimpan: models/lof_threshold_merged.json")
+
 # Save configuration
 config = {
     'optimal_k': best_k,
-    'contamination': contamination,
+    'contamination': float(anomaly_pct / 100),  # Fraksi yang ditandai (hasil ambang, bukan parameter model)
+    'threshold': threshold.describe(),
+    'threshold_path': 'models/lof_threshold_merged.json',
     'n_features': len(feature_cols),
     'feature_names': feature_cols,
-    'model_type': 'LocalOutlierFactor',
-    'grid_search_results': grid_results,
+    'model_type': 'EnsembleLOF' if use_ensemble else 'ShardedLOF' if use_sharded else 'LocalOutlierFactor',
+    'neighbor_backend': NEIGHBOR_BACKEND,
+    'ensemble': {
+        'n_estimators': len(lof_model.estimators_),
+        'max_samples': ENSEMBLE_MAX_SAMPLES,
+        'member_neighbors': lof_model.member_neighbors_,
+        'aggregate': lof_model.aggregate,
+    } if use_ensemble else None,
+    'sharding': {'key': SHARD_KEY, **lof_model.summary()} if use_sharded else None,
     'final_anomalies_count': int(total_anomalies),
     'final_anomaly_percentage': float(anomaly_pct),
     'source_distribution': {
@@ -175,9 +218,11 @@ print("\n" + "="*80)
 print("TAHAP 5-6 SELESAI - RINGKASAN LOF ANOMALY DETECTION")
 print("="*80)
 
-print(f"\nModel: Local Outlier Factor")
-print(f"Optimal k: {best_k}")
-print(f"Contamination: {contamination*100}%")
+model_name = ('Ensemble LOF (subsampel)' if use_ensemble
+              else f"LOF per shard ('{SHARD_KEY}')" if use_sharded else 'Local Outlier Factor')
+print(f"\nModel: {model_name}")
+print(f"k: {best_k}")
+print(f"Ambang: {threshold.rule} -> LOF > {cutoff:.4f}")
 print(f"Total fitur: {len(feature_cols)}")
 
 print(f"\nHasil deteksi:")
@@ -196,5 +241,6 @@ print(f"\nFile output:")
 print(f"  - {output_path}")
 print(f"  - models/lof_model_merged.pkl")
 print(f"  - models/lof_config_merged.json")
+print(f"  - models/lof_threshold_merged.json")
 
 print("\n" + "="*80)
@@ -1,22 +1,32 @@
-import pandas as pd
 import numpy as np
 from sklearn.cluster import KMeans
-from sklearn.metrics import silhouette_score
 import json
 import sys
 
+from pipeline.blocked_knn import blocked_silhouette_score
+from pipeline.cubes import build_cubes, write_cubes
+from pipeline.feature_matrix import feature_matrix_for
+from pipeline.model_registry import register_stage_outputs
+from pipeline.schema import format_memory_report, load_frame
+
 # Set UTF-8 encoding for Windows console
 if sys.platform == 'win32':
     sys.stdout.reconfigure(encoding='utf-8')
 
+# Silhouette dengan kernel jarak berblok (tile = baris x kolom, sesuaikan dengan cache L2/L3)
+SILHOUETTE_BLOCK_ROWS = 256
+SILHOUETTE_BLOCK_COLS = 4096
+SILHOUETTE_N_THREADS = -1
+
 print("\n" + "="*80)
 print("TAHAP 7: K-MEANS CLUSTERING - MERGED DATASET ANOMALIES")
 print("="*80)
 
 # Load anomalies data
 print("\n[7.1] Memuat data anomali...")
-merged_df = pd.read_csv('data/anomalies/merged_with_lof_scores.csv')
+merged_df, merged_schema = load_frame('data/anomalies/merged_with_lof_scores.csv')
 print(f"  Total data: {len(merged_df):,} baris")
+print(f"  {format_memory_report(merged_schema)}")
 
 # Filter only anomalies
 anomalies_df = merged_df[merged_df['is_anomaly'] == 1].copy()
@@ -40,9 +50,9 @@ with open('models/feature_info_merged.json', 'r') as f:
 feature_cols = feature_info['feature_columns']
 print(f"\n[7.2] Fitur untuk clustering: {len(feature_cols)}")
 
-# Extract features (already normalized)
-X_anomalies = anomalies_df[feature_cols].values
-print(f"  Matriks fitur anomali: {X_anomalies.shape}")
+# Extract features (already normalized): hanya baris anomali dari matriks mmap
+X_anomalies, anomalies_mmap = feature_matrix_for('merged', anomalies_df, feature_cols)
+print(f"  Matriks fitur anomali: {X_anomalies.shape} ({'mmap data/matrix/merged.npy' if anomalies_mmap else 'dari CSV'})")
 
 # ============================================================================
 # DETERMINE OPTIMAL NUMBER OF CLUSTERS
@@ -72,7 +82,8 @@ for k in k_range:
 
     # Calculate metrics
     inertia = kmeans.inertia_
-    sil_score = silhouette_score(X_anomalies, cluster_labels)
+    sil_score = blocked_silhouette_score(X_anomalies, cluster_labels, block_rows=SILHOUETTE_BLOCK_ROWS,
+                                         block_cols=SILHOUETTE_BLOCK_COLS, n_threads=SILHOUETTE_N_THREADS)
 
     inertias.append(inertia)
     silhouette_scores.append(sil_score)
@@ -158,7 +169,7 @@ for cluster_id in range(optimal_k):
     print(f"\n  Contoh 3 Anomali Teratas (LOF Score):")
     top_samples = cluster_data.nlargest(3, 'lof_score')
     for idx, row in top_samples.iterrows():
-        print(f"    User {row['user_id']} | {row['timestamp'][:19]} | LOF: {row['lof_score']:.2e}")
+        print(f"    User {row['user_id']} | {str(row['timestamp'])[:19]} | LOF: {row['lof_score']:.2e}")
 
 # ============================================================================
 # CLUSTER INTERPRETATIONS
@@ -236,6 +247,10 @@ output_path = 'data/anomalies/merged_anomalies_clustered.csv'
 merged_df.to_csv(output_path, index=False)
 print(f"✓ Data dengan cluster labels tersimpan: {output_path}")
 
+# Agregat dashboard (hari x jam x cluster x source, top user, kuantil skor)
+cubes_path = write_cubes(build_cubes(merged_df, 'merged'), 'merged', source_path=output_path)
+print(f"✓ Cube dashboard tersimpan: {cubes_path}")
+
 # Save K-Means configuration
 kmeans_config = {
     'optimal_k': optimal_k,
@@ -258,6 +273,11 @@ with open('models/kmeans_config_merged.json', 'w') as f:
     json.dump(kmeans_config, f, indent=2)
 print(f"✓ Konfigurasi K-Means tersimpan: models/kmeans_config_merged.json")
 
+# Satu bundle berversi per run: scaler + data referensi LOF + K-Means + spesifikasi fitur
+bundle = register_stage_outputs('merged', kmeans=kmeans_final, kmeans_feature_columns=feature_cols)
+bundle_path = f"models/registry/merged/v{bundle['version']:04d}"
+print(f"✓ Bundle model terdaftar: {bundle_path} (sha256 {bundle['bundle_sha256'][:12]})")
+
 # ============================================================================
 # SUMMARY
 # ============================================================================
@@ -283,6 +303,7 @@ for cluster_id, count in cluster_counts.items():
 print(f"\nFile output:")
 print(f"  - {output_path}")
 print(f"  - models/kmeans_config_merged.json")
+print(f"  - {bundle_path}/")
 
 print("\n" + "="*80)
 print("Pipeline LOF + K-Means selesai!")
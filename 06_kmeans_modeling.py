@@ -1,10 +1,20 @@
 import json
 import sys
+from typing import Optional
 
 import joblib
+import numpy as np
 import pandas as pd
 from sklearn.cluster import KMeans
-from sklearn.metrics import davies_bouldin_score, silhouette_score
+from sklearn.metrics import davies_bouldin_score
+
+from pipeline.blocked_knn import blocked_silhouette_score
+from pipeline.cubes import NO_CLUSTER, build_cubes, write_cubes
+from pipeline.model_registry import register_stage_outputs
+from pipeline.schema import format_memory_report, load_frame
+from pipeline.sql_fingerprint import extract_fields, ip_last_octet
+from pipeline.timeparse import calendar_fields, combine_date_time, epoch_seconds, parse_timestamps
+from pipeline.user_profiles import PROFILE_STORE_PATH, ProfileStore
 
 
 if sys.platform == "win32":  # ensure UTF-8 output on Windows
@@ -13,20 +23,40 @@ if sys.platform == "win32":  # ensure UTF-8 output on Windows
 
 WORK_START = 8
 WORK_END = 19
+# Calendar values used when a timestamp cannot be parsed
+CALENDAR_DEFAULTS = {"hour": 0, "day_of_week": 0, "day_of_month": 1, "month": 1}
+# Silhouette via the blocked distance kernel (tile = rows x cols, sized to L2/L3)
+SILHOUETTE_BLOCK_ROWS = 256
+SILHOUETTE_BLOCK_COLS = 4096
+SILHOUETTE_N_THREADS = -1
+# Processes for the combined IP/verb/table extraction (-1 = all cores)
+FINGERPRINT_N_JOBS = -1
+
+
+def silhouette_of(X: np.ndarray, labels: np.ndarray) -> float:
+    return blocked_silhouette_score(
+        X,
+        labels,
+        block_rows=SILHOUETTE_BLOCK_ROWS,
+        block_cols=SILHOUETTE_BLOCK_COLS,
+        n_threads=SILHOUETTE_N_THREADS,
+    )
 
 
 def attach_timestamp(df: pd.DataFrame) -> pd.DataFrame:
     df = df.copy()
     if "date" in df.columns and df["date"].notnull().any():
-        ts_series = df["date"].astype(str).str.strip() + " " + df["timestamp"].astype(str).str.strip()
+        df["timestamp_dt"] = combine_date_time(df["date"], df["timestamp"], source="staff")
     else:
-        ts_series = df["timestamp"].astype(str).str.strip()
+        df["timestamp_dt"] = parse_timestamps(df["timestamp"], source="tracker")
 
-    df["timestamp_dt"] = pd.to_datetime(ts_series, errors="coerce")
-    df["hour_actual"] = df["timestamp_dt"].dt.hour.fillna(0).astype(int)
-    df["day_of_week_actual"] = df["timestamp_dt"].dt.dayofweek.fillna(0).astype(int)
-    df["day_of_month_actual"] = df["timestamp_dt"].dt.day.fillna(1).astype(int)
-    df["month_actual"] = df["timestamp_dt"].dt.month.fillna(1).astype(int)
+    # Calendar fields by integer arithmetic on epoch seconds
+    df["epoch_s"] = epoch_seconds(df["timestamp_dt"])
+    valid = df["epoch_s"].notna().to_numpy()
+    calendar = calendar_fields(df["epoch_s"].fillna(0))
+    for field, default in CALENDAR_DEFAULTS.items():
+        df[f"{field}_actual"] = np.where(valid, calendar[field], default).astype(int)
+    df["day_index"] = calendar["day_index"].where(valid)
 
     df["is_outside_work_hours"] = (
         (df["hour_actual"] < WORK_START) | (df["hour_actual"] >= WORK_END)
@@ -37,6 +67,49 @@ def attach_timestamp(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
+def user_profiles(dataset: str, user_ids: pd.Series) -> Optional[pd.DataFrame]:
+    """Store features aligned with ``user_ids``; None when the store misses any user."""
+    store = ProfileStore(PROFILE_STORE_PATH)
+    try:
+        profiles = store.features(dataset, user_ids)
+    finally:
+        store.close()
+
+    events = profiles.get("events")
+    covered = events.notna() if events is not None else pd.Series(False, index=profiles.index)
+    missing = pd.unique(user_ids[~covered & user_ids.notna()])
+    if len(missing):
+        examples = ", ".join(str(user) for user in missing[:5])
+        print(f"  ⚠ Profile store tidak memuat {len(missing)} user {dataset} (mis. {examples}); "
+              f"statistik per-user dihitung ulang dari data")
+        return None
+    return profiles
+
+
+def tracker_profiles_from_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Per-user statistics of the tracker frame itself, in the store's column names."""
+    daily_counts = df.groupby(["user_id", "day_index"]).size()
+    daily_avg = daily_counts.groupby(level=0).mean()
+    diversity = df.groupby("user_id")["query_type"].nunique()
+    delete_counts = df[df["query_type"] == "DELETE"].groupby("user_id").size()
+    return pd.DataFrame({
+        "avg_daily_activity": df["user_id"].map(daily_avg),
+        "distinct_ops": df["user_id"].map(diversity),
+        "delete_count": df["user_id"].map(delete_counts).fillna(0).astype(int),
+    })
+
+
+def staff_profiles_from_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Per-user statistics of the staff frame itself, in the store's column names."""
+    date_str = df["date"].astype(str).str.strip()
+    daily_counts = df.groupby(["user_id", date_str]).size()
+    daily_avg = daily_counts.groupby(level=0).mean()
+    return pd.DataFrame({
+        "avg_daily_activity": df["user_id"].map(daily_avg),
+        "active_days": date_str.groupby(df["user_id"]).transform("nunique"),
+    })
+
+
 def build_tracker_features(df: pd.DataFrame) -> tuple[pd.DataFrame, list[str]]:
     df = df.copy()
     df = attach_timestamp(df)
@@ -51,18 +124,19 @@ def build_tracker_features(df: pd.DataFrame) -> tuple[pd.DataFrame, list[str]]:
     else:
         df["query_length_normalized"] = 0
 
-    df["ip_address"] = df["query_text"].str.extract(r"(\d{1,3}(?:\.\d{1,3}){3})", expand=False).fillna("0.0.0.0")
-    df["ip_last_octet"] = df["ip_address"].apply(lambda ip: int(ip.split(".")[-1]) if pd.notna(ip) and "." in ip else 0)
+    # IP from the combined IP/verb/table pattern (one match per distinct query)
+    ips = extract_fields(df["query_info"], n_jobs=FINGERPRINT_N_JOBS)["ip"]
+    df["ip_address"] = ips.astype(str).where(ips.notna(), "0.0.0.0")
+    df["ip_last_octet"] = ip_last_octet(ips)
 
-    daily_counts = df.groupby(["user_id", df["timestamp_dt"].dt.date]).size()
-    daily_avg = daily_counts.groupby(level=0).mean()
-    df["user_avg_daily_activity"] = df["user_id"].map(daily_avg).fillna(0)
-
-    diversity = df.groupby("user_id")["query_type"].nunique()
-    df["user_query_diversity"] = df["user_id"].map(diversity).fillna(0)
-
-    delete_counts = df[df["query_type"] == "DELETE"].groupby("user_id").size()
-    df["delete_operation_count"] = df["user_id"].map(delete_counts).fillna(0)
+    # Per-user statistics from the profile store written by stage 03 (one lookup per user);
+    # recomputed from the frame when the store does not cover every user
+    profiles = user_profiles("tracker", df["user_id"])
+    if profiles is None:
+        profiles = tracker_profiles_from_frame(df)
+    df["user_avg_daily_activity"] = profiles["avg_daily_activity"].fillna(0)
+    df["user_query_diversity"] = profiles["distinct_ops"].fillna(0)
+    df["delete_operation_count"] = profiles["delete_count"].fillna(0)
 
     df["modification_ratio"] = df["rasio_operasi_modifikasi"].fillna(0)
 
@@ -93,7 +167,7 @@ def build_tracker_features(df: pd.DataFrame) -> tuple[pd.DataFrame, list[str]]:
     ]
 
     # compute IP hits per hour for anomalies later on
-    df["hour_bucket"] = df["timestamp_dt"].dt.floor("h")
+    df["hour_bucket"] = df["epoch_s"] // 3600
 
     return df, feature_cols
 
@@ -102,12 +176,11 @@ def build_staff_features(df: pd.DataFrame) -> tuple[pd.DataFrame, list[str]]:
     df = df.copy()
     df = attach_timestamp(df)
 
-    df["date_str"] = df["date"].astype(str).str.strip()
-    daily_counts = df.groupby(["user_id", df["date_str"]]).size()
-    daily_avg = daily_counts.groupby(level=0).mean()
-    df["user_avg_daily_activity"] = df["user_id"].map(daily_avg).fillna(0)
-
-    df["login_day_diversity"] = df.groupby("user_id")["date_str"].transform("nunique")
+    profiles = user_profiles("staff", df["user_id"])
+    if profiles is None:
+        profiles = staff_profiles_from_frame(df)
+    df["user_avg_daily_activity"] = profiles["avg_daily_activity"].fillna(0)
+    df["login_day_diversity"] = profiles["active_days"].fillna(0)
 
     feature_cols = [
         "hour_actual",
@@ -134,7 +207,7 @@ def build_staff_features(df: pd.DataFrame) -> tuple[pd.DataFrame, list[str]]:
         if col not in df.columns:
             df[col] = 0
 
-    df["hour_bucket"] = df["timestamp_dt"].dt.floor("h")
+    df["hour_bucket"] = df["epoch_s"] // 3600
 
     return df, feature_cols
 
@@ -192,7 +265,7 @@ def run_clustering(
         labels = kmeans.fit_predict(X)
 
         inertia = float(kmeans.inertia_)
-        silhouette = float(silhouette_score(X, labels))
+        silhouette = silhouette_of(X, labels)
         davies = float(davies_bouldin_score(X, labels))
 
         print(f"\n  k={k}: Inertia={inertia:.0f}, Silhouette={silhouette:.3f}, Davies-Bouldin={davies:.3f}")
@@ -225,7 +298,7 @@ def run_clustering(
     cluster_labels = final_kmeans.fit_predict(X)
     anomalies_df["cluster"] = cluster_labels
 
-    final_silhouette = float(silhouette_score(X, cluster_labels))
+    final_silhouette = silhouette_of(X, cluster_labels)
     final_db = float(davies_bouldin_score(X, cluster_labels))
 
     print("\n[7.4] CLUSTER DISTRIBUTION:")
@@ -248,7 +321,7 @@ def run_clustering(
             else "N/A"
         )
 
-        peak_hour_series = cluster_data["timestamp_dt"].dt.hour
+        peak_hour_series = cluster_data.loc[cluster_data["epoch_s"].notna(), "hour_actual"]
         peak_hour = int(peak_hour_series.mode().iloc[0]) if not peak_hour_series.empty else "N/A"
         outside_pct = cluster_data["is_outside_work_hours"].mean() * 100
 
@@ -284,9 +357,20 @@ def run_clustering(
     with open(config["config_path"], "w", encoding="utf-8") as cfg:
         json.dump(cluster_config, cfg, indent=2)
 
+    # Dashboard aggregates over all scored rows; rows that were not clustered keep cluster -1
+    scored = df.assign(cluster=NO_CLUSTER)
+    scored.loc[anomalies_df.index, "cluster"] = cluster_labels
+    cubes_path = write_cubes(build_cubes(scored, name), name, source_path=config["clustered_csv"])
+
     print(f"\nSaved clustered data to {config['clustered_csv']}")
     print(f"Saved K-Means model to {config['model_path']}")
     print(f"Saved config to {config['config_path']}")
+    print(f"Saved dashboard cubes to {cubes_path}")
+
+    # One versioned bundle per run: scaler + LOF reference data + K-Means + feature spec
+    manifest = register_stage_outputs(name, kmeans=final_kmeans, kmeans_feature_columns=feature_cols_extended)
+    print(f"Registered bundle models/registry/{name}/v{manifest['version']:04d} "
+          f"(sha256 {manifest['bundle_sha256'][:12]})")
 
 
 def main() -> None:
@@ -321,7 +405,8 @@ def main() -> None:
     ]
 
     for dataset in datasets:
-        df = pd.read_csv(dataset["input"])
+        df, schema = load_frame(dataset["input"])
+        print(f"\n{dataset['name']}: {format_memory_report(schema)}")
         enriched_df, feature_cols = dataset["builder"](df)
 
         config = {
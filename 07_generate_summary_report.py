@@ -1,9 +1,10 @@
-import pandas as pd
 import json
 from datetime import datetime
 from pathlib import Path
 import sys
 
+from pipeline.schema import format_memory_report, load_frame
+
 # Set UTF-8 encoding for Windows console
 if sys.platform == 'win32':
     sys.stdout.reconfigure(encoding='utf-8')
@@ -14,12 +15,23 @@ print("="*80)
 
 # Load all necessary data
 print("\n[1] Memuat data...")
-merged_df = pd.read_csv('data/anomalies/merged_anomalies_clustered.csv')
+merged_df, merged_schema = load_frame('data/anomalies/merged_anomalies_clustered.csv')
+print(f"  {format_memory_report(merged_schema)}")
 anomalies_df = merged_df[merged_df['is_anomaly'] == 1]
 
 with open('models/lof_config_merged.json', 'r') as f:
     lof_config = json.load(f)
 
+# Aturan ambang LOF (persentil atau skor absolut) dari distribusi skor tersimpan
+lof_threshold = lof_config.get('threshold')
+if lof_threshold:
+    if lof_threshold['rule'] == 'score':
+        threshold_label = f"LOF > {lof_threshold['cutoff']:.4f} (ambang absolut)"
+    else:
+        threshold_label = f"LOF > {lof_threshold['cutoff']:.4f} (persentil {lof_threshold['percentile']:g})"
+else:
+    threshold_label = f"contamination {lof_config['contamination']*100}%"
+
 with open('models/kmeans_config_merged.json', 'r') as f:
     kmeans_config = json.load(f)
 
@@ -218,8 +230,8 @@ report_html = f"""
 
         <h3>1. Local Outlier Factor (LOF)</h3>
         <ul>
-            <li><strong>Optimal k-neighbors:</strong> {lof_config['optimal_k']}</li>
-            <li><strong>Contamination rate:</strong> {lof_config['contamination']*100}%</li>
+            <li><strong>k-neighbors:</strong> {lof_config['optimal_k']}</li>
+            <li><strong>Anomaly threshold:</strong> {threshold_label}</li>
             <li><strong>Features used:</strong> {lof_config['n_features']} fitur</li>
             <li><strong>Anomalies detected:</strong> {lof_config['final_anomalies_count']} ({lof_config['final_anomaly_percentage']:.2f}%)</li>
         </ul>
@@ -332,7 +344,7 @@ for cluster_id in range(kmeans_config['optimal_k']):
         report_html += f"""
                 <tr>
                     <td>User {row['user_id']}</td>
-                    <td>{row['timestamp'][:19]}</td>
+                    <td>{str(row['timestamp'])[:19]}</td>
                     <td>{row['lof_score']:.2e}</td>
                 </tr>
 """
@@ -369,7 +381,7 @@ for i, (idx, row) in enumerate(top_anomalies.iterrows(), 1):
             <tr>
                 <td>{i}</td>
                 <td>User {row['user_id']}</td>
-                <td>{row['timestamp'][:19]}</td>
+                <td>{str(row['timestamp'])[:19]}</td>
                 <td>{row['lof_score']:.2e}</td>
                 <td>C{int(row['cluster'])}: {cluster_label[:30]}...</td>
                 <td>{row['dataset_source']}</td>
@@ -437,7 +449,7 @@ report_html += f"""
             <ul>
                 <li>Monitor trend anomali bulanan</li>
                 <li>Update model dengan data baru setiap bulan</li>
-                <li>Review false positives dan adjust contamination rate jika diperlukan</li>
+                <li>Review false positives dan geser ambang LOF (persentil/skor) di dashboard jika diperlukan</li>
             </ul>
         </div>
 
@@ -504,8 +516,8 @@ md_content = f"""# 🔍 Laporan Deteksi Anomali
 ## 🔬 Metodologi
 
 ### LOF (Local Outlier Factor)
-- Optimal k-neighbors: {lof_config['optimal_k']}
-- Contamination: {lof_config['contamination']*100}%
+- k-neighbors: {lof_config['optimal_k']}
+- Anomaly threshold: {threshold_label}
 - Features: {lof_config['n_features']}
 - Anomalies: {lof_config['final_anomalies_count']} ({lof_config['final_anomaly_percentage']:.2f}%)
 
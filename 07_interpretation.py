@@ -4,6 +4,10 @@ from pathlib import Path
 
 import pandas as pd
 
+from pipeline.alert_bursts import aggregate_bursts
+from pipeline.schema import load_frame
+from pipeline.timeparse import calendar_fields, combine_date_time, epoch_seconds, parse_timestamps
+
 
 def ensure_utf8_console() -> None:
     if sys.platform == "win32":
@@ -11,7 +15,9 @@ def ensure_utf8_console() -> None:
 
 
 def summarize_clusters(df: pd.DataFrame, config: dict) -> dict:
-    df["timestamp_dt"] = pd.to_datetime(df["timestamp"], errors="coerce")
+    df["timestamp_dt"] = parse_timestamps(df["timestamp"], source=config["name"])
+    epoch = epoch_seconds(df["timestamp_dt"])
+    df["hour_actual"] = calendar_fields(epoch.fillna(0))["hour"].where(epoch.notna())
     total = len(df)
     summaries = []
 
@@ -20,7 +26,7 @@ def summarize_clusters(df: pd.DataFrame, config: dict) -> dict:
         if cluster_data.empty:
             continue
 
-        peak_hours = cluster_data["timestamp_dt"].dt.hour
+        peak_hours = cluster_data["hour_actual"].dropna()
         peak_hour = int(peak_hours.mode().iloc[0]) if not peak_hours.empty else None
 
         dominant_field = config.get("dominant_field")
@@ -50,6 +56,30 @@ def summarize_clusters(df: pd.DataFrame, config: dict) -> dict:
     return {"total_anomalies": total, "clusters": summaries}
 
 
+def summarize_bursts(df: pd.DataFrame, config: dict, reports_dir: Path) -> dict:
+    """Roll anomalies of the same key (user, IP, statement fingerprint / cluster) into bursts."""
+    keys = [col for col in config["burst_keys"] if col in df.columns]
+    times = df["timestamp_dt"]
+    if "date" in df.columns:   # staff timestamps carry the time of day only
+        times = combine_date_time(df["date"], df["timestamp"], source="staff")
+    events = df.assign(burst_time=times).dropna(subset=["burst_time"])
+    bursts = aggregate_bursts(events, key_columns=keys, time_col="burst_time")
+    bursts_path = reports_dir / f"{config['name']}_alert_bursts.csv"
+    bursts.to_csv(bursts_path, index=False)
+    top = bursts.head(5)
+    return {
+        "key_columns": keys,
+        "total_bursts": int(len(bursts)),
+        "repeated_bursts": int((bursts["count"] > 1).sum()),
+        "largest_bursts": [
+            {col: (value.isoformat() if isinstance(value, pd.Timestamp) else value)
+             for col, value in row.items() if col in keys + ["first_seen", "last_seen", "count", "max_lof_score"]}
+            for row in top.astype(object).to_dict("records")
+        ],
+        "path": str(bursts_path),
+    }
+
+
 def main() -> None:
     ensure_utf8_console()
     print("\n" + "=" * 60)
@@ -62,23 +92,27 @@ def main() -> None:
             "path": Path("data/anomalies/tracker_anomalies_clustered.csv"),
             "dominant_field": "query_type",
             "metric_columns": ["lof_score", "modification_ratio"],
+            "burst_keys": ["user_id", "ip_address", "fingerprint_id"],
         },
         {
             "name": "staff",
             "path": Path("data/anomalies/staff_anomalies_clustered.csv"),
             "dominant_field": "name",
             "metric_columns": ["IsAfterWorkHours", "frekuensi_login_per_user"],
+            "burst_keys": ["user_id", "cluster"],
         },
     ]
 
     combined_report = {"generated_at": pd.Timestamp.now().isoformat(), "datasets": {}}
+    reports_dir = Path("data/reports")
+    reports_dir.mkdir(parents=True, exist_ok=True)
 
     for dataset in datasets:
         if not dataset["path"].exists():
             print(f"File not found: {dataset['path']} (skipping {dataset['name']}).")
             continue
 
-        df = pd.read_csv(dataset["path"])
+        df, _ = load_frame(dataset["path"])
         summary = summarize_clusters(df, dataset)
         combined_report["datasets"][dataset["name"]] = summary
 
@@ -95,8 +129,14 @@ def main() -> None:
                 print(f"  Avg {metric}: {mean_value:.2f}")
             print(f"  Top users: {cluster['top_users']}")
 
-    reports_dir = Path("data/reports")
-    reports_dir.mkdir(parents=True, exist_ok=True)
+        bursts = summarize_bursts(df, dataset, reports_dir)
+        summary["bursts"] = bursts
+        print(
+            f"Alert bursts ({', '.join(bursts['key_columns'])}): "
+            f"{summary['total_anomalies']} anomalies -> {bursts['total_bursts']} alerts "
+            f"({bursts['repeated_bursts']} repeated) | written to {bursts['path']}"
+        )
+
     report_path = reports_dir / "interpretation_report.json"
     with report_path.open("w", encoding="utf-8") as report_file:
         json.dump(combined_report, report_file, indent=2)
@@ -1,32 +1,42 @@
+from __future__ import annotations
+
 import json
+import os
 from pathlib import Path
 from typing import Dict, Tuple, Optional, List
+import numpy as np
 import pandas as pd
 import streamlit as st
-import plotly.express as px
-import plotly.graph_objects as go
 from datetime import datetime
-import io
-import sqlite3
-
-# Database imports (optional, will handle import errors gracefully)
-try:
-    from sqlalchemy import create_engine, text
-    SQLALCHEMY_AVAILABLE = True
-except ImportError:
-    SQLALCHEMY_AVAILABLE = False
-
-try:
-    import mysql.connector
-    MYSQL_AVAILABLE = True
-except ImportError:
-    MYSQL_AVAILABLE = False
-
-try:
-    import psycopg2
-    POSTGRES_AVAILABLE = True
-except ImportError:
-    POSTGRES_AVAILABLE = False
+
+from pipeline.artifact_store import ArtifactStore
+from pipeline.csv_upload import CsvChunkWriter, UploadValidation, stream_csv_upload
+from pipeline.cubes import DAY_NAMES, Cubes, build_cubes, load_cubes
+from pipeline.feature_matrix import FeatureMatrix, ROW_ID_COLUMN, column_stats, matrix_exists, matrix_paths, open_feature_matrix
+from pipeline.lazy_imports import LazyModule, module_available
+from pipeline.score_threshold import ScoreThreshold
+from pipeline.timeparse import combine_date_time
+
+# Plotly loads on the first chart, not on every rerun of the script
+px = LazyModule("plotly.express")
+go = LazyModule("plotly.graph_objects")
+
+# Anomaly explorer store: imported on the first Stage 07 page (it pulls in the profile/SQL helpers)
+anomaly_store = LazyModule("pipeline.anomaly_store")
+
+# Optional dependencies: checked without importing them (DB stack loads on first use)
+SQLALCHEMY_AVAILABLE = module_available("sqlalchemy")
+MYSQL_AVAILABLE = module_available("mysql.connector")
+POSTGRES_AVAILABLE = module_available("psycopg2")
+
+# Streaming CSV upload into the artifact store (without pyarrow: straight to data/raw)
+PARQUET_AVAILABLE = module_available("pyarrow")
+
+# Streaming ingestion (pooled engines + artifact store, needs SQLAlchemy and pyarrow)
+DB_INGEST_AVAILABLE = SQLALCHEMY_AVAILABLE and PARQUET_AVAILABLE
+
+INGEST_PREVIEW_ROWS = 10_000
+UPLOAD_CHUNKSIZE = 50_000
 
 # ============================================================================
 # PAGE CONFIGURATION
@@ -417,8 +427,10 @@ DATASETS = {
         "anomalies_path": Path("data/anomalies/tracker_with_lof_scores.csv"),
         "clustered_path": Path("data/anomalies/tracker_anomalies_clustered.csv"),
         "lof_config": Path("models/lof_config_tracker.json"),
+        "lof_threshold": Path("models/lof_threshold_tracker.json"),
         "kmeans_config": Path("models/kmeans_config_tracker.json"),
         "feature_info": Path("models/feature_info_tracker.json"),
+        "feature_matrix": "tracker",
         "description": "Log aktivitas database dengan query type, timestamp, dan user information"
     },
     "staff": {
@@ -430,8 +442,10 @@ DATASETS = {
         "anomalies_path": Path("data/anomalies/staff_with_lof_scores.csv"),
         "clustered_path": Path("data/anomalies/staff_anomalies_clustered.csv"),
         "lof_config": Path("models/lof_config_staff.json"),
+        "lof_threshold": Path("models/lof_threshold_staff.json"),
         "kmeans_config": Path("models/kmeans_config_staff.json"),
         "feature_info": Path("models/feature_info_staff.json"),
+        "feature_matrix": "staff",
         "description": "Data login staff dengan informasi waktu akses dan pola login"
     },
     "merged": {
@@ -443,8 +457,10 @@ DATASETS = {
         "anomalies_path": Path("data/anomalies/merged_with_lof_scores.csv"),
         "clustered_path": Path("data/anomalies/merged_anomalies_clustered.csv"),
         "lof_config": Path("models/lof_config_merged.json"),
+        "lof_threshold": Path("models/lof_threshold_merged.json"),
         "kmeans_config": Path("models/kmeans_config_merged.json"),
         "feature_info": Path("models/feature_info_merged.json"),
+        "feature_matrix": "merged",
         "description": "Dataset gabungan Tracker + Staff dengan dataset_source identifier"
     }
 }
@@ -476,6 +492,74 @@ def load_config(path: Path) -> Optional[Dict]:
         st.error(f"Error loading {path}: {str(e)}")
         return None
 
+@st.cache_resource
+def _open_feature_matrix(name: str, mtime: float) -> FeatureMatrix:
+    return open_feature_matrix(name)
+
+def load_feature_matrix(name: str) -> Optional[FeatureMatrix]:
+    """Memory-mapped feature matrix from stage 04 (read-only, shared page cache)"""
+    if not matrix_exists(name):
+        return None
+    try:
+        # mtime in the cache key: a re-run of stage 04 maps the new file
+        return _open_feature_matrix(name, matrix_paths(name)["matrix"].stat().st_mtime)
+    except Exception as e:
+        st.error(f"Error loading feature matrix {name}: {str(e)}")
+        return None
+
+@st.cache_resource
+def _load_score_threshold(path: str, mtime: float) -> ScoreThreshold:
+    return ScoreThreshold.load(path)
+
+def load_score_threshold(path: Path) -> Optional[ScoreThreshold]:
+    """Stored LOF score distribution + threshold rule from stage 05"""
+    if not path.exists():
+        return None
+    try:
+        # mtime in the cache key: a re-run of stage 05 loads the new sketch
+        return _load_score_threshold(str(path), path.stat().st_mtime)
+    except Exception as e:
+        st.error(f"Error loading {path}: {str(e)}")
+        return None
+
+@st.cache_data(ttl=3600)
+def _load_dataset_cubes(name: str, path: str, mtime: float) -> Cubes:
+    cubes = load_cubes(name, source_path=path)
+    if cubes is None:
+        # Clustered file older than the cubes (or from a stage 06 run without them): aggregate it once
+        cubes = build_cubes(pd.read_csv(path), name)
+    return cubes
+
+def load_dataset_cubes(name: str) -> Optional[Cubes]:
+    """Pre-aggregated chart data from stage 06 (data/cubes/<name>)"""
+    path = DATASETS[name]["clustered_path"]
+    if not path.exists():
+        return None
+    try:
+        # mtime in the cache key: a re-run of stage 06 loads the new cubes
+        return _load_dataset_cubes(name, str(path), path.stat().st_mtime)
+    except Exception as e:
+        st.error(f"Error loading cubes {name}: {str(e)}")
+        return None
+
+@st.cache_resource
+def _open_anomaly_store(name: str, path: str, mtime: float) -> anomaly_store.AnomalyStore:
+    store = anomaly_store.AnomalyStore()
+    store.load(name, path)
+    return store
+
+def load_anomaly_store(name: str) -> Optional[anomaly_store.AnomalyStore]:
+    """Indexed anomaly rows for the explorer (SQLite, loaded from the clustered file)"""
+    path = DATASETS[name]["clustered_path"]
+    if not path.exists():
+        return None
+    try:
+        # mtime in the cache key: a re-run of stage 06 reloads the store
+        return _open_anomaly_store(name, str(path), path.stat().st_mtime)
+    except Exception as e:
+        st.error(f"Error loading anomaly store {name}: {str(e)}")
+        return None
+
 def format_number(num: int) -> str:
     """Format number with thousand separator"""
     return f"{num:,}"
@@ -496,62 +580,97 @@ def get_file_info(path: Path) -> Dict:
 # DATA UPLOAD & DATABASE FUNCTIONS
 # ============================================================================
 
-def connect_to_database(db_type: str, config: Dict) -> Optional[pd.DataFrame]:
+def connect_to_database(db_type: str, config: Dict, dataset_name: str) -> Optional[Tuple[pd.DataFrame, Dict]]:
     """
-    Connect to database and execute query
+    Stream a query result into the artifact store and data/raw/{dataset_name}_raw.csv
+
+    Engines are pooled per DSN and the result is read through a server-side
+    cursor in chunks, so the full result set is never held in memory.
 
     Args:
         db_type: 'mysql', 'mariadb', 'postgresql', or 'sqlite'
-        config: Database connection configuration
+        config: Database connection configuration; optional streaming keys:
+            'chunksize', 'partition_col' (parallel range extraction, e.g. 'timestamp'),
+            'n_partitions', 'workers'
+        dataset_name: 'tracker' or 'staff'
 
     Returns:
-        DataFrame with query results or None if error
+        (preview DataFrame of the first INGEST_PREVIEW_ROWS rows, validation results
+        over every ingested chunk) or None if error
     """
+    if not DB_INGEST_AVAILABLE:
+        st.error("Database ingestion requires SQLAlchemy and pyarrow (pip install sqlalchemy pyarrow)")
+        return None
+    if db_type == 'postgresql' and not POSTGRES_AVAILABLE:
+        st.error("PostgreSQL driver not installed (pip install psycopg2-binary)")
+        return None
+
+    from pipeline.db_ingest import DEFAULT_CHUNKSIZE, build_dsn, ingest_query, partitioned_ingest
+
     try:
-        if db_type == 'sqlite':
-            # SQLite connection
-            conn = sqlite3.connect(config['database'])
-            df = pd.read_sql_query(config['query'], conn)
-            conn.close()
-            return df
-
-        elif db_type in ['mysql', 'mariadb'] and MYSQL_AVAILABLE:
-            # MySQL/MariaDB connection
-            conn = mysql.connector.connect(
-                host=config['host'],
-                port=config.get('port', 3306),
-                user=config['user'],
-                password=config['password'],
-                database=config['database']
+        dsn = build_dsn(db_type, config)
+        store = ArtifactStore()
+        store_name = f"{dataset_name}_raw"
+        chunksize = int(config.get('chunksize') or DEFAULT_CHUNKSIZE)
+        # Same chunk-by-chunk validation as the streaming CSV upload
+        validation = UploadValidation(dataset_name)
+
+        if config.get('partition_col'):
+            result = partitioned_ingest(
+                dsn, config['query'], store, store_name,
+                partition_col=config['partition_col'],
+                n_partitions=int(config.get('n_partitions', 4)),
+                workers=int(config.get('workers', 4)),
+                chunksize=chunksize,
+                on_chunk=validation.update
             )
-            df = pd.read_sql_query(config['query'], conn)
-            conn.close()
-            return df
-
-        elif db_type == 'postgresql' and POSTGRES_AVAILABLE and SQLALCHEMY_AVAILABLE:
-            # PostgreSQL connection via SQLAlchemy
-            connection_string = f"postgresql://{config['user']}:{config['password']}@{config['host']}:{config.get('port', 5432)}/{config['database']}"
-            engine = create_engine(connection_string)
-            df = pd.read_sql_query(config['query'], engine)
-            engine.dispose()
-            return df
-
-        elif db_type in ['mysql', 'mariadb'] and SQLALCHEMY_AVAILABLE:
-            # MySQL/MariaDB via SQLAlchemy (fallback)
-            connection_string = f"mysql+pymysql://{config['user']}:{config['password']}@{config['host']}:{config.get('port', 3306)}/{config['database']}"
-            engine = create_engine(connection_string)
-            df = pd.read_sql_query(config['query'], engine)
-            engine.dispose()
-            return df
-
         else:
-            st.error(f"Database type '{db_type}' not supported or required libraries not installed")
-            return None
+            result = ingest_query(dsn, config['query'], store, store_name, chunksize=chunksize,
+                                  on_chunk=validation.update)
+
+        output_path = Path(f"data/raw/{dataset_name}_raw.csv")
+        store.export_csv(store_name, output_path)
+
+        st.info(
+            f"📥 {format_number(result.rows)} rows streamed in {result.chunks} chunks "
+            f"({result.partitions} partitions, {result.seconds:.1f}s) → {store.dataset_path(store_name)}"
+        )
+        return store.head(store_name, INGEST_PREVIEW_ROWS), validation.result()
 
     except Exception as e:
         st.error(f"Database connection error: {str(e)}")
         return None
 
+def render_ingest_options(key_prefix: str) -> Dict:
+    """
+    Streaming options for database ingestion (chunk size, parallel range extraction)
+
+    Args:
+        key_prefix: Unique widget key prefix
+
+    Returns:
+        Dict merged into db_config
+    """
+    with st.expander("⚙️ Streaming Options"):
+        chunksize = st.number_input(
+            "Chunk size (rows)", min_value=1_000, value=50_000, step=10_000,
+            key=f"{key_prefix}_chunksize"
+        )
+        partition_col = st.text_input(
+            "Partition column (kosongkan = tanpa partisi)", value="",
+            help="Kolom waktu, mis. 'timestamp', untuk ekstraksi paralel per rentang",
+            key=f"{key_prefix}_partition_col"
+        )
+        n_partitions = st.number_input("Partitions", min_value=1, max_value=64, value=4, key=f"{key_prefix}_n_partitions")
+        workers = st.number_input("Workers", min_value=1, max_value=16, value=4, key=f"{key_prefix}_workers")
+
+    return {
+        'chunksize': int(chunksize),
+        'partition_col': partition_col.strip() or None,
+        'n_partitions': int(n_partitions),
+        'workers': int(workers)
+    }
+
 def parse_sql_file(sql_content: str) -> str:
     """
     Parse SQL file and extract the main query
@@ -586,46 +705,63 @@ def parse_sql_file(sql_content: str) -> str:
 
     return query
 
-def upload_csv_data(uploaded_file, dataset_name: str) -> Optional[pd.DataFrame]:
+def upload_csv_data(uploaded_file, dataset_name: str) -> Optional[Tuple[pd.DataFrame, Dict]]:
     """
-    Upload and process CSV file
+    Stream an uploaded CSV into the artifact store and data/raw, chunk by chunk
 
     Args:
         uploaded_file: Streamlit uploaded file object
         dataset_name: 'tracker' or 'staff'
 
     Returns:
-        DataFrame or None if error
+        (preview DataFrame, validation results) or None if error
     """
-    try:
-        # Try different separators
-        content = uploaded_file.getvalue().decode('utf-8')
-
-        # Detect separator
-        first_line = content.split('\n')[0]
-        if '\t' in first_line:
-            sep = '\t'
-        elif ';' in first_line:
-            sep = ';'
-        else:
-            sep = ','
+    output_path = Path(f"data/raw/{dataset_name}_raw.csv")
 
-        # Read CSV
-        df = pd.read_csv(io.StringIO(content), sep=sep)
+    # Reruns of the page keep the uploaded file: ingest each upload once
+    cache_key = f"csv_upload_{dataset_name}"
+    cached = st.session_state.get(cache_key)
+    if cached and cached['file_id'] == uploaded_file.file_id and output_path.exists():
+        return cached['preview'], cached['validation']
 
-        # Save to raw folder
-        output_path = Path(f"data/raw/{dataset_name}_raw.csv")
-        output_path.parent.mkdir(parents=True, exist_ok=True)
-        df.to_csv(output_path, index=False)
-
-        st.success(f"✅ CSV uploaded successfully! Saved to {output_path}")
-        return df
+    try:
+        progress = st.progress(0.0, text="Parsing CSV...")
+        total_bytes = max(uploaded_file.size, 1)
+
+        def on_chunk(bytes_read: int, rows: int) -> None:
+            progress.progress(min(bytes_read / total_bytes, 1.0), text=f"{format_number(rows)} rows parsed")
+
+        if PARQUET_AVAILABLE:
+            store = ArtifactStore()
+            store_name = f"{dataset_name}_raw"
+            store.reset(store_name)
+            result = stream_csv_upload(uploaded_file, store.open_writer(store_name), dataset_name,
+                                       chunksize=UPLOAD_CHUNKSIZE, on_chunk=on_chunk)
+            store.export_csv(store_name, output_path)
+            preview = store.head(store_name, INGEST_PREVIEW_ROWS)
+        else:
+            result = stream_csv_upload(uploaded_file, CsvChunkWriter(output_path), dataset_name,
+                                       chunksize=UPLOAD_CHUNKSIZE, on_chunk=on_chunk)
+            preview = pd.read_csv(output_path, nrows=INGEST_PREVIEW_ROWS)
+        progress.empty()
+
+        sep_label = {'\t': 'tab', ';': 'semicolon', ',': 'comma'}.get(result.sep, repr(result.sep))
+        st.success(
+            f"✅ CSV uploaded successfully! {format_number(result.rows)} rows ({sep_label} separated) "
+            f"parsed in {result.chunks} chunks, {result.seconds:.1f}s. Saved to {output_path}"
+        )
+        st.session_state[cache_key] = {
+            'file_id': uploaded_file.file_id,
+            'preview': preview,
+            'validation': result.validation
+        }
+        return preview, result.validation
 
     except Exception as e:
         st.error(f"Error uploading CSV: {str(e)}")
         return None
 
-def upload_sql_file(uploaded_file, dataset_name: str, db_config: Dict) -> Optional[pd.DataFrame]:
+def upload_sql_file(uploaded_file, dataset_name: str, db_config: Dict) -> Optional[Tuple[pd.DataFrame, Dict]]:
     """
     Upload SQL file and execute query
 
@@ -635,25 +771,20 @@ def upload_sql_file(uploaded_file, dataset_name: str, db_config: Dict) -> Option
         db_config: Database configuration
 
     Returns:
-        DataFrame or None if error
+        (preview DataFrame, validation results) or None if error
     """
     try:
         # Read SQL file
         sql_content = uploaded_file.getvalue().decode('utf-8')
         query = parse_sql_file(sql_content)
 
-        # Execute query
+        # Execute query (streamed to data/raw by connect_to_database)
         db_config['query'] = query
-        df = connect_to_database(db_config['type'], db_config)
-
-        if df is not None:
-            # Save to raw folder
-            output_path = Path(f"data/raw/{dataset_name}_raw.csv")
-            output_path.parent.mkdir(parents=True, exist_ok=True)
-            df.to_csv(output_path, index=False)
+        ingested = connect_to_database(db_config['type'], db_config, dataset_name)
 
-            st.success(f"✅ SQL executed successfully! Saved to {output_path}")
-            return df
+        if ingested is not None:
+            st.success(f"✅ SQL executed successfully! Saved to data/raw/{dataset_name}_raw.csv")
+            return ingested
 
         return None
 
@@ -661,74 +792,21 @@ def upload_sql_file(uploaded_file, dataset_name: str, db_config: Dict) -> Option
         st.error(f"Error executing SQL file: {str(e)}")
         return None
 
-def validate_uploaded_data(df: pd.DataFrame, dataset_type: str) -> Dict:
-    """
-    Validate uploaded data structure
+def render_validation(validation: Dict):
+    """Render validation errors, warnings and the typed-schema memory footprint"""
+    for error in validation['errors']:
+        render_alert(f"❌ {error}", "danger")
 
-    Args:
-        df: DataFrame to validate
-        dataset_type: 'tracker' or 'staff'
+    for warning in validation['warnings']:
+        render_alert(f"⚠️ {warning}", "warning")
 
-    Returns:
-        Dictionary with validation results
-    """
-    results = {
-        'valid': True,
-        'errors': [],
-        'warnings': [],
-        'info': {}
-    }
+    if validation['valid']:
+        render_alert("✅ Data validation passed!", "success")
 
-    # Basic checks
-    results['info']['rows'] = len(df)
-    results['info']['columns'] = len(df.columns)
-    results['info']['column_names'] = df.columns.tolist()
-
-    if dataset_type == 'tracker':
-        # Expected columns for tracker
-        required_cols = ['timestamp', 'user_id']  # Minimal requirements
-        recommended_cols = ['query_info', 'query_type', 'ip_address']
-
-        # Check required columns
-        missing_required = [col for col in required_cols if col not in df.columns]
-        if missing_required:
-            results['valid'] = False
-            results['errors'].append(f"Missing required columns: {', '.join(missing_required)}")
-
-        # Check recommended columns
-        missing_recommended = [col for col in recommended_cols if col not in df.columns]
-        if missing_recommended:
-            results['warnings'].append(f"Missing recommended columns: {', '.join(missing_recommended)}")
-
-    elif dataset_type == 'staff':
-        # Expected columns for staff
-        required_cols = ['user_id', 'timestamp']  # Minimal requirements
-        recommended_cols = ['name', 'date']
-
-        # Check required columns
-        missing_required = [col for col in required_cols if col not in df.columns]
-        if missing_required:
-            results['valid'] = False
-            results['errors'].append(f"Missing required columns: {', '.join(missing_required)}")
-
-        # Check recommended columns
-        missing_recommended = [col for col in recommended_cols if col not in df.columns]
-        if missing_recommended:
-            results['warnings'].append(f"Missing recommended columns: {', '.join(missing_recommended)}")
-
-    # Check for empty data
-    if len(df) == 0:
-        results['valid'] = False
-        results['errors'].append("Dataset is empty (0 rows)")
-
-    # Check for missing values
-    missing_pct = (df.isnull().sum().sum() / (len(df) * len(df.columns))) * 100
-    if missing_pct > 50:
-        results['warnings'].append(f"High percentage of missing values: {missing_pct:.1f}%")
-
-    results['info']['missing_percentage'] = round(missing_pct, 2)
-
-    return results
+    render_alert(
+        f"Memory: {validation['info']['memory_before_mb']} MB → "
+        f"{validation['info']['memory_after_mb']} MB with the typed schema", "info"
+    )
 
 def merge_datasets(df_tracker: pd.DataFrame, df_staff: pd.DataFrame) -> pd.DataFrame:
     """
@@ -747,8 +825,10 @@ def merge_datasets(df_tracker: pd.DataFrame, df_staff: pd.DataFrame) -> pd.DataF
 
     # FIX: Combine date + time for staff dataset if 'date' column exists
     if 'date' in df_staff_copy.columns and 'timestamp' in df_staff_copy.columns:
-        # Combine date and time columns into full datetime
-        df_staff_copy['timestamp'] = df_staff_copy['date'].astype(str) + ' ' + df_staff_copy['timestamp'].astype(str)
+        # Combine date and time columns into full datetime (integer offsets, no string concat)
+        combined = combine_date_time(df_staff_copy['date'], df_staff_copy['timestamp'], source='staff')
+        # Keep the merged column textual, in the same layout as the tracker timestamps
+        df_staff_copy['timestamp'] = combined.dt.strftime('%Y-%m-%d %H:%M:%S')
         # Drop the date column after merging
         df_staff_copy = df_staff_copy.drop(columns=['date'])
 
@@ -903,29 +983,17 @@ def create_cluster_scatter_2d(df: pd.DataFrame, dataset_name: str) -> go.Figure:
 
     return fig
 
-def create_temporal_heatmap(df: pd.DataFrame, dataset_name: str) -> go.Figure:
+def create_temporal_heatmap(cubes: Cubes, dataset_name: str) -> go.Figure:
     """Create heatmap of anomalies by hour and day of week"""
-    if 'timestamp' not in df.columns:
-        return None
-
     try:
-        df_temp = df.copy()
-        df_temp['timestamp'] = pd.to_datetime(df_temp['timestamp'], errors='coerce')
-        df_temp = df_temp.dropna(subset=['timestamp'])
-
-        df_temp['hour'] = df_temp['timestamp'].dt.hour
-        df_temp['day_of_week'] = df_temp['timestamp'].dt.dayofweek
-
-        # Create pivot table
-        heatmap_data = df_temp.groupby(['day_of_week', 'hour']).size().unstack(fill_value=0)
-
-        # Day names
-        day_names = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+        heatmap_data = cubes.heatmap()
+        if heatmap_data.empty:
+            return None
 
         fig = go.Figure(data=go.Heatmap(
             z=heatmap_data.values,
             x=list(range(24)),
-            y=[day_names[i] for i in heatmap_data.index],
+            y=[DAY_NAMES[i] for i in heatmap_data.index],
             colorscale='Blues',
             text=heatmap_data.values,
             texttemplate='%{text}',
@@ -955,13 +1023,13 @@ def create_comparison_metrics(dataset1_name: str, dataset2_name: str) -> pd.Data
         # Load configs
         lof_config = load_config(dataset_info["lof_config"])
         kmeans_config = load_config(dataset_info["kmeans_config"])
-        df_clustered = load_data(dataset_info["clustered_path"])
+        cubes = load_dataset_cubes(ds_key)
 
-        if df_clustered is not None and lof_config and kmeans_config:
+        if cubes is not None and lof_config and kmeans_config:
             datasets_data.append({
                 'Dataset': DATASETS[ds_key]['label'],
-                'Total Anomalies': len(df_clustered),
-                'Clusters': df_clustered['cluster'].nunique() if 'cluster' in df_clustered.columns else 'N/A',
+                'Total Anomalies': cubes.total_anomalies,
+                'Clusters': len(cubes.cluster_counts()) or 'N/A',
                 'LOF K': lof_config.get('optimal_k', 'N/A'),
                 'Anomaly Rate (%)': round(lof_config.get('final_anomaly_percentage', 0), 2),
                 'Silhouette Score': round(kmeans_config.get('silhouette_score', 0), 3),
@@ -1121,22 +1189,13 @@ def render_stage_01():
 
             if uploaded_file is not None:
                 with st.spinner("Uploading and processing CSV..."):
-                    df_raw = upload_csv_data(uploaded_file, dataset_key)
-
-                if df_raw is not None:
-                    # Validate data
-                    validation = validate_uploaded_data(df_raw, dataset_key)
+                    uploaded = upload_csv_data(uploaded_file, dataset_key)
 
-                    if validation['errors']:
-                        for error in validation['errors']:
-                            render_alert(f"❌ {error}", "danger")
+                if uploaded is not None:
+                    # Validation counts accumulated while streaming
+                    df_raw, validation = uploaded
 
-                    if validation['warnings']:
-                        for warning in validation['warnings']:
-                            render_alert(f"⚠️ {warning}", "warning")
-
-                    if validation['valid']:
-                        render_alert("✅ Data validation passed!", "success")
+                    render_validation(validation)
 
         elif data_source == "Upload SQL":
             # Upload SQL file
@@ -1168,10 +1227,13 @@ def render_stage_01():
                 else:
                     db_name = st.text_input("SQLite Database Path", value="database.db", key=f"db_name_{dataset_key}")
 
+            ingest_options = render_ingest_options(f"sql_ingest_{dataset_key}")
+
             if uploaded_sql is not None and st.button("Execute SQL", key=f"exec_sql_{dataset_key}"):
                 db_config = {
                     'type': db_type,
-                    'database': db_name
+                    'database': db_name,
+                    **ingest_options
                 }
 
                 if db_type != 'sqlite':
@@ -1183,22 +1245,12 @@ def render_stage_01():
                     })
 
                 with st.spinner("Executing SQL query..."):
-                    df_raw = upload_sql_file(uploaded_sql, dataset_key, db_config)
-
-                if df_raw is not None:
-                    # Validate data
-                    validation = validate_uploaded_data(df_raw, dataset_key)
-
-                    if validation['errors']:
-                        for error in validation['errors']:
-                            render_alert(f"❌ {error}", "danger")
-
-                    if validation['warnings']:
-                        for warning in validation['warnings']:
-                            render_alert(f"⚠️ {warning}", "warning")
+                    ingested = upload_sql_file(uploaded_sql, dataset_key, db_config)
 
-                    if validation['valid']:
-                        render_alert("✅ Data validation passed!", "success")
+                if ingested is not None:
+                    # Validation accumulated over every ingested chunk
+                    df_raw, validation = ingested
+                    render_validation(validation)
 
         elif data_source == "Connect to Database":
             # Direct database connection
@@ -1230,11 +1282,14 @@ def render_stage_01():
                     key=f"db_query_{dataset_key}"
                 )
 
+            ingest_options = render_ingest_options(f"db_ingest_{dataset_key}")
+
             if st.button("Connect & Query", key=f"connect_db_{dataset_key}"):
                 db_config = {
                     'type': db_type,
                     'database': db_name,
-                    'query': query
+                    'query': query,
+                    **ingest_options
                 }
 
                 if db_type != 'sqlite':
@@ -1246,28 +1301,14 @@ def render_stage_01():
                     })
 
                 with st.spinner("Connecting to database..."):
-                    df_raw = connect_to_database(db_type, db_config)
-
-                if df_raw is not None:
-                    # Save to file
-                    output_path = Path(f"data/raw/{dataset_key}_raw.csv")
-                    output_path.parent.mkdir(parents=True, exist_ok=True)
-                    df_raw.to_csv(output_path, index=False)
-                    st.success(f"✅ Data retrieved successfully! Saved to {output_path}")
-
-                    # Validate data
-                    validation = validate_uploaded_data(df_raw, dataset_key)
+                    ingested = connect_to_database(db_type, db_config, dataset_key)
 
-                    if validation['errors']:
-                        for error in validation['errors']:
-                            render_alert(f"❌ {error}", "danger")
+                if ingested is not None:
+                    df_raw, validation = ingested
+                    st.success(f"✅ Data retrieved successfully! Saved to data/raw/{dataset_key}_raw.csv")
 
-                    if validation['warnings']:
-                        for warning in validation['warnings']:
-                            render_alert(f"⚠️ {warning}", "warning")
-
-                    if validation['valid']:
-                        render_alert("✅ Data validation passed!", "success")
+                    # Validation accumulated over every ingested chunk
+                    render_validation(validation)
 
         # If no data loaded, stop here
         if df_raw is None:
@@ -1278,6 +1319,7 @@ def render_stage_01():
 
         # Continue with original data display
         df_raw = load_data(dataset_info["raw_path"])  # Reload to ensure cached
+        file_info = get_file_info(dataset_info["raw_path"])  # Also set for uploads and database ingests
 
         if df_raw is None:
             render_alert("Gagal memuat data", "danger")
@@ -1608,10 +1650,16 @@ def render_stage_04():
     # Verification
     st.markdown("#### ✅ Verification")
 
-    # Only calculate mean/std for numeric columns (exclude timestamp, user_id, name, etc.)
-    numeric_cols = df_normalized.select_dtypes(include=['float64', 'int64']).columns
-    mean_val = df_normalized[numeric_cols].mean().mean()
-    std_val = df_normalized[numeric_cols].std().mean()
+    feature_matrix = load_feature_matrix(dataset_info["feature_matrix"])
+    if feature_matrix is not None:
+        # Exactly the modeled features, read block by block from the memory-mapped matrix
+        means, stds = column_stats(feature_matrix.X)
+        mean_val, std_val = means.mean(), stds.mean()
+    else:
+        # Only calculate mean/std for numeric columns (exclude timestamp, user_id, name, row_id, etc.)
+        numeric_cols = df_normalized.select_dtypes(include=['float64', 'int64']).columns.drop(ROW_ID_COLUMN, errors='ignore')
+        mean_val = df_normalized[numeric_cols].mean().mean()
+        std_val = df_normalized[numeric_cols].std().mean()
 
     col1, col2 = st.columns(2)
 
@@ -1623,6 +1671,13 @@ def render_stage_04():
         color = "green" if abs(std_val - 1.0) < 0.01 else "yellow"
         render_metric_card("Std Dev ≈ 1", f"{std_val:.6f}", color)
 
+    if feature_matrix is not None:
+        n_rows, n_features = feature_matrix.shape
+        st.caption(
+            f"Feature matrix: {n_rows:,} × {n_features} "
+            f"({matrix_paths(feature_matrix.name)['matrix']}, {feature_matrix.nbytes / (1024 * 1024):.2f} MB, memory-mapped)"
+        )
+
     # Before/After comparison with visualization
     if df_transformed is not None:
         st.markdown("#### 📊 Distribution Before/After")
@@ -1693,25 +1748,77 @@ def render_stage_05():
         st.markdown('</div>', unsafe_allow_html=True)
         return
 
+    # Stored score distribution; fall back to a sketch of the stored lof_score column
+    threshold = load_score_threshold(dataset_info["lof_threshold"])
+    if threshold is None and 'lof_score' in df_anomalies.columns:
+        threshold = ScoreThreshold().fit(df_anomalies['lof_score'].to_numpy())
+
     # LOF Parameters
-    st.markdown("#### ⚙️ LOF Parameters (dari Grid Search)")
+    st.markdown("#### ⚙️ LOF Parameters")
 
     col1, col2, col3 = st.columns(3)
 
     with col1:
-        render_metric_card("Optimal K", str(lof_config.get('optimal_k', 'N/A')), "blue")
+        render_metric_card("K (n_neighbors)", str(lof_config.get('optimal_k', 'N/A')), "blue")
 
     with col2:
-        render_metric_card("Contamination", f"{lof_config.get('contamination', 0)*100:.0f}%", "purple")
+        stored_cutoff = lof_config.get('threshold', {}).get('cutoff')
+        render_metric_card("Stored Threshold", f"{stored_cutoff:.3f}" if stored_cutoff is not None else "N/A", "purple")
 
     with col3:
         render_metric_card("Features Used", str(lof_config.get('n_features', 'N/A')), "green")
 
+    # Live threshold: flags re-derived from the stored scores, no refit
+    cutoff = None
+    if threshold is not None:
+        st.markdown("#### 🎚️ Anomaly Threshold (live, tanpa refit)")
+
+        col1, col2 = st.columns([1, 2])
+
+        with col1:
+            rule = st.radio(
+                "Aturan ambang",
+                ["percentile", "score"],
+                index=0 if threshold.rule == "percentile" else 1,
+                format_func=lambda x: "Persentil skor" if x == "percentile" else "Skor LOF absolut",
+                key=f"lof_threshold_rule_{dataset_key}"
+            )
+
+        with col2:
+            if rule == "percentile":
+                percentile = st.slider(
+                    "Tandai skor di atas persentil",
+                    min_value=80.0, max_value=99.9,
+                    value=float(min(max(threshold.percentile or 95.0, 80.0), 99.9)),
+                    step=0.1,
+                    key=f"lof_threshold_percentile_{dataset_key}"
+                )
+                cutoff = threshold.cutoff(percentile=percentile)
+            else:
+                cutoff = st.number_input(
+                    "Tandai skor LOF di atas",
+                    min_value=0.0,
+                    value=float(threshold.cutoff()),
+                    step=0.1,
+                    format="%.4f",
+                    key=f"lof_threshold_score_{dataset_key}"
+                )
+
+        st.caption(
+            f"Ambang aktif: LOF > {cutoff:.4f} (persentil {threshold.percentile_of(cutoff):.2f} "
+            f"dari {threshold.sketch.n:,} skor tersimpan)"
+        )
+
     # Results
     st.markdown("#### 📊 Detection Results")
 
-    total_data = len(df_anomalies[df_anomalies['is_anomaly'].isin([-1, 1])]) if 'is_anomaly' in df_anomalies.columns else len(df_anomalies)
-    anomalies = df_anomalies[df_anomalies['is_anomaly'] == -1] if 'is_anomaly' in df_anomalies.columns else df_anomalies
+    total_data = len(df_anomalies)
+    if cutoff is not None:
+        anomalies = df_anomalies[threshold.flag(df_anomalies['lof_score'], score=cutoff)]
+    elif 'is_anomaly' in df_anomalies.columns:
+        anomalies = df_anomalies[df_anomalies['is_anomaly'] == 1]
+    else:
+        anomalies = df_anomalies
     num_anomalies = len(anomalies)
     anomaly_rate = (num_anomalies / total_data * 100) if total_data > 0 else 0
 
@@ -1744,6 +1851,9 @@ def render_stage_05():
                 labels={'lof_score': 'LOF Score', 'count': 'Frequency'}
             )
             fig_hist.update_layout(showlegend=False)
+            if cutoff is not None:
+                fig_hist.add_vline(x=cutoff, line_dash="dash", line_color="#EF4444",
+                                   annotation_text="threshold")
             st.plotly_chart(fig_hist, use_container_width=True)
 
         with col2:
@@ -1772,7 +1882,12 @@ def render_stage_05():
         display_cols = [col for col in ['timestamp', 'user_id', 'query_type', 'name', 'lof_score'] if col in top_anomalies.columns]
         st.dataframe(top_anomalies[display_cols], use_container_width=True)
 
-    # Grid search results
+    # Score distribution summary
+    if 'threshold' in lof_config:
+        with st.expander("🔬 Score Distribution (stored)"):
+            st.json(lof_config['threshold'])
+
+    # Grid search results (configs from before the threshold rule)
     if 'grid_search_results' in lof_config:
         with st.expander("🔬 Grid Search Results"):
             grid_results = pd.DataFrame(lof_config['grid_search_results'])
@@ -1807,8 +1922,9 @@ def render_stage_06():
     # Load data
     df_clustered = load_data(dataset_info["clustered_path"])
     kmeans_config = load_config(dataset_info["kmeans_config"])
+    cubes = load_dataset_cubes(dataset_key)
 
-    if df_clustered is None or kmeans_config is None:
+    if df_clustered is None or kmeans_config is None or cubes is None:
         render_alert("Data K-Means belum tersedia. Jalankan script 06_kmeans_modeling.py terlebih dahulu.", "warning")
         st.markdown('</div>', unsafe_allow_html=True)
         return
@@ -1835,7 +1951,7 @@ def render_stage_06():
     st.markdown("#### 📊 Cluster Distribution & Visualization")
 
     if 'cluster' in df_clustered.columns:
-        cluster_counts = df_clustered['cluster'].value_counts().sort_index()
+        cluster_counts = cubes.cluster_counts()
 
         col1, col2 = st.columns(2)
 
@@ -1861,24 +1977,14 @@ def render_stage_06():
 
         # Temporal heatmap
         st.markdown("#### 🕐 Temporal Analysis")
-        fig_heatmap = create_temporal_heatmap(df_clustered, DATASETS[dataset_key]['label'])
+        fig_heatmap = create_temporal_heatmap(cubes, DATASETS[dataset_key]['label'])
         if fig_heatmap:
             st.plotly_chart(fig_heatmap, use_container_width=True)
 
         # Cluster summary table
         st.markdown("#### 📋 Cluster Summary")
 
-        cluster_summary = df_clustered.groupby('cluster').agg({
-            'cluster': 'size',
-            'user_id': 'nunique',
-            'lof_score': 'mean'
-        }).rename(columns={
-            'cluster': 'Count',
-            'user_id': 'Unique Users',
-            'lof_score': 'Avg LOF Score'
-        })
-
-        cluster_summary['Percentage'] = (cluster_summary['Count'] / len(df_clustered) * 100).round(1)
+        cluster_summary = cubes.cluster_summary()
 
         st.dataframe(cluster_summary, use_container_width=True)
 
@@ -1888,12 +1994,11 @@ def render_stage_06():
         # Check if cluster interpretations available
         cluster_interpretations = kmeans_config.get('cluster_interpretations', {})
 
-        for cluster_id in sorted(df_clustered['cluster'].unique()):
-            cluster_data = df_clustered[df_clustered['cluster'] == cluster_id]
+        for cluster_id, cluster_row in cluster_summary.iterrows():
             cluster_info = cluster_interpretations.get(str(cluster_id), {})
             cluster_label = cluster_info.get('label', f'Cluster {cluster_id}')
 
-            with st.expander(f"Cluster {cluster_id}: {cluster_label} ({len(cluster_data)} anomalies)"):
+            with st.expander(f"Cluster {cluster_id}: {cluster_label} ({int(cluster_row['Count'])} anomalies)"):
                 # Show interpretation if available
                 if cluster_info:
                     render_alert(f"📌 {cluster_label}", "info")
@@ -1901,25 +2006,20 @@ def render_stage_06():
                 col1, col2 = st.columns(2)
 
                 with col1:
-                    render_metric_card("Total Anomalies", format_number(len(cluster_data)), "blue")
-                    render_metric_card("Unique Users", str(cluster_data['user_id'].nunique()), "green")
+                    render_metric_card("Total Anomalies", format_number(int(cluster_row['Count'])), "blue")
+                    render_metric_card("Unique Users", str(int(cluster_row['Unique Users'])), "green")
 
                 with col2:
-                    render_metric_card("Avg LOF Score", f"{cluster_data['lof_score'].mean():.2e}", "purple")
+                    render_metric_card("Avg LOF Score", f"{cluster_row['Avg LOF Score']:.2e}", "purple")
 
                     # Peak hour
-                    if 'timestamp' in cluster_data.columns:
-                        try:
-                            timestamps = pd.to_datetime(cluster_data['timestamp'], errors='coerce')
-                            if not timestamps.isna().all():
-                                peak_hour = timestamps.dt.hour.mode().iloc[0] if not timestamps.dt.hour.mode().empty else 'N/A'
-                                render_metric_card("Peak Hour", f"{peak_hour}:00", "yellow")
-                        except:
-                            pass
+                    peak_hour = cubes.peak_hour(cluster_id)
+                    if peak_hour is not None:
+                        render_metric_card("Peak Hour", f"{peak_hour}:00", "yellow")
 
                 # Top users in cluster
                 st.markdown("**Top 5 Users in this Cluster:**")
-                top_users = cluster_data['user_id'].value_counts().head(5)
+                top_users = cubes.users(cluster_id, n=5)
                 st.dataframe(pd.DataFrame({
                     'User ID': top_users.index,
                     'Anomaly Count': top_users.values
@@ -1943,6 +2043,99 @@ def render_stage_06():
 
     st.markdown('</div>', unsafe_allow_html=True)
 
+def render_anomaly_explorer(store: anomaly_store.AnomalyStore, dataset_key: str):
+    """Server-side filtered, keyset-paginated anomaly table; returns the CSV export callable"""
+    bounds = store.bounds(dataset_key)
+    if not bounds["rows"]:
+        render_alert("No anomaly data available to display.", "warning")
+        return None
+
+    # Filter options
+    col1, col2, col3 = st.columns(3)
+
+    with col1:
+        user_filter = st.text_input("Filter by User ID", key="explorer_user").strip()
+
+    with col2:
+        selected_cluster = st.selectbox(
+            "Filter by Cluster",
+            options=['All'] + bounds["clusters"],
+            key="cluster_filter"
+        )
+
+    with col3:
+        sort_by = st.selectbox("Sort by", options=list(anomaly_store.SORT_KEYS), key="sort_filter")
+
+    col1, col2, col3 = st.columns(3)
+
+    start = end = None
+    with col1:
+        if bounds["min_epoch"] is not None:
+            first_day = pd.Timestamp(bounds["min_epoch"], unit="s").date()
+            last_day = pd.Timestamp(bounds["max_epoch"], unit="s").date()
+            date_range = st.date_input("Date range", value=(first_day, last_day), min_value=first_day,
+                                       max_value=last_day, key="explorer_dates")
+            if isinstance(date_range, (tuple, list)) and len(date_range) == 2:
+                epoch_day = pd.Timestamp("1970-01-01").date()
+                start = (date_range[0] - epoch_day).days * 86400
+                end = ((date_range[1] - epoch_day).days + 1) * 86400
+
+    min_score = max_score = None
+    with col2:
+        if bounds["max_score"] > bounds["min_score"]:
+            min_score, max_score = st.slider(
+                "LOF score range",
+                min_value=float(bounds["min_score"]),
+                max_value=float(bounds["max_score"]),
+                value=(float(bounds["min_score"]), float(bounds["max_score"])),
+                format="%.3g",
+                key="explorer_scores"
+            )
+
+    with col3:
+        page_size = st.selectbox("Rows per page", options=[25, 50, 100, 200], index=1, key="explorer_page_size")
+
+    filters = anomaly_store.AnomalyFilter(
+        user_id=user_filter or None,
+        cluster=None if selected_cluster == 'All' else int(selected_cluster),
+        start=start,
+        end=end,
+        min_score=min_score,
+        max_score=max_score,
+    )
+
+    # Keys of the pages up to the current one; a new query starts at page 1
+    query = (dataset_key, filters, sort_by, page_size)
+    if st.session_state.get("explorer_query") != query:
+        st.session_state.explorer_query = query
+        st.session_state.explorer_keys = [None]
+    page_keys = st.session_state.explorer_keys
+
+    page = store.page(dataset_key, filters, sort=sort_by, after=page_keys[-1], limit=page_size)
+    total = store.count(dataset_key, filters)
+    first_row = (len(page_keys) - 1) * page_size
+
+    # Display (only this page is sent to the browser)
+    st.dataframe(page.rows, use_container_width=True, height=400)
+
+    col1, col2, col3 = st.columns([1, 2, 1])
+
+    with col1:
+        st.button("◀ Previous", key="explorer_prev", disabled=len(page_keys) == 1, on_click=page_keys.pop)
+
+    with col2:
+        if total:
+            st.caption(f"Rows {first_row + 1:,}–{first_row + len(page.rows):,} of {total:,} (filtered from {bounds['rows']:,})")
+        else:
+            st.caption(f"No anomalies match the filters ({bounds['rows']:,} in total)")
+
+    with col3:
+        st.button("Next ▶", key="explorer_next", disabled=page.next_key is None,
+                  on_click=page_keys.append, args=(page.next_key,))
+
+    # Runs only when the download is requested
+    return store.csv_download(dataset_key, filters, sort=sort_by)
+
 def render_stage_07():
     """Stage 07: Results & Interpretation"""
     st.markdown('<div class="stage-card">', unsafe_allow_html=True)
@@ -1955,8 +2148,9 @@ def render_stage_07():
     df_clustered = load_data(dataset_info["clustered_path"])
     lof_config = load_config(dataset_info["lof_config"])
     kmeans_config = load_config(dataset_info["kmeans_config"])
+    cubes = load_dataset_cubes(dataset_key)
 
-    if df_clustered is None:
+    if df_clustered is None or cubes is None:
         render_alert("Data tidak tersedia. Pastikan semua pipeline sudah dijalankan.", "warning")
         st.markdown('</div>', unsafe_allow_html=True)
         return
@@ -2161,17 +2355,12 @@ def render_stage_07():
     # ========================================================================
     st.markdown("#### 💡 Security Recommendations")
 
-    # Analyze data to generate recommendations
-    anomalies_df = df_clustered[df_clustered['is_anomaly'] == 1] if 'is_anomaly' in df_clustered.columns else df_clustered
-
-    # Calculate key metrics for recommendations
-    weekend_anomalies = anomalies_df['IsWeekend'].sum() if 'IsWeekend' in anomalies_df.columns else 0
-    outside_hours_anomalies = anomalies_df['IsOutsideWorkHours'].sum() if 'IsOutsideWorkHours' in anomalies_df.columns else 0
-    weekend_pct = (weekend_anomalies / len(anomalies_df) * 100) if len(anomalies_df) > 0 else 0
-    outside_hours_pct = (outside_hours_anomalies / len(anomalies_df) * 100) if len(anomalies_df) > 0 else 0
+    # Key metrics for recommendations (from the stage 06 cubes)
+    weekend_anomalies, weekend_pct = cubes.weekend_share()
+    outside_hours_anomalies, outside_hours_pct = cubes.outside_hours_share()
 
     # Top users with anomalies
-    top_anomaly_users = anomalies_df['user_id'].value_counts().head(10) if 'user_id' in anomalies_df.columns else pd.Series()
+    top_anomaly_users = cubes.users(n=10)
 
     # Generate recommendations
     recommendations = {
@@ -2286,10 +2475,10 @@ def render_stage_07():
 
             for idx, ds_key in enumerate([dataset_key, other_dataset]):
                 ds_info = DATASETS[ds_key]
-                df_comp = load_data(ds_info["clustered_path"])
+                cubes_comp = load_dataset_cubes(ds_key)
 
-                if df_comp is not None and 'cluster' in df_comp.columns:
-                    cluster_counts = df_comp['cluster'].value_counts().sort_index()
+                if cubes_comp is not None:
+                    cluster_counts = cubes_comp.cluster_counts()
 
                     fig = px.bar(
                         x=cluster_counts.index,
@@ -2314,11 +2503,11 @@ def render_stage_07():
     col1, col2, col3, col4 = st.columns(4)
 
     with col1:
-        render_metric_card("Total Anomalies", format_number(len(df_clustered)), "red")
+        render_metric_card("Total Anomalies", format_number(cubes.total_anomalies), "red")
 
     with col2:
         if 'cluster' in df_clustered.columns:
-            render_metric_card("Total Clusters", str(df_clustered['cluster'].nunique()), "blue")
+            render_metric_card("Total Clusters", str(len(cubes.cluster_counts())), "blue")
 
     with col3:
         if lof_config:
@@ -2431,35 +2620,8 @@ def render_stage_07():
     # Complete dataset view
     st.markdown("#### 📋 Complete Anomaly Dataset")
 
-    # Filter options
-    col1, col2 = st.columns(2)
-
-    with col1:
-        if 'cluster' in df_clustered.columns:
-            selected_cluster = st.selectbox(
-                "Filter by Cluster",
-                options=['All'] + sorted(df_clustered['cluster'].unique().tolist()),
-                key="cluster_filter"
-            )
-
-    with col2:
-        sort_by = st.selectbox(
-            "Sort by",
-            options=['lof_score', 'cluster', 'user_id', 'timestamp'] if all(col in df_clustered.columns for col in ['lof_score', 'cluster', 'user_id', 'timestamp']) else df_clustered.columns.tolist(),
-            key="sort_filter"
-        )
-
-    # Filter data
-    display_df = df_clustered.copy()
-    if selected_cluster != 'All' and 'cluster' in df_clustered.columns:
-        display_df = display_df[display_df['cluster'] == selected_cluster]
-
-    # Sort data
-    if sort_by in display_df.columns:
-        display_df = display_df.sort_values(by=sort_by, ascending=False)
-
-    # Display
-    st.dataframe(display_df, use_container_width=True, height=400)
+    store = load_anomaly_store(dataset_key)
+    export_csv = render_anomaly_explorer(store, dataset_key) if store is not None else None
 
     # Export options
     st.markdown("#### 📥 Export Results")
@@ -2467,19 +2629,18 @@ def render_stage_07():
     col1, col2, col3 = st.columns(3)
 
     with col1:
-        csv = df_clustered.to_csv(index=False).encode('utf-8')
-        st.download_button(
-            label="📥 Download CSV",
-            data=csv,
-            file_name=f"{dataset_key}_anomalies_results.csv",
-            mime="text/csv"
-        )
+        if export_csv is not None:
+            st.download_button(
+                label="📥 Download CSV (filtered)",
+                data=export_csv,
+                file_name=f"{dataset_key}_anomalies_results.csv",
+                mime="text/csv"
+            )
 
     with col2:
-        json_data = df_clustered.to_json(orient='records', indent=2)
         st.download_button(
             label="📥 Download JSON",
-            data=json_data,
+            data=lambda: df_clustered.to_json(orient='records', indent=2),
             file_name=f"{dataset_key}_anomalies_results.json",
             mime="application/json"
         )
@@ -2559,14 +2720,14 @@ def main():
         dataset_key = st.session_state.selected_dataset
         ds_info = DATASETS[dataset_key]
 
-        # Load final results
-        df_final = load_data(ds_info["clustered_path"])
+        # Final results (cubes only, the clustered rows are not loaded here)
+        cubes = load_dataset_cubes(dataset_key)
         lof_conf = load_config(ds_info["lof_config"])
         kmeans_conf = load_config(ds_info["kmeans_config"])
 
-        if df_final is not None and lof_conf and kmeans_conf:
-            st.sidebar.metric("Total Anomalies", format_number(len(df_final)))
-            st.sidebar.metric("Clusters", df_final['cluster'].nunique() if 'cluster' in df_final.columns else 'N/A')
+        if cubes is not None and lof_conf and kmeans_conf:
+            st.sidebar.metric("Total Anomalies", format_number(cubes.total_anomalies))
+            st.sidebar.metric("Clusters", len(cubes.cluster_counts()) or 'N/A')
             st.sidebar.metric("Anomaly Rate", f"{lof_conf.get('final_anomaly_percentage', 0):.2f}%")
             st.sidebar.metric("Silhouette", f"{kmeans_conf.get('silhouette_score', 0):.3f}")
         else:
@@ -0,0 +1,93 @@
+"""Import-time budget of the Streamlit dashboard (cold start).
+
+Runs the dashboard once in a fresh interpreter with ``python -X importtime``
+(Streamlit "bare mode": the default page is executed without a server) and
+parses the per-module timings from stderr. Reported:
+
+* the cumulative import time of every top-level import, largest first;
+* the total over all top-level imports, checked against --budget-ms;
+* any module of --deferred (DB stack, plotly.express, sklearn, the anomaly
+  explorer store) that was imported although the default page does not
+  need it.
+
+Exits with status 1 when the budget is exceeded or a deferred module was
+imported, so it can run as a check in CI or a container build.
+
+    python benchmarks/bench_app_import.py --budget-ms 1500
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+DEFERRED_MODULES = ["sqlalchemy", "psycopg2", "mysql.connector", "plotly.express", "sklearn", "pipeline.anomaly_store"]
+
+_LINE_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def import_times(script: str, runs: int) -> pd.DataFrame:
+    """Per-module self/cumulative import time (µs), median over ``runs`` fresh interpreters."""
+    frames = []
+    for run in range(runs):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", script],
+            cwd=REPO_ROOT, capture_output=True, text=True,
+            env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(f"{script} failed:\n{proc.stderr[-2000:]}")
+        rows = []
+        for line in proc.stderr.splitlines():
+            match = _LINE_RE.match(line)
+            if match:
+                self_us, cumulative_us, indent, module = match.groups()
+                rows.append({"module": module, "depth": len(indent) // 2,
+                             "self_us": int(self_us), "cumulative_us": int(cumulative_us), "run": run})
+        frames.append(pd.DataFrame(rows))
+    times = pd.concat(frames)
+    return (times.groupby(["module", "depth"], as_index=False)[["self_us", "cumulative_us"]].median()
+            .sort_values("cumulative_us", ascending=False))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--script", default="app.py")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--budget-ms", type=float, default=1500.0)
+    parser.add_argument("--deferred", nargs="*", default=DEFERRED_MODULES,
+                        help="Modules the default page must not import")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--out", default="data/reports/app_import_benchmark.csv")
+    args = parser.parse_args()
+
+    times = import_times(args.script, args.runs)
+    top_level = times[times["depth"] == 0]
+    total_ms = top_level["cumulative_us"].sum() / 1000
+    imported = set(times["module"])
+    leaked = [module for module in args.deferred if module in imported]
+
+    print(f"\n{args.script}: {len(imported)} modules, top-level imports {total_ms:,.0f} ms "
+          f"(median of {args.runs} runs, budget {args.budget_ms:,.0f} ms)")
+    for row in top_level.head(args.top).itertuples():
+        print(f"  {row.cumulative_us / 1000:8.1f} ms  {row.module}")
+    for module in args.deferred:
+        print(f"  {'IMPORTED' if module in leaked else 'deferred':>8}  {module}")
+
+    out = Path(args.out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    top_level.to_csv(out, index=False)
+    print(f"\n✓ Hasil benchmark tersimpan: {args.out}")
+
+    if total_ms > args.budget_ms or leaked:
+        print(f"✗ Budget import terlampaui atau modul tertunda ikut dimuat: {leaked or f'{total_ms:,.0f} ms'}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
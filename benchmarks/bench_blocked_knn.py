@@ -0,0 +1,105 @@
+"""Blocked BLAS kNN backend versus sklearn's neighbour search for LOF.
+
+Builds matrices of 10^5-10^6 rows from the stage-04 tracker matrix
+(data/matrix/tracker.npy, run 04_normalization.py first) by resampling its
+rows with a small Gaussian jitter (--jitter, in standardized units). The
+jitter keeps the kNN from degenerating into ties between copied rows.
+
+For every size and block shape it times the kNN query (k+1 neighbours,
+self included, what LOF asks for) of ``algorithm="auto"`` and of the blocked
+kernel, and checks that the k-distances agree. ``--lof`` also times the
+full LOF fit with both backends and reports the largest score difference.
+
+    python benchmarks/bench_blocked_knn.py --rows 100000 300000 1000000
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import NearestNeighbors
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from pipeline.blocked_knn import blocked_kneighbors, fit_lof  # noqa: E402
+from pipeline.feature_matrix import open_feature_matrix  # noqa: E402
+
+
+def resample(X: np.ndarray, n_rows: int, jitter: float, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    rows = rng.integers(0, len(X), size=n_rows)
+    return np.asarray(X[rows], dtype=np.float64) + rng.normal(scale=jitter, size=(n_rows, X.shape[1]))
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def run(dataset, sizes, n_neighbors, block_rows, block_cols, n_threads, jitter, lof, sklearn_max_rows) -> pd.DataFrame:
+    base = open_feature_matrix(dataset).X
+    rows = []
+    for n in sizes:
+        X = resample(base, n, jitter)
+        print(f"\n{dataset} x{n / len(base):.0f}: {n:,} x {X.shape[1]}, k={n_neighbors}")
+
+        reference, sklearn_seconds = None, float("nan")
+        if n <= sklearn_max_rows:
+            (reference, _), sklearn_seconds = timed(
+                lambda: NearestNeighbors(n_neighbors=n_neighbors + 1, n_jobs=n_threads).fit(X).kneighbors(X)
+            )
+            print(f"  sklearn auto          {sklearn_seconds:8.2f}s  {n / sklearn_seconds:12,.0f} rows/s")
+
+        for br in block_rows:
+            for bc in block_cols:
+                (distances, _), seconds = timed(lambda: blocked_kneighbors(
+                    X, n_neighbors + 1, block_rows=br, block_cols=bc, n_threads=n_threads))
+                max_diff = float(np.abs(distances - reference).max()) if reference is not None else float("nan")
+                print(f"  blocked {br:>5}x{bc:<6}  {seconds:8.2f}s  {n / seconds:12,.0f} rows/s  "
+                      f"speedup={sklearn_seconds / seconds:5.2f}  max |Δd|={max_diff:.1e}")
+                rows.append({
+                    "dataset": dataset, "rows": n, "features": X.shape[1], "n_neighbors": n_neighbors,
+                    "block_rows": br, "block_cols": bc, "n_threads": n_threads,
+                    "sklearn_seconds": round(sklearn_seconds, 3), "blocked_seconds": round(seconds, 3),
+                    "speedup": round(sklearn_seconds / seconds, 3), "max_distance_diff": max_diff,
+                })
+
+        if lof and n <= sklearn_max_rows:
+            full, sklearn_lof = timed(lambda: fit_lof(X, n_neighbors, backend="sklearn", n_threads=n_threads))
+            blocked, blocked_lof = timed(lambda: fit_lof(X, n_neighbors, backend="blocked", block_rows=block_rows[0],
+                                                         block_cols=block_cols[0], n_threads=n_threads))
+            diff = np.abs(full.negative_outlier_factor_ - blocked.negative_outlier_factor_).max()
+            print(f"  LOF fit: sklearn {sklearn_lof:.2f}s, blocked {blocked_lof:.2f}s, max |Δscore|={diff:.1e}")
+            rows[-1].update({"lof_sklearn_seconds": round(sklearn_lof, 3), "lof_blocked_seconds": round(blocked_lof, 3),
+                             "lof_max_score_diff": float(diff)})
+    return pd.DataFrame(rows)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dataset", default="tracker")
+    parser.add_argument("--rows", nargs="+", type=int, default=[100_000, 300_000, 1_000_000])
+    parser.add_argument("--n-neighbors", type=int, default=20)
+    parser.add_argument("--block-rows", nargs="+", type=int, default=[256, 512, 1024])
+    parser.add_argument("--block-cols", nargs="+", type=int, default=[4096])
+    parser.add_argument("--n-threads", type=int, default=-1)
+    parser.add_argument("--jitter", type=float, default=0.01)
+    parser.add_argument("--lof", action="store_true", help="Also compare full LOF fits")
+    parser.add_argument("--sklearn-max-rows", type=int, default=1_000_000,
+                        help="Skip the sklearn baseline above this many rows")
+    parser.add_argument("--out", default="data/reports/blocked_knn_benchmark.csv")
+    args = parser.parse_args()
+
+    results = run(args.dataset, args.rows, args.n_neighbors, args.block_rows, args.block_cols,
+                  args.n_threads, args.jitter, args.lof, args.sklearn_max_rows)
+    Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+    results.to_csv(args.out, index=False)
+    print(f"\n✓ Hasil benchmark tersimpan: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Accuracy and cost of EnsembleLOF versus a full LOF fit.
+
+Runs a grid of (s = max_samples, M = n_estimators) on the stage-04 feature
+matrices (data/matrix/<dataset>.npy, run 04_normalization*.py first) and
+reports, per configuration, the fit time and the agreement with full LOF:
+rank correlation, overlap of the top-``contamination`` rows and ROC AUC
+against the full-LOF labels. Pick the cheapest (s, M) whose agreement is
+good enough for the throughput budget.
+
+    python benchmarks/bench_ensemble_lof.py --datasets tracker merged
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+from sklearn.neighbors import LocalOutlierFactor
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from pipeline.ensemble_lof import EnsembleLOF, compare_to_full  # noqa: E402
+from pipeline.feature_matrix import open_feature_matrix  # noqa: E402
+
+
+def run(datasets, samples, estimators, n_neighbors, contamination, aggregate, n_jobs) -> pd.DataFrame:
+    rows = []
+    for name in datasets:
+        X = open_feature_matrix(name).X
+        start = time.perf_counter()
+        full_scores = -LocalOutlierFactor(n_neighbors=n_neighbors).fit(X).negative_outlier_factor_
+        full_seconds = time.perf_counter() - start
+        print(f"\n{name}: {X.shape[0]:,} x {X.shape[1]}, full LOF (k={n_neighbors}) {full_seconds:.2f}s")
+
+        for s in samples:
+            for m in estimators:
+                if s <= n_neighbors:
+                    continue
+                model = EnsembleLOF(n_estimators=m, max_samples=s, n_neighbors=n_neighbors,
+                                    aggregate=aggregate, n_jobs=n_jobs)
+                start = time.perf_counter()
+                model.fit(X)
+                seconds = time.perf_counter() - start
+                accuracy = compare_to_full(full_scores, model.scores_, contamination)
+                rows.append({
+                    "dataset": name,
+                    "rows": X.shape[0],
+                    "max_samples": min(s, X.shape[0]),
+                    "n_estimators": len(model.estimators_),
+                    "member_k": model.member_neighbors_,
+                    "seconds": round(seconds, 3),
+                    "full_seconds": round(full_seconds, 3),
+                    **{key: round(value, 4) for key, value in accuracy.items()},
+                })
+                print(f"  s={s:<6} M={m:<4} {seconds:7.2f}s  spearman={accuracy['spearman']:.3f}  "
+                      f"top{contamination:.0%}={accuracy['top_overlap']:.3f}  auc={accuracy['auc']:.3f}")
+    return pd.DataFrame(rows)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--datasets", nargs="+", default=["tracker", "merged"])
+    parser.add_argument("--samples", nargs="+", type=int, default=[512, 1024, 2048])
+    parser.add_argument("--estimators", nargs="+", type=int, default=[5, 10, 20])
+    parser.add_argument("--n-neighbors", type=int, default=20)
+    parser.add_argument("--contamination", type=float, default=0.05)
+    parser.add_argument("--aggregate", choices=["mean", "max_rank"], default="mean")
+    parser.add_argument("--n-jobs", type=int, default=-1)
+    parser.add_argument("--out", default="data/reports/ensemble_lof_benchmark.csv")
+    args = parser.parse_args()
+
+    results = run(args.datasets, args.samples, args.estimators, args.n_neighbors,
+                  args.contamination, args.aggregate, args.n_jobs)
+    Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+    results.to_csv(args.out, index=False)
+    print(f"\n✓ Hasil benchmark tersimpan: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""Load test of the HTTP scoring service on localhost.
+
+For every --workers the service (``python -m pipeline.score_api``) is started
+on a free port. Then, for every --concurrency and --batch-size, that many
+keep-alive clients each send --requests NDJSON requests of batch-size events
+taken from the raw tracker export. Recorded per run: client-side p50/p99
+latency, requests/s and events/s, and how many requests the server
+coalesced into one scoring batch. Run stages 01-06 first so that the
+registry and the profile store exist.
+
+    python benchmarks/bench_score_api.py --workers 1 2 --concurrency 1 16 64 --batch-size 1 50
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from pipeline.tail_daemon import parse_lines  # noqa: E402
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def get_json(port: int, path: str) -> dict:
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=5) as response:
+        return json.load(response)
+
+
+def start_server(args: argparse.Namespace, workers: int) -> tuple[subprocess.Popen, int]:
+    port = free_port()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "pipeline.score_api", "--model", args.model, "--port", str(port),
+         "--workers", str(workers), "--max-batch", str(args.max_batch), "--max-wait-ms", str(args.max_wait_ms)],
+        cwd=REPO_ROOT, stdout=subprocess.DEVNULL, env={**os.environ, "PYTHONPATH": str(REPO_ROOT)},
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            get_json(port, "/healthz")
+            return proc, port
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("score_api did not come up within 60 s")
+
+
+async def client(port: int, bodies: list[bytes], latencies: list) -> None:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        for body in bodies:
+            started = time.perf_counter()
+            writer.write(f"POST /score HTTP/1.1\r\nHost: 127.0.0.1\r\nContent-Type: application/x-ndjson\r\n"
+                         f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body)
+            await writer.drain()
+            status = await reader.readline()
+            length = 0
+            while (line := await reader.readline()) not in (b"\r\n", b""):
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":", 1)[1])
+            await reader.readexactly(length)
+            if b" 200 " not in status:
+                raise RuntimeError(f"score_api answered {status!r}")
+            latencies.append(time.perf_counter() - started)
+    finally:
+        writer.close()
+
+
+async def load(port: int, events: list[str], concurrency: int, batch_size: int, requests: int) -> dict:
+    rng = np.random.default_rng(0)
+    latencies: list[float] = []
+    clients = []
+    for _ in range(concurrency):
+        bodies = []
+        for _ in range(requests):
+            start = int(rng.integers(0, len(events) - batch_size))
+            bodies.append("".join(events[start:start + batch_size]).encode("utf-8"))
+        clients.append(client(port, bodies, latencies))
+    started = time.perf_counter()
+    await asyncio.gather(*clients)
+    seconds = time.perf_counter() - started
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+    return {"requests": len(latencies), "seconds": round(seconds, 2),
+            "requests_per_s": round(len(latencies) / seconds, 1),
+            "events_per_s": round(len(latencies) * batch_size / seconds, 1),
+            "latency_p50_ms": round(p50, 2), "latency_p99_ms": round(p99, 2)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--input", default="tracker januar5000i.csv")
+    parser.add_argument("--model", default="tracker")
+    parser.add_argument("--workers", nargs="+", type=int, default=[1, 2])
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 16, 64])
+    parser.add_argument("--batch-size", nargs="+", type=int, default=[1, 50], help="Events per request")
+    parser.add_argument("--requests", type=int, default=50, help="Requests per client")
+    parser.add_argument("--max-batch", type=int, default=2048)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    parser.add_argument("--out", default="data/reports/score_api_benchmark.csv")
+    args = parser.parse_args()
+
+    raw, _ = parse_lines((REPO_ROOT / args.input).read_text(encoding="utf-8").splitlines()[1:])
+    events = [json.dumps(event) + "\n" for event in raw.to_dict("records")]
+
+    rows = []
+    for workers in args.workers:
+        proc, port = start_server(args, workers)
+        try:
+            for batch_size in args.batch_size:
+                for concurrency in args.concurrency:
+                    before = get_json(port, "/metrics")
+                    run = asyncio.run(load(port, events, concurrency, batch_size, args.requests))
+                    after = get_json(port, "/metrics")
+                    batches = after["batches"] - before["batches"]
+                    run["requests_per_batch"] = round(run["requests"] / batches, 2) if batches else None
+                    print(f"  workers={workers} batch={batch_size:>4} clients={concurrency:>4}  "
+                          f"{run['requests_per_s']:>8,.0f} req/s {run['events_per_s']:>9,.0f} event/s  "
+                          f"p50={run['latency_p50_ms']} p99={run['latency_p99_ms']} ms  "
+                          f"request/batch={run['requests_per_batch']}")
+                    rows.append({"workers": workers, "batch_size": batch_size, "concurrency": concurrency,
+                                 "max_wait_ms": args.max_wait_ms, **run,
+                                 "server_p50_ms": after["latency_ms"]["p50"],
+                                 "server_p99_ms": after["latency_ms"]["p99"]})
+        finally:
+            proc.terminate()
+            proc.wait(timeout=30)
+
+    Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+    pd.DataFrame(rows).to_csv(args.out, index=False)
+    print(f"\n✓ Hasil benchmark tersimpan: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
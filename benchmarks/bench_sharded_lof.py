@@ -0,0 +1,68 @@
+"""Fit time of ShardedLOF versus the number of shards.
+
+Resamples the stage-04 matrix (data/matrix/<dataset>.npy, run
+04_normalization*.py first) to --rows rows with a small jitter and splits
+them into S equal random shards for each S in --shards. It reports the fit
+time against S=1, one global LOF. With brute-force or tree kNN the work per
+shard drops like (n/S)^a with a > 1, and shards run in parallel across
+--n-jobs processes. So the speedup should grow at least linearly in S
+until the cores run out.
+
+    python benchmarks/bench_sharded_lof.py --rows 50000 --shards 1 2 4 8
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.bench_blocked_knn import resample  # noqa: E402
+from pipeline.feature_matrix import open_feature_matrix  # noqa: E402
+from pipeline.sharded_lof import ShardedLOF  # noqa: E402
+
+
+def run(dataset, n_rows, shard_counts, n_neighbors, backend, n_jobs, jitter) -> pd.DataFrame:
+    X = resample(open_feature_matrix(dataset).X, n_rows, jitter)
+    rng = np.random.default_rng(0)
+    print(f"\n{dataset}: {n_rows:,} x {X.shape[1]}, k={n_neighbors}, backend={backend}, n_jobs={n_jobs}")
+
+    rows, base = [], None
+    for s in shard_counts:
+        keys = rng.integers(0, s, size=n_rows)
+        model = ShardedLOF(n_neighbors=n_neighbors, normalize="robust", min_shard_rows=n_neighbors + 1,
+                           backend=backend, n_jobs=n_jobs)
+        start = time.perf_counter()
+        model.fit(X, keys)
+        seconds = time.perf_counter() - start
+        base = base or seconds
+        print(f"  shards={s:<4} {seconds:8.2f}s  speedup={base / seconds:5.2f}")
+        rows.append({"dataset": dataset, "rows": n_rows, "shards": s, "n_jobs": n_jobs, "backend": backend,
+                     "seconds": round(seconds, 3), "speedup": round(base / seconds, 3)})
+    return pd.DataFrame(rows)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dataset", default="tracker")
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--shards", nargs="+", type=int, default=[1, 2, 4, 8])
+    parser.add_argument("--n-neighbors", type=int, default=20)
+    parser.add_argument("--backend", choices=["sklearn", "blocked"], default="sklearn")
+    parser.add_argument("--n-jobs", type=int, default=-1)
+    parser.add_argument("--jitter", type=float, default=0.01)
+    parser.add_argument("--out", default="data/reports/sharded_lof_benchmark.csv")
+    args = parser.parse_args()
+
+    results = run(args.dataset, args.rows, args.shards, args.n_neighbors, args.backend, args.n_jobs, args.jitter)
+    Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+    results.to_csv(args.out, index=False)
+    print(f"\n✓ Hasil benchmark tersimpan: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
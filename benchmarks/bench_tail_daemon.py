@@ -0,0 +1,93 @@
+"""Throughput and latency of the tail daemon against a local file writer.
+
+For every --rate (lines/s) the raw tracker export is replayed into a fresh
+log file in a temporary directory while :class:`pipeline.tail_daemon.TailDaemon`
+tails it with the latest registered bundle. The daemon's own metrics are
+recorded once the whole file has been scored: events/s, p50/p99 latency from
+read to written, batch time and how often the reader waited on a full queue.
+Run stages 01-06 first so that the registry and the staff logins exist.
+
+    python benchmarks/bench_tail_daemon.py --rate 1000 5000 50000 --flush-ms 200 500
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from pipeline.artifact_store import ArtifactStore  # noqa: E402
+from pipeline.model_registry import ModelRegistry  # noqa: E402
+from pipeline.tail_daemon import (  # noqa: E402
+    SCORED_DATASET, Checkpoint, FileTailSource, StreamFeaturizer, TailDaemon, load_logins, replay_log,
+)
+
+
+async def run_once(source: str, bundle, logins, rate: float, flush_ms: int, max_batch: int,
+                   queue_chunks: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        log = Path(tmp) / "tracker.log"
+        daemon = TailDaemon(
+            FileTailSource(log, poll_interval=0.05, read_bytes=64 << 10),
+            bundle,
+            featurizer=StreamFeaturizer(bundle.feature_columns, table_profile=bundle.table_profile,
+                                        logins=logins, profile_path=Path(tmp) / "profiles.sqlite"),
+            store=ArtifactStore(Path(tmp) / "store"),
+            checkpoint=Checkpoint(Path(tmp) / "checkpoint"),
+            flush_ms=flush_ms, max_batch=max_batch, queue_chunks=queue_chunks,
+        )
+        stop = asyncio.Event()
+
+        async def feed() -> None:
+            await replay_log(source, log, rate=rate)
+            end = os.path.getsize(log)
+            while (daemon.metrics.position or {}).get("offset", 0) < end:
+                await asyncio.sleep(0.05)
+            stop.set()
+
+        feeder = asyncio.create_task(feed())
+        summary = await daemon.run(stop)
+        await feeder
+        summary["rows_in_store"] = daemon.store.row_count(SCORED_DATASET)
+        return summary
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--input", default="tracker januar5000i.csv")
+    parser.add_argument("--model", default="tracker")
+    parser.add_argument("--logins", default="data/cleaned/staff_cleaned.csv")
+    parser.add_argument("--rate", nargs="+", type=float, default=[1000, 5000, 50000])
+    parser.add_argument("--flush-ms", nargs="+", type=int, default=[200, 500])
+    parser.add_argument("--max-batch", type=int, default=5000)
+    parser.add_argument("--queue-chunks", type=int, default=8)
+    parser.add_argument("--out", default="data/reports/tail_daemon_benchmark.csv")
+    args = parser.parse_args()
+
+    bundle = ModelRegistry().load(args.model)
+    logins = load_logins(args.logins)
+    rows = []
+    for flush_ms in args.flush_ms:
+        for rate in args.rate:
+            m = asyncio.run(run_once(args.input, bundle, logins, rate, flush_ms, args.max_batch, args.queue_chunks))
+            print(f"  flush={flush_ms:>4} ms rate={rate:>8,.0f}/s  {m['events_scored']:,} event "
+                  f"({m['throughput_eps']:,.0f}/s)  latensi p50={m['latency_ms']['p50']} p99={m['latency_ms']['p99']} ms  "
+                  f"batch p50={m['batch_ms']['p50']} ms  backpressure={m['backpressure_waits']}")
+            rows.append({"flush_ms": flush_ms, "rate": rate, "events": m["events_scored"],
+                         "rows_in_store": m["rows_in_store"], "batches": m["batches"], "alerts": m["alerts"],
+                         "throughput_eps": m["throughput_eps"], "latency_p50_ms": m["latency_ms"]["p50"],
+                         "latency_p99_ms": m["latency_ms"]["p99"], "batch_p50_ms": m["batch_ms"]["p50"],
+                         "batch_p99_ms": m["batch_ms"]["p99"], "backpressure_waits": m["backpressure_waits"]})
+
+    Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+    pd.DataFrame(rows).to_csv(args.out, index=False)
+    print(f"\n✓ Hasil benchmark tersimpan: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
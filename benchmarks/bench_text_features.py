@@ -0,0 +1,111 @@
+"""Throughput of the query_info text features: str.extract versus the one-pass tokenizer.
+
+Resamples the raw tracker log (data/raw/tracker_raw.csv, run
+01_load_explore.py first) to --rows rows. By default every copy of a
+statement gets a fresh numeric literal (--unique-ratio of the rows), so
+that the factorize/LRU dedupe in :mod:`pipeline.sql_fingerprint` cannot hide
+the tokenizer cost as the log grows. Three extractors are timed:
+
+* ``str.extract``: three separate regex passes (IP, verb, table), as the
+  older stage scripts did;
+* ``extract_fields``: one match of a combined IP/verb/table pattern per
+  distinct statement;
+* ``fingerprint_series``: the full tokenizer, which also builds the
+  literal-free template and its hash.
+
+The last two run with every N in --n-jobs processes over the distinct
+statements.
+
+Reports rows/s and rows/s per core, and checks that all extractors agree
+on the IP column.
+
+    python benchmarks/bench_text_features.py --rows 200000 1000000 --n-jobs 1 2 4
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from joblib import effective_n_jobs
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from pipeline import sql_fingerprint  # noqa: E402
+from pipeline.sql_fingerprint import extract_fields, fingerprint_series  # noqa: E402
+
+IP_PATTERN = r"(\d{1,3}(?:\.\d{1,3}){3})"
+VERB_PATTERN = r"^\s*(SELECT|INSERT|UPDATE|DELETE)"
+TABLE_PATTERN = r"(?:FROM|INTO|UPDATE)\s+`?(\w+)"
+
+
+def resample_queries(queries: pd.Series, n_rows: int, unique_ratio: float, seed: int = 0) -> pd.Series:
+    rng = np.random.default_rng(seed)
+    sample = queries.to_numpy(dtype=object)[rng.integers(0, len(queries), size=n_rows)]
+    fresh = rng.random(n_rows) < unique_ratio
+    sample[fresh] = [f"{q} AND id='{i}'" for q, i in zip(sample[fresh], np.flatnonzero(fresh))]
+    return pd.Series(sample, dtype="object")
+
+
+def extract_baseline(queries: pd.Series) -> pd.DataFrame:
+    text = queries.fillna("")
+    return pd.DataFrame({
+        "ip": text.str.extract(IP_PATTERN, expand=False),
+        "query_type": text.str.extract(VERB_PATTERN, flags=2, expand=False).str.upper().fillna("OTHER"),
+        "sql_table": text.str.extract(TABLE_PATTERN, flags=2, expand=False),
+    })
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def run(queries: pd.Series, sizes, n_jobs_list, unique_ratio) -> pd.DataFrame:
+    rows = []
+    for n in sizes:
+        sample = resample_queries(queries, n, unique_ratio)
+        print(f"\n{n:,} rows, {sample.nunique():,} distinct statements")
+
+        baseline, seconds = timed(lambda: extract_baseline(sample))
+        reference = baseline["ip"]
+        candidates = [("str.extract", 1, seconds, reference)]
+        for extractor in (extract_fields, fingerprint_series):
+            for n_jobs in n_jobs_list:
+                sql_fingerprint.fingerprint_query.cache_clear()
+                result, seconds = timed(lambda: extractor(sample, n_jobs=n_jobs))
+                candidates.append((f"{extractor.__name__} n_jobs={n_jobs}", effective_n_jobs(n_jobs),
+                                   seconds, result["ip"]))
+
+        for name, cores, seconds, ips in candidates:
+            agree = float((ips.astype(object).fillna("") == reference.fillna("")).mean())
+            print(f"  {name:<30} {seconds:8.2f}s  {n / seconds:12,.0f} rows/s  "
+                  f"{n / seconds / cores:12,.0f} rows/s/core  ip agree={agree:.2%}")
+            rows.append({"rows": n, "extractor": name, "cores": cores, "seconds": round(seconds, 3),
+                         "rows_per_s": round(n / seconds), "rows_per_s_per_core": round(n / seconds / cores),
+                         "ip_agreement": agree})
+    return pd.DataFrame(rows)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--input", default="data/raw/tracker_raw.csv")
+    parser.add_argument("--rows", nargs="+", type=int, default=[200_000, 1_000_000])
+    parser.add_argument("--n-jobs", nargs="+", type=int, default=[1, -1])
+    parser.add_argument("--unique-ratio", type=float, default=0.5,
+                        help="Share of rows given a fresh literal (defeats the dedupe)")
+    parser.add_argument("--out", default="data/reports/text_features_benchmark.csv")
+    args = parser.parse_args()
+
+    queries = pd.read_csv(args.input, usecols=["query_info"])["query_info"]
+    results = run(queries, args.rows, args.n_jobs, args.unique_ratio)
+    Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+    results.to_csv(args.out, index=False)
+    print(f"\n✓ Hasil benchmark tersimpan: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
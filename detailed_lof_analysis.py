@@ -23,29 +23,39 @@ tracker = pd.read_csv('data/anomalies/tracker_with_lof_scores.csv')
 staff = pd.read_csv('data/anomalies/staff_with_lof_scores.csv')
 
 print("\n" + "="*80)
-print("BAGIAN 1: PROSES GRID SEARCH UNTUK PARAMETER OPTIMAL")
+print("BAGIAN 1: PARAMETER LOF & AMBANG ANOMALI")
 print("="*80)
 
-print("\n[A] TRACKER - Grid Search k-neighbors:")
+print("\n[A] TRACKER - LOF k-neighbors & ambang skor:")
 print("-" * 80)
-print(f"{'k':<5} {'Anomalies':<12} {'Percentage':<12} {'LOF Min':<20} {'LOF Mean':<20}")
+threshold = tracker_config.get('threshold')
+if threshold:
+    rule = (f"skor absolut {threshold['score']}" if threshold['rule'] == 'score'
+            else f"persentil {threshold['percentile']:g}")
+    print(f"  k={tracker_config['optimal_k']} (fit sekali), ambang: LOF > {threshold['cutoff']:.4f} ({rule})")
+    print(f"  Persentil skor: {threshold['score_percentiles']}")
+else:
+    print(f"{'k':<5} {'Anomalies':<12} {'Percentage':<12} {'LOF Min':<20} {'LOF Mean':<20}")
+    for result in tracker_config.get('grid_search_results', []):
+        print(f"{result['k']:<5} {result['anomalies_detected']:<12} {result['anomaly_percentage']:<12.2f} "
+              f"{result['lof_score_min']:<20.2e} {result['lof_score_mean']:<20.2e}")
 print("-" * 80)
-for result in tracker_config['grid_search_results']:
-    print(f"{result['k']:<5} {result['anomalies_detected']:<12} {result['anomaly_percentage']:<12.2f} "
-          f"{result['lof_score_min']:<20.2e} {result['lof_score_mean']:<20.2e}")
-print("-" * 80)
-print(f"✓ OPTIMAL: k={tracker_config['optimal_k']} dipilih karena paling mendekati contamination 5%")
 print(f"  Hasil: {tracker_config['final_anomalies_count']} anomalies ({tracker_config['final_anomaly_percentage']:.2f}%)")
 
-print("\n[B] STAFF - Grid Search k-neighbors:")
-print("-" * 80)
-print(f"{'k':<5} {'Anomalies':<12} {'Percentage':<12} {'LOF Min':<20} {'LOF Mean':<20}")
+print("\n[B] STAFF - LOF k-neighbors & ambang skor:")
 print("-" * 80)
-for result in staff_config['grid_search_results']:
-    print(f"{result['k']:<5} {result['anomalies_detected']:<12} {result['anomaly_percentage']:<12.2f} "
-          f"{result['lof_score_min']:<20.2e} {result['lof_score_mean']:<20.2e}")
+threshold = staff_config.get('threshold')
+if threshold:
+    rule = (f"skor absolut {threshold['score']}" if threshold['rule'] == 'score'
+            else f"persentil {threshold['percentile']:g}")
+    print(f"  k={staff_config['optimal_k']} (fit sekali), ambang: LOF > {threshold['cutoff']:.4f} ({rule})")
+    print(f"  Persentil skor: {threshold['score_percentiles']}")
+else:
+    print(f"{'k':<5} {'Anomalies':<12} {'Percentage':<12} {'LOF Min':<20} {'LOF Mean':<20}")
+    for result in staff_config.get('grid_search_results', []):
+        print(f"{result['k']:<5} {result['anomalies_detected']:<12} {result['anomaly_percentage']:<12.2f} "
+              f"{result['lof_score_min']:<20.2e} {result['lof_score_mean']:<20.2e}")
 print("-" * 80)
-print(f"✓ OPTIMAL: k={staff_config['optimal_k']} dipilih karena paling mendekati contamination 5%")
 print(f"  Hasil: {staff_config['final_anomalies_count']} anomalies ({staff_config['final_anomaly_percentage']:.2f}%)")
 
 print("\n" + "="*80)
@@ -215,7 +225,7 @@ TRACKER Files:
   2. models/lof_model_tracker.pkl
      ├─ Model LOF yang sudah di-training
      ├─ Dapat digunakan untuk prediksi data baru
-     └─ Parameters: k=5, contamination=0.05
+     └─ Parameters: k=20 (ambang dari models/lof_threshold_tracker.json)
 
   3. models/feature_info_tracker.json
      ├─ Metadata 14 fitur yang digunakan
@@ -224,7 +234,7 @@ TRACKER Files:
 
   4. models/lof_config_tracker.json
      ├─ Konfigurasi lengkap model
-     ├─ Hasil grid search semua k
+     ├─ Aturan ambang + ringkasan distribusi skor
      └─ Statistik anomali detection
 
 STAFF Files:
@@ -235,13 +245,13 @@ STAFF Files:
      └─ Kolom: lof_score, is_anomaly
 
   2. models/lof_model_staff.pkl
-     └─ Model LOF (k=5, contamination=0.05)
+     └─ Model LOF (k=20, ambang: models/lof_threshold_staff.json)
 
   3. models/feature_info_staff.json
      └─ Metadata 11 fitur + scaler params
 
   4. models/lof_config_staff.json
-     └─ Config + grid search results
+     └─ Config + aturan ambang
 """)
 
 print("\n" + "="*80)
@@ -0,0 +1,6 @@
+"""Reusable building blocks for the LOF + K-Means pipeline scripts.
+
+The numbered stage scripts (01_*.py ... 07_*.py) cannot be imported because
+of their numeric prefixes, so logic shared between stages, the Streamlit app
+and the benchmarks lives here.
+"""
@@ -0,0 +1,178 @@
+"""Roll repeated anomalies up into one alert per burst.
+
+One misbehaving user or workstation produces many near-identical anomalous
+events, e.g. the same ``delete from resep_dokter_racikan`` statement minutes
+apart, and each becomes its own ``is_anomaly=1`` row. :class:`BurstAggregator`
+groups anomalies by a key (default ``user_id, ip, fingerprint_id``; the
+cluster id works as well) into bursts in event time:
+
+* a burst continues while consecutive anomalies of the key are at most
+  ``gap`` apart, and is split after ``max_span`` so that a storm that never
+  pauses still produces an alert per span;
+* it keeps the count, first/last time, max and mean ``lof_score`` and the
+  context columns of its highest-scoring event, and is emitted as one row
+  when it closes.
+
+Open bursts live in an in-memory keyed store (an ``OrderedDict`` in order of
+last update). Keys whose last anomaly is more than ``gap`` before the
+watermark (the latest event time seen) are closed and evicted from the front
+of that order, so eviction only touches expired entries. At most ``max_keys``
+bursts are open; beyond that the least recently updated one is closed early
+(``closed_by="capacity"``), which bounds memory during an alert storm over
+many keys.
+"""
+
+from collections import OrderedDict
+from itertools import repeat
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+
+DEFAULT_KEY_COLUMNS = ("user_id", "ip", "fingerprint_id")
+DEFAULT_CONTEXT_COLUMNS = ("query_type", "sql_table", "query_info", "cluster")
+DEFAULT_GAP = "15min"
+DEFAULT_MAX_SPAN = "1h"
+DEFAULT_MAX_KEYS = 10_000
+
+
+class _Burst:
+    __slots__ = ("first", "last", "count", "score_sum", "max_score", "context")
+
+    def __init__(self, t: int, score: float, context: tuple):
+        self.first = self.last = t
+        self.count = 1
+        self.score_sum = self.max_score = score
+        self.context = context
+
+    def add(self, t: int, score: float, context: tuple) -> None:
+        self.first = min(self.first, t)
+        self.last = max(self.last, t)
+        self.count += 1
+        self.score_sum += score
+        if score > self.max_score:
+            self.max_score, self.context = score, context
+
+
+class BurstAggregator:
+    """Keyed window store that turns anomaly rows into burst alerts.
+
+    Args:
+        key_columns: Columns identifying "the same" alert
+        time_col: Event time column (datetime-like)
+        score_col: LOF score column
+        gap: Largest pause inside a burst (pandas offset alias)
+        max_span: Longest burst before it is split
+        max_keys: Open bursts kept in memory
+        context_columns: Columns copied from the highest-scoring event (those present)
+    """
+
+    def __init__(
+        self,
+        key_columns: Sequence[str] = DEFAULT_KEY_COLUMNS,
+        time_col: str = "datetime",
+        score_col: str = "lof_score",
+        gap: str = DEFAULT_GAP,
+        max_span: Optional[str] = DEFAULT_MAX_SPAN,
+        max_keys: int = DEFAULT_MAX_KEYS,
+        context_columns: Sequence[str] = DEFAULT_CONTEXT_COLUMNS,
+    ):
+        self.key_columns = list(key_columns)
+        self.time_col = time_col
+        self.score_col = score_col
+        self.gap = pd.Timedelta(gap).value
+        self.max_span = pd.Timedelta(max_span).value if max_span is not None else None
+        self.max_keys = max_keys
+        self.context_columns = list(context_columns)
+        self._context: Optional[list[str]] = None   # context columns present, fixed by the first frame
+        self._open: "OrderedDict[tuple, _Burst]" = OrderedDict()
+        self.watermark: Optional[int] = None
+        self.stats = {"anomalies": 0, "bursts": 0, "closed_by_capacity": 0}
+
+    def __len__(self) -> int:
+        return len(self._open)
+
+    def _close(self, key: tuple, burst: _Burst, reason: str, closed: list) -> None:
+        closed.append((*key, burst.first, burst.last, burst.count, burst.max_score,
+                       burst.score_sum / burst.count, reason, *burst.context))
+        self.stats["bursts"] += 1
+        if reason == "capacity":
+            self.stats["closed_by_capacity"] += 1
+
+    def _frame(self, closed: list) -> pd.DataFrame:
+        columns = self.key_columns + ["first_seen", "last_seen", "count", "max_lof_score", "mean_lof_score",
+                                      "closed_by"] + (self._context or [])
+        bursts = pd.DataFrame(closed, columns=columns)
+        for col in ("first_seen", "last_seen"):
+            bursts[col] = pd.to_datetime(bursts[col].astype(np.int64), unit="ns")
+        bursts.insert(len(self.key_columns) + 2, "duration_s",
+                      (bursts["last_seen"] - bursts["first_seen"]).dt.total_seconds())
+        return bursts
+
+    def update(self, anomalies: pd.DataFrame) -> pd.DataFrame:
+        """Add anomaly rows; returns the bursts that closed (gap, span or capacity)."""
+        closed: list = []
+        if not anomalies.empty:
+            if self._context is None:
+                self._context = [col for col in self.context_columns
+                                 if col in anomalies.columns and col not in self.key_columns]
+            times = pd.to_datetime(anomalies[self.time_col]).to_numpy(dtype="datetime64[ns]").astype(np.int64)
+            keys = anomalies[self.key_columns].astype(object)
+            keys = keys.where(keys.notna(), None).itertuples(index=False, name=None)
+            # itertuples() over zero columns yields no rows at all
+            contexts = (anomalies[self._context].itertuples(index=False, name=None) if self._context
+                        else repeat((), len(anomalies)))
+            rows = list(zip(times, keys, anomalies[self.score_col].to_numpy(dtype=np.float64), contexts))
+            for t, key, score, context in sorted(rows, key=lambda row: row[0]):
+                t = int(t)
+                burst = self._open.get(key)
+                if burst is not None:
+                    if t - burst.last > self.gap:
+                        self._close(key, self._open.pop(key), "gap", closed)
+                        burst = None
+                    elif self.max_span is not None and t - burst.first >= self.max_span:
+                        self._close(key, self._open.pop(key), "max_span", closed)
+                        burst = None
+                if burst is None:
+                    self._open[key] = _Burst(t, score, context)
+                else:
+                    burst.add(t, score, context)
+                    self._open.move_to_end(key)
+                while len(self._open) > self.max_keys:
+                    self._close(*self._open.popitem(last=False), "capacity", closed)
+            self.stats["anomalies"] += len(rows)
+            self.watermark = max(self.watermark or int(times.max()), int(times.max()))
+        if self.watermark is not None:
+            self._expire(self.watermark, closed)
+        return self._frame(closed)
+
+    def _expire(self, now: int, closed: list) -> None:
+        while self._open:
+            key, burst = next(iter(self._open.items()))
+            if now - burst.last <= self.gap:
+                break
+            del self._open[key]
+            self._close(key, burst, "gap", closed)
+
+    def expire(self, now) -> pd.DataFrame:
+        """Close bursts with no anomaly within ``gap`` before ``now`` (advances the watermark)."""
+        now = int(pd.Timestamp(now).value)
+        self.watermark = max(self.watermark or now, now)
+        closed: list = []
+        self._expire(self.watermark, closed)
+        return self._frame(closed)
+
+    def flush(self) -> pd.DataFrame:
+        """Close every open burst (end of a batch run)."""
+        closed: list = []
+        while self._open:
+            self._close(*self._open.popitem(last=False), "flush", closed)
+        return self._frame(closed)
+
+
+def aggregate_bursts(anomalies: pd.DataFrame, **kwargs) -> pd.DataFrame:
+    """All bursts of a finished set of anomalies, largest first (see :class:`BurstAggregator`)."""
+    aggregator = BurstAggregator(**kwargs)
+    bursts = pd.concat([aggregator.update(anomalies), aggregator.flush()], ignore_index=True)
+    return bursts.sort_values(["count", "max_lof_score"], ascending=False, ignore_index=True)
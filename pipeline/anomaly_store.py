@@ -0,0 +1,322 @@
+"""Indexed SQLite store behind the dashboard's anomaly explorer.
+
+Stage 07 of the dashboard used to load the whole clustered CSV, filter and
+sort it with pandas, send the full frame to ``st.dataframe`` and build the
+CSV download with ``df_clustered.to_csv()`` on every rerun. :class:`AnomalyStore`
+loads the anomalies of a clustered file once (again only when its size or
+mtime changes) into one SQLite table:
+
+* the filter and sort columns (``user_id``, ``cluster``, ``epoch_s``,
+  ``lof_score``) as typed columns, with one index per sort order, so a page
+  is an index range scan;
+* the original row as one CSV-encoded line (``record``), so a page is parsed
+  back into the file's own columns and an export is the header plus the
+  stored lines, without any re-encoding.
+
+Pages use keyset pagination: the next page starts strictly after the sort
+key of the last row shown (``(lof_score, row_id) < (?, ?)``), so page N
+costs the same as page 1 and rows do not shift between pages. An unknown
+event time is stored as ``epoch_s`` -1 and never matches a time range.
+
+Every call opens its own short-lived connection, so one store can be shared
+by the dashboard's script threads and its download handlers.
+"""
+
+import csv
+import io
+import sqlite3
+import tempfile
+from contextlib import closing
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import BinaryIO, Callable, Iterator, Optional
+
+import numpy as np
+import pandas as pd
+
+from pipeline.cubes import NO_CLUSTER, event_epochs
+from pipeline.user_profiles import user_keys
+
+
+ANOMALY_STORE_PATH = "data/explorer/anomalies.sqlite"
+LOAD_CHUNKSIZE = 50_000
+EXPORT_CHUNK_ROWS = 10_000
+NO_TIME = -1
+
+# Sort order -> key columns (all in the same direction, row_id breaks ties)
+SORT_KEYS = {
+    "lof_score": ("lof_score", "row_id"),
+    "timestamp": ("epoch_s", "row_id"),
+    "cluster": ("cluster", "lof_score", "row_id"),
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS anomalies (
+    dataset TEXT NOT NULL,
+    row_id INTEGER NOT NULL,
+    user_id TEXT,
+    cluster INTEGER NOT NULL,
+    epoch_s INTEGER NOT NULL,
+    lof_score REAL NOT NULL,
+    record TEXT NOT NULL,
+    PRIMARY KEY (dataset, row_id)
+);
+CREATE INDEX IF NOT EXISTS anomalies_by_score ON anomalies (dataset, lof_score, row_id);
+CREATE INDEX IF NOT EXISTS anomalies_by_time ON anomalies (dataset, epoch_s, row_id);
+CREATE INDEX IF NOT EXISTS anomalies_by_cluster ON anomalies (dataset, cluster, lof_score, row_id);
+CREATE INDEX IF NOT EXISTS anomalies_by_user ON anomalies (dataset, user_id, lof_score, row_id);
+CREATE TABLE IF NOT EXISTS sources (
+    dataset TEXT PRIMARY KEY,
+    source TEXT NOT NULL,
+    source_size INTEGER NOT NULL,
+    source_mtime REAL NOT NULL,
+    header TEXT NOT NULL,
+    rows INTEGER NOT NULL,
+    loaded_at TEXT NOT NULL
+);
+"""
+
+
+def _csv_lines(rows) -> list[str]:
+    """One CSV line per row (same quoting as the source file, '\\n' terminated)."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    lines = []
+    for row in rows:
+        writer.writerow(row)
+        lines.append(buffer.getvalue())
+        buffer.seek(0)
+        buffer.truncate()
+    return lines
+
+
+@dataclass(frozen=True)
+class AnomalyFilter:
+    """Server-side filter; None means "any". ``start``/``end`` are epoch seconds, end exclusive."""
+
+    user_id: Optional[str] = None
+    cluster: Optional[int] = None
+    start: Optional[int] = None
+    end: Optional[int] = None
+    min_score: Optional[float] = None
+    max_score: Optional[float] = None
+
+    def where(self) -> tuple[str, list]:
+        """SQL conditions (joined with AND, without the dataset) and their parameters."""
+        clauses, params = [], []
+        if self.user_id is not None:
+            clauses.append("user_id = ?")
+            params.append(str(user_keys([self.user_id]).iloc[0]))
+        if self.cluster is not None:
+            clauses.append("cluster = ?")
+            params.append(int(self.cluster))
+        if self.start is not None:
+            clauses.append("epoch_s >= ?")
+            params.append(int(self.start))
+        if self.end is not None:
+            clauses.append("epoch_s < ?")
+            params.append(int(self.end))
+        if self.start is not None or self.end is not None:
+            clauses.append(f"epoch_s != {NO_TIME}")
+        if self.min_score is not None:
+            clauses.append("lof_score >= ?")
+            params.append(float(self.min_score))
+        if self.max_score is not None:
+            clauses.append("lof_score <= ?")
+            params.append(float(self.max_score))
+        return " AND ".join(clauses), params
+
+
+@dataclass
+class Page:
+    """One page of rows plus the key to pass as ``after`` for the next one (None on the last page)."""
+
+    rows: pd.DataFrame
+    next_key: Optional[tuple]
+
+
+class AnomalyStore:
+    """SQLite-backed anomaly rows of the clustered files (see module docstring).
+
+    Args:
+        path: SQLite file (created with its tables if missing)
+    """
+
+    def __init__(self, path=ANOMALY_STORE_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path)
+
+    # -------------------------------------------------------------- loading
+    def is_current(self, dataset: str, source_path) -> bool:
+        """True if ``dataset`` was loaded from ``source_path`` as it is now (size and mtime)."""
+        stat = Path(source_path).stat()
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT source, source_size, source_mtime FROM sources WHERE dataset = ?",
+                               (dataset,)).fetchone()
+        return row == (str(source_path), stat.st_size, stat.st_mtime)
+
+    def load(self, dataset: str, source_path, chunksize: int = LOAD_CHUNKSIZE) -> int:
+        """(Re)load the anomalies of a clustered CSV unless already current; returns the stored rows.
+
+        Rows with ``is_anomaly`` 0 (the normal rows of the merged file) are
+        skipped. The old rows are replaced in one transaction, so readers
+        see either the previous or the new load.
+        """
+        if self.is_current(dataset, source_path):
+            with closing(self._connect()) as conn:
+                return conn.execute("SELECT rows FROM sources WHERE dataset = ?", (dataset,)).fetchone()[0]
+
+        stat = Path(source_path).stat()
+        header, stored, offset = None, 0, 0
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM anomalies WHERE dataset = ?", (dataset,))
+            for chunk in pd.read_csv(source_path, chunksize=chunksize):
+                if header is None:
+                    header = _csv_lines([chunk.columns])[0]
+                row_ids = np.arange(offset, offset + len(chunk))
+                offset += len(chunk)
+                if "is_anomaly" in chunk.columns:
+                    keep = (chunk["is_anomaly"] == 1).to_numpy()
+                    chunk, row_ids = chunk[keep], row_ids[keep]
+                if chunk.empty:
+                    continue
+                epoch = event_epochs(chunk, dataset)
+                epoch = (pd.Series(NO_TIME, index=chunk.index) if epoch is None
+                         else epoch.astype("Float64").fillna(NO_TIME).astype(np.int64))
+                cluster = (chunk["cluster"].fillna(NO_CLUSTER).astype(np.int64) if "cluster" in chunk.columns
+                           else pd.Series(NO_CLUSTER, index=chunk.index))
+                users = (user_keys(chunk["user_id"]).astype(object).where(chunk["user_id"].notna().to_numpy(), None)
+                         if "user_id" in chunk.columns else pd.Series(None, index=chunk.index, dtype=object))
+                records = _csv_lines(chunk.astype(object).where(chunk.notna(), "").itertuples(index=False, name=None))
+                conn.executemany(
+                    "INSERT INTO anomalies (dataset, row_id, user_id, cluster, epoch_s, lof_score, record) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    zip([dataset] * len(chunk), row_ids.tolist(), users.tolist(), cluster.tolist(),
+                        epoch.tolist(), chunk["lof_score"].astype(float).tolist(), records),
+                )
+                stored += len(chunk)
+            if header is None:
+                header = _csv_lines([pd.read_csv(source_path, nrows=0).columns])[0]
+            conn.execute(
+                "INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (dataset, str(source_path), stat.st_size, stat.st_mtime, header, stored,
+                 datetime.now().isoformat()),
+            )
+        return stored
+
+    # ---------------------------------------------------------------- reads
+    def _header(self, conn: sqlite3.Connection, dataset: str) -> str:
+        row = conn.execute("SELECT header FROM sources WHERE dataset = ?", (dataset,)).fetchone()
+        if row is None:
+            raise KeyError(f"dataset {dataset!r} is not loaded")
+        return row[0]
+
+    def bounds(self, dataset: str) -> dict:
+        """Rows, clusters and the score / time ranges of a dataset (for the filter widgets)."""
+        with closing(self._connect()) as conn:
+            rows, min_score, max_score = conn.execute(
+                "SELECT COUNT(*), MIN(lof_score), MAX(lof_score) FROM anomalies WHERE dataset = ?", (dataset,)
+            ).fetchone()
+            min_epoch, max_epoch = conn.execute(
+                f"SELECT MIN(epoch_s), MAX(epoch_s) FROM anomalies WHERE dataset = ? AND epoch_s != {NO_TIME}",
+                (dataset,),
+            ).fetchone()
+            clusters = [row[0] for row in conn.execute(
+                "SELECT DISTINCT cluster FROM anomalies WHERE dataset = ? ORDER BY cluster", (dataset,))]
+        return {"rows": rows, "min_score": min_score, "max_score": max_score,
+                "min_epoch": min_epoch, "max_epoch": max_epoch, "clusters": clusters}
+
+    @staticmethod
+    def _query(dataset: str, flt: AnomalyFilter, sort: str, descending: bool,
+               after: Optional[tuple]) -> tuple[str, list, tuple]:
+        if sort not in SORT_KEYS:
+            raise ValueError(f"Unknown sort {sort!r}, expected one of {sorted(SORT_KEYS)}")
+        keys = SORT_KEYS[sort]
+        where, params = flt.where()
+        clauses, params = ["dataset = ?"] + ([where] if where else []), [dataset] + params
+        if after is not None:
+            if len(after) != len(keys):
+                raise ValueError(f"Key {after!r} does not match sort {sort!r}")
+            clauses.append(f"({', '.join(keys)}) {'<' if descending else '>'} ({', '.join('?' * len(keys))})")
+            params.extend(after)
+        order = ", ".join(f"{key} {'DESC' if descending else 'ASC'}" for key in keys)
+        return f"WHERE {' AND '.join(clauses)} ORDER BY {order}", params, keys
+
+    def count(self, dataset: str, flt: AnomalyFilter = AnomalyFilter()) -> int:
+        where, params = flt.where()
+        with closing(self._connect()) as conn:
+            return conn.execute(
+                f"SELECT COUNT(*) FROM anomalies WHERE dataset = ?{' AND ' + where if where else ''}",
+                [dataset] + params,
+            ).fetchone()[0]
+
+    def page(
+        self,
+        dataset: str,
+        flt: AnomalyFilter = AnomalyFilter(),
+        sort: str = "lof_score",
+        descending: bool = True,
+        after: Optional[tuple] = None,
+        limit: int = 50,
+    ) -> Page:
+        """Up to ``limit`` rows after the key ``after`` (None: first page), as the source file's columns."""
+        tail, params, keys = self._query(dataset, flt, sort, descending, after)
+        with closing(self._connect()) as conn:
+            header = self._header(conn, dataset)
+            rows = conn.execute(f"SELECT {', '.join(keys)}, record FROM anomalies {tail} LIMIT ?",
+                                params + [limit + 1]).fetchall()
+        more = len(rows) > limit
+        rows = rows[:limit]
+        frame = pd.read_csv(io.StringIO(header + "".join(row[-1] for row in rows)))
+        return Page(rows=frame, next_key=tuple(rows[-1][:-1]) if more else None)
+
+    def iter_csv(
+        self,
+        dataset: str,
+        flt: AnomalyFilter = AnomalyFilter(),
+        sort: str = "lof_score",
+        descending: bool = True,
+        chunk_rows: int = EXPORT_CHUNK_ROWS,
+    ) -> Iterator[str]:
+        """The header, then the filtered rows in ``chunk_rows`` blocks (one keyset query each)."""
+        with closing(self._connect()) as conn:
+            yield self._header(conn, dataset)
+            after = None
+            while True:
+                tail, params, keys = self._query(dataset, flt, sort, descending, after)
+                rows = conn.execute(f"SELECT {', '.join(keys)}, record FROM anomalies {tail} LIMIT ?",
+                                    params + [chunk_rows]).fetchall()
+                if not rows:
+                    return
+                yield "".join(row[-1] for row in rows)
+                if len(rows) < chunk_rows:
+                    return
+                after = tuple(rows[-1][:-1])
+
+    def export_csv(self, dataset: str, out: BinaryIO, flt: AnomalyFilter = AnomalyFilter(),
+                   sort: str = "lof_score", descending: bool = True) -> None:
+        """Write the filtered rows as UTF-8 CSV to a binary file object, block by block."""
+        for block in self.iter_csv(dataset, flt, sort, descending):
+            out.write(block.encode("utf-8"))
+
+    def csv_download(self, dataset: str, flt: AnomalyFilter = AnomalyFilter(),
+                     sort: str = "lof_score", descending: bool = True) -> Callable[[], bytes]:
+        """Deferred ``data=`` for ``st.download_button``: runs the export only when clicked.
+
+        The rows are streamed into a temporary file and read back as bytes;
+        Streamlit does not accept the temporary file object itself.
+        """
+        def export() -> bytes:
+            with tempfile.TemporaryFile() as out:
+                self.export_csv(dataset, out, flt, sort, descending)
+                out.seek(0)
+                return out.read()
+
+        return export
+
@@ -0,0 +1,151 @@
+"""Columnar artifact store for chunked pipeline data.
+
+Each dataset is a directory of Parquet part files plus a ``_manifest.json``
+that records the parts, their row counts and the column list::
+
+    data/store/tracker_raw/
+        _manifest.json
+        part-000000-000000.parquet
+        part-000001-000000.parquet
+
+Writers append one part per chunk, so producers (database cursors, CSV
+uploads, the tail daemon) never hold more than a chunk in memory, and readers
+can stream the parts back one at a time or load only the columns they need.
+Several writers may feed the same dataset concurrently (e.g. parallel range
+extraction); each gets its own part prefix and manifest updates are locked.
+"""
+
+import json
+import shutil
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, Optional
+
+import pandas as pd
+
+
+MANIFEST_NAME = "_manifest.json"
+DEFAULT_ROOT = Path("data/store")
+
+_manifest_lock = threading.Lock()
+
+
+class DatasetWriter:
+    """Appends DataFrame chunks as Parquet parts of one dataset."""
+
+    def __init__(self, store: "ArtifactStore", dataset: str, writer_id: int):
+        self.store = store
+        self.dataset = dataset
+        self.writer_id = writer_id
+        self.rows = 0
+        self._seq = 0
+
+    def write(self, chunk: pd.DataFrame) -> None:
+        if chunk.empty:
+            return
+        name = f"part-{self.writer_id:06d}-{self._seq:06d}.parquet"
+        path = self.store.dataset_path(self.dataset) / name
+        chunk.to_parquet(path, index=False)
+        self.store._register_part(self.dataset, name, len(chunk), list(chunk.columns))
+        self.rows += len(chunk)
+        self._seq += 1
+
+
+class ArtifactStore:
+    """Directory-per-dataset Parquet store rooted at ``data/store``."""
+
+    def __init__(self, root=DEFAULT_ROOT):
+        self.root = Path(root)
+
+    # --------------------------------------------------------------- layout
+    def dataset_path(self, dataset: str) -> Path:
+        return self.root / dataset
+
+    def exists(self, dataset: str) -> bool:
+        return (self.dataset_path(dataset) / MANIFEST_NAME).exists()
+
+    def manifest(self, dataset: str) -> dict:
+        path = self.dataset_path(dataset) / MANIFEST_NAME
+        if not path.exists():
+            return {"dataset": dataset, "rows": 0, "columns": [], "parts": []}
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def row_count(self, dataset: str) -> int:
+        return int(self.manifest(dataset)["rows"])
+
+    def parts(self, dataset: str) -> list[Path]:
+        base = self.dataset_path(dataset)
+        return [base / part["file"] for part in self.manifest(dataset)["parts"]]
+
+    # --------------------------------------------------------------- writing
+    def reset(self, dataset: str) -> None:
+        """Remove every part of ``dataset`` and start an empty manifest."""
+        path = self.dataset_path(dataset)
+        if path.exists():
+            shutil.rmtree(path)
+        path.mkdir(parents=True, exist_ok=True)
+        self._write_manifest(dataset, {"dataset": dataset, "rows": 0, "columns": [], "parts": []})
+
+    def open_writer(self, dataset: str) -> DatasetWriter:
+        """New writer with a unique part prefix (safe to use from several threads)."""
+        self.dataset_path(dataset).mkdir(parents=True, exist_ok=True)
+        with _manifest_lock:
+            manifest = self.manifest(dataset)
+            writer_id = int(manifest.get("next_writer", 0))
+            manifest["next_writer"] = writer_id + 1
+            self._write_manifest(dataset, manifest)
+        return DatasetWriter(self, dataset, writer_id)
+
+    def append(self, dataset: str, chunk: pd.DataFrame) -> None:
+        self.open_writer(dataset).write(chunk)
+
+    def _register_part(self, dataset: str, name: str, rows: int, columns: list) -> None:
+        with _manifest_lock:
+            manifest = self.manifest(dataset)
+            manifest["parts"].append({"file": name, "rows": rows})
+            manifest["parts"].sort(key=lambda part: part["file"])
+            manifest["rows"] = int(manifest["rows"]) + rows
+            if not manifest["columns"]:
+                manifest["columns"] = [str(col) for col in columns]
+            manifest["updated"] = datetime.now().isoformat(timespec="seconds")
+            self._write_manifest(dataset, manifest)
+
+    def _write_manifest(self, dataset: str, manifest: dict) -> None:
+        path = self.dataset_path(dataset) / MANIFEST_NAME
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        tmp.replace(path)
+
+    # --------------------------------------------------------------- reading
+    def iter_chunks(self, dataset: str, columns: Optional[list] = None) -> Iterator[pd.DataFrame]:
+        for part in self.parts(dataset):
+            yield pd.read_parquet(part, columns=columns)
+
+    def read(self, dataset: str, columns: Optional[list] = None) -> pd.DataFrame:
+        chunks = list(self.iter_chunks(dataset, columns=columns))
+        if not chunks:
+            return pd.DataFrame(columns=columns or self.manifest(dataset)["columns"])
+        return pd.concat(chunks, ignore_index=True)
+
+    def head(self, dataset: str, n: int = 10) -> pd.DataFrame:
+        frames, remaining = [], n
+        for chunk in self.iter_chunks(dataset):
+            frames.append(chunk.head(remaining))
+            remaining -= len(frames[-1])
+            if remaining <= 0:
+                break
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+    def export_csv(self, dataset: str, path) -> int:
+        """Stream the dataset into one CSV file (for the numbered stage scripts)."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        rows = 0
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            for i, chunk in enumerate(self.iter_chunks(dataset)):
+                chunk.to_csv(f, index=False, header=(i == 0))
+                rows += len(chunk)
+        return rows
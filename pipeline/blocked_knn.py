@@ -0,0 +1,273 @@
+"""Exact kNN and silhouette on dense features with a blocked BLAS kernel.
+
+The feature matrices have a few dozen dense columns at most. At that width
+one matrix product is the cheapest way to get many Euclidean distances at
+once:
+
+    ||x - y||² = ||x||² + ||y||² - 2·x·yᵀ
+
+The row norms are computed once. The cross term is a GEMM on one tile of
+``block_rows`` query rows by ``block_cols`` reference rows. Each tile is
+reduced right away. The first tile is cut to the k smallest distances per
+query row with ``np.argpartition``. On later tiles only the few entries
+below a row's current k-th distance are gathered and merged. So the memory
+is one tile per thread, whatever n is. The defaults (256 x 4096 float64 =
+8 MiB) fit a typical L3; use smaller tiles for L2.
+
+Query blocks run on ``n_threads`` Python threads (GEMM and argpartition
+release the GIL), and BLAS is pinned to one thread meanwhile. With d ≈ 15
+a tile product is too thin for BLAS to scale well, while blocks scale
+almost linearly and also parallelize the argpartition.
+
+``fit_lof`` hands the resulting kNN graph to sklearn as
+``LocalOutlierFactor(metric="precomputed")``, so the LOF math and the
+fitted model stay sklearn's. ``blocked_silhouette_score`` reuses the tiles
+for the K-Means silhouette: the per-cluster distance sums of a tile are
+one more GEMM, ``D_tile @ onehot(labels)``.
+
+Distances are as exact as sklearn's ``euclidean_distances``, which uses the
+same expansion. Ties between equal distances (duplicate rows) may be broken
+differently than by the KD-tree of ``algorithm="auto"``.
+
+``benchmarks/bench_blocked_knn.py`` measures speed and agreement against
+sklearn. On one core, at 10^5 rows, sklearn's kNN is still about 1.8x
+faster (its brute force path is a compiled version of the same kernel),
+so the LOF stages keep ``backend="sklearn"`` by default. The blocked kNN
+pays off when several cores are available for the query blocks. The
+silhouette is exact to 1e-16 and about 2x faster than
+``sklearn.metrics.silhouette_score`` at 2·10^4 rows.
+"""
+
+from functools import lru_cache
+
+import numpy as np
+from joblib import Parallel, delayed
+from scipy import sparse
+from sklearn.neighbors import LocalOutlierFactor
+from threadpoolctl import ThreadpoolController
+
+
+BACKENDS = ("sklearn", "blocked")
+DEFAULT_BLOCK_ROWS = 256     # query rows per tile
+DEFAULT_BLOCK_COLS = 4096    # reference rows per tile (256 x 4096 x 8 B = 8 MiB)
+
+
+@lru_cache(maxsize=1)
+def _threadpools() -> ThreadpoolController:
+    # Scanning the loaded libraries takes ~15 ms; do it once per process, not per call
+    return ThreadpoolController()
+
+
+def _as_dense(X) -> np.ndarray:
+    return np.asarray(X, dtype=np.float64)
+
+
+def _squared_norms(X: np.ndarray) -> np.ndarray:
+    return np.einsum("ij,ij->i", X, X)
+
+
+def _squared_tile(Xq: np.ndarray, xq: np.ndarray, Y: np.ndarray, yy: np.ndarray,
+                  q0: int, c0: int, c1: int, same: bool) -> np.ndarray:
+    """Squared distances of the query block to reference rows ``c0:c1``."""
+    tile = Xq @ Y[c0:c1].T
+    tile *= -2.0
+    tile += xq[:, None]
+    tile += yy[None, c0:c1]
+    np.maximum(tile, 0.0, out=tile)  # rounding can go slightly negative
+    if same:
+        # A row and itself: exactly 0, as euclidean_distances(X) gives
+        lo, hi = max(q0, c0), min(q0 + len(Xq), c1)
+        if lo < hi:
+            diag = np.arange(lo, hi)
+            tile[diag - q0, diag - c0] = 0.0
+    return tile
+
+
+def _partial_tile(Xq2: np.ndarray, xq: np.ndarray, Y: np.ndarray, yy: np.ndarray,
+                  q0: int, c0: int, c1: int, same: bool) -> np.ndarray:
+    """``||y||² - 2·x·yᵀ`` of the query block to reference rows ``c0:c1``.
+
+    ``Xq2`` is the query block times -2, so the tile costs one GEMM and one
+    add. Adding the query norm ``xq`` gives the squared distance; the kNN
+    only does that for the few entries it keeps.
+    """
+    tile = Xq2 @ Y[c0:c1].T
+    tile += yy[None, c0:c1]
+    if same:
+        lo, hi = max(q0, c0), min(q0 + len(Xq2), c1)
+        if lo < hi:
+            diag = np.arange(lo, hi)
+            tile[diag - q0, diag - c0] = -xq[diag - q0]  # a row and itself: exactly 0
+    return tile
+
+
+def _merge_candidates(best_d, best_i, rows, cols, values):
+    """Merge candidate entries into the per-row top-k (kept sorted by row)."""
+    n_rows, k = best_d.shape
+    all_rows = np.concatenate([np.repeat(np.arange(n_rows), k), rows])
+    all_d = np.concatenate([best_d.ravel(), values])
+    all_i = np.concatenate([best_i.ravel(), cols])
+    order = np.argsort(all_d, kind="stable")
+    order = order[np.argsort(all_rows[order], kind="stable")]   # by row, then distance
+    starts = np.searchsorted(all_rows[order], np.arange(n_rows))  # every row has >= k entries
+    take = order[starts[:, None] + np.arange(k)]
+    return all_d[take], all_i[take]
+
+
+def _block_kneighbors(X, xx, Y, yy, q0: int, q1: int, k: int, block_cols: int, same: bool):
+    Xq2, xq = -2.0 * X[q0:q1], xx[q0:q1]
+    best_d = np.full((q1 - q0, k), np.inf)   # squared distances
+    best_i = np.zeros((q1 - q0, k), dtype=np.int64)
+
+    for c0 in range(0, len(Y), block_cols):
+        c1 = min(c0 + block_cols, len(Y))
+        tile = _partial_tile(Xq2, xq, Y, yy, q0, c0, c1, same)
+
+        # Once the top-k holds real neighbours, only a few entries of a tile
+        # beat the k-th distance: gather those instead of partitioning the tile
+        beats = np.flatnonzero(tile < (best_d.max(axis=1) - xq)[:, None])
+        if len(beats) < tile.size // 16:
+            rows, cols = np.divmod(beats, c1 - c0)
+            best_d, best_i = _merge_candidates(best_d, best_i, rows, cols + c0, tile.ravel()[beats] + xq[rows])
+            continue
+
+        tile += xq[:, None]
+        if tile.shape[1] > k:
+            part = np.argpartition(tile, k - 1, axis=1)[:, :k]
+            tile_d, tile_i = np.take_along_axis(tile, part, axis=1), part + c0
+        else:
+            tile_d, tile_i = tile, np.broadcast_to(np.arange(c0, c1), tile.shape)
+
+        cand_d = np.concatenate([best_d, tile_d], axis=1)
+        cand_i = np.concatenate([best_i, tile_i], axis=1)
+        part = np.argpartition(cand_d, k - 1, axis=1)[:, :k]
+        best_d = np.take_along_axis(cand_d, part, axis=1)
+        best_i = np.take_along_axis(cand_i, part, axis=1)
+
+    order = np.lexsort((best_i, best_d), axis=-1)  # by distance, then row index
+    best_d = np.maximum(np.take_along_axis(best_d, order, axis=1), 0.0)  # rounding can go slightly negative
+    return np.sqrt(best_d), np.take_along_axis(best_i, order, axis=1)
+
+
+def blocked_kneighbors(
+    X,
+    n_neighbors: int,
+    Y=None,
+    block_rows: int = DEFAULT_BLOCK_ROWS,
+    block_cols: int = DEFAULT_BLOCK_COLS,
+    n_threads: int = -1,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Exact Euclidean kNN of the rows of ``X`` among the rows of ``Y``.
+
+    Args:
+        X: Query rows (array or memmap)
+        n_neighbors: k
+        Y: Reference rows; ``None`` means ``X`` (each row is then its own
+            neighbour at distance 0, as in ``KNeighborsTransformer``)
+        block_rows: Query rows per tile
+        block_cols: Reference rows per tile
+        n_threads: Threads over query blocks (-1 = all cores)
+
+    Returns:
+        (distances, indices), both (n_queries x k), sorted by distance
+    """
+    same = Y is None
+    X = _as_dense(X)
+    Y = X if same else _as_dense(Y)
+    if not 0 < n_neighbors <= len(Y):
+        raise ValueError(f"n_neighbors must be in [1, {len(Y)}], got {n_neighbors}")
+    xx = _squared_norms(X)
+    yy = xx if same else _squared_norms(Y)
+
+    starts = range(0, len(X), block_rows)
+    with _threadpools().limit(limits=1, user_api="blas"):
+        if len(starts) == 1:   # a small query (e.g. one request) needs no thread pool
+            blocks = [_block_kneighbors(X, xx, Y, yy, 0, len(X), n_neighbors, block_cols, same)]
+        else:
+            blocks = Parallel(n_jobs=n_threads, prefer="threads")(
+                delayed(_block_kneighbors)(X, xx, Y, yy, q0, min(q0 + block_rows, len(X)), n_neighbors,
+                                           block_cols, same)
+                for q0 in starts
+            )
+    return np.vstack([d for d, _ in blocks]), np.vstack([i for _, i in blocks])
+
+
+def kneighbors_graph(X, n_neighbors: int, **kwargs) -> sparse.csr_matrix:
+    """Sparse distance graph of ``X`` with each row's ``n_neighbors + 1`` nearest
+    rows, itself included, the layout ``metric="precomputed"`` estimators expect.
+    """
+    distances, indices = blocked_kneighbors(X, n_neighbors + 1, **kwargs)
+    n_rows, width = indices.shape
+    indptr = np.arange(0, n_rows * width + 1, width)
+    # Explicit zeros (duplicates) stay stored: they are neighbours, not gaps
+    return sparse.csr_matrix((distances.ravel(), indices.ravel(), indptr), shape=(n_rows, n_rows))
+
+
+def fit_lof(
+    X,
+    n_neighbors: int = 20,
+    backend: str = "blocked",
+    block_rows: int = DEFAULT_BLOCK_ROWS,
+    block_cols: int = DEFAULT_BLOCK_COLS,
+    n_threads: int = -1,
+) -> LocalOutlierFactor:
+    """Fit sklearn's LOF on ``X`` with the chosen neighbour backend.
+
+    ``backend="sklearn"`` is a plain ``LocalOutlierFactor`` (``algorithm="auto"``);
+    ``backend="blocked"`` fits it on the blocked kNN graph. Either way the
+    scores are ``-model.negative_outlier_factor_``.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"backend must be one of {BACKENDS}")
+    if backend == "sklearn":
+        return LocalOutlierFactor(n_neighbors=n_neighbors, n_jobs=n_threads).fit(_as_dense(X))
+    graph = kneighbors_graph(X, n_neighbors, block_rows=block_rows, block_cols=block_cols, n_threads=n_threads)
+    return LocalOutlierFactor(n_neighbors=n_neighbors, metric="precomputed").fit(graph)
+
+
+def _block_cluster_sums(X, xx, onehot, q0: int, q1: int, block_cols: int) -> np.ndarray:
+    Xq, xq = X[q0:q1], xx[q0:q1]
+    sums = np.zeros((q1 - q0, onehot.shape[1]))
+    for c0 in range(0, len(X), block_cols):
+        c1 = min(c0 + block_cols, len(X))
+        tile = _squared_tile(Xq, xq, X, xx, q0, c0, c1, same=True)
+        np.sqrt(tile, out=tile)
+        sums += tile @ onehot[c0:c1]
+    return sums
+
+
+def blocked_silhouette_score(
+    X,
+    labels,
+    block_rows: int = DEFAULT_BLOCK_ROWS,
+    block_cols: int = DEFAULT_BLOCK_COLS,
+    n_threads: int = -1,
+) -> float:
+    """Mean silhouette coefficient, same definition as ``sklearn.metrics.silhouette_score``.
+
+    Rows of singleton clusters score 0.
+    """
+    X = _as_dense(X)
+    classes, y = np.unique(np.asarray(labels), return_inverse=True)
+    if not 2 <= len(classes) <= len(X) - 1:
+        raise ValueError(f"Number of labels is {len(classes)}. Valid values are 2 to n_samples - 1 (inclusive)")
+    counts = np.bincount(y)
+    onehot = np.zeros((len(X), len(classes)))
+    onehot[np.arange(len(X)), y] = 1.0
+    xx = _squared_norms(X)
+
+    with _threadpools().limit(limits=1, user_api="blas"):
+        blocks = Parallel(n_jobs=n_threads, prefer="threads")(
+            delayed(_block_cluster_sums)(X, xx, onehot, q0, min(q0 + block_rows, len(X)), block_cols)
+            for q0 in range(0, len(X), block_rows)
+        )
+    sums = np.vstack(blocks)
+
+    rows = np.arange(len(X))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        intra = sums[rows, y] / (counts[y] - 1)
+        means = sums / counts
+        means[rows, y] = np.inf
+        inter = means.min(axis=1)
+        silhouette = (inter - intra) / np.maximum(intra, inter)
+    return float(np.mean(np.nan_to_num(silhouette)))
@@ -0,0 +1,238 @@
+"""Pre-aggregated cubes behind the dashboard charts.
+
+The dashboard used to read the clustered CSV on every rerun and aggregate
+it again: the temporal heatmap re-parsed every timestamp for one
+``groupby(["day_of_week", "hour"])``, stage 07 recounted weekend and
+outside-hours anomalies and top users, and the sidebar loaded the whole
+file for two numbers. Stage 06 now writes three small tables per dataset
+next to its clustered output, in ``data/cubes/<name>/``:
+
+* ``counts.csv``: rows per (``day_of_week``, ``hour``, ``cluster``,
+  ``source``, ``is_anomaly``) with the sum and max of ``lof_score``. An
+  unknown time is -1, and so is the cluster of a row that was not clustered;
+* ``top_users.csv``: the ``top_n`` users by anomaly count, over all
+  anomalies (``cluster`` -1) and per cluster;
+* ``scores.csv``: rows, distinct users, mean and quantiles of
+  ``lof_score`` per (``cluster``, ``source``, ``is_anomaly``), plus an
+  all-sources member (``source`` ``"*"``, as in a SQL ``ROLLUP``) because
+  distinct users do not add up over sources;
+
+plus ``meta.json`` (written last) with the source file's size and mtime.
+Every chart and metric of the dashboard is derived from a :class:`Cubes`
+(a few hundred rows), so a page costs O(cube size) instead of O(rows).
+"""
+
+import json
+import os
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from pipeline.timeparse import WORK_END, WORK_START, calendar_fields, combine_date_time, epoch_seconds, parse_timestamps
+
+
+CUBES_DIR = "data/cubes"
+CUBE_TABLES = ("counts", "top_users", "scores")
+DEFAULT_TOP_N = 20
+SCORE_QUANTILES = (0.25, 0.5, 0.75, 0.9, 0.99)
+NO_CLUSTER = -1
+ALL_SOURCES = "*"
+DAY_NAMES = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+
+def event_epochs(df: pd.DataFrame, name: str) -> Optional[pd.Series]:
+    """Event time of every row in epoch seconds (NA if unknown), None without a time column.
+
+    The stage 06 ``epoch_s`` column is used when present, otherwise the time
+    is parsed again from ``timestamp_dt``, ``date`` + ``timestamp`` or
+    ``timestamp``.
+    """
+    if "epoch_s" in df.columns:
+        return df["epoch_s"]
+    if "timestamp_dt" in df.columns:
+        times = parse_timestamps(df["timestamp_dt"], source=f"{name}:cube")
+    elif "date" in df.columns and "timestamp" in df.columns:
+        times = combine_date_time(df["date"], df["timestamp"], source=name)
+    elif "timestamp" in df.columns:
+        times = parse_timestamps(df["timestamp"], source=name)
+    else:
+        return None
+    return epoch_seconds(times)
+
+
+def _calendar(df: pd.DataFrame, name: str) -> tuple[np.ndarray, np.ndarray]:
+    """(day_of_week, hour) of every row, -1 where the time is unknown.
+
+    The ``hour`` / ``day_of_week`` columns of the scored files are
+    normalized, so the time is taken from the stage 06 calendar columns or
+    derived from :func:`event_epochs`.
+    """
+    if {"day_of_week_actual", "hour_actual"} <= set(df.columns) and "epoch_s" in df.columns:
+        valid = df["epoch_s"].notna().to_numpy()
+        days, hours = df["day_of_week_actual"].to_numpy(), df["hour_actual"].to_numpy()
+    else:
+        epoch = event_epochs(df, name)
+        if epoch is None:
+            return np.full(len(df), -1), np.full(len(df), -1)
+        valid = epoch.notna().to_numpy()
+        calendar = calendar_fields(epoch.fillna(0).astype(np.int64))
+        days, hours = calendar["day_of_week"].to_numpy(), calendar["hour"].to_numpy()
+    return (np.where(valid, days, -1).astype(np.int8), np.where(valid, hours, -1).astype(np.int8))
+
+
+def build_cubes(df: pd.DataFrame, name: str, top_n: int = DEFAULT_TOP_N) -> "Cubes":
+    """Cubes of a scored frame (``lof_score``, ``is_anomaly``, optional ``cluster`` / ``dataset_source``).
+
+    Args:
+        df: All scored rows, or only the anomalies (then there are no is_anomaly=0 cells)
+        name: Dataset name, used as ``source`` when there is no ``dataset_source``
+        top_n: Users kept per cluster in ``top_users``
+    """
+    days, hours = _calendar(df, name)
+    keys = pd.DataFrame({
+        "day_of_week": days,
+        "hour": hours,
+        "cluster": (df["cluster"].fillna(NO_CLUSTER).astype(np.int64).to_numpy()
+                    if "cluster" in df.columns else np.full(len(df), NO_CLUSTER)),
+        "source": (df["dataset_source"].astype(str).to_numpy() if "dataset_source" in df.columns
+                   else np.full(len(df), name, dtype=object)),
+        "is_anomaly": (df["is_anomaly"].astype(np.int8).to_numpy() if "is_anomaly" in df.columns
+                       else np.ones(len(df), dtype=np.int8)),
+        "lof_score": df["lof_score"].to_numpy(dtype=np.float64),
+        "user_id": df["user_id"].to_numpy() if "user_id" in df.columns else np.full(len(df), None),
+    })
+
+    counts = (keys.groupby(["day_of_week", "hour", "cluster", "source", "is_anomaly"], observed=True)["lof_score"]
+              .agg(count="size", lof_score_sum="sum", lof_score_max="max").reset_index())
+
+    scores = pd.concat([_score_stats(keys), _score_stats(keys.assign(source=ALL_SOURCES))], ignore_index=True)
+
+    anomalies = keys[keys["is_anomaly"] == 1]
+    per_user = [anomalies.assign(cluster=NO_CLUSTER)]
+    if (anomalies["cluster"] != NO_CLUSTER).any():
+        per_user.append(anomalies[anomalies["cluster"] != NO_CLUSTER])
+    top_users = (pd.concat(per_user).groupby(["cluster", "user_id"], observed=True)["lof_score"]
+                 .agg(anomalies="size", lof_score_max="max").reset_index()
+                 .sort_values(["cluster", "anomalies", "lof_score_max"], ascending=[True, False, False])
+                 .groupby("cluster").head(top_n).reset_index(drop=True))
+
+    meta = {"name": name, "rows": int(len(df)), "top_n": top_n, "built_at": datetime.now().isoformat()}
+    return Cubes(counts=counts, top_users=top_users, scores=scores, meta=meta)
+
+
+def _score_stats(keys: pd.DataFrame) -> pd.DataFrame:
+    groups = keys.groupby(["cluster", "source", "is_anomaly"], observed=True)
+    stats = groups["lof_score"].agg(count="size", lof_score_mean="mean").join(groups["user_id"].nunique().rename("users"))
+    quantiles = groups["lof_score"].quantile(list(SCORE_QUANTILES)).unstack()
+    quantiles.columns = [f"lof_score_p{round(q * 100)}" for q in SCORE_QUANTILES]
+    return stats.join(quantiles).reset_index()
+
+
+@dataclass
+class Cubes:
+    """The cubes of one dataset plus the derived views the dashboard shows."""
+
+    counts: pd.DataFrame
+    top_users: pd.DataFrame
+    scores: pd.DataFrame
+    meta: dict = field(default_factory=dict)
+
+    def anomalies(self, cluster: Optional[int] = None) -> pd.DataFrame:
+        """``counts`` cells of anomalies (of one cluster)."""
+        cells = self.counts[self.counts["is_anomaly"] == 1]
+        return cells if cluster is None else cells[cells["cluster"] == cluster]
+
+    @property
+    def total_anomalies(self) -> int:
+        return int(self.anomalies()["count"].sum())
+
+    def cluster_counts(self) -> pd.Series:
+        """Anomalies per cluster (clustered anomalies only), by cluster id."""
+        cells = self.anomalies()
+        cells = cells[cells["cluster"] != NO_CLUSTER]
+        return cells.groupby("cluster")["count"].sum().sort_index()
+
+    def heatmap(self, cluster: Optional[int] = None) -> pd.DataFrame:
+        """Anomalies by day of week (rows 0-6) and hour (columns 0-23)."""
+        cells = self.anomalies(cluster)
+        cells = cells[cells["hour"] >= 0]
+        return (cells.pivot_table(index="day_of_week", columns="hour", values="count", aggfunc="sum", fill_value=0)
+                .reindex(columns=range(24), fill_value=0))
+
+    def share(self, mask_fn) -> tuple[int, float]:
+        """(anomalies, % of anomalies with a known time) whose (day, hour) cell satisfies ``mask_fn``."""
+        cells = self.anomalies()
+        cells = cells[cells["hour"] >= 0]
+        total = int(cells["count"].sum())
+        hits = int(cells.loc[mask_fn(cells["day_of_week"], cells["hour"]), "count"].sum())
+        return hits, (hits / total * 100 if total else 0.0)
+
+    def weekend_share(self) -> tuple[int, float]:
+        return self.share(lambda day, hour: day >= 5)
+
+    def outside_hours_share(self) -> tuple[int, float]:
+        return self.share(lambda day, hour: (hour < WORK_START) | (hour >= WORK_END))
+
+    def peak_hour(self, cluster: Optional[int] = None) -> Optional[int]:
+        cells = self.anomalies(cluster)
+        by_hour = cells[cells["hour"] >= 0].groupby("hour")["count"].sum()
+        return int(by_hour.idxmax()) if not by_hour.empty else None
+
+    def users(self, cluster: Optional[int] = None, n: int = DEFAULT_TOP_N) -> pd.Series:
+        """Top users by anomaly count (over all anomalies or one cluster)."""
+        rows = self.top_users[self.top_users["cluster"] == (NO_CLUSTER if cluster is None else cluster)]
+        return rows.set_index("user_id")["anomalies"].head(n)
+
+    def cluster_summary(self) -> pd.DataFrame:
+        """Count, distinct users, mean LOF score and share per cluster (anomalies)."""
+        scores = self.scores[(self.scores["is_anomaly"] == 1) & (self.scores["cluster"] != NO_CLUSTER)
+                             & (self.scores["source"] == ALL_SOURCES)]
+        summary = (scores.set_index("cluster")[["count", "users", "lof_score_mean"]].sort_index()
+                   .rename(columns={"count": "Count", "users": "Unique Users", "lof_score_mean": "Avg LOF Score"}))
+        summary["Percentage"] = (summary["Count"] / summary["Count"].sum() * 100).round(1)
+        return summary
+
+
+def cube_dir(name: str, root=CUBES_DIR) -> Path:
+    return Path(root) / name
+
+
+def write_cubes(cubes: Cubes, name: str, source_path=None, root=CUBES_DIR) -> Path:
+    """Write the tables, then ``meta.json`` (each by atomic rename); returns the directory.
+
+    ``source_path`` is the file the cubes summarize; its size and mtime go
+    into the metadata so that readers can tell when the cubes are stale.
+    """
+    directory = cube_dir(name, root)
+    directory.mkdir(parents=True, exist_ok=True)
+    for table in CUBE_TABLES:
+        tmp = directory / f".{table}.csv.tmp"
+        getattr(cubes, table).to_csv(tmp, index=False)
+        os.replace(tmp, directory / f"{table}.csv")
+    meta = dict(cubes.meta)
+    if source_path is not None:
+        stat = Path(source_path).stat()
+        meta.update(source=str(source_path), source_size=stat.st_size, source_mtime=stat.st_mtime)
+    tmp = directory / ".meta.json.tmp"
+    tmp.write_text(json.dumps(meta, indent=2), encoding="utf-8")
+    os.replace(tmp, directory / "meta.json")
+    return directory
+
+
+def load_cubes(name: str, source_path=None, root=CUBES_DIR) -> Optional[Cubes]:
+    """Cubes of ``name``, or None if missing or (with ``source_path``) older than that file."""
+    directory = cube_dir(name, root)
+    meta_path = directory / "meta.json"
+    if not meta_path.exists():
+        return None
+    meta = json.loads(meta_path.read_text(encoding="utf-8"))
+    if source_path is not None:
+        stat = Path(source_path).stat()
+        if (meta.get("source_size"), meta.get("source_mtime")) != (stat.st_size, stat.st_mtime):
+            return None
+    tables = {table: pd.read_csv(directory / f"{table}.csv") for table in CUBE_TABLES}
+    return Cubes(**tables, meta=meta)
@@ -0,0 +1,258 @@
+"""Streaming database ingestion into the artifact store.
+
+The dashboard used to open a new connection (or a throwaway SQLAlchemy engine)
+per query and pull the whole result set into one DataFrame. Here:
+
+* engines are created once per DSN and cached, so repeated queries reuse a
+  connection pool (``pool_pre_ping`` drops connections the server closed);
+* queries run with ``stream_results=True``, which makes MySQL/MariaDB use an
+  unbuffered ``SSCursor`` and PostgreSQL a named server-side cursor, and are
+  read with ``chunksize`` so only one chunk is in memory at a time;
+* every chunk is written straight into :class:`~pipeline.artifact_store.ArtifactStore`;
+* :func:`partitioned_ingest` optionally splits the query into ranges of a
+  time column (``timestamp`` for the SIMRS audit tables) and extracts the
+  ranges in parallel on pooled connections.
+
+SQLite goes through the same code path, so everything can be tested locally
+against a ``.db`` file.
+"""
+
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator, NamedTuple, Optional, Union
+
+import pandas as pd
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import URL, Engine
+
+from pipeline.artifact_store import ArtifactStore
+
+
+DEFAULT_CHUNKSIZE = 50_000
+DEFAULT_PORTS = {"mysql": 3306, "mariadb": 3306, "postgresql": 5432}
+
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+_engines: dict[str, Engine] = {}
+_engines_lock = threading.Lock()
+
+
+class IngestResult(NamedTuple):
+    dataset: str
+    rows: int
+    chunks: int
+    partitions: int
+    seconds: float
+
+
+def build_dsn(db_type: str, config: dict) -> URL:
+    """SQLAlchemy URL for the dashboard's ``db_config`` dict."""
+    if db_type == "sqlite":
+        return URL.create("sqlite", database=config["database"])
+
+    if db_type in ("mysql", "mariadb"):
+        try:
+            import pymysql  # noqa: F401
+            drivername = "mysql+pymysql"
+        except ImportError:
+            drivername = "mysql+mysqlconnector"
+    elif db_type == "postgresql":
+        drivername = "postgresql+psycopg2"
+    else:
+        raise ValueError(f"Database type '{db_type}' not supported")
+
+    return URL.create(
+        drivername,
+        username=config.get("user"),
+        password=config.get("password"),
+        host=config.get("host", "localhost"),
+        port=int(config.get("port") or DEFAULT_PORTS[db_type]),
+        database=config.get("database"),
+    )
+
+
+def get_engine(dsn: Union[str, URL], pool_size: int = 5) -> Engine:
+    """Pooled engine for ``dsn``, created on first use and cached afterwards."""
+    key = dsn.render_as_string(hide_password=False) if isinstance(dsn, URL) else str(dsn)
+    with _engines_lock:
+        engine = _engines.get(key)
+        if engine is None:
+            if key.startswith("sqlite"):
+                engine = create_engine(
+                    dsn,
+                    pool_pre_ping=True,
+                    connect_args={"check_same_thread": False},
+                )
+            else:
+                engine = create_engine(
+                    dsn,
+                    pool_pre_ping=True,
+                    pool_size=pool_size,
+                    max_overflow=pool_size,
+                    pool_recycle=3600,
+                )
+            _engines[key] = engine
+        return engine
+
+
+def dispose_engines() -> None:
+    """Close every pooled connection (e.g. on shutdown)."""
+    with _engines_lock:
+        for engine in _engines.values():
+            engine.dispose()
+        _engines.clear()
+
+
+def quote_identifier(engine: Engine, name: str, what: str = "column", qualified: bool = False) -> str:
+    """``name`` quoted by the engine's dialect, for identifiers typed by a user.
+
+    Raises:
+        ValueError: unless ``name`` is a plain identifier (or, with
+            ``qualified``, dot-separated ones such as ``schema.table``)
+    """
+    parts = (name or "").split(".") if qualified else [name or ""]
+    if not all(_IDENTIFIER.match(part) for part in parts):
+        raise ValueError(f"Invalid {what} {name!r}: expected a plain {what} name")
+    return ".".join(engine.dialect.identifier_preparer.quote(part) for part in parts)
+
+
+def _clean_query(query: str) -> str:
+    return query.strip().rstrip(";").strip()
+
+
+def iter_query(
+    dsn: Union[str, URL],
+    query: str,
+    chunksize: int = DEFAULT_CHUNKSIZE,
+    params: Optional[dict] = None,
+) -> Iterator[pd.DataFrame]:
+    """Stream ``query`` as DataFrame chunks over a server-side cursor."""
+    engine = get_engine(dsn)
+    with engine.connect() as conn:
+        conn = conn.execution_options(stream_results=True, max_row_buffer=chunksize)
+        yield from pd.read_sql_query(text(_clean_query(query)), conn, params=params, chunksize=chunksize)
+
+
+def ingest_query(
+    dsn: Union[str, URL],
+    query: str,
+    store: ArtifactStore,
+    dataset: str,
+    chunksize: int = DEFAULT_CHUNKSIZE,
+    reset: bool = True,
+    on_chunk: Optional[Callable[[pd.DataFrame], None]] = None,
+) -> IngestResult:
+    """Copy the result of ``query`` into ``store`` chunk by chunk.
+
+    ``on_chunk`` is called with every chunk before it is written (e.g. to
+    accumulate an upload validation over the whole result).
+    """
+    started = time.perf_counter()
+    if reset:
+        store.reset(dataset)
+    writer = store.open_writer(dataset)
+    chunks = 0
+    for chunk in iter_query(dsn, query, chunksize=chunksize):
+        if on_chunk is not None:
+            on_chunk(chunk)
+        writer.write(chunk)
+        chunks += 1
+    return IngestResult(dataset, writer.rows, chunks, 1, time.perf_counter() - started)
+
+
+def _split_range(low, high, n_partitions: int) -> list:
+    """``n_partitions + 1`` edges between ``low`` and ``high`` (same type as the bounds)."""
+    if isinstance(low, (int, float)) and isinstance(high, (int, float)):
+        step = (high - low) / n_partitions
+        edges = [low + step * i for i in range(n_partitions)] + [high]
+        return [int(e) for e in edges] if isinstance(low, int) and isinstance(high, int) else edges
+
+    # Datetime columns (SQLite returns them as ISO strings). Bounds that are
+    # not dates (dirty rows) cannot be split, so the range stays whole.
+    as_text = isinstance(low, str)
+    try:
+        start, end = pd.Timestamp(low), pd.Timestamp(high)
+    except (ValueError, TypeError):
+        return [low, high]
+    edges = list(pd.date_range(start, end, periods=n_partitions + 1))
+    edges[0], edges[-1] = start, end
+    if as_text:
+        return [e.strftime("%Y-%m-%d %H:%M:%S") for e in edges[:-1]] + [high]
+    return [e.to_pydatetime() for e in edges[:-1]] + [high]
+
+
+def partitioned_ingest(
+    dsn: Union[str, URL],
+    query: str,
+    store: ArtifactStore,
+    dataset: str,
+    partition_col: str = "timestamp",
+    n_partitions: int = 4,
+    workers: int = 4,
+    chunksize: int = DEFAULT_CHUNKSIZE,
+    reset: bool = True,
+    on_chunk: Optional[Callable[[pd.DataFrame], None]] = None,
+) -> IngestResult:
+    """Extract ``query`` in ``n_partitions`` ranges of ``partition_col`` in parallel.
+
+    Ranges are ``[lo, hi)`` except the last one, which is closed; rows whose
+    ``partition_col`` is NULL are fetched by one extra partition, so the union
+    is exactly the original result. Parts are written in range order, so
+    reading the dataset back yields the rows ordered by partition.
+
+    ``partition_col`` (typed into the dashboard) must be a plain identifier
+    and a column of the query's result; it is quoted by the dialect before it
+    goes into the partition queries.
+
+    ``on_chunk`` is called with every chunk before it is written; calls from
+    the partition threads are serialized, so it needs no locking of its own.
+    """
+    started = time.perf_counter()
+    base = _clean_query(query)
+    source = f"SELECT * FROM ({base}) AS src"
+    engine = get_engine(dsn, pool_size=max(5, workers))
+    quoted = quote_identifier(engine, partition_col, "partition column")
+
+    with engine.connect() as conn:
+        columns = list(conn.execute(text(f"{source} LIMIT 0")).keys())
+        if partition_col not in columns:
+            raise ValueError(f"Partition column {partition_col!r} is not in the query result {columns}")
+        partition_col = quoted
+        low, high = conn.execute(
+            text(f"SELECT MIN({partition_col}), MAX({partition_col}) FROM ({base}) AS src")
+        ).one()
+
+    if reset:
+        store.reset(dataset)
+
+    jobs = []
+    if low is not None:
+        edges = _split_range(low, high, max(1, n_partitions)) if low != high else [low, high]
+        for i in range(len(edges) - 1):
+            upper_op = "<=" if i == len(edges) - 2 else "<"
+            sql = f"{source} WHERE {partition_col} >= :lo AND {partition_col} {upper_op} :hi"
+            jobs.append((sql, {"lo": edges[i], "hi": edges[i + 1]}))
+    jobs.append((f"{source} WHERE {partition_col} IS NULL", None))
+
+    # Writers are opened up front so part names follow range order
+    writers = [store.open_writer(dataset) for _ in jobs]
+    observe_lock = threading.Lock()
+
+    def run(job_index: int) -> int:
+        sql, params = jobs[job_index]
+        chunks = 0
+        for chunk in iter_query(dsn, sql, chunksize=chunksize, params=params):
+            if on_chunk is not None:
+                with observe_lock:
+                    on_chunk(chunk)
+            writers[job_index].write(chunk)
+            chunks += 1
+        return chunks
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        chunks = sum(pool.map(run, range(len(jobs))))
+
+    rows = sum(writer.rows for writer in writers)
+    return IngestResult(dataset, rows, chunks, len(jobs), time.perf_counter() - started)
@@ -0,0 +1,277 @@
+"""Hash-based streaming deduplication across chunks and runs.
+
+Rows are reduced to 64- or 128-bit digests of their key columns with
+``pd.util.hash_pandas_object`` (vectorised, no Python loop per row). Digests
+are kept in a time-partitioned index (one sorted ``.npy`` file per day or
+month under ``data/dedup_index/<name>/``) so a new chunk only has to consult
+the partitions its own timestamps fall into, and old partitions can be
+retired to bound memory and disk.
+
+A Bloom filter sits in front of the index: rows the filter has never seen
+are new without touching any partition, and only "maybe seen" rows pay for
+loading their partition into an in-memory set. Lookups and inserts are O(1)
+per row.
+"""
+
+import json
+import math
+import shutil
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+
+_HASH_KEY_LO = "0123456789123456"   # pandas' default hash key
+_HASH_KEY_HI = "lofkmeans-dedup1"
+_PARTITION_FORMATS = {"D": "%Y-%m-%d", "M": "%Y-%m"}
+_UNKNOWN_PARTITION = "unknown"
+
+
+def hash_rows(df: pd.DataFrame, key_cols: list[str], bits: int = 64) -> np.ndarray:
+    """Digest the key columns of every row.
+
+    Returns:
+        uint64 array of shape (n,) for ``bits=64`` or (n, 2) for ``bits=128``
+    """
+    if bits not in (64, 128):
+        raise ValueError("bits must be 64 or 128")
+    keys = df[key_cols]
+    lo = pd.util.hash_pandas_object(keys, index=False, hash_key=_HASH_KEY_LO).to_numpy(np.uint64)
+    if bits == 64:
+        return lo
+    # hash_key only salts object columns, so numeric keys are hashed as text
+    # to keep the upper 64 bits independent of the lower ones.
+    salted = keys.apply(lambda col: col if col.dtype == object else col.astype(str).astype(object))
+    hi = pd.util.hash_pandas_object(salted, index=False, hash_key=_HASH_KEY_HI).to_numpy(np.uint64)
+    return np.column_stack([hi, lo])
+
+
+class BloomFilter:
+    """Packed-bit Bloom filter addressed by double hashing of 64-bit digests."""
+
+    def __init__(self, capacity: int = 1_000_000, error_rate: float = 0.01):
+        self.capacity = int(capacity)
+        self.error_rate = float(error_rate)
+        self.n_bits = max(64, int(-self.capacity * math.log(self.error_rate) / math.log(2) ** 2))
+        self.n_hashes = max(1, int(round(self.n_bits / self.capacity * math.log(2))))
+        self.bits = np.zeros((self.n_bits + 7) // 8, dtype=np.uint8)
+
+    def _positions(self, digests: np.ndarray) -> np.ndarray:
+        h1 = digests
+        h2 = (digests >> np.uint64(32)) | (digests << np.uint64(32)) | np.uint64(1)
+        steps = np.arange(self.n_hashes, dtype=np.uint64)
+        return (h1[:, None] + steps[None, :] * h2[:, None]) % np.uint64(self.n_bits)
+
+    def add(self, digests: np.ndarray) -> None:
+        if len(digests) == 0:
+            return
+        positions = self._positions(digests).ravel()
+        np.bitwise_or.at(self.bits, positions >> np.uint64(3), np.left_shift(1, positions & np.uint64(7)).astype(np.uint8))
+
+    def might_contain(self, digests: np.ndarray) -> np.ndarray:
+        if len(digests) == 0:
+            return np.zeros(0, dtype=bool)
+        positions = self._positions(digests)
+        hit = (self.bits[positions >> np.uint64(3)] >> (positions & np.uint64(7)).astype(np.uint8)) & 1
+        return hit.all(axis=1)
+
+
+class DigestIndex:
+    """Persisted, time-partitioned index of row digests.
+
+    Args:
+        path: Directory holding the partitions, the Bloom filter and meta.json
+        key_cols: Columns that define a duplicate
+        time_col: Column used to choose the partition (``None`` = single partition)
+        partition_freq: ``"D"`` (daily) or ``"M"`` (monthly) partitions
+        bits: Digest width, 64 or 128
+        use_bloom: Put a Bloom filter in front of the partitions
+        bloom_capacity / bloom_error_rate: Bloom filter sizing
+        max_cached_partitions: Partitions kept as in-memory sets (LRU)
+        retention_partitions: Keep only the newest N partitions (``None`` = all)
+    """
+
+    def __init__(
+        self,
+        path,
+        key_cols: list[str],
+        time_col: Optional[str] = None,
+        partition_freq: str = "D",
+        bits: int = 64,
+        use_bloom: bool = True,
+        bloom_capacity: int = 1_000_000,
+        bloom_error_rate: float = 0.01,
+        max_cached_partitions: int = 8,
+        retention_partitions: Optional[int] = None,
+    ):
+        if partition_freq not in _PARTITION_FORMATS:
+            raise ValueError(f"partition_freq must be one of {list(_PARTITION_FORMATS)}")
+        self.path = Path(path)
+        self.key_cols = list(key_cols)
+        self.time_col = time_col
+        self.partition_freq = partition_freq
+        self.bits = bits
+        self.max_cached_partitions = max_cached_partitions
+        self.retention_partitions = retention_partitions
+        self.bloom = BloomFilter(bloom_capacity, bloom_error_rate) if use_bloom else None
+
+        self._cache: "OrderedDict[str, set]" = OrderedDict()
+        self._dirty: dict[str, list] = {}
+        self._counts: dict[str, int] = {}
+        self.stats = {"rows": 0, "duplicates": 0, "bloom_negatives": 0}
+
+    # ------------------------------------------------------------ persistence
+    def load(self) -> "DigestIndex":
+        meta_path = self.path / "meta.json"
+        if not meta_path.exists():
+            return self
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("key_cols") != self.key_cols or meta.get("bits") != self.bits:
+            raise ValueError(
+                f"Digest index at {self.path} was built for key_cols={meta.get('key_cols')} "
+                f"bits={meta.get('bits')}; reset it or use the same settings"
+            )
+        self._counts = {k: int(v) for k, v in meta.get("partitions", {}).items()}
+        bloom_path = self.path / "bloom.npy"
+        if self.bloom is not None and bloom_path.exists():
+            bits = np.load(bloom_path)
+            if bits.shape == self.bloom.bits.shape:
+                self.bloom.bits = bits
+            else:
+                self._rebuild_bloom()
+        return self
+
+    def save(self) -> None:
+        self.path.mkdir(parents=True, exist_ok=True)
+        for partition, new_keys in self._dirty.items():
+            stored = self._read_partition(partition)
+            merged = np.unique(np.concatenate([stored] + new_keys), axis=0)
+            np.save(self._partition_file(partition), merged)
+            self._counts[partition] = len(merged)
+        self._dirty.clear()
+        self._enforce_retention()
+
+        if self.bloom is not None:
+            np.save(self.path / "bloom.npy", self.bloom.bits)
+        meta = {
+            "key_cols": self.key_cols,
+            "time_col": self.time_col,
+            "partition_freq": self.partition_freq,
+            "bits": self.bits,
+            "partitions": dict(sorted(self._counts.items())),
+        }
+        with open(self.path / "meta.json", "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+
+    def reset(self) -> "DigestIndex":
+        """Drop every stored digest (full rebuild)."""
+        if self.path.exists():
+            shutil.rmtree(self.path)
+        self._cache.clear()
+        self._dirty.clear()
+        self._counts.clear()
+        if self.bloom is not None:
+            self.bloom.bits[:] = 0
+        return self
+
+    # -------------------------------------------------------------- partitions
+    def _partition_file(self, partition: str) -> Path:
+        return self.path / f"part-{partition}.npy"
+
+    def _read_partition(self, partition: str) -> np.ndarray:
+        file = self._partition_file(partition)
+        empty_shape = (0,) if self.bits == 64 else (0, 2)
+        return np.load(file) if file.exists() else np.empty(empty_shape, dtype=np.uint64)
+
+    def _as_keys(self, digests: np.ndarray) -> list:
+        if self.bits == 64:
+            return digests.tolist()
+        return [(int(hi) << 64) | int(lo) for hi, lo in digests]
+
+    def _partition_set(self, partition: str) -> set:
+        if partition in self._cache:
+            self._cache.move_to_end(partition)
+            return self._cache[partition]
+
+        keys = set(self._as_keys(self._read_partition(partition)))
+        for pending in self._dirty.get(partition, []):
+            keys.update(self._as_keys(pending))
+        self._cache[partition] = keys
+        while len(self._cache) > self.max_cached_partitions:
+            self._cache.popitem(last=False)
+        return keys
+
+    def _partitions_for(self, chunk: pd.DataFrame) -> np.ndarray:
+        if self.time_col is None:
+            return np.full(len(chunk), "all", dtype=object)
+        times = pd.to_datetime(chunk[self.time_col], errors="coerce", format="ISO8601")
+        labels = times.dt.strftime(_PARTITION_FORMATS[self.partition_freq])
+        return labels.fillna(_UNKNOWN_PARTITION).to_numpy(dtype=object)
+
+    def _enforce_retention(self) -> None:
+        if self.retention_partitions is None:
+            return
+        dated = sorted(p for p in self._counts if p != _UNKNOWN_PARTITION)
+        expired = dated[: max(0, len(dated) - self.retention_partitions)]
+        for partition in expired:
+            self._partition_file(partition).unlink(missing_ok=True)
+            self._counts.pop(partition, None)
+            self._cache.pop(partition, None)
+        if expired and self.bloom is not None:
+            self._rebuild_bloom()
+
+    def _rebuild_bloom(self) -> None:
+        self.bloom.bits[:] = 0
+        for partition in self._counts:
+            stored = self._read_partition(partition)
+            self.bloom.add(stored if self.bits == 64 else stored[:, 1])
+
+    # ------------------------------------------------------------------ dedup
+    def filter_new(self, chunk: pd.DataFrame) -> np.ndarray:
+        """Mark rows never seen before (in this chunk, earlier chunks or runs).
+
+        The kept rows are registered in the index, so calling this chunk by
+        chunk is equivalent to ``drop_duplicates(subset=key_cols, keep='first')``
+        over the concatenation of all chunks.
+
+        Returns:
+            Boolean numpy mask aligned with ``chunk`` (True = keep)
+        """
+        n = len(chunk)
+        if n == 0:
+            return np.zeros(0, dtype=bool)
+
+        digests = hash_rows(chunk, self.key_cols, self.bits)
+        bloom_digest = digests if self.bits == 64 else digests[:, 1]
+        partitions = self._partitions_for(chunk)
+        keys = self._as_keys(digests)
+
+        keep = ~pd.Series(keys).duplicated(keep="first").to_numpy()
+        maybe_seen = self.bloom.might_contain(bloom_digest) if self.bloom is not None else np.ones(n, dtype=bool)
+        self.stats["bloom_negatives"] += int((keep & ~maybe_seen).sum())
+
+        for i in np.flatnonzero(keep & maybe_seen):
+            if keys[i] in self._partition_set(partitions[i]):
+                keep[i] = False
+
+        if keep.any():
+            new_partitions = partitions[keep]
+            new_digests = digests[keep]
+            for partition in pd.unique(new_partitions):
+                selected = new_digests[new_partitions == partition]
+                self._dirty.setdefault(partition, []).append(selected)
+                if partition in self._cache:
+                    self._cache[partition].update(self._as_keys(selected))
+            if self.bloom is not None:
+                self.bloom.add(bloom_digest[keep])
+
+        self.stats["rows"] += n
+        self.stats["duplicates"] += int(n - keep.sum())
+        return keep
+
+    def drop_duplicates(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        return chunk[self.filter_new(chunk)]
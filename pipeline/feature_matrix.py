@@ -0,0 +1,206 @@
+"""Memory-mapped feature matrices shared by the modeling stages.
+
+The normalization stage used to hand its output to LOF and K-Means only
+through ``*_normalized.csv``; every consumer re-parsed the CSV and copied the
+feature columns out with ``df[feature_cols].values``. Now stage 04 also
+writes, per dataset, under ``data/matrix/``:
+
+* ``<name>.npy``: the normalized features, float64, C-contiguous
+  (n_rows x n_features)
+* ``<name>_rows.npy``: int64 row ids, the ``row_id`` column of the
+  normalized CSV (and of every frame derived from it)
+* ``<name>.json``: shape, dtype and feature column order
+
+Consumers open the arrays with ``np.load(mmap_mode="r")``. Opening is
+instant whatever the size, the pages are shared through the OS page cache by
+every process that maps the same file, and :func:`iter_blocks` lets
+computations walk matrices larger than RAM block by block.
+"""
+
+import json
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+
+MATRIX_DIR = "data/matrix"
+ROW_ID_COLUMN = "row_id"
+DEFAULT_BLOCK_ROWS = 65_536
+
+
+@dataclass
+class FeatureMatrix:
+    """Read-only view of a stored matrix (``X`` and ``row_ids`` are memmaps)."""
+
+    name: str
+    X: np.ndarray
+    row_ids: np.ndarray
+    feature_columns: list[str]
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return self.X.shape
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.X.nbytes + self.row_ids.nbytes)
+
+    def positions(self, row_ids) -> np.ndarray:
+        """Matrix rows holding ``row_ids`` (``row_ids`` of the matrix are sorted)."""
+        row_ids = np.asarray(row_ids, dtype=np.int64)
+        pos = np.searchsorted(self.row_ids, row_ids)
+        if len(pos) and (pos.max() >= len(self.row_ids) or not np.array_equal(self.row_ids[pos], row_ids)):
+            raise KeyError(f"Unknown row ids for feature matrix '{self.name}'")
+        return pos
+
+    def rows(self, row_ids) -> np.ndarray:
+        """Feature rows for ``row_ids``, in that order.
+
+        Returns the memmap itself when ``row_ids`` are exactly the stored
+        rows, otherwise an in-memory copy of the requested rows only.
+        """
+        row_ids = np.asarray(row_ids, dtype=np.int64)
+        if np.array_equal(row_ids, self.row_ids):
+            return self.X
+        return np.asarray(self.X[self.positions(row_ids)])
+
+
+def matrix_paths(name: str, root=MATRIX_DIR) -> dict[str, Path]:
+    root = Path(root)
+    return {
+        "matrix": root / f"{name}.npy",
+        "rows": root / f"{name}_rows.npy",
+        "meta": root / f"{name}.json",
+    }
+
+
+def _ranges(n_rows: int, block_rows: int) -> Iterator[tuple[int, int]]:
+    for start in range(0, n_rows, block_rows):
+        yield start, min(start + block_rows, n_rows)
+
+
+def _replace_npy(path: Path, values, dtype, block_rows: int = DEFAULT_BLOCK_ROWS) -> None:
+    """Write an .npy block by block to a temp file, then swap it in atomically."""
+    tmp = path.with_name(path.name + ".tmp")
+    out = np.lib.format.open_memmap(tmp, mode="w+", dtype=dtype, shape=values.shape)
+    for start, stop in _ranges(len(values), block_rows):
+        out[start:stop] = values[start:stop]
+    out.flush()
+    del out
+    os.replace(tmp, path)
+
+
+def save_feature_matrix(
+    name: str,
+    X,
+    feature_columns: Sequence[str],
+    row_ids=None,
+    root=MATRIX_DIR,
+    block_rows: int = DEFAULT_BLOCK_ROWS,
+) -> dict[str, Path]:
+    """Store ``X`` (array or DataFrame) as ``<name>.npy`` plus its row-id index.
+
+    Args:
+        row_ids: One id per row, ascending (default ``0..n-1``)
+    """
+    paths = matrix_paths(name, root)
+    paths["matrix"].parent.mkdir(parents=True, exist_ok=True)
+    values = X.to_numpy(dtype=np.float64) if isinstance(X, pd.DataFrame) else X
+    n_rows, n_features = values.shape
+    if n_features != len(feature_columns):
+        raise ValueError(f"Matrix has {n_features} columns but {len(feature_columns)} feature names")
+    row_ids = np.arange(n_rows, dtype=np.int64) if row_ids is None else np.asarray(row_ids, dtype=np.int64)
+    if len(row_ids) != n_rows or np.any(np.diff(row_ids) <= 0):
+        raise ValueError("row_ids must be unique, ascending and one per row")
+
+    _replace_npy(paths["matrix"], values, np.float64, block_rows)
+    _replace_npy(paths["rows"], row_ids, np.int64)
+    meta = {
+        "name": name,
+        "shape": [n_rows, n_features],
+        "dtype": "float64",
+        "feature_columns": list(feature_columns),
+    }
+    paths["meta"].write_text(json.dumps(meta, indent=2), encoding="utf-8")
+    return paths
+
+
+def matrix_exists(name: str, root=MATRIX_DIR) -> bool:
+    return all(path.exists() for path in matrix_paths(name, root).values())
+
+
+def open_feature_matrix(name: str, root=MATRIX_DIR) -> FeatureMatrix:
+    """Map a stored matrix read-only; raises FileNotFoundError if it is missing."""
+    paths = matrix_paths(name, root)
+    meta = json.loads(paths["meta"].read_text(encoding="utf-8"))
+    X = np.load(paths["matrix"], mmap_mode="r")
+    row_ids = np.load(paths["rows"], mmap_mode="r")
+    if list(X.shape) != meta["shape"] or len(row_ids) != X.shape[0]:
+        raise ValueError(f"Feature matrix '{name}' does not match its metadata")
+    return FeatureMatrix(name=name, X=X, row_ids=row_ids, feature_columns=meta["feature_columns"])
+
+
+def open_matching_matrix(
+    name: str,
+    df: pd.DataFrame,
+    feature_columns: Sequence[str],
+    root=MATRIX_DIR,
+) -> Optional[FeatureMatrix]:
+    """The stored matrix if it covers ``df``'s ``row_id`` values and columns, else None.
+
+    Lets a stage fall back to ``df[feature_columns]`` when stage 04 has not
+    been re-run since the CSVs changed.
+    """
+    if ROW_ID_COLUMN not in df.columns or not matrix_exists(name, root):
+        return None
+    try:
+        matrix = open_feature_matrix(name, root)
+        if matrix.feature_columns != list(feature_columns):
+            return None
+        matrix.positions(df[ROW_ID_COLUMN].to_numpy())
+    except (KeyError, ValueError, OSError):
+        return None
+    return matrix
+
+
+def feature_matrix_for(
+    name: str,
+    df: pd.DataFrame,
+    feature_columns: Sequence[str],
+    root=MATRIX_DIR,
+) -> tuple[np.ndarray, bool]:
+    """Features of ``df``'s rows from the stored matrix, or from ``df`` itself.
+
+    Returns:
+        (X, True) when served from the memory-mapped matrix,
+        (``df[feature_columns].values``, False) otherwise
+    """
+    matrix = open_matching_matrix(name, df, feature_columns, root)
+    if matrix is None:
+        return df[list(feature_columns)].values, False
+    return matrix.rows(df[ROW_ID_COLUMN].to_numpy()), True
+
+
+def iter_blocks(X: np.ndarray, block_rows: int = DEFAULT_BLOCK_ROWS) -> Iterator[tuple[int, np.ndarray]]:
+    """``(start, block)`` pairs over the rows of ``X``; each block is in memory."""
+    for start, stop in _ranges(len(X), block_rows):
+        yield start, np.asarray(X[start:stop])
+
+
+def column_stats(X: np.ndarray, block_rows: int = DEFAULT_BLOCK_ROWS) -> tuple[np.ndarray, np.ndarray]:
+    """Per-column mean and (population) std computed block by block."""
+    n = 0
+    total = np.zeros(X.shape[1])
+    total_sq = np.zeros(X.shape[1])
+    for _, block in iter_blocks(X, block_rows):
+        n += len(block)
+        total += block.sum(axis=0)
+        total_sq += np.square(block).sum(axis=0)
+    if n == 0:
+        return total, total_sq
+    mean = total / n
+    return mean, np.sqrt(np.maximum(total_sq / n - mean ** 2, 0.0))
@@ -0,0 +1,242 @@
+"""Incremental Local Outlier Factor (ILOF) over a stream of events.
+
+Batch LOF has to be refitted from scratch whenever data arrives. Following
+Pokrajac, Lazarevic & Latecki (2007), ``IncrementalLOF`` keeps every point's
+k nearest neighbours, k-distance, reverse neighbours, local reachability
+density (lrd) and LOF, and on each insertion or deletion recomputes only the
+points whose values can actually change:
+
+* insert ``p``: points that get ``p`` as a new neighbour change their
+  k-distance; their reverse neighbours change reach-distances and thus lrd;
+  the reverse neighbours of every point with a new lrd change LOF;
+* delete ``p``: the reverse neighbours of ``p`` re-query their kNN, after
+  which the same lrd / LOF propagation applies.
+
+The definitions match ``sklearn.neighbors.LocalOutlierFactor`` (exactly k
+Euclidean neighbours, ``lrd = 1 / (mean reach-dist + 1e-10)``), so on the same
+points the scores equal ``-negative_outlier_factor_``. Scores are positive;
+higher = more anomalous, like ``lof_score`` in the stage scripts.
+
+Passing ``window_size`` turns the engine into a sliding window: the oldest
+point is expired before each insertion once the window is full.
+"""
+
+from collections import deque
+from typing import Optional
+
+import numpy as np
+from sklearn.neighbors import NearestNeighbors
+
+
+_LRD_EPS = 1e-10
+
+
+class IncrementalLOF:
+    """Exact LOF maintained under point insertions and deletions.
+
+    Args:
+        n_neighbors: k, as in ``LocalOutlierFactor``
+        window_size: Keep only the newest N points (``None`` = unbounded)
+    """
+
+    def __init__(self, n_neighbors: int = 20, window_size: Optional[int] = None):
+        if n_neighbors < 1:
+            raise ValueError("n_neighbors must be >= 1")
+        if window_size is not None and window_size <= n_neighbors:
+            raise ValueError("window_size must be larger than n_neighbors")
+        self.n_neighbors = n_neighbors
+        self.window_size = window_size
+
+        self._X = np.empty((0, 0), dtype=np.float64)
+        self._active = np.zeros(0, dtype=bool)
+        self._next_id = 0
+        self._order: deque = deque()           # insertion order, for the window
+
+        self._knn: dict[int, np.ndarray] = {}  # id -> neighbour ids (nearest first)
+        self._knn_dist: dict[int, np.ndarray] = {}
+        self._rnn: dict[int, set] = {}         # id -> ids that have it as neighbour
+        self._kdist: dict[int, float] = {}
+        self._lrd: dict[int, float] = {}
+        self._lof: dict[int, float] = {}
+        self.last_update_size = 0              # points rescored by the last call
+
+    # ---------------------------------------------------------------- storage
+    def __len__(self) -> int:
+        return len(self._order)
+
+    @property
+    def ids(self) -> np.ndarray:
+        return np.fromiter(self._order, dtype=np.int64, count=len(self._order))
+
+    def _store(self, x: np.ndarray) -> int:
+        if self._X.shape[1] == 0:
+            self._X = np.empty((16, x.shape[0]), dtype=np.float64)
+            self._active = np.zeros(16, dtype=bool)
+        elif x.shape[0] != self._X.shape[1]:
+            raise ValueError(f"Expected {self._X.shape[1]} features, got {x.shape[0]}")
+        if self._next_id == len(self._X):
+            self._X = np.concatenate([self._X, np.empty_like(self._X)])
+            self._active = np.concatenate([self._active, np.zeros_like(self._active)])
+        point_id = self._next_id
+        self._X[point_id] = x
+        self._active[point_id] = True
+        self._next_id += 1
+        self._order.append(point_id)
+        return point_id
+
+    def _active_ids(self) -> np.ndarray:
+        return np.flatnonzero(self._active[: self._next_id])
+
+    def _query(self, x: np.ndarray, exclude: Optional[int] = None) -> tuple[np.ndarray, np.ndarray]:
+        """Exact k nearest active points of ``x`` (brute force, vectorised)."""
+        candidates = self._active_ids()
+        if exclude is not None:
+            candidates = candidates[candidates != exclude]
+        dist = np.sqrt(((self._X[candidates] - x) ** 2).sum(axis=1))
+        k = min(self.n_neighbors, len(candidates))
+        nearest = np.argpartition(dist, k - 1)[:k] if k < len(candidates) else np.arange(len(candidates))
+        order = nearest[np.lexsort((candidates[nearest], dist[nearest]))]
+        return candidates[order], dist[order]
+
+    # ------------------------------------------------------------- structures
+    def _set_knn(self, point_id: int, neighbors: np.ndarray, dists: np.ndarray) -> None:
+        for old in self._knn.get(point_id, ()):
+            self._rnn.get(int(old), set()).discard(point_id)
+        self._knn[point_id] = neighbors
+        self._knn_dist[point_id] = dists
+        self._kdist[point_id] = float(dists[-1])
+        for new in neighbors:
+            self._rnn.setdefault(int(new), set()).add(point_id)
+
+    def _update_lrd(self, point_id: int) -> None:
+        neighbors = self._knn[point_id]
+        kdists = np.fromiter((self._kdist[int(o)] for o in neighbors), dtype=np.float64, count=len(neighbors))
+        reach = np.maximum(kdists, self._knn_dist[point_id])
+        self._lrd[point_id] = 1.0 / (reach.mean() + _LRD_EPS)
+
+    def _update_lof(self, point_id: int) -> None:
+        neighbors = self._knn[point_id]
+        lrds = np.fromiter((self._lrd[int(o)] for o in neighbors), dtype=np.float64, count=len(neighbors))
+        self._lof[point_id] = float(lrds.mean() / self._lrd[point_id])
+
+    def _propagate(self, changed_kdist: set) -> None:
+        """Recompute lrd / LOF for everything reachable from changed k-distances."""
+        changed_lrd = set(changed_kdist)
+        for q in changed_kdist:
+            changed_lrd |= self._rnn.get(q, set())
+        for o in changed_lrd:
+            self._update_lrd(o)
+
+        changed_lof = set(changed_lrd)
+        for o in changed_lrd:
+            changed_lof |= self._rnn.get(o, set())
+        for o in changed_lof:
+            self._update_lof(o)
+        self.last_update_size = len(changed_lof)
+
+    def _rebuild(self) -> None:
+        """Batch build of all structures from the active points."""
+        self._knn.clear(); self._knn_dist.clear(); self._rnn.clear()
+        self._kdist.clear(); self._lrd.clear(); self._lof.clear()
+        ids = self._active_ids()
+        if len(ids) <= self.n_neighbors:
+            return
+        nn = NearestNeighbors(n_neighbors=self.n_neighbors).fit(self._X[ids])
+        dists, idx = nn.kneighbors()
+        for row, point_id in enumerate(ids):
+            self._set_knn(int(point_id), ids[idx[row]], dists[row])
+        for point_id in ids:
+            self._update_lrd(int(point_id))
+        for point_id in ids:
+            self._update_lof(int(point_id))
+        self.last_update_size = len(ids)
+
+    # -------------------------------------------------------------------- API
+    def fit(self, X) -> "IncrementalLOF":
+        """Reset the engine and load ``X`` in one batch (oldest row first)."""
+        X = np.asarray(X, dtype=np.float64)
+        if self.window_size is not None:
+            X = X[-self.window_size:]
+        self._X = np.empty((0, 0), dtype=np.float64)
+        self._active = np.zeros(0, dtype=bool)
+        self._next_id = 0
+        self._order.clear()
+        for row in X:
+            self._store(row)
+        self._rebuild()
+        return self
+
+    def insert(self, x) -> tuple[int, float]:
+        """Add one point and return ``(point_id, lof_score)``.
+
+        The score is NaN while the engine holds ``n_neighbors`` points or fewer.
+        """
+        x = np.asarray(x, dtype=np.float64).ravel()
+        if self.window_size is not None and len(self) >= self.window_size:
+            self.delete(self._order[0])
+
+        point_id = self._store(x)
+        n_active = len(self)
+        if n_active <= self.n_neighbors:
+            return point_id, float("nan")
+        if n_active == self.n_neighbors + 1:
+            self._rebuild()
+            return point_id, self._lof[point_id]
+
+        neighbors, dists = self._query(x, exclude=point_id)
+        self._set_knn(point_id, neighbors, dists)
+
+        # Points for which the new point is closer than their current k-th neighbour
+        others = self._active_ids()
+        others = others[others != point_id]
+        d_to_new = np.sqrt(((self._X[others] - x) ** 2).sum(axis=1))
+        kdists = np.fromiter((self._kdist[int(q)] for q in others), dtype=np.float64, count=len(others))
+        changed_kdist = {point_id}
+        for q, d in zip(others[d_to_new < kdists], d_to_new[d_to_new < kdists]):
+            q = int(q)
+            pos = int(np.searchsorted(self._knn_dist[q], d, side="right"))
+            new_neighbors = np.insert(self._knn[q], pos, point_id)[: self.n_neighbors]
+            new_dists = np.insert(self._knn_dist[q], pos, d)[: self.n_neighbors]
+            self._set_knn(q, new_neighbors, new_dists)
+            changed_kdist.add(q)
+
+        self._propagate(changed_kdist)
+        return point_id, self._lof[point_id]
+
+    def insert_many(self, X) -> np.ndarray:
+        """Insert rows in order; returns the score of each row at insertion time."""
+        X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+        return np.array([self.insert(row)[1] for row in X])
+
+    def delete(self, point_id: int) -> None:
+        """Remove a point (e.g. expired from the window) and repair its neighbours."""
+        point_id = int(point_id)
+        if point_id >= self._next_id or not self._active[point_id]:
+            raise KeyError(f"Point {point_id} is not in the engine")
+        self._active[point_id] = False
+        self._order.remove(point_id)
+
+        if len(self) <= self.n_neighbors:
+            self._rebuild()
+            return
+
+        affected = self._rnn.pop(point_id, set())
+        for o in self._knn.pop(point_id, ()):
+            if int(o) in self._rnn:
+                self._rnn[int(o)].discard(point_id)
+        self._knn_dist.pop(point_id, None)
+        self._kdist.pop(point_id, None)
+        self._lrd.pop(point_id, None)
+        self._lof.pop(point_id, None)
+
+        for q in affected:
+            neighbors, dists = self._query(self._X[q], exclude=q)
+            self._set_knn(q, neighbors, dists)
+        self._propagate(affected)
+
+    def score(self, point_id: int) -> float:
+        return self._lof.get(int(point_id), float("nan"))
+
+    def scores(self) -> np.ndarray:
+        """Current LOF of every active point, in insertion order."""
+        return np.array([self._lof.get(i, np.nan) for i in self._order])
@@ -0,0 +1,58 @@
+"""Deferred imports for the Streamlit dashboard.
+
+Streamlit re-executes ``app.py`` on every interaction, and a container cold
+start pays for every module the script imports before the first page is
+drawn. Most of the dashboard never needs the database stack (SQLAlchemy
+alone is ~150 ms), the DB drivers or ``plotly.express`` (~60 ms) on a given
+run. So:
+
+* :func:`module_available` answers "is it installed?" from the import
+  system's finders without executing the module. It replaces the
+  ``try: import x`` blocks that existed only to set ``*_AVAILABLE`` flags;
+* :class:`LazyModule` stands in for a module bound at the top of a script
+  (``px = LazyModule("plotly.express")``). The real import runs on the
+  first attribute access, so the code using ``px.histogram(...)`` is
+  unchanged.
+
+``benchmarks/bench_app_import.py`` checks the result with ``-X importtime``.
+"""
+
+import importlib
+import importlib.util
+from types import ModuleType
+
+
+def module_available(name: str) -> bool:
+    """True if ``name`` can be imported; only parent packages of a dotted name are imported."""
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+class LazyModule:
+    """Proxy that imports ``name`` on first attribute access.
+
+    Args:
+        name: Absolute module name, e.g. ``"plotly.graph_objects"``
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def _load(self) -> ModuleType:
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<LazyModule {self._name!r} ({state})>"
@@ -0,0 +1,394 @@
+"""Versioned model bundles shared across pipeline runs.
+
+``models/`` holds loose files (``scaler_tracker.pkl``, ``lof_model_tracker.pkl``,
+``kmeans_model_tracker.pkl``, ...) that every run overwrites, so nothing ties
+a scaler to the LOF model that was fitted on its output. The registry stores
+one immutable bundle per run and dataset::
+
+    models/registry/tracker/
+        v0001/
+            manifest.json        version, training fingerprint, file hashes
+            features.json        feature spec (LOF and K-Means columns)
+            config.json          LOF / K-Means configs of the run
+            scaler.joblib        fitted StandardScaler
+            lof_fit_X.npy        LOF reference rows           (mmap)
+            lof_k_distance.npy   k-distance of every reference row
+            lof_lrd.npy          local reachability densities
+            lof_scores.npy       training LOF scores
+            lof_threshold.json   ScoreThreshold (sketch + rule)
+            kmeans.joblib        fitted KMeans
+            table_profile.joblib sparse table-profile projector (tracker)
+        v0002/ ...
+
+Estimators go through ``joblib.dump`` uncompressed and the LOF reference
+data is plain ``.npy``. Neither contains a pickled DataFrame. Loading maps the
+arrays with ``mmap_mode="r"``, so a bundle opens in milliseconds whatever
+the training size, and :class:`LofReference` scores new rows against the
+mapped reference data without refitting (the same math as sklearn's
+``novelty=True`` LOF).
+
+Every file is recorded with its SHA-256 in ``manifest.json``. The training
+data is fingerprinted the same way (hash of the matrix bytes, row ids and
+feature columns), and registration refuses a scaler, LOF model and matrix
+whose shapes do not line up. A bundle whose content hash equals that of the
+latest version is not stored again. Versions are written to a temporary
+directory and renamed into place, so readers never see half a bundle.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional, Sequence
+
+import joblib
+import numpy as np
+from sklearn.neighbors import LocalOutlierFactor
+
+from pipeline.blocked_knn import blocked_kneighbors
+from pipeline.feature_matrix import iter_blocks, open_feature_matrix
+from pipeline.score_threshold import ScoreThreshold
+
+
+REGISTRY_ROOT = "models/registry"
+MANIFEST_NAME = "manifest.json"
+_LRD_EPS = 1e-10   # as in sklearn's LocalOutlierFactor
+_HASH_CHUNK = 1 << 20
+_LOF_ARRAYS = ("fit_X", "k_distance", "lrd", "scores")
+
+
+def _sha256_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def training_fingerprint(X, feature_columns: Sequence[str], row_ids=None) -> dict:
+    """Shape and SHA-256 of a training matrix (hashed block by block)."""
+    digest = hashlib.sha256()
+    for _, block in iter_blocks(X):
+        digest.update(np.ascontiguousarray(block, dtype=np.float64).tobytes())
+    fingerprint = {
+        "rows": int(X.shape[0]),
+        "features": int(X.shape[1]),
+        "matrix_sha256": digest.hexdigest(),
+        "feature_columns_sha256": hashlib.sha256(json.dumps(list(feature_columns)).encode()).hexdigest(),
+    }
+    if row_ids is not None:
+        row_ids = np.ascontiguousarray(row_ids, dtype=np.int64)
+        fingerprint["row_ids_sha256"] = hashlib.sha256(row_ids.tobytes()).hexdigest()
+    return fingerprint
+
+
+@dataclass
+class LofReference:
+    """What LOF needs to score new rows: reference rows, k-distances and lrd.
+
+    ``score_samples`` gives the LOF of each query row with respect to the
+    reference rows (higher = more anomalous), identical to
+    ``-LocalOutlierFactor(novelty=True).fit(fit_X).score_samples(X)``.
+    """
+
+    n_neighbors: int
+    fit_X: np.ndarray
+    k_distance: np.ndarray
+    lrd: np.ndarray
+    scores: np.ndarray
+
+    @classmethod
+    def from_model(cls, model: LocalOutlierFactor, X) -> "LofReference":
+        """Reference data of a fitted LOF; ``X`` is the matrix it was fitted on."""
+        k = int(model.n_neighbors_)
+        return cls(
+            n_neighbors=k,
+            fit_X=np.asarray(X, dtype=np.float64),
+            k_distance=np.asarray(model._distances_fit_X_[:, k - 1], dtype=np.float64),
+            lrd=np.asarray(model._lrd, dtype=np.float64),
+            scores=np.asarray(-model.negative_outlier_factor_, dtype=np.float64),
+        )
+
+    def score_samples(self, X, n_threads: int = 1) -> np.ndarray:
+        distances, neighbors = blocked_kneighbors(np.atleast_2d(X), self.n_neighbors, Y=self.fit_X,
+                                                  n_threads=n_threads)
+        reach = np.maximum(distances, self.k_distance[neighbors])
+        lrd = 1.0 / (reach.mean(axis=1) + _LRD_EPS)
+        return self.lrd[neighbors].mean(axis=1) / lrd
+
+
+@dataclass
+class ModelBundle:
+    """One registered version: estimators, feature spec and manifest."""
+
+    name: str
+    version: int
+    path: Path
+    manifest: dict
+    feature_columns: list[str]
+    kmeans_feature_columns: Optional[list[str]] = None
+    config: dict = field(default_factory=dict)
+    scaler: object = None
+    lof: Optional[LofReference] = None
+    lof_model: object = None            # LOF variants without reference arrays (ensemble, sharded)
+    kmeans: object = None
+    threshold: Optional[ScoreThreshold] = None
+    table_profile: object = None        # BlockProjector of the profil_tabel_* columns
+
+    def score(self, X_normalized) -> np.ndarray:
+        """LOF scores of already-normalized rows against the bundle's reference data."""
+        if self.lof is None:
+            raise ValueError(f"Bundle {self.name} v{self.version} has no LOF reference data")
+        return self.lof.score_samples(X_normalized)
+
+    def score_raw(self, X_raw) -> np.ndarray:
+        """LOF scores of raw feature rows (scaled with the bundle's own scaler first)."""
+        return self.score(self.scaler.transform(np.atleast_2d(X_raw)))
+
+
+class ModelRegistry:
+    """Directory-per-dataset registry of versioned bundles (``models/registry``)."""
+
+    def __init__(self, root=REGISTRY_ROOT):
+        self.root = Path(root)
+
+    # --------------------------------------------------------------- layout
+    def bundle_path(self, name: str, version: int) -> Path:
+        return self.root / name / f"v{version:04d}"
+
+    def versions(self, name: str) -> list[int]:
+        base = self.root / name
+        if not base.exists():
+            return []
+        return sorted(int(p.name[1:]) for p in base.iterdir()
+                      if p.is_dir() and p.name[1:].isdigit() and (p / MANIFEST_NAME).exists())
+
+    def latest_version(self, name: str) -> Optional[int]:
+        versions = self.versions(name)
+        return versions[-1] if versions else None
+
+    def manifest(self, name: str, version: Optional[int] = None) -> dict:
+        version = self._resolve(name, version)
+        with open(self.bundle_path(name, version) / MANIFEST_NAME, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _resolve(self, name: str, version: Optional[int]) -> int:
+        version = self.latest_version(name) if version is None else version
+        if version is None or not (self.bundle_path(name, version) / MANIFEST_NAME).exists():
+            raise FileNotFoundError(f"No registered bundle '{name}' version {version}")
+        return version
+
+    # ------------------------------------------------------------- register
+    def register(
+        self,
+        name: str,
+        feature_columns: Sequence[str],
+        training_X,
+        training_row_ids=None,
+        scaler=None,
+        lof_model=None,
+        threshold: Optional[ScoreThreshold] = None,
+        kmeans=None,
+        kmeans_feature_columns: Optional[Sequence[str]] = None,
+        config: Optional[dict] = None,
+        table_profile=None,
+    ) -> dict:
+        """Store a new version unless it is identical to the latest one.
+
+        Args:
+            name: Dataset name ('tracker', 'staff', 'merged')
+            feature_columns: Columns of ``training_X`` (the LOF / scaler features)
+            training_X: Normalized matrix the LOF model was fitted on
+            training_row_ids: Row ids of ``training_X`` (for the fingerprint)
+            scaler: Fitted scaler that produced ``training_X``
+            lof_model: Fitted LOF; a ``LocalOutlierFactor`` is stored as
+                reference arrays, other variants as a joblib file
+            threshold: Fitted ScoreThreshold of the run
+            kmeans: Fitted KMeans
+            kmeans_feature_columns: Columns the KMeans model expects
+            config: JSON-serializable run configuration
+            table_profile: Fitted BlockProjector behind the table-profile columns
+
+        Returns:
+            Manifest of the stored (or unchanged latest) version
+        """
+        feature_columns = list(feature_columns)
+        self._check_links(feature_columns, training_X, scaler, lof_model)
+
+        self.root.joinpath(name).mkdir(parents=True, exist_ok=True)
+        tmp = self.root / name / f".tmp-{os.getpid()}-{time.time_ns()}"
+        tmp.mkdir()
+        try:
+            self._write_files(tmp, feature_columns, training_X, scaler, lof_model, threshold,
+                              kmeans, kmeans_feature_columns, config, table_profile)
+            files = {p.name: {"sha256": _sha256_file(p), "bytes": p.stat().st_size}
+                     for p in sorted(tmp.iterdir())}
+            training = training_fingerprint(training_X, feature_columns, training_row_ids)
+            bundle_sha = hashlib.sha256(
+                json.dumps({"files": files, "training": training}, sort_keys=True).encode()
+            ).hexdigest()
+
+            latest = self.latest_version(name)
+            if latest is not None and self.manifest(name, latest)["bundle_sha256"] == bundle_sha:
+                shutil.rmtree(tmp)
+                return self.manifest(name, latest)
+
+            manifest = {
+                "name": name,
+                "created_at": datetime.now().isoformat(timespec="seconds"),
+                "bundle_sha256": bundle_sha,
+                "training": training,
+                "files": files,
+            }
+            return self._publish(name, tmp, manifest)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+
+    @staticmethod
+    def _check_links(feature_columns: list[str], X, scaler, lof_model) -> None:
+        if X.shape[1] != len(feature_columns):
+            raise ValueError(f"Training matrix has {X.shape[1]} columns but {len(feature_columns)} feature names")
+        if scaler is not None and getattr(scaler, "n_features_in_", X.shape[1]) != X.shape[1]:
+            raise ValueError(f"Scaler was fitted on {scaler.n_features_in_} features, matrix has {X.shape[1]}")
+        if isinstance(lof_model, LocalOutlierFactor) and lof_model.n_samples_fit_ != X.shape[0]:
+            raise ValueError(f"LOF was fitted on {lof_model.n_samples_fit_} rows, matrix has {X.shape[0]}")
+
+    @staticmethod
+    def _write_files(path: Path, feature_columns, X, scaler, lof_model, threshold, kmeans,
+                     kmeans_feature_columns, config, table_profile=None) -> None:
+        spec = {
+            "feature_columns": feature_columns,
+            "kmeans_feature_columns": list(kmeans_feature_columns) if kmeans_feature_columns is not None else None,
+        }
+        (path / "features.json").write_text(json.dumps(spec, indent=2), encoding="utf-8")
+        (path / "config.json").write_text(json.dumps(config or {}, indent=2, default=str), encoding="utf-8")
+        if scaler is not None:
+            joblib.dump(scaler, path / "scaler.joblib")
+        if isinstance(lof_model, LocalOutlierFactor):
+            reference = LofReference.from_model(lof_model, X)
+            for array in _LOF_ARRAYS:
+                np.save(path / f"lof_{array}.npy", getattr(reference, array))
+            (path / "lof.json").write_text(json.dumps({"n_neighbors": reference.n_neighbors}), encoding="utf-8")
+        elif lof_model is not None:
+            joblib.dump(lof_model, path / "lof_model.joblib")
+        if threshold is not None:
+            threshold.save(path / "lof_threshold.json")
+        if kmeans is not None:
+            joblib.dump(kmeans, path / "kmeans.joblib")
+        if table_profile is not None:
+            joblib.dump(table_profile, path / "table_profile.joblib")
+
+    def _publish(self, name: str, tmp: Path, manifest: dict) -> dict:
+        """Rename ``tmp`` to the next free version (retrying if a writer raced us)."""
+        while True:
+            version = (self.latest_version(name) or 0) + 1
+            manifest["version"] = version
+            (tmp / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+            try:
+                os.rename(tmp, self.bundle_path(name, version))
+                return manifest
+            except OSError:
+                if not self.bundle_path(name, version).exists():
+                    raise
+
+    # ----------------------------------------------------------------- load
+    def load(self, name: str, version: Optional[int] = None) -> ModelBundle:
+        """Open a bundle (latest by default); arrays are memory-mapped, bundles cached."""
+        version = self._resolve(name, version)
+        return _load_bundle(str(self.bundle_path(name, version).resolve()), name, version)
+
+    def verify(self, name: str, version: Optional[int] = None) -> list[str]:
+        """Files of a bundle whose content no longer matches the manifest."""
+        version = self._resolve(name, version)
+        path = self.bundle_path(name, version)
+        return [file for file, meta in self.manifest(name, version)["files"].items()
+                if not (path / file).exists() or _sha256_file(path / file) != meta["sha256"]]
+
+
+@lru_cache(maxsize=32)
+def _load_bundle(path: str, name: str, version: int) -> ModelBundle:
+    base = Path(path)
+    manifest = json.loads((base / MANIFEST_NAME).read_text(encoding="utf-8"))
+    spec = json.loads((base / "features.json").read_text(encoding="utf-8"))
+    files = manifest["files"]
+
+    lof = None
+    if "lof.json" in files:
+        lof_meta = json.loads((base / "lof.json").read_text(encoding="utf-8"))
+        arrays = {array: np.load(base / f"lof_{array}.npy", mmap_mode="r") for array in _LOF_ARRAYS}
+        lof = LofReference(n_neighbors=lof_meta["n_neighbors"], **arrays)
+
+    def optional_joblib(file: str):
+        return joblib.load(base / file, mmap_mode="r") if file in files else None
+
+    return ModelBundle(
+        name=name,
+        version=version,
+        path=base,
+        manifest=manifest,
+        feature_columns=spec["feature_columns"],
+        kmeans_feature_columns=spec["kmeans_feature_columns"],
+        config=json.loads((base / "config.json").read_text(encoding="utf-8")),
+        scaler=optional_joblib("scaler.joblib"),
+        lof=lof,
+        lof_model=optional_joblib("lof_model.joblib"),
+        kmeans=optional_joblib("kmeans.joblib"),
+        threshold=ScoreThreshold.load(base / "lof_threshold.json") if "lof_threshold.json" in files else None,
+        table_profile=optional_joblib("table_profile.joblib"),
+    )
+
+
+def register_stage_outputs(
+    name: str,
+    kmeans=None,
+    kmeans_feature_columns: Optional[Sequence[str]] = None,
+    models_dir="models",
+    registry: Optional[ModelRegistry] = None,
+) -> dict:
+    """Register the current run of ``name`` from the stage 04-06 outputs.
+
+    Collects ``scaler_<name>.pkl``, ``feature_info_<name>.json``,
+    ``lof_model_<name>.pkl``, ``lof_threshold_<name>.json``,
+    ``table_profile_<name>.joblib`` (stage 03) and the LOF /
+    K-Means configs from ``models_dir``, plus the training matrix
+    ``data/matrix/<name>.npy``, and stores them as one bundle.
+
+    Raises:
+        ValueError: when the stored scaler, feature spec, LOF model and
+            matrix do not belong to the same run
+    """
+    models_dir = Path(models_dir)
+    registry = registry or ModelRegistry(models_dir / "registry")
+    feature_info = json.loads((models_dir / f"feature_info_{name}.json").read_text(encoding="utf-8"))
+    matrix = open_feature_matrix(name)
+    if matrix.feature_columns != feature_info["feature_columns"]:
+        raise ValueError(f"data/matrix/{name}.npy and feature_info_{name}.json list different features")
+
+    config = {"feature_info": feature_info}
+    for key, file in (("lof", f"lof_config_{name}.json"), ("kmeans", f"kmeans_config_{name}.json")):
+        if (models_dir / file).exists():
+            config[key] = json.loads((models_dir / file).read_text(encoding="utf-8"))
+
+    def optional(file: str, loader):
+        path = models_dir / file
+        return loader(path) if path.exists() else None
+
+    return registry.register(
+        name,
+        feature_columns=matrix.feature_columns,
+        training_X=matrix.X,
+        training_row_ids=matrix.row_ids,
+        scaler=optional(f"scaler_{name}.pkl", joblib.load),
+        lof_model=optional(f"lof_model_{name}.pkl", joblib.load),
+        threshold=optional(f"lof_threshold_{name}.json", ScoreThreshold.load),
+        kmeans=kmeans,
+        kmeans_feature_columns=kmeans_feature_columns,
+        config=config,
+        table_profile=optional(f"table_profile_{name}.joblib", joblib.load),
+    )
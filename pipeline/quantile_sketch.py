@@ -0,0 +1,259 @@
+"""Mergeable streaming quantile sketches and the IQR outlier filter built on them.
+
+``KLLSketch`` is a KLL sketch (Karnin, Lang & Liberty, 2016): a stack of
+compactors where level ``h`` holds items of weight ``2**h``. When a level
+overflows it is sorted and every other item (random offset) is promoted to the
+next level. Memory is O(k log(n/k)) and the rank error is roughly ``1.7/k``
+for ``k`` >= 100, independent of how many chunks were fed in. Two sketches
+built on different chunks or runs merge into one sketch of the union.
+
+``IQRFilter`` keeps one sketch per configured column, persists them as JSON
+under ``models/`` and derives ``[Q1 - f*IQR, Q3 + f*IQR]`` bounds from the
+sketches, so chunked or incremental ingestion can filter each chunk without
+materialising or sorting the full history. The sketches are seeded (the
+compaction offsets are the only randomness), so the same input gives the same
+bounds on every run. With a ``time_col`` the filter also keeps a watermark
+(newest event time fed); after :meth:`IQRFilter.load` only rows newer than
+the saved watermark are fed, so re-reading a full export on top of a
+persisted state does not count the history twice.
+"""
+
+import json
+import math
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from pipeline.timeparse import epoch_seconds, parse_timestamps
+
+
+_CAPACITY_DECAY = 2.0 / 3.0
+
+
+class KLLSketch:
+    """KLL quantile sketch over float values."""
+
+    def __init__(self, k: int = 200, seed: Optional[int] = None):
+        if k < 8:
+            raise ValueError("k must be >= 8")
+        self.k = k
+        self.n = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self.compactors: list[np.ndarray] = [np.empty(0, dtype=np.float64)]
+        self._rng = np.random.default_rng(seed)
+
+    # ------------------------------------------------------------------ sizing
+    def _capacity(self, level: int) -> int:
+        depth = len(self.compactors) - level - 1
+        return max(2, int(math.ceil(self.k * _CAPACITY_DECAY ** depth)))
+
+    def _max_size(self) -> int:
+        return sum(self._capacity(h) for h in range(len(self.compactors)))
+
+    @property
+    def size(self) -> int:
+        """Number of retained items."""
+        return sum(len(c) for c in self.compactors)
+
+    # ---------------------------------------------------------------- updates
+    def update(self, values) -> "KLLSketch":
+        """Add a batch of values (NaNs are ignored)."""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return self
+
+        self.n += int(values.size)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self.compactors[0] = np.concatenate([self.compactors[0], values])
+        self._compress()
+        return self
+
+    def merge(self, other: "KLLSketch") -> "KLLSketch":
+        """Fold ``other`` into this sketch in place."""
+        if other.n == 0:
+            return self
+        while len(self.compactors) < len(other.compactors):
+            self.compactors.append(np.empty(0, dtype=np.float64))
+        for level, items in enumerate(other.compactors):
+            self.compactors[level] = np.concatenate([self.compactors[level], items])
+        self.n += other.n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+        return self
+
+    def _compress(self) -> None:
+        while self.size > self._max_size():
+            for level in range(len(self.compactors)):
+                if len(self.compactors[level]) >= self._capacity(level):
+                    if level + 1 == len(self.compactors):
+                        self.compactors.append(np.empty(0, dtype=np.float64))
+                    self._compact(level)
+                    break
+            else:  # pragma: no cover - every level below capacity
+                break
+
+    def _compact(self, level: int) -> None:
+        items = np.sort(self.compactors[level])
+        keep = items[-1:] if items.size % 2 else items[:0]
+        if items.size % 2:
+            items = items[:-1]
+        offset = int(self._rng.integers(0, 2))
+        self.compactors[level + 1] = np.concatenate([self.compactors[level + 1], items[offset::2]])
+        self.compactors[level] = keep
+
+    # ---------------------------------------------------------------- queries
+    def _weighted_items(self) -> tuple[np.ndarray, np.ndarray]:
+        values = np.concatenate(self.compactors)
+        weights = np.concatenate(
+            [np.full(len(c), 2 ** level, dtype=np.float64) for level, c in enumerate(self.compactors)]
+        )
+        order = np.argsort(values, kind="stable")
+        return values[order], np.cumsum(weights[order])
+
+    def quantiles(self, qs) -> np.ndarray:
+        """Approximate quantiles for ``qs`` in [0, 1]."""
+        qs = np.atleast_1d(np.asarray(qs, dtype=np.float64))
+        if self.n == 0:
+            return np.full(qs.shape, np.nan)
+        values, cum_weights = self._weighted_items()
+        targets = qs * cum_weights[-1]
+        idx = np.searchsorted(cum_weights, targets, side="left")
+        result = values[np.clip(idx, 0, len(values) - 1)]
+        result = np.where(qs <= 0, self.min, result)
+        return np.where(qs >= 1, self.max, result)
+
+    def quantile(self, q: float) -> float:
+        return float(self.quantiles([q])[0])
+
+    def rank(self, value: float) -> float:
+        """Approximate fraction of items <= ``value``."""
+        if self.n == 0:
+            return math.nan
+        values, cum_weights = self._weighted_items()
+        idx = np.searchsorted(values, value, side="right")
+        return float(cum_weights[idx - 1] / cum_weights[-1]) if idx > 0 else 0.0
+
+    # ------------------------------------------------------------ persistence
+    def to_dict(self) -> dict:
+        return {
+            "type": "kll",
+            "k": self.k,
+            "n": self.n,
+            "min": self.min if self.n else None,
+            "max": self.max if self.n else None,
+            "compactors": [c.tolist() for c in self.compactors],
+        }
+
+    @classmethod
+    def from_dict(cls, state: dict, seed: Optional[int] = None) -> "KLLSketch":
+        sketch = cls(k=int(state["k"]), seed=seed)
+        sketch.n = int(state["n"])
+        sketch.min = math.inf if state.get("min") is None else float(state["min"])
+        sketch.max = -math.inf if state.get("max") is None else float(state["max"])
+        sketch.compactors = [np.asarray(c, dtype=np.float64) for c in state["compactors"]] or [
+            np.empty(0, dtype=np.float64)
+        ]
+        return sketch
+
+
+class IQRFilter:
+    """Per-column IQR outlier filter backed by persisted KLL sketches.
+
+    Args:
+        columns: Mapping ``column -> {"q_low": 0.25, "q_high": 0.75, "factor": 1.5}``;
+            missing keys fall back to those defaults
+        state_path: JSON file holding the sketches between runs
+        k: Sketch accuracy parameter for newly created sketches
+        seed: Seed of the sketches' compaction offsets (stored with the state)
+        time_col: Event time column; enables the watermark (see module docstring)
+    """
+
+    DEFAULTS = {"q_low": 0.25, "q_high": 0.75, "factor": 1.5}
+
+    def __init__(self, columns: dict, state_path=None, k: int = 200, seed: int = 0,
+                 time_col: Optional[str] = None):
+        self.columns = {col: {**self.DEFAULTS, **(cfg or {})} for col, cfg in columns.items()}
+        self.state_path = Path(state_path) if state_path else None
+        self.k = k
+        self.seed = seed
+        self.time_col = time_col
+        self.sketches = {col: KLLSketch(k=k, seed=seed) for col in self.columns}
+        self.watermark: Optional[int] = None      # newest event time fed (epoch seconds)
+        self._resume_after: Optional[int] = None  # watermark of the loaded state
+        self.skipped = 0                          # rows at or before that watermark
+
+    def load(self) -> "IQRFilter":
+        """Restore sketches saved by a previous run (missing file = fresh start)."""
+        if self.state_path is None or not self.state_path.exists():
+            return self
+        with open(self.state_path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        self.seed = int(state.get("seed", self.seed))
+        for col, sketch_state in state.get("sketches", {}).items():
+            if col in self.columns:
+                self.sketches[col] = KLLSketch.from_dict(sketch_state, seed=self.seed)
+        self.watermark = self._resume_after = state.get("watermark")
+        return self
+
+    def save(self) -> None:
+        if self.state_path is None:
+            return
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        state = {
+            "columns": self.columns,
+            "seed": self.seed,
+            "time_col": self.time_col,
+            "watermark": self.watermark,
+            "bounds": {col: list(bounds) for col, bounds in self.bounds().items()},
+            "sketches": {col: sketch.to_dict() for col, sketch in self.sketches.items()},
+        }
+        with open(self.state_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+
+    def update(self, chunk: pd.DataFrame) -> "IQRFilter":
+        """Feed one chunk into every column sketch (only rows past the loaded watermark)."""
+        if self.time_col is not None and self.time_col in chunk.columns:
+            epoch = epoch_seconds(parse_timestamps(chunk[self.time_col]))
+            if self._resume_after is not None:
+                new = (epoch > self._resume_after).fillna(False).to_numpy(dtype=bool)
+                self.skipped += int((~new).sum())
+                chunk, epoch = chunk[new], epoch[new]
+            if epoch.notna().any():
+                newest = int(epoch.max())
+                self.watermark = newest if self.watermark is None else max(self.watermark, newest)
+        for col, sketch in self.sketches.items():
+            if col in chunk.columns:
+                sketch.update(pd.to_numeric(chunk[col], errors="coerce").to_numpy())
+        return self
+
+    def bounds(self) -> dict:
+        """Current ``(lower, upper, q_low_value, q_high_value)`` per column."""
+        result = {}
+        for col, cfg in self.columns.items():
+            q_low, q_high = self.sketches[col].quantiles([cfg["q_low"], cfg["q_high"]])
+            spread = q_high - q_low
+            result[col] = (
+                float(q_low - cfg["factor"] * spread),
+                float(q_high + cfg["factor"] * spread),
+                float(q_low),
+                float(q_high),
+            )
+        return result
+
+    def mask(self, chunk: pd.DataFrame) -> pd.Series:
+        """Boolean mask of rows inside the bounds for all configured columns."""
+        keep = pd.Series(True, index=chunk.index)
+        for col, (lower, upper, _, _) in self.bounds().items():
+            if col in chunk.columns and not np.isnan(lower):
+                values = pd.to_numeric(chunk[col], errors="coerce")
+                keep &= values.between(lower, upper) | values.isna()
+        return keep
+
+    def apply(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        return chunk[self.mask(chunk)]
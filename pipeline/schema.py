@@ -0,0 +1,172 @@
+"""Typed, compact in-memory schema for tracker, staff and merged frames.
+
+CSV round-trips leave every stage with ``user_id`` as int64/float64/object,
+``query_type`` and ``dataset_source`` as Python strings, 0/1 flags as int64
+and timestamps as strings that are re-parsed downstream. ``enforce_schema``
+fixes the dtypes once, at load time, based on column names:
+
+==========================  ===============================================
+``user_id``                 int32 (nullable ``Int32`` when ids are missing)
+categorical text            ``category`` (query_type, dataset_source, ...)
+0/1 flags                   int8 (Is*, NightShift, op_*, source_*, ...)
+hour / day / month fields   int8
+timestamps                  datetime64[ns] (full date-time or date strings)
+``epoch_s``                 kept int64 (seconds since 1970, see timeparse)
+other integers              int32 when the values fit
+==========================  ===============================================
+
+Every rule is value-preserving: a column is only converted when all its
+values survive (flags must be 0/1, timestamps must all parse, ...), so the
+same call is safe on raw, cleaned, normalised and scored frames. Normalised
+flags (z-scores) simply stay float64.
+"""
+
+import re
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+
+USER_COLUMNS = ("user_id",)
+CATEGORICAL_COLUMNS = ("query_type", "dataset_source", "sql_table", "ip", "ip_address", "name")
+SMALL_INT_COLUMNS = ("hour", "day_of_week", "month", "day_of_month", "week")
+DATETIME_COLUMNS = ("datetime", "timestamp", "date", "login_time", "session_end")
+EPOCH_COLUMNS = ("epoch_s",)
+FLAG_COLUMNS = ("NightShift", "is_anomaly", "aktivitas_tanpa_login")
+FLAG_PREFIXES = ("Is", "op_", "source_")
+
+_DATETIME_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}([ T]\d{2}:\d{2}(:\d{2}(\.\d+)?)?)?$")
+_CATEGORY_MAX_UNIQUE_RATIO = 0.5
+
+
+def memory_mb(df: pd.DataFrame) -> float:
+    """Deep memory usage of ``df`` in MB (object strings included)."""
+    return float(df.memory_usage(deep=True).sum()) / (1024 * 1024)
+
+
+def _is_flag(col: str) -> bool:
+    return col in FLAG_COLUMNS or col.startswith(FLAG_PREFIXES)
+
+
+def _is_text(series: pd.Series) -> bool:
+    return pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)
+
+
+def _as_int8_flag(series: pd.Series) -> Optional[pd.Series]:
+    if pd.api.types.is_bool_dtype(series):
+        return series.astype(np.int8)
+    if not pd.api.types.is_numeric_dtype(series) or series.isna().any():
+        return None
+    return series.astype(np.int8) if series.isin([0, 1]).all() else None
+
+
+def _as_small_int(series: pd.Series, dtype=np.int8) -> Optional[pd.Series]:
+    if not pd.api.types.is_numeric_dtype(series) or series.isna().any() or series.empty:
+        return None
+    info = np.iinfo(dtype)
+    values = series.to_numpy()
+    if not np.array_equal(values, np.round(values)) or values.min() < info.min or values.max() > info.max:
+        return None
+    return series.astype(dtype)
+
+
+def _as_user_id(series: pd.Series) -> Optional[pd.Series]:
+    numeric = pd.to_numeric(series, errors="coerce")
+    if numeric.isna().sum() != series.isna().sum():
+        return None  # non-numeric ids: leave them to the categorical rule
+    valid = numeric.dropna()
+    if len(valid) and (not np.array_equal(valid, np.round(valid)) or valid.abs().max() > np.iinfo(np.int32).max):
+        return None
+    return numeric.astype("Int32") if numeric.isna().any() else numeric.astype(np.int32)
+
+
+def _as_datetime(series: pd.Series) -> Optional[pd.Series]:
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    if not _is_text(series):
+        return None
+    values = series.dropna().astype(str)
+    if values.empty or not values.str.match(_DATETIME_PATTERN).all():
+        return None  # e.g. staff 'timestamp' holds only the time of day
+    parsed = pd.to_datetime(series, errors="coerce", format="ISO8601")
+    return parsed if parsed.isna().sum() == series.isna().sum() else None
+
+
+def _as_category(series: pd.Series) -> Optional[pd.Series]:
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series
+    if not _is_text(series) or len(series) == 0:
+        return None
+    if series.nunique(dropna=True) > _CATEGORY_MAX_UNIQUE_RATIO * len(series):
+        return None
+    return series.astype("category")
+
+
+def enforce_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """Return ``df`` with compact, value-preserving dtypes (see module docstring)."""
+    converted = {}
+    for col in df.columns:
+        series = df[col]
+        if col in EPOCH_COLUMNS:
+            result = None
+        elif col in USER_COLUMNS:
+            result = _as_user_id(series)
+            if result is None:
+                result = _as_category(series)
+        elif col in DATETIME_COLUMNS:
+            result = _as_datetime(series)
+        elif col in CATEGORICAL_COLUMNS:
+            result = _as_category(series)
+        elif col in SMALL_INT_COLUMNS:
+            result = _as_small_int(series)
+        elif _is_flag(col):
+            result = _as_int8_flag(series)
+        elif pd.api.types.is_integer_dtype(series) and not pd.api.types.is_extension_array_dtype(series):
+            result = _as_small_int(series, np.int32)
+        else:
+            result = None
+        if result is not None and result.dtype != series.dtype:
+            converted[col] = result
+
+    if not converted:
+        return df
+    df = df.copy()
+    for col, result in converted.items():
+        df[col] = result
+    return df
+
+
+def schema_report(before: pd.DataFrame, after: pd.DataFrame) -> dict:
+    """Memory before/after and the dtype changes made by ``enforce_schema``."""
+    before_mb, after_mb = memory_mb(before), memory_mb(after)
+    return {
+        "rows": len(after),
+        "before_mb": round(before_mb, 3),
+        "after_mb": round(after_mb, 3),
+        "ratio": round(before_mb / after_mb, 2) if after_mb else None,
+        "dtypes": {
+            col: f"{before[col].dtype} -> {after[col].dtype}"
+            for col in after.columns
+            if col in before.columns and before[col].dtype != after[col].dtype
+        },
+    }
+
+
+def load_frame(path, **read_csv_kwargs) -> tuple[pd.DataFrame, dict]:
+    """``pd.read_csv`` followed by ``enforce_schema``.
+
+    Returns:
+        (typed frame, schema_report)
+    """
+    raw = pd.read_csv(path, **read_csv_kwargs)
+    typed = enforce_schema(raw)
+    return typed, schema_report(raw, typed)
+
+
+def format_memory_report(report: dict) -> str:
+    """One-line summary for the stage scripts' console output."""
+    return (
+        f"Memori: {report['before_mb']:.2f} MB -> {report['after_mb']:.2f} MB "
+        f"({report['ratio']}x lebih kecil, {len(report['dtypes'])} kolom dikonversi)"
+    )
@@ -0,0 +1,700 @@
+"""Local HTTP scoring service for tracker and staff events.
+
+``POST /score`` takes events as JSON (one object, a list, or
+``{"events": [...]}``) or NDJSON (``Content-Type: application/x-ndjson``,
+one object per line) and answers with one result per event, in order::
+
+    {"lof_score": 1.83, "is_anomaly": 1, "cluster": 2, "id": "..."}
+
+``id`` is echoed when the event has one. An event whose ``timestamp`` (or
+``date``) is sent but does not parse gets ``{"error": "...", "id": ...}``
+in its place instead of a score; the other events of the request are scored
+as usual. NDJSON requests get NDJSON back.
+Otherwise the response is ``{"model", "version", "cutoff", "results"}``.
+
+* **Features.** Events are scored independently against the model bundle of
+  the registry; no state is updated. :class:`EventFeaturizer` derives what a
+  single event determines: calendar fields and flags from ``timestamp`` (plus
+  ``date`` for staff logins, combined per event so that an event's result
+  does not depend on its batch), the operation one-hot and IP from
+  ``query_info``, and per-user profile columns from the batch profiles of
+  stage 03 in :class:`~pipeline.user_profiles.ProfileStore`. An event may also
+  send any feature column itself (raw, unscaled values as in stage 03), which
+  takes precedence. Columns that stay unknown (sliding windows, sessions,
+  table profile) are listed under ``imputed_features`` in the metrics and
+  imputed from the LOF reference rows: the mean of the ``impute_neighbors``
+  reference rows nearest to the event on its known (scaled) columns. The
+  scaler mean would be a point that no real event looks like, and LOF flags
+  nearly every such row.
+* **Anomaly and cluster.** ``is_anomaly`` uses the bundle's threshold (the
+  training cutoff). Only anomalies get a ``cluster``, from the bundle's
+  K-Means on the stage 06 columns. The batch-relative columns of stage 06
+  (``query_length_normalized``, ``ip_hits_per_hour``) are 0 unless sent,
+  as for a missing value there.
+* **Micro-batches.** :class:`MicroBatcher` coalesces concurrent requests: a
+  batch closes ``max_wait_ms`` after its first request or at ``max_batch``
+  events, and is featurized and scored with one vectorized call in a worker
+  thread, so the event loop keeps accepting requests in the meantime.
+* **Worker pool.** :class:`ScoreServer` loads the bundle (LOF reference
+  arrays memory-mapped), binds the socket and then forks ``workers``
+  processes that all accept on it. The mapped pages are shared by every
+  worker instead of copied. Without ``os.fork`` (Windows) one worker runs
+  in-process.
+* **Metrics.** Request latency (received to answered) and batch time go into
+  log-spaced histograms. Each worker writes its own row of an anonymous
+  shared memory mapping created before the fork, so ``GET /metrics`` on any
+  worker reports p50/p99 and counters over the whole pool.
+
+Run and query locally::
+
+    python -m pipeline.score_api --model tracker --workers 2 --port 8766
+    curl -s localhost:8766/score -d '{"timestamp": "2025-01-02 22:46:35",
+        "user_id": 10, "query_info": "192.168.1.7 delete from diagnosa_pasien"}'
+"""
+
+import argparse
+import asyncio
+import json
+import mmap
+import os
+import signal
+import socket
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from pipeline.blocked_knn import blocked_kneighbors
+from pipeline.model_registry import ModelBundle, ModelRegistry
+from pipeline.score_threshold import ScoreThreshold
+from pipeline.sql_fingerprint import extract_fields, ip_last_octet
+from pipeline.timeparse import WORK_END, WORK_START, calendar_fields, combine_date_time, epoch_seconds, parse_timestamps
+from pipeline.user_profiles import PROFILE_STORE_PATH, ProfileStore
+
+
+DEFAULT_PORT = 8766
+DEFAULT_MAX_BATCH = 2_048
+DEFAULT_MAX_WAIT_MS = 5.0
+DEFAULT_MAX_PENDING = 1_024          # queued requests per worker before new ones wait
+DEFAULT_IMPUTE_NEIGHBORS = 5
+MAX_BODY_BYTES = 32 << 20
+LATENCY_EDGES_S = np.geomspace(1e-5, 60.0, 241)   # ~7 % wide buckets from 10 µs to 60 s
+
+# Profile statistic behind each per-user column of stages 03 and 06
+PROFILE_SOURCES = {
+    "frekuensi_aktivitas_per_user": "events",
+    "jumlah_tipe_operasi_unik": "distinct_ops",
+    "rasio_operasi_modifikasi": "modification_ratio",
+    "pola_waktu_akses": "hour_std",
+    "frekuensi_login_per_user": "events",
+    "pola_waktu_login": "hour_std",
+    "rasio_login_weekend": "weekend_ratio",
+    "user_avg_daily_activity": "avg_daily_activity",
+    "user_query_diversity": "distinct_ops",
+    "delete_operation_count": "delete_count",
+    "login_day_diversity": "active_days",
+}
+# Stage 06 columns read from the normalized LOF features under another name
+KMEANS_ALIASES = {"modification_ratio": "rasio_operasi_modifikasi"}
+
+
+# -------------------------------------------------------------- featurizing
+class EventFeaturizer:
+    """Raw model features and stage 06 columns for independent events.
+
+    Args:
+        bundle: Model bundle whose feature columns are produced
+        profile_path: Profile store written by stage 03
+        profile_dataset: Profiles to look users up in (default: the bundle name)
+    """
+
+    def __init__(self, bundle: ModelBundle, profile_path=PROFILE_STORE_PATH, profile_dataset: Optional[str] = None):
+        self.bundle = bundle
+        self.profile_path = profile_path
+        self.profile_dataset = profile_dataset or bundle.name
+        self.columns = list(dict.fromkeys(bundle.feature_columns + (bundle.kmeans_feature_columns or [])))
+        self._profiles: Optional[ProfileStore] = None
+
+        derived = {"hour", "day_of_week", "month", "day_of_month", "IsOutsideWorkHours", "IsWeekend", "NightShift",
+                   "IsEarlyLogin", "IsLateLogin", "IsAfterWorkHours"} | set(PROFILE_SOURCES)
+        self.imputed = [col for col in bundle.feature_columns if col not in derived and not col.startswith("op_")]
+
+    @property
+    def profiles(self) -> ProfileStore:
+        # Opened on first use, i.e. in the scoring thread of a worker (never before the fork)
+        if self._profiles is None:
+            self._profiles = ProfileStore(self.profile_path)
+        return self._profiles
+
+    def close(self) -> None:
+        if self._profiles is not None:
+            self._profiles.close()
+            self._profiles = None
+
+    def times(self, events: pd.DataFrame) -> tuple[pd.Series, pd.Series]:
+        """Datetime of every event, and which events sent a timestamp that does not parse.
+
+        Only strings are parsed: a JSON number would otherwise be read as
+        nanoseconds since 1970, so it counts as a timestamp that does not parse.
+        """
+        times = pd.Series(pd.NaT, index=events.index, dtype="datetime64[ns]")
+        if "timestamp" not in events.columns:
+            return times, pd.Series(False, index=events.index)
+        source = f"api:{self.bundle.name}"
+        stamps = events["timestamp"]
+        text = _is_text(stamps)
+        dated = events["date"].notna() if "date" in events.columns else pd.Series(False, index=events.index)
+        if dated.any():
+            text &= ~dated | _is_text(events["date"])
+        with warnings.catch_warnings():   # unparsed timestamps are answered per event, not logged
+            warnings.simplefilter("ignore", RuntimeWarning)
+            if (dated & text).any():   # staff: date + time of day
+                rows = dated & text
+                times[rows] = combine_date_time(events.loc[rows, "date"], stamps[rows], source=source)
+            if (~dated & text).any():
+                times[~dated & text] = parse_timestamps(stamps[~dated & text], source=source)
+        return times, (stamps.notna() | dated) & times.isna()
+
+    def transform(self, events: pd.DataFrame, times: Optional[pd.Series] = None) -> pd.DataFrame:
+        """Every derivable column for ``events`` (NaN where an event does not determine it)."""
+        if times is None:
+            times, _ = self.times(events)
+        epoch = epoch_seconds(times)
+        valid = epoch.notna().to_numpy()
+        calendar = calendar_fields(epoch.fillna(0))
+        columns = {col: np.where(valid, calendar[col].to_numpy(dtype=np.float64), np.nan)
+                   for col in ("hour", "day_of_week", "month", "day_of_month")}
+        hour, weekday = columns["hour"], columns["day_of_week"]
+        flags = {
+            "IsOutsideWorkHours": (hour < WORK_START) | (hour >= WORK_END),
+            "IsWeekend": (weekday == 5) | (weekday == 6),
+            "NightShift": (hour >= 21) | (hour < 6),
+            "IsEarlyLogin": hour < 8,
+            "IsLateLogin": hour >= 10,
+            "IsAfterWorkHours": hour >= 19,
+        }
+        columns.update({col: np.where(valid, flag, np.nan) for col, flag in flags.items()})
+        # Stage 06 names of the same values
+        columns.update({f"{col}_actual": columns[col] for col in ("hour", "day_of_week", "month", "day_of_month")})
+        columns.update(is_outside_work_hours=columns["IsOutsideWorkHours"], is_weekend_flag=columns["IsWeekend"],
+                       night_shift_flag=columns["NightShift"])
+
+        sent_type = events.get("query_type", pd.Series(None, index=events.index, dtype=object))
+        if "query_info" in events.columns:   # events of the batch without query_info stay unknown
+            sent_query = events["query_info"].notna()
+            fields = extract_fields(events["query_info"].astype(object).where(sent_query, ""))
+            query_type = fields["query_type"].where(sent_query, sent_type)
+            columns["ip_last_octet"] = np.where(sent_query, ip_last_octet(fields["ip"]).to_numpy(dtype=np.float64),
+                                                np.nan)
+        else:
+            query_type = sent_type
+        known_type = query_type.notna().to_numpy()
+        if known_type.any():
+            for col in self.columns:
+                if col.startswith("op_"):
+                    columns[col] = np.where(known_type, query_type.eq(col[3:]).to_numpy(), np.nan)
+
+        if "user_id" in events.columns:
+            profiles = self.profiles.features(self.profile_dataset, pd.to_numeric(events["user_id"], errors="coerce"))
+            for col, source in PROFILE_SOURCES.items():
+                if col in self.columns and source in profiles.columns:
+                    columns[col] = profiles[source].to_numpy(dtype=np.float64)
+
+        # Values sent with the event win over derived ones
+        for col in self.columns:
+            if col in events.columns:
+                sent = pd.to_numeric(events[col], errors="coerce").to_numpy(dtype=np.float64)
+                columns[col] = np.where(np.isnan(sent), columns[col], sent) if col in columns else sent
+        return pd.DataFrame(columns, index=events.index)
+
+
+def _is_text(values: pd.Series) -> pd.Series:
+    return values.map(lambda value: isinstance(value, str)).astype(bool)
+
+
+def _time_error(row: dict) -> str:
+    """Per-event error for a ``date``/``timestamp`` pair that gave no time."""
+    sent = {col: value for col, value in row.items() if pd.notna(value)}
+    for col, value in sent.items():
+        if not isinstance(value, str):
+            return f"{col} must be a string, got {value!r}"
+    return "timestamp does not parse: " + " ".join(repr(value) for value in sent.values())
+
+
+# ------------------------------------------------------------------ scoring
+class ScoringService:
+    """Featurize, scale and score a batch of events with one bundle.
+
+    Args:
+        bundle: Model bundle with a scaler and LOF reference data
+        featurizer: Defaults to an :class:`EventFeaturizer` for the bundle
+        impute_neighbors: Reference rows averaged for a missing column
+    """
+
+    def __init__(self, bundle: ModelBundle, featurizer: Optional[EventFeaturizer] = None,
+                 impute_neighbors: int = DEFAULT_IMPUTE_NEIGHBORS):
+        if bundle.lof is None or bundle.scaler is None:
+            raise ValueError(f"Bundle {bundle.name} v{bundle.version} needs a scaler and LOF reference data")
+        self.bundle = bundle
+        self.featurizer = featurizer or EventFeaturizer(bundle)
+        self.threshold = bundle.threshold or ScoreThreshold().fit(np.asarray(bundle.lof.scores))
+        self.cutoff = float(self.threshold.cutoff())
+        self.impute_neighbors = impute_neighbors
+        self._references: dict[tuple, np.ndarray] = {}   # known-column subsets of fit_X, per missing pattern
+
+    def score(self, events: pd.DataFrame) -> pd.DataFrame:
+        """``lof_score``, ``is_anomaly``, ``cluster`` and ``error`` (nullable) aligned with ``events``.
+
+        Events whose timestamp does not parse get an ``error`` and no score.
+        """
+        times, unparsed = self.featurizer.times(events)
+        result = pd.DataFrame({"lof_score": np.nan, "is_anomaly": pd.array([pd.NA] * len(events), dtype="Int64"),
+                               "cluster": pd.array([pd.NA] * len(events), dtype="Int64"), "error": None},
+                              index=events.index)
+        if unparsed.any():
+            sent = events.loc[unparsed].reindex(columns=["date", "timestamp"])
+            result.loc[unparsed, "error"] = [_time_error(row) for row in sent.to_dict("records")]
+        valid = ~unparsed.to_numpy()
+        if valid.any():
+            scored = self._score(events[valid], times[valid])
+            result.loc[valid, ["lof_score", "is_anomaly", "cluster"]] = scored
+        return result
+
+    def _score(self, events: pd.DataFrame, times: pd.Series) -> pd.DataFrame:
+        frame = self.featurizer.transform(events, times)
+        X = frame.reindex(columns=self.bundle.feature_columns).to_numpy(dtype=np.float64)
+        X_scaled = self._impute(self.bundle.scaler.transform(X))   # the scaler passes NaN through
+        scores = self.bundle.lof.score_samples(X_scaled)
+        anomalous = scores > self.cutoff
+
+        result = pd.DataFrame({"lof_score": scores, "is_anomaly": anomalous.astype(int)}, index=events.index)
+        result["cluster"] = pd.array([pd.NA] * len(result), dtype="Int64")
+        if self.bundle.kmeans is not None and self.bundle.kmeans_feature_columns and anomalous.any():
+            scaled = pd.DataFrame(X_scaled[anomalous], columns=self.bundle.feature_columns)
+            K = self._kmeans_matrix(frame[anomalous].reset_index(drop=True), scaled, scores[anomalous])
+            result.loc[anomalous, "cluster"] = self.bundle.kmeans.predict(K)
+        return result
+
+    def _impute(self, X: np.ndarray) -> np.ndarray:
+        missing = np.isnan(X)
+        if not missing.any():
+            return X
+        reference = self.bundle.lof.fit_X
+        patterns, inverse = np.unique(missing, axis=0, return_inverse=True)
+        for index, pattern in enumerate(patterns):
+            if not pattern.any():
+                continue
+            rows = np.flatnonzero(inverse.ravel() == index)
+            if pattern.all():
+                X[np.ix_(rows, pattern)] = np.asarray(reference).mean(axis=0)
+                continue
+            known = self._references.get(key := tuple(pattern))
+            if known is None:
+                known = self._references[key] = np.ascontiguousarray(reference[:, ~pattern])
+            _, neighbors = blocked_kneighbors(X[np.ix_(rows, ~pattern)], self.impute_neighbors, Y=known)
+            X[np.ix_(rows, pattern)] = np.asarray(reference)[neighbors][:, :, pattern].mean(axis=1)
+        return X
+
+    def _kmeans_matrix(self, frame: pd.DataFrame, scaled: pd.DataFrame, scores: np.ndarray) -> np.ndarray:
+        # Stage 06 reads the LOF features from the normalized file (operation flags cast to int)
+        columns = {}
+        for col in self.bundle.kmeans_feature_columns:
+            source = KMEANS_ALIASES.get(col, col)
+            if col == "lof_score":
+                columns[col] = scores
+            elif source in scaled.columns:
+                values = scaled[source].to_numpy()
+                columns[col] = np.trunc(values) if col.startswith("op_") else values
+            elif col in frame.columns:
+                columns[col] = frame[col].to_numpy(dtype=np.float64)
+            else:
+                columns[col] = np.zeros(len(frame))
+        return np.nan_to_num(np.column_stack(list(columns.values())).astype(np.float64))
+
+    def close(self) -> None:
+        self.featurizer.close()
+
+
+def parse_events(body: bytes, content_type: str = "") -> tuple[list[dict], bool]:
+    """Events of a request body and whether it was NDJSON.
+
+    Raises:
+        ValueError: on invalid JSON or when an event is not an object
+    """
+    ndjson = "ndjson" in content_type or "jsonl" in content_type
+    if not ndjson:
+        try:
+            document = json.loads(body)
+        except json.JSONDecodeError:
+            if body.strip().count(b"\n") == 0:
+                raise ValueError("body is not valid JSON") from None
+            ndjson = True   # several JSON lines without the NDJSON content type
+    if ndjson:
+        try:
+            events = [json.loads(line) for line in body.splitlines() if line.strip()]
+        except json.JSONDecodeError as exc:
+            raise ValueError(f"invalid NDJSON line: {exc}") from None
+    elif isinstance(document, dict):
+        events = document["events"] if "events" in document else [document]
+    else:
+        events = document
+    if not isinstance(events, list) or not all(isinstance(event, dict) for event in events):
+        raise ValueError("expected an event object, a list of objects or {\"events\": [...]}")
+    return events, ndjson
+
+
+def result_records(events: Sequence[dict], result: pd.DataFrame) -> list[dict]:
+    records = []
+    clusters = result["cluster"].astype(object).where(result["cluster"].notna(), None)
+    for event, score, flag, cluster, error in zip(events, result["lof_score"], result["is_anomaly"], clusters,
+                                                   result["error"]):
+        if error is not None:
+            record = {"error": error}
+        else:
+            record = {"lof_score": float(score), "is_anomaly": int(flag),
+                      "cluster": None if cluster is None else int(cluster)}
+        if "id" in event:
+            record["id"] = event["id"]
+        records.append(record)
+    return records
+
+
+# ------------------------------------------------------------------ metrics
+def _histogram_percentiles(counts: np.ndarray, percentiles=(50, 99)) -> dict:
+    total = counts.sum()
+    if total == 0:
+        return {f"p{p}": None for p in percentiles}
+    cumulative = np.cumsum(counts) / total
+    upper = np.append(LATENCY_EDGES_S, np.inf)
+    return {f"p{p}": round(float(upper[np.searchsorted(cumulative, p / 100)]) * 1000, 2) for p in percentiles}
+
+
+class SharedMetrics:
+    """Counters and latency histograms of every worker in one shared mapping.
+
+    The anonymous ``mmap`` is created before the fork, so all workers see the
+    same pages. Worker ``slot`` only ever writes its own row; readers sum the
+    rows (a snapshot may be a few events behind a concurrent write).
+    """
+
+    COUNTERS = ("requests", "events", "errors", "batches", "batched_requests")
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.started = time.time()
+        self.slot = 0
+        n_buckets = len(LATENCY_EDGES_S) + 1
+        self._width = len(self.COUNTERS) + 2 * n_buckets
+        self._map = mmap.mmap(-1, workers * self._width * 8)
+        self.table = np.frombuffer(self._map, dtype=np.int64).reshape(workers, self._width)
+        self._latency = slice(len(self.COUNTERS), len(self.COUNTERS) + n_buckets)
+        self._batch = slice(self._latency.stop, self._width)
+
+    def _add(self, counter: str, value: int = 1) -> None:
+        self.table[self.slot, self.COUNTERS.index(counter)] += value
+
+    def record_request(self, seconds: float, events: int, error: bool = False) -> None:
+        row = self.table[self.slot]
+        row[self._latency][np.searchsorted(LATENCY_EDGES_S, seconds)] += 1
+        self._add("requests")
+        self._add("events", events)
+        if error:
+            self._add("errors")
+
+    def record_batch(self, seconds: float, requests: int) -> None:
+        self.table[self.slot][self._batch][np.searchsorted(LATENCY_EDGES_S, seconds)] += 1
+        self._add("batches")
+        self._add("batched_requests", requests)
+
+    def snapshot(self) -> dict:
+        table = self.table.copy()
+        totals = dict(zip(self.COUNTERS, table[:, :len(self.COUNTERS)].sum(axis=0).tolist()))
+        uptime = time.time() - self.started
+        return {
+            "uptime_s": round(uptime, 1),
+            **{key: totals[key] for key in ("requests", "events", "errors", "batches")},
+            "throughput_eps": round(totals["events"] / uptime, 1) if uptime else 0.0,
+            "requests_per_batch": round(totals["batched_requests"] / totals["batches"], 2) if totals["batches"] else None,
+            "events_per_batch": round(totals["events"] / totals["batches"], 1) if totals["batches"] else None,
+            "latency_ms": _histogram_percentiles(table[:, self._latency].sum(axis=0)),
+            "batch_ms": _histogram_percentiles(table[:, self._batch].sum(axis=0)),
+            "requests_per_worker": table[:, self.COUNTERS.index("requests")].tolist(),
+        }
+
+
+# ------------------------------------------------------------ micro-batches
+class MicroBatcher:
+    """Coalesce concurrent requests into one scoring call per batch.
+
+    Args:
+        service: Scores a DataFrame of events
+        max_batch: Events per batch (a larger request is scored on its own)
+        max_wait_ms: How long a batch stays open after its first request
+        metrics: Receives the time of every batch
+        max_pending: Requests queued before ``submit`` waits (backpressure)
+    """
+
+    def __init__(self, service: ScoringService, max_batch: int = DEFAULT_MAX_BATCH,
+                 max_wait_ms: float = DEFAULT_MAX_WAIT_MS, metrics: Optional[SharedMetrics] = None,
+                 max_pending: int = DEFAULT_MAX_PENDING):
+        self.service = service
+        self.max_batch = max_batch
+        self.max_wait_ms = max_wait_ms
+        self.metrics = metrics
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="score-batch")
+
+    async def submit(self, events: list[dict]) -> list[dict]:
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((events, future))
+        return await future
+
+    def _score(self, requests: list) -> list[list[dict]]:
+        started = time.perf_counter()
+        events = [event for request, _ in requests for event in request]
+        records = result_records(events, self.service.score(pd.DataFrame.from_records(events)))
+        if self.metrics is not None:
+            self.metrics.record_batch(time.perf_counter() - started, len(requests))
+        split, start = [], 0
+        for request, _ in requests:
+            split.append(records[start:start + len(request)])
+            start += len(request)
+        return split
+
+    async def run(self) -> None:
+        """Score batches until a ``None`` sentinel is queued (queued requests are answered first)."""
+        loop = asyncio.get_running_loop()
+        done = False
+        while not done:
+            first = await self._queue.get()
+            if first is None:
+                break
+            batch, rows = [first], len(first[0])
+            deadline = loop.time() + self.max_wait_ms / 1000
+            while rows < self.max_batch:
+                try:
+                    item = self._queue.get_nowait() if self._queue.qsize() else \
+                        await asyncio.wait_for(self._queue.get(), max(deadline - loop.time(), 0))
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    done = True
+                    break
+                batch.append(item)
+                rows += len(item[0])
+            try:
+                results = await loop.run_in_executor(self._executor, self._score, batch)
+            except Exception as exc:   # answer every request of the batch, keep serving
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+                continue
+            for (_, future), records in zip(batch, results):
+                if not future.done():
+                    future.set_result(records)
+
+    async def close(self) -> None:
+        await self._queue.put(None)
+
+    def shutdown(self) -> None:
+        self._executor.submit(self.service.close).result()   # the profile connection belongs to that thread
+        self._executor.shutdown(wait=True)
+
+
+# ------------------------------------------------------------------- server
+class ScoreServer:
+    """Pre-forked HTTP workers sharing the memory-mapped bundle.
+
+    Args:
+        bundle: Model bundle to serve (loaded once, before the fork)
+        host / port: Listening address (port 0 = pick a free one)
+        workers: Processes accepting on the shared socket
+        max_batch / max_wait_ms: Micro-batch limits per worker
+        profile_path / profile_dataset: Profile store of stage 03
+    """
+
+    def __init__(self, bundle: ModelBundle, host: str = "127.0.0.1", port: int = DEFAULT_PORT,
+                 workers: int = 1, max_batch: int = DEFAULT_MAX_BATCH, max_wait_ms: float = DEFAULT_MAX_WAIT_MS,
+                 profile_path=PROFILE_STORE_PATH, profile_dataset: Optional[str] = None):
+        self.bundle = bundle
+        self.workers = workers if hasattr(os, "fork") else 1
+        self.max_batch = max_batch
+        self.max_wait_ms = max_wait_ms
+        self.service = ScoringService(bundle, EventFeaturizer(bundle, profile_path, profile_dataset))
+        self.metrics = SharedMetrics(self.workers)
+        self.sock = socket.create_server((host, port), backlog=1024)
+        self.sock.setblocking(False)
+        self.address = self.sock.getsockname()[:2]
+        self._children: dict[int, int] = {}
+        self._batcher: Optional[MicroBatcher] = None
+
+    # ------------------------------------------------------------- requests
+    def describe(self) -> dict:
+        return {
+            **self.metrics.snapshot(),
+            "model": {"name": self.bundle.name, "version": self.bundle.version},
+            "threshold": {"rule": self.service.threshold.rule, "cutoff": self.service.cutoff},
+            "imputed_features": self.service.featurizer.imputed,
+            "workers": self.workers,
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait_ms,
+        }
+
+    async def _respond(self, method: str, path: str, headers: dict, body: bytes) -> tuple[str, str, bytes, int]:
+        """(status, content type, payload, events scored) of one request."""
+        path = path.split("?", 1)[0]
+        if path in ("/metrics", "/healthz", "/"):
+            if method != "GET":
+                return "405 Method Not Allowed", "application/json", b'{"error": "use GET"}', 0
+            document = {"status": "ok", "pid": os.getpid()} if path == "/healthz" else self.describe()
+            return "200 OK", "application/json", json.dumps(document, default=str).encode("utf-8"), 0
+        if path != "/score":
+            return "404 Not Found", "application/json", json.dumps({"error": f"unknown path {path}"}).encode("utf-8"), 0
+        if method != "POST":
+            return "405 Method Not Allowed", "application/json", b'{"error": "use POST"}', 0
+
+        try:
+            events, ndjson = parse_events(body, headers.get("content-type", ""))
+        except ValueError as exc:
+            return "400 Bad Request", "application/json", json.dumps({"error": str(exc)}).encode("utf-8"), 0
+        records = await self._batcher.submit(events) if events else []
+        if ndjson:
+            payload = "".join(json.dumps(record) + "\n" for record in records).encode("utf-8")
+            return "200 OK", "application/x-ndjson", payload, len(records)
+        document = {"model": self.bundle.name, "version": self.bundle.version, "cutoff": self.service.cutoff,
+                    "results": records}
+        return "200 OK", "application/json", json.dumps(document).encode("utf-8"), len(records)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        # HTTP/1.1 with keep-alive; one request at a time per connection
+        try:
+            while True:
+                request = (await reader.readline()).decode("latin-1").split()
+                if not request:
+                    break
+                received = time.perf_counter()
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length") or 0)
+                if len(request) < 3 or length > MAX_BODY_BYTES:
+                    status, content_type, payload = "400 Bad Request", "application/json", b'{"error": "bad request"}'
+                    scored = 0
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(length) if length else b""
+                    try:
+                        status, content_type, payload, scored = await self._respond(request[0], request[1],
+                                                                                     headers, body)
+                    except Exception as exc:
+                        status, content_type, scored = "500 Internal Server Error", "application/json", 0
+                        payload = json.dumps({"error": f"{type(exc).__name__}: {exc}"}).encode("utf-8")
+                    connection = headers.get("connection", "").lower()
+                    keep_alive = connection == "keep-alive" or (request[2] == "HTTP/1.1" and connection != "close")
+                writer.write(f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\nContent-Length: {len(payload)}\r\n"
+                             f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + payload)
+                await writer.drain()
+                if request[1:2] == ["/score"]:
+                    self.metrics.record_request(time.perf_counter() - received, scored, error=status != "200 OK")
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    # -------------------------------------------------------------- workers
+    async def _serve(self) -> None:
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            with suppress(NotImplementedError):   # not available on Windows
+                loop.add_signal_handler(sig, stop.set)
+        self._batcher = MicroBatcher(self.service, self.max_batch, self.max_wait_ms, self.metrics)
+        batcher = asyncio.create_task(self._batcher.run())
+        server = await asyncio.start_server(self._handle, sock=self.sock, limit=MAX_BODY_BYTES)
+        try:
+            await stop.wait()
+        finally:
+            server.close()
+            await self._batcher.close()
+            await batcher
+            self._batcher.shutdown()
+
+    def _fork_worker(self, slot: int) -> None:
+        pid = os.fork()
+        if pid == 0:   # worker: new event loop and scoring thread, parent's handlers dropped
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            self.metrics.slot = slot
+            code = 0
+            try:
+                asyncio.run(self._serve())
+            except BaseException:
+                code = 1
+            finally:
+                os._exit(code)
+        self._children[pid] = slot
+
+    def serve_forever(self) -> None:
+        """Run the pool until SIGINT/SIGTERM; a worker that dies is replaced."""
+        if self.workers == 1:
+            asyncio.run(self._serve())
+            return
+        stopping = False
+
+        def stop(signum, frame) -> None:
+            nonlocal stopping
+            stopping = True
+            for pid in self._children:
+                with suppress(ProcessLookupError):
+                    os.kill(pid, signal.SIGTERM)
+
+        signal.signal(signal.SIGINT, stop)
+        signal.signal(signal.SIGTERM, stop)
+        for slot in range(self.workers):
+            self._fork_worker(slot)
+        while self._children:
+            pid, status = os.wait()
+            slot = self._children.pop(pid, None)
+            if slot is not None and not stopping:
+                print(f"  Worker {pid} berhenti (status {status}), diganti", flush=True)
+                self._fork_worker(slot)
+        self.sock.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default="tracker")
+    parser.add_argument("--version", type=int, help="Bundle version (default: latest)")
+    parser.add_argument("--registry", default="models/registry")
+    parser.add_argument("--profile-store", default=PROFILE_STORE_PATH)
+    parser.add_argument("--profile-dataset", help="Profiles to look users up in (default: --model)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--max-batch", type=int, default=DEFAULT_MAX_BATCH)
+    parser.add_argument("--max-wait-ms", type=float, default=DEFAULT_MAX_WAIT_MS)
+    args = parser.parse_args()
+
+    bundle = ModelRegistry(args.registry).load(args.model, args.version)
+    server = ScoreServer(bundle, host=args.host, port=args.port, workers=args.workers, max_batch=args.max_batch,
+                         max_wait_ms=args.max_wait_ms, profile_path=args.profile_store,
+                         profile_dataset=args.profile_dataset)
+    host, port = server.address
+    print(f"✓ Model {bundle.name} v{bundle.version}, {server.workers} worker, cutoff LOF {server.service.cutoff:.3f}")
+    if server.service.featurizer.imputed:
+        print(f"  Fitur diimputasi dari baris referensi terdekat (tidak tersedia per event): "
+              f"{server.service.featurizer.imputed}")
+    print(f"  POST http://{host}:{port}/score   GET http://{host}:{port}/metrics", flush=True)
+    server.serve_forever()
+    print("\n✓ Server berhenti")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Contamination-free anomaly thresholds on a stored LOF score distribution.
+
+``LocalOutlierFactor(contamination=0.05)`` bakes the flag rate into the
+model, and the stage scripts used to refit LOF for several k just to land
+near 5% flagged. Here LOF is fitted once. Its raw scores go into a
+:class:`~pipeline.quantile_sketch.KLLSketch`, which is persisted next to the
+model, and ``is_anomaly`` is decided at query time by one of two rules:
+
+* ``percentile``: flag scores above the p-th percentile of the stored
+  distribution (p=95 flags about 5%, what contamination=0.05 did);
+* ``score``: flag scores above an absolute LOF value (e.g. 1.5), whatever
+  share of the data that turns out to be.
+
+A score is flagged when it is strictly greater than the cutoff, as in
+sklearn's ``predict``. Moving the threshold needs only the sketch, never a
+refit: the dashboard re-derives the cutoff and the flags from the stored
+sketch and the stored scores.
+"""
+
+import json
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from pipeline.quantile_sketch import KLLSketch
+
+
+DEFAULT_PERCENTILE = 95.0
+SKETCH_K = 1000   # rank error ~0.2%; exact while fewer than ~1000 scores are stored
+SUMMARY_PERCENTILES = (50, 90, 95, 99, 99.9)
+
+
+class ScoreThreshold:
+    """Score sketch plus the rule that turns LOF scores into anomaly flags.
+
+    Args:
+        percentile: Flag scores above this percentile of the distribution
+        score: Absolute LOF cutoff; takes precedence over ``percentile``
+        k: Sketch accuracy parameter
+    """
+
+    def __init__(self, percentile: Optional[float] = DEFAULT_PERCENTILE, score: Optional[float] = None,
+                 k: int = SKETCH_K):
+        if score is None and percentile is None:
+            raise ValueError("Either percentile or score must be set")
+        if percentile is not None and not 0 <= percentile <= 100:
+            raise ValueError("percentile must be in [0, 100]")
+        self.percentile = percentile
+        self.score = score
+        self.sketch = KLLSketch(k=k, seed=0)
+
+    @property
+    def rule(self) -> str:
+        return "score" if self.score is not None else "percentile"
+
+    def fit(self, scores) -> "ScoreThreshold":
+        """Store the score distribution (adds to what is already stored)."""
+        self.sketch.update(scores)
+        return self
+
+    def cutoff(self, percentile: Optional[float] = None, score: Optional[float] = None) -> float:
+        """Absolute LOF cutoff for the stored rule or for the rule given here."""
+        if score is not None:
+            return float(score)
+        if percentile is not None:
+            return self.sketch.quantile(percentile / 100)
+        if self.score is not None:
+            return float(self.score)
+        return self.sketch.quantile(self.percentile / 100)
+
+    def flag(self, scores, percentile: Optional[float] = None, score: Optional[float] = None) -> np.ndarray:
+        """Boolean anomaly flags: ``scores > cutoff``."""
+        return np.asarray(scores, dtype=np.float64) > self.cutoff(percentile, score)
+
+    def flagged_fraction(self, cutoff: float) -> float:
+        """Share of the stored distribution above ``cutoff`` (from the sketch)."""
+        return 1.0 - self.sketch.rank(cutoff)
+
+    def percentile_of(self, score: float) -> float:
+        return 100.0 * self.sketch.rank(score)
+
+    def describe(self) -> dict:
+        """Rule, cutoff and distribution summary for configs and reports."""
+        cutoff = self.cutoff()
+        return {
+            "rule": self.rule,
+            "percentile": self.percentile,
+            "score": self.score,
+            "cutoff": cutoff,
+            "expected_anomaly_fraction": self.flagged_fraction(cutoff),
+            "n_scores": self.sketch.n,
+            "score_min": self.sketch.min if self.sketch.n else None,
+            "score_max": self.sketch.max if self.sketch.n else None,
+            "score_percentiles": {
+                str(p): float(q) for p, q in zip(SUMMARY_PERCENTILES, self.sketch.quantiles(np.array(SUMMARY_PERCENTILES) / 100))
+            },
+        }
+
+    # ------------------------------------------------------------ persistence
+    def save(self, path) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        state = {"summary": self.describe(), "sketch": self.sketch.to_dict()}
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+
+    @classmethod
+    def load(cls, path) -> "ScoreThreshold":
+        with open(path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        summary = state["summary"]
+        threshold = cls(percentile=summary["percentile"], score=summary["score"])
+        threshold.sketch = KLLSketch.from_dict(state["sketch"], seed=0)
+        return threshold
@@ -0,0 +1,257 @@
+"""Login session reconstruction linking staff logins to tracker activity.
+
+Every staff login (``trackerjani.csv``) opens a session for that user that
+lasts until the user's next login or ``max_duration``, whichever comes first.
+Tracker events are attached to the session that was active when they
+happened with a sorted as-of join (``pd.merge_asof(..., by=user_id,
+direction="backward")``): both sides are sorted once by time and merged in a
+single pass, so the cost is O((n + m) log(n + m)) instead of a nested loop
+over logins x events. Events with no active session get ``session_id = -1``;
+activity without a login is itself a useful signal.
+
+Per-session aggregates (queries per session, active duration, time from login
+to the first DELETE) are computed with one groupby over the attached events
+and broadcast back onto the events as features.
+
+:class:`SessionTracker` is the streaming counterpart used by the tail
+daemon: it keeps each user's login times plus running aggregates of the open
+sessions, and gives every event the values of its session *so far* (queries
+up to and including the event, time to the first DELETE seen yet), because
+the rest of the session has not happened when the event is scored.
+"""
+
+from bisect import bisect_right, insort
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+
+NO_SESSION = -1
+SESSION_FEATURE_COLUMNS = [
+    "jumlah_query_sesi",
+    "durasi_sesi",
+    "waktu_ke_delete_pertama",
+    "detik_sejak_login",
+    "aktivitas_tanpa_login",
+]
+
+
+def _user_key(values: pd.Series) -> pd.Series:
+    """Common join key for user ids stored as int, float or zero-padded text."""
+    numeric = pd.to_numeric(values, errors="coerce")
+    return numeric.fillna(NO_SESSION).astype(np.int64)
+
+
+def build_sessions(
+    logins: pd.DataFrame,
+    user_col: str = "user_id",
+    time_col: str = "datetime",
+    max_duration: str = "12h",
+) -> pd.DataFrame:
+    """One row per login: ``session_id, user_id, login_time, session_end``."""
+    sessions = pd.DataFrame({
+        "user_key": _user_key(logins[user_col]).to_numpy(),
+        "login_time": pd.to_datetime(logins[time_col]).to_numpy(),
+    })
+    sessions = sessions[sessions["user_key"] != NO_SESSION]
+    sessions = sessions.dropna(subset=["login_time"]).sort_values(["user_key", "login_time"], kind="stable")
+    # Repeated logins at the same instant open one session
+    sessions = sessions.drop_duplicates().reset_index(drop=True)
+
+    next_login = sessions.groupby("user_key")["login_time"].shift(-1)
+    limit = sessions["login_time"] + pd.Timedelta(max_duration)
+    sessions["session_end"] = next_login.where(next_login < limit, limit)
+    sessions.insert(0, "session_id", np.arange(len(sessions), dtype=np.int64))
+    return sessions.rename(columns={"user_key": user_col})
+
+
+def attach_sessions(
+    events: pd.DataFrame,
+    sessions: pd.DataFrame,
+    user_col: str = "user_id",
+    time_col: str = "datetime",
+) -> pd.DataFrame:
+    """Add ``session_id`` and ``login_time`` of the active session to every event.
+
+    Returns:
+        Copy of ``events`` (same index and order) with the two new columns
+    """
+    left = pd.DataFrame({
+        "user_key": _user_key(events[user_col]).to_numpy(),
+        "event_time": pd.to_datetime(events[time_col]).to_numpy(),
+        "row": np.arange(len(events)),
+    })
+    valid = left["event_time"].notna()
+    right = sessions.rename(columns={user_col: "user_key"})[["user_key", "login_time", "session_id", "session_end"]]
+
+    joined = pd.merge_asof(
+        left[valid].sort_values("event_time", kind="stable"),
+        right.sort_values("login_time", kind="stable"),
+        left_on="event_time",
+        right_on="login_time",
+        by="user_key",
+        direction="backward",
+    )
+    expired = joined["event_time"] >= joined["session_end"]
+    joined.loc[expired, ["session_id", "login_time"]] = [np.nan, pd.NaT]
+
+    session_id = np.full(len(events), NO_SESSION, dtype=np.int64)
+    login_time = np.full(len(events), np.datetime64("NaT"), dtype="datetime64[ns]")
+    rows = joined["row"].to_numpy()
+    session_id[rows] = joined["session_id"].fillna(NO_SESSION).astype(np.int64).to_numpy()
+    login_time[rows] = joined["login_time"].to_numpy(dtype="datetime64[ns]")
+
+    result = events.copy()
+    result["session_id"] = session_id
+    result["login_time"] = login_time
+    return result
+
+
+def session_features(
+    events: pd.DataFrame,
+    sessions: pd.DataFrame,
+    time_col: str = "datetime",
+    query_type_col: str = "query_type",
+    max_duration: str = "12h",
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Aggregate attached events per session and broadcast the result back.
+
+    Durations are in seconds. "Not applicable" values (no DELETE in the
+    session, event without a session) are set to ``max_duration`` so the
+    columns stay numeric for scaling and LOF.
+
+    Returns:
+        (events with SESSION_FEATURE_COLUMNS, sessions with the aggregates)
+    """
+    cap = pd.Timedelta(max_duration).total_seconds()
+    times = pd.to_datetime(events[time_col])
+    in_session = events["session_id"] != NO_SESSION
+    attached = pd.DataFrame({
+        "session_id": events.loc[in_session, "session_id"],
+        "event_time": times[in_session],
+        "is_delete": events.loc[in_session, query_type_col].eq("DELETE"),
+    })
+
+    grouped = attached.groupby("session_id")
+    per_session = pd.DataFrame({
+        "jumlah_query_sesi": grouped.size(),
+        "event_terakhir": grouped["event_time"].max(),
+        "delete_pertama": attached[attached["is_delete"]].groupby("session_id")["event_time"].min(),
+    })
+    sessions = sessions.merge(per_session, left_on="session_id", right_index=True, how="left")
+    sessions["jumlah_query_sesi"] = sessions["jumlah_query_sesi"].fillna(0).astype(np.int64)
+    sessions["durasi_sesi"] = (
+        (sessions["event_terakhir"] - sessions["login_time"]).dt.total_seconds().fillna(0)
+    )
+    sessions["waktu_ke_delete_pertama"] = (
+        (sessions["delete_pertama"] - sessions["login_time"]).dt.total_seconds().fillna(cap)
+    )
+    sessions = sessions.drop(columns=["event_terakhir", "delete_pertama"])
+
+    lookup = sessions.set_index("session_id")
+    result = events.copy()
+    session_ids = result["session_id"]
+    for col, missing in (("jumlah_query_sesi", 0), ("durasi_sesi", 0.0), ("waktu_ke_delete_pertama", cap)):
+        result[col] = session_ids.map(lookup[col]).fillna(missing).to_numpy()
+    result["detik_sejak_login"] = (
+        (times - pd.to_datetime(result["login_time"])).dt.total_seconds().fillna(cap).to_numpy()
+    )
+    result["aktivitas_tanpa_login"] = (~in_session).astype(int).to_numpy()
+    return result, sessions
+
+
+def sessionize(
+    events: pd.DataFrame,
+    logins: pd.DataFrame,
+    user_col: str = "user_id",
+    event_time_col: str = "datetime",
+    login_time_col: str = "datetime",
+    query_type_col: str = "query_type",
+    max_duration: str = "12h",
+    sessions: Optional[pd.DataFrame] = None,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """build_sessions -> attach_sessions -> session_features in one call."""
+    if sessions is None:
+        sessions = build_sessions(logins, user_col=user_col, time_col=login_time_col, max_duration=max_duration)
+    attached = attach_sessions(events, sessions, user_col=user_col, time_col=event_time_col)
+    return session_features(
+        attached, sessions, time_col=event_time_col, query_type_col=query_type_col, max_duration=max_duration
+    )
+
+
+class SessionTracker:
+    """Streaming session features for events arriving batch by batch.
+
+    Args:
+        logins: Initial login events (``user_col`` and ``time_col``); more
+            can be added with :meth:`add_logins`
+        user_col / time_col: Column names in both logins and event chunks
+        max_duration: Session length cap, as in :func:`build_sessions`
+    """
+
+    def __init__(
+        self,
+        logins: Optional[pd.DataFrame] = None,
+        user_col: str = "user_id",
+        time_col: str = "datetime",
+        max_duration: str = "12h",
+    ):
+        self.user_col = user_col
+        self.time_col = time_col
+        self.max_duration = max_duration
+        self._cap_ns = pd.Timedelta(max_duration).value
+        self._logins: dict[int, list[int]] = {}
+        self._open: dict[tuple[int, int], list] = {}   # (user, login) -> [queries, last event, first DELETE]
+        if logins is not None:
+            self.add_logins(logins)
+
+    def add_logins(self, logins: pd.DataFrame) -> None:
+        users = _user_key(logins[self.user_col]).to_numpy()
+        times = pd.to_datetime(logins[self.time_col]).to_numpy(dtype="datetime64[ns]")
+        for user, t in zip(users, times):
+            if user == NO_SESSION or np.isnat(t):
+                continue
+            known = self._logins.setdefault(int(user), [])
+            t = int(t.astype(np.int64))
+            if not known or known[-1] < t:
+                known.append(t)
+            elif t not in known:
+                insort(known, t)
+
+    def update(self, chunk: pd.DataFrame, query_type_col: str = "query_type") -> pd.DataFrame:
+        """SESSION_FEATURE_COLUMNS for the rows of ``chunk`` (aligned with its index)."""
+        cap_s = self._cap_ns / 1e9
+        users = _user_key(chunk[self.user_col]).to_numpy()
+        times = pd.to_datetime(chunk[self.time_col]).to_numpy(dtype="datetime64[ns]").astype(np.int64)
+        is_delete = chunk[query_type_col].eq("DELETE").to_numpy()
+        rows = np.zeros((len(chunk), len(SESSION_FEATURE_COLUMNS)))
+        for i in np.argsort(times, kind="stable"):
+            t = int(times[i])
+            logins = self._logins.get(int(users[i]), ())
+            pos = bisect_right(logins, t)
+            login = logins[pos - 1] if pos else None
+            if login is None or t - login >= self._cap_ns:
+                rows[i] = (0, 0.0, cap_s, cap_s, 1)
+                continue
+            state = self._open.setdefault((int(users[i]), login), [0, login, None])
+            state[0] += 1
+            state[1] = max(state[1], t)
+            if is_delete[i] and (state[2] is None or t < state[2]):
+                state[2] = t
+            first_delete = (state[2] - login) / 1e9 if state[2] is not None else cap_s
+            rows[i] = (state[0], (state[1] - login) / 1e9, first_delete, (t - login) / 1e9, 0)
+        return pd.DataFrame(rows, index=chunk.index, columns=SESSION_FEATURE_COLUMNS)
+
+    def expire(self, now) -> int:
+        """Forget sessions (and logins) that ended before ``now``."""
+        cutoff = int(pd.Timestamp(now).value) - self._cap_ns
+        stale = [key for key in self._open if key[1] <= cutoff]
+        for key in stale:
+            del self._open[key]
+        for user, logins in self._logins.items():
+            # Keep the last login before the cutoff: it bounds late events
+            drop = bisect_right(logins, cutoff) - 1
+            if drop > 0:
+                del logins[:drop]
+        return len(stale)
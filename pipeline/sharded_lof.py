@@ -0,0 +1,168 @@
+"""LOF fitted per shard of rows, with scores normalized across shards.
+
+One global LOF compares every row with the whole population: a burst of
+pharmacy IP traffic and a registration clerk's logins share one density
+model, and the kNN cost grows superlinearly with n. ``ShardedLOF`` splits
+the rows by a key (``dataset_source``, month, a user cohort, ...). It fits
+one LOF per shard, with the shards in parallel worker processes, as in
+:mod:`pipeline.ensemble_lof`. The largest shards are dispatched first, so
+the wall time is about the largest shard when there are enough cores.
+
+Shards smaller than ``min_shard_rows`` are pooled into one ``__other__``
+shard, so that no LOF is fitted on a handful of rows.
+
+Raw LOF values are not comparable across shards: a tight shard has a median
+near 1.0 and a narrow spread, a diffuse one a long tail. ``normalize`` maps
+each shard's scores before they are combined:
+
+* ``"rank"`` (default): the percentile of the score within its shard (0-1).
+  Every shard then flags the same share of rows.
+* ``"robust"``: a map per shard on log scores. It sends the shard median to
+  1 and the upper-tail spread (q99 - q50 of log LOF) to the size-weighted
+  spread of all shards, so the shards' q99 coincide. The result stays on the
+  LOF scale (inliers ≈ 1, larger = more anomalous). The tail is used rather
+  than the body because duplicate rows give some shards LOF values of 1e9
+  and more, which a q90 spread leaves untouched.
+* ``"none"``: raw per-shard LOF.
+"""
+
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+
+from pipeline.blocked_knn import DEFAULT_BLOCK_COLS, DEFAULT_BLOCK_ROWS, fit_lof
+
+
+NORMALIZATIONS = ("rank", "robust", "none")
+OTHER_SHARD = "__other__"
+
+
+def _fit_shard(X, rows: np.ndarray, n_neighbors: int, backend: str, block_rows: int, block_cols: int):
+    model = fit_lof(np.asarray(X[rows], dtype=np.float64), min(n_neighbors, len(rows) - 1), backend=backend,
+                    block_rows=block_rows, block_cols=block_cols, n_threads=1)
+    return model, -model.negative_outlier_factor_
+
+
+def _log_scores(scores: np.ndarray) -> np.ndarray:
+    return np.log(np.maximum(scores, np.finfo(np.float64).tiny))
+
+
+def _spread(scores: np.ndarray) -> float:
+    """q99 - q50 of the log scores; std (or 1) when the upper tail is flat."""
+    logs = _log_scores(scores)
+    q50, q99 = np.quantile(logs, [0.5, 0.99])
+    spread = q99 - q50
+    if spread <= 0:
+        spread = logs.std()
+    return float(spread) if spread > 0 else 1.0
+
+
+class ShardedLOF:
+    """One LOF per shard of rows, scores normalized across shards.
+
+    Args:
+        n_neighbors: k per shard (capped at shard size - 1)
+        normalize: "rank", "robust" or "none" (see module docstring)
+        min_shard_rows: Smaller shards are pooled into ``__other__``
+        backend: Neighbour backend of :func:`pipeline.blocked_knn.fit_lof`
+        n_jobs: Worker processes (-1 = all cores)
+        block_rows, block_cols: Tile shape of the blocked backend
+    """
+
+    def __init__(
+        self,
+        n_neighbors: int = 20,
+        normalize: str = "rank",
+        min_shard_rows: int = 200,
+        backend: str = "sklearn",
+        n_jobs: int = -1,
+        block_rows: int = DEFAULT_BLOCK_ROWS,
+        block_cols: int = DEFAULT_BLOCK_COLS,
+    ):
+        if normalize not in NORMALIZATIONS:
+            raise ValueError(f"normalize must be one of {NORMALIZATIONS}")
+        self.n_neighbors = n_neighbors
+        self.normalize = normalize
+        self.min_shard_rows = max(min_shard_rows, n_neighbors + 1)
+        self.backend = backend
+        self.n_jobs = n_jobs
+        self.block_rows = block_rows
+        self.block_cols = block_cols
+
+        self.estimators_: dict = {}
+        self.shards_: Optional[np.ndarray] = None       # shard label per fitted row
+        self.shard_stats_: dict = {}
+        self.raw_scores_: Optional[np.ndarray] = None   # per-shard LOF before normalization
+        self.scores_: Optional[np.ndarray] = None
+
+    def _assign_shards(self, keys) -> np.ndarray:
+        keys = pd.Series(keys).astype("string").fillna("NA").to_numpy(dtype=object)
+        labels, counts = np.unique(keys, return_counts=True)
+        small = set(labels[counts < self.min_shard_rows])
+        if small:
+            keys = np.where(np.isin(keys, list(small)), OTHER_SHARD, keys)
+        return keys
+
+    def fit(self, X, keys) -> "ShardedLOF":
+        """Fit one LOF per shard of ``X``; ``keys`` holds the shard key of every row."""
+        if len(keys) != len(X):
+            raise ValueError(f"keys has {len(keys)} entries for {len(X)} rows")
+        shards = self._assign_shards(keys)
+        members = {label: np.flatnonzero(shards == label) for label in np.unique(shards)}
+        if any(len(rows) <= 1 for rows in members.values()):
+            raise ValueError(f"Too few rows to fit LOF per shard (min_shard_rows={self.min_shard_rows})")
+        order = sorted(members, key=lambda label: len(members[label]), reverse=True)  # largest first
+
+        results = Parallel(n_jobs=self.n_jobs)(
+            delayed(_fit_shard)(X, members[label], self.n_neighbors, self.backend, self.block_rows, self.block_cols)
+            for label in order
+        )
+
+        self.shards_ = shards
+        self.raw_scores_ = np.empty(len(X), dtype=np.float64)
+        self.estimators_, self.shard_stats_ = {}, {}
+        for label, (model, scores) in zip(order, results):
+            self.estimators_[label] = model
+            self.raw_scores_[members[label]] = scores
+            self.shard_stats_[label] = {
+                "rows": int(len(scores)),
+                "n_neighbors": int(model.n_neighbors_),
+                "median": float(np.median(scores)),
+                "spread": _spread(scores),
+            }
+        self.scores_ = self._normalized(members)
+        return self
+
+    def fit_score(self, X, keys) -> np.ndarray:
+        return self.fit(X, keys).scores_
+
+    def _normalized(self, members: dict) -> np.ndarray:
+        if self.normalize == "none":
+            return self.raw_scores_.copy()
+        scores = np.empty_like(self.raw_scores_)
+        if self.normalize == "rank":
+            for label, rows in members.items():
+                raw = self.raw_scores_[rows]
+                scores[rows] = np.searchsorted(np.sort(raw), raw, side="right") / len(raw)
+            return scores
+
+        sizes = np.array([stats["rows"] for stats in self.shard_stats_.values()])
+        spreads = np.array([stats["spread"] for stats in self.shard_stats_.values()])
+        pooled_spread = float(np.average(spreads, weights=sizes))
+        for label, rows in members.items():
+            stats = self.shard_stats_[label]
+            centred = _log_scores(self.raw_scores_[rows]) - np.log(stats["median"])
+            scores[rows] = np.exp(centred * (pooled_spread / stats["spread"]))
+        for stats in self.shard_stats_.values():
+            stats["pooled_spread"] = pooled_spread
+        return scores
+
+    def summary(self) -> dict:
+        """Per-shard sizes, k and normalization parameters for configs."""
+        return {
+            "normalize": self.normalize,
+            "min_shard_rows": self.min_shard_rows,
+            "shards": self.shard_stats_,
+        }
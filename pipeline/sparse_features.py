@@ -0,0 +1,228 @@
+"""Sparse per-user behavioural feature blocks.
+
+Distributions over target tables or SQL templates have hundreds of columns,
+most of them zero for any given user. Instead of ``pd.get_dummies`` this
+module builds a CSR count matrix with one row per (user_id, time window) and
+one column per token, weights it (TF-IDF or normalised counts) and reduces it
+to a fixed width with TruncatedSVD or a sparse random projection, so LOF sees
+a small dense block no matter how many tables the hospital system has.
+
+:class:`BlockProjector` keeps the fitted vocabulary, weighting and reducer
+so that new count rows can be projected into the same space, and
+:class:`SparseBlockStream` does that for events arriving batch by batch (the
+counts of the user's current window so far), as the tail daemon needs.
+"""
+
+from typing import NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.decomposition import TruncatedSVD
+from sklearn.feature_extraction.text import TfidfTransformer
+from sklearn.preprocessing import normalize
+from sklearn.random_projection import SparseRandomProjection
+
+
+WEIGHTINGS = ("tfidf", "l1", "l2", "count")
+REDUCERS = ("svd", "random")
+
+
+class SparseFeatureBlock(NamedTuple):
+    matrix: sparse.csr_matrix   # (n_groups, n_tokens), weighted
+    groups: pd.DataFrame        # key columns for every matrix row
+    vocabulary: pd.Index        # token for every matrix column
+    row_group: np.ndarray       # matrix row of every input event
+    weighter: object = None     # fitted TfidfTransformer for weighting='tfidf'
+
+
+def _weight(counts: sparse.csr_matrix, weighting: str, weighter) -> sparse.csr_matrix:
+    if weighting == "tfidf":
+        return weighter.transform(counts)
+    if weighting in ("l1", "l2"):
+        return normalize(counts, norm=weighting)
+    return counts
+
+
+def build_sparse_block(
+    df: pd.DataFrame,
+    token_col: str,
+    user_col: str = "user_id",
+    time_col: Optional[str] = "datetime",
+    window: Optional[str] = "1D",
+    weighting: str = "tfidf",
+) -> SparseFeatureBlock:
+    """Count ``token_col`` values per user and window into a CSR matrix.
+
+    Args:
+        df: Event frame (one row per tracker event)
+        token_col: Column holding the categorical token, e.g. ``sql_table``
+            or ``fingerprint_id``
+        user_col: Column identifying the user
+        time_col: Datetime column used for windowing; ``None`` aggregates
+            over the whole history
+        window: Pandas offset alias for the window (``"1h"``, ``"1D"``, ...)
+        weighting: ``tfidf``, ``l1`` (row distribution), ``l2`` or ``count``
+
+    Returns:
+        SparseFeatureBlock
+    """
+    if weighting not in WEIGHTINGS:
+        raise ValueError(f"weighting must be one of {WEIGHTINGS}, got '{weighting}'")
+
+    key_cols = [user_col]
+    keys = df[[user_col]].copy()
+    if time_col is not None and window is not None:
+        keys["window_start"] = pd.to_datetime(df[time_col]).dt.floor(window)
+        key_cols.append("window_start")
+
+    row_group, groups = pd.MultiIndex.from_frame(keys[key_cols]).factorize()
+    col_codes, vocabulary = pd.factorize(df[token_col], use_na_sentinel=True)
+
+    present = col_codes >= 0
+    counts = sparse.coo_matrix(
+        (
+            np.ones(int(present.sum()), dtype=np.float32),
+            (row_group[present], col_codes[present]),
+        ),
+        shape=(len(groups), len(vocabulary)),
+    ).tocsr()  # duplicate (row, col) pairs are summed here
+    counts.sum_duplicates()
+
+    weighter = TfidfTransformer(sublinear_tf=True).fit(counts) if weighting == "tfidf" else None
+    matrix = _weight(counts, weighting, weighter)
+
+    return SparseFeatureBlock(
+        matrix=sparse.csr_matrix(matrix, dtype=np.float32),
+        groups=groups.to_frame(index=False),
+        vocabulary=pd.Index(vocabulary, name=token_col),
+        row_group=row_group,
+        weighter=weighter,
+    )
+
+
+def reduce_block(
+    block: SparseFeatureBlock,
+    n_components: int = 8,
+    method: str = "svd",
+    random_state: int = 42,
+):
+    """Project a sparse block to exactly ``n_components`` dense columns.
+
+    TruncatedSVD needs ``n_components < n_tokens``; when the vocabulary is
+    smaller than that the missing components are zero-padded so the output
+    width (and therefore the LOF feature list) stays fixed.
+
+    Returns:
+        (reduced, reducer): float32 array of shape (n_groups, n_components)
+        and the fitted reducer (None if nothing could be fitted)
+    """
+    if method not in REDUCERS:
+        raise ValueError(f"method must be one of {REDUCERS}, got '{method}'")
+
+    n_groups, n_tokens = block.matrix.shape
+    reduced = np.zeros((n_groups, n_components), dtype=np.float32)
+
+    if method == "svd":
+        usable = min(n_components, n_tokens - 1, n_groups - 1)
+        if usable < 1:
+            return reduced, None
+        reducer = TruncatedSVD(n_components=usable, random_state=random_state)
+    else:
+        usable = n_components
+        if n_tokens == 0:
+            return reduced, None
+        reducer = SparseRandomProjection(n_components=usable, random_state=random_state)
+
+    reduced[:, :usable] = reducer.fit_transform(block.matrix)
+    return reduced, reducer
+
+
+def attach_block_features(
+    df: pd.DataFrame,
+    block: SparseFeatureBlock,
+    reduced: np.ndarray,
+    prefix: str,
+) -> tuple[pd.DataFrame, list[str]]:
+    """Broadcast the per-(user, window) vectors back onto every event row."""
+    columns = [f"{prefix}{i}" for i in range(reduced.shape[1])]
+    per_event = pd.DataFrame(reduced[block.row_group], columns=columns, index=df.index)
+    df = df.drop(columns=[c for c in columns if c in df.columns])
+    return pd.concat([df, per_event], axis=1), columns
+
+
+class BlockProjector(NamedTuple):
+    """Everything needed to project new count rows like the training block."""
+
+    vocabulary: pd.Index
+    weighting: str
+    weighter: object
+    reducer: object
+    n_components: int
+
+    @classmethod
+    def from_block(cls, block: SparseFeatureBlock, reducer, n_components: int,
+                   weighting: str = "tfidf") -> "BlockProjector":
+        return cls(block.vocabulary, weighting, block.weighter, reducer, n_components)
+
+    def transform(self, counts: sparse.csr_matrix) -> np.ndarray:
+        """Dense (n_rows, n_components) vectors for count rows over ``vocabulary``."""
+        reduced = np.zeros((counts.shape[0], self.n_components), dtype=np.float32)
+        if self.reducer is None or counts.shape[0] == 0:
+            return reduced
+        projected = self.reducer.transform(_weight(sparse.csr_matrix(counts, dtype=np.float32),
+                                                   self.weighting, self.weighter))
+        reduced[:, :projected.shape[1]] = projected
+        return reduced
+
+
+class SparseBlockStream:
+    """Streaming counterpart of build_sparse_block -> reduce_block -> attach_block_features.
+
+    Every event gets the projection of its (user, window) counts up to and
+    including the event; the batch version uses the counts of the whole
+    window. Tokens missing from the projector's vocabulary are ignored.
+
+    Args:
+        projector: Fitted on the training block
+        token_col / user_col / time_col / window: As in :func:`build_sparse_block`
+        prefix: Output column prefix, as in :func:`attach_block_features`
+    """
+
+    def __init__(self, projector: BlockProjector, token_col: str, user_col: str = "user_id",
+                 time_col: str = "datetime", window: str = "1D", prefix: str = "profil_tabel_"):
+        self.projector = projector
+        self.token_col = token_col
+        self.user_col = user_col
+        self.time_col = time_col
+        self.window = window
+        self.columns = [f"{prefix}{i}" for i in range(projector.n_components)]
+        self._counts: dict[tuple, dict[int, int]] = {}   # (user, window start) -> token code -> count
+
+    def update(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        """Projected vectors for the rows of ``chunk``, aligned with its index."""
+        starts = pd.to_datetime(chunk[self.time_col]).dt.floor(self.window).to_numpy(dtype="datetime64[ns]")
+        codes = self.projector.vocabulary.get_indexer(chunk[self.token_col])
+        users = chunk[self.user_col].to_numpy()
+        indptr, indices, values = np.zeros(len(chunk) + 1, dtype=np.int64), [], []
+        rows: list[Optional[tuple]] = [None] * len(chunk)
+        for i in np.argsort(starts, kind="stable"):
+            counts = self._counts.setdefault((users[i], starts[i]), {})
+            if codes[i] >= 0:
+                counts[int(codes[i])] = counts.get(int(codes[i]), 0) + 1
+            rows[i] = (list(counts), list(counts.values()))
+        for i, (row_indices, row_values) in enumerate(rows):
+            indices.extend(row_indices)
+            values.extend(row_values)
+            indptr[i + 1] = len(indices)
+        counts = sparse.csr_matrix((np.asarray(values, dtype=np.float32), np.asarray(indices, dtype=np.int64), indptr),
+                                   shape=(len(chunk), len(self.projector.vocabulary)))
+        return pd.DataFrame(self.projector.transform(counts), index=chunk.index, columns=self.columns)
+
+    def expire(self, now) -> int:
+        """Forget windows that ended before ``now``."""
+        current = pd.Timestamp(now).floor(self.window).to_datetime64()
+        stale = [key for key in self._counts if key[1] < current]
+        for key in stale:
+            del self._counts[key]
+        return len(stale)
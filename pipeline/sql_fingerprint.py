@@ -0,0 +1,264 @@
+"""SQL fingerprinting for tracker ``query_info`` strings.
+
+Every tracker row looks like ``<client ip> <sql statement>``, where the SQL
+either carries inline literals (``where no_rawat='2025/01/02/000051'``) or a
+trailing pipe-delimited parameter list (``values(|202501020020|000228|...)``).
+This module reduces each string to:
+
+- ``ip``: the leading client IP (``192.168.1.6``)
+- ``query_type``: INSERT / UPDATE / DELETE / SELECT / OTHER
+- ``sql_table``: the target table (``reg_periksa``, ``resep_dokter``, ...)
+- ``sql_template``: the statement with every literal replaced by ``?``
+- ``fingerprint_id``: a stable signed 64-bit hash of ``sql_template``
+
+Parsing is a single ``finditer`` pass over one compiled pattern, memoised with
+an LRU cache so repeated statements are only tokenised once.
+
+Callers that only need ``ip``, ``query_type`` and ``sql_table`` (no template)
+can use :func:`extract_fields`: one anchored ``match`` of a combined pattern
+per distinct string, several times cheaper than the full tokenizer and than
+three separate ``str.extract`` passes.
+
+Both entry points factorize the column first, so the work is O(distinct
+strings). Large columns (at least ``PARALLEL_MIN_UNIQUES`` distinct strings)
+can be split into partitions on a process pool (``n_jobs``): the regex work
+is pure Python and holds the GIL, so threads would not help.
+"""
+
+import hashlib
+import re
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed, effective_n_jobs
+
+
+QUERY_TYPES = ["DELETE", "INSERT", "OTHER", "SELECT", "UPDATE"]
+FINGERPRINT_COLUMNS = ["ip", "query_type", "sql_table", "sql_template", "fingerprint_id"]
+
+_CACHE_SIZE = 65536
+PARALLEL_MIN_UNIQUES = 20_000   # below this, pool start-up costs more than it saves
+_PARTITIONS_PER_JOB = 4         # several partitions per worker evens out long statements
+
+# Keywords that may follow a pipe-delimited parameter run inside a statement,
+# e.g. "set kd_prosedur_utama=? |89.52|2025/01/02/000031 where no_rawat=?"
+_PIPE_STOP = r"(?=\)?\s*\Z|\s+(?:where|and|or|set|values|limit|order|group)\b)"
+
+_TOKEN_RE = re.compile(
+    r"""
+    (?P<ip>\A\s*\d{1,3}(?:\.\d{1,3}){3}\b)
+  | (?P<pipe>\|(?:[^|]*\|)*.*?""" + _PIPE_STOP + r""")
+  | (?P<str>'(?:[^'\\]|\\.|'')*'?|"(?:[^"\\]|\\.)*"?)
+  | (?P<ident>`?[A-Za-z_][\w$]*`?(?:\.`?[A-Za-z_][\w$]*`?)*)
+  | (?P<num>[-+]?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)
+  | (?P<param>\?)
+  | (?P<ws>\s+)
+  | (?P<op>.)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+# IP, verb and target table in one anchored match. UPDATE names its table
+# right after the verb (and optional modifiers); the other verbs after the
+# first FROM / INTO.
+_FIELDS_RE = re.compile(
+    r"""
+    \A\s*(?P<ip>\d{1,3}(?:\.\d{1,3}){3}\b)?\s*
+    (?:
+        (?P<update>update)\s+(?:(?:low_priority|ignore)\s+)*`?(?P<update_table>[A-Za-z_][\w$]*)
+      | (?P<verb>select|insert|delete)\b
+        (?:.*?\b(?:from|into)\s+`?(?P<table>[A-Za-z_][\w$]*))?
+    )?
+    """,
+    re.VERBOSE | re.DOTALL | re.IGNORECASE,
+)
+
+# "?, ?, ?" and "?,?" lists collapse to a single marker so IN-lists and
+# VALUES tuples of different lengths share one template.
+_PARAM_LIST_RE = re.compile(r"\?(?:\s*,\s*\?)+")
+
+_VERBS = {"select", "insert", "update", "delete"}
+_TABLE_AFTER = {"insert": "into", "delete": "from", "select": "from"}
+_UPDATE_MODIFIERS = {"low_priority", "ignore"}
+
+
+class SqlFingerprint(NamedTuple):
+    ip: Optional[str]
+    query_type: str
+    sql_table: Optional[str]
+    sql_template: str
+    fingerprint_id: int
+
+
+def _stable_hash(text: str) -> int:
+    """Signed 64-bit hash that is identical across processes and runs."""
+    digest = hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little", signed=True)
+
+
+def _find_table(verb: Optional[str], words: list[str]) -> Optional[str]:
+    if verb is None:
+        return None
+    if verb == "update":
+        for word in words[1:]:
+            if word not in _UPDATE_MODIFIERS:
+                return word
+        return None
+
+    marker = _TABLE_AFTER[verb]
+    try:
+        position = words.index(marker)
+    except ValueError:
+        return None
+    return words[position + 1] if position + 1 < len(words) else None
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def fingerprint_query(query: str) -> SqlFingerprint:
+    """Tokenise one ``query_info`` string into its fingerprint.
+
+    Args:
+        query: Raw ``query_info`` value (``"<ip> <sql>"``)
+
+    Returns:
+        SqlFingerprint with ip, query_type, sql_table, sql_template and
+        fingerprint_id
+    """
+    ip = None
+    parts: list[str] = []
+    words: list[str] = []
+
+    for match in _TOKEN_RE.finditer(query):
+        kind = match.lastgroup
+        if kind == "ip":
+            ip = match.group().strip()
+        elif kind == "ident":
+            word = match.group().replace("`", "").lower()
+            words.append(word)
+            parts.append(word)
+        elif kind in ("str", "num", "param"):
+            parts.append("?")
+        elif kind == "pipe":
+            parts.append("|?|")
+        elif kind == "ws":
+            if parts and parts[-1] != " ":
+                parts.append(" ")
+        else:
+            parts.append(match.group())
+
+    template = _PARAM_LIST_RE.sub("?+", "".join(parts).strip())
+
+    verb = words[0] if words and words[0] in _VERBS else None
+    table = _find_table(verb, words)
+    query_type = verb.upper() if verb else "OTHER"
+
+    return SqlFingerprint(ip, query_type, table, template, _stable_hash(template))
+
+
+def _query_fields(query: str) -> tuple[Optional[str], str, Optional[str]]:
+    match = _FIELDS_RE.match(query)
+    ip, update, update_table, verb, table = match.group("ip", "update", "update_table", "verb", "table")
+    if update:
+        return ip, "UPDATE", update_table.lower()
+    if verb:
+        return ip, verb.upper(), table.lower() if table else None
+    return ip, "OTHER", None
+
+
+def _fingerprint_many(queries: list[str]) -> list[SqlFingerprint]:
+    return [fingerprint_query(query) for query in queries]
+
+
+def _fields_many(queries: list[str]) -> list[tuple]:
+    return [_query_fields(query) for query in queries]
+
+
+def _map_partitions(func, queries: list[str], n_jobs: int) -> list:
+    """``func`` over ``queries``, split across ``n_jobs`` processes when it is large enough."""
+    n_workers = effective_n_jobs(n_jobs)
+    if n_workers == 1 or len(queries) < PARALLEL_MIN_UNIQUES:
+        return func(queries)
+    bounds = np.linspace(0, len(queries), n_workers * _PARTITIONS_PER_JOB + 1).astype(int)
+    parts = Parallel(n_jobs=n_jobs)(delayed(func)(queries[lo:hi]) for lo, hi in zip(bounds[:-1], bounds[1:]))
+    return [item for part in parts for item in part]
+
+
+def _broadcast(rows: list, columns: list[str], codes: np.ndarray, index: pd.Index) -> pd.DataFrame:
+    """Per-unique rows back onto the original rows; code -1 takes the last row."""
+    take = np.where(codes < 0, len(rows) - 1, codes)
+    result = pd.DataFrame(rows, columns=columns).iloc[take].reset_index(drop=True)
+    result.index = index
+    result["query_type"] = pd.Categorical(result["query_type"], categories=QUERY_TYPES)
+    result["sql_table"] = result["sql_table"].astype("category")
+    result["ip"] = result["ip"].astype("category")
+    return result
+
+
+def fingerprint_series(queries: pd.Series, n_jobs: int = 1) -> pd.DataFrame:
+    """Fingerprint a ``query_info`` column.
+
+    Only the distinct strings are tokenised; results are broadcast back with
+    the factorized codes, so the cost is O(unique queries) rather than O(rows).
+
+    Args:
+        queries: Series of raw ``query_info`` strings (NaN allowed)
+        n_jobs: Processes for the distinct strings (-1 = all cores)
+
+    Returns:
+        DataFrame aligned with ``queries.index`` with FINGERPRINT_COLUMNS.
+        ``query_type``, ``sql_table`` and ``ip`` are categoricals and
+        ``fingerprint_id`` is int64.
+    """
+    codes, uniques = pd.factorize(queries, use_na_sentinel=True)
+    parsed = _map_partitions(_fingerprint_many, [str(q) for q in uniques], n_jobs)
+    parsed.append(SqlFingerprint(None, "OTHER", None, "", _stable_hash("")))
+
+    result = _broadcast(parsed, FINGERPRINT_COLUMNS, codes, queries.index)
+    result["fingerprint_id"] = result["fingerprint_id"].astype("int64")
+    return result
+
+
+def extract_fields(queries: pd.Series, n_jobs: int = 1) -> pd.DataFrame:
+    """``ip``, ``query_type`` and ``sql_table`` of a ``query_info`` column.
+
+    Same values as :func:`fingerprint_series` for these three columns, from
+    one combined pattern match per distinct string and without a template.
+
+    Args:
+        queries: Series of raw ``query_info`` strings (NaN allowed)
+        n_jobs: Processes for the distinct strings (-1 = all cores)
+
+    Returns:
+        DataFrame aligned with ``queries.index`` with categorical ``ip``,
+        ``query_type`` and ``sql_table``
+    """
+    codes, uniques = pd.factorize(queries, use_na_sentinel=True)
+    parsed = _map_partitions(_fields_many, [str(q) for q in uniques], n_jobs)
+    parsed.append((None, "OTHER", None))
+    return _broadcast(parsed, ["ip", "query_type", "sql_table"], codes, queries.index)
+
+
+def ip_last_octet(ips: pd.Series) -> pd.Series:
+    """Last octet of an ``ip`` column as int16 (0 when missing).
+
+    Computed once per distinct address on the categories of ``ips``.
+    """
+    ips = ips.astype("category")
+    octets = np.array([int(ip.rsplit(".", 1)[-1]) for ip in ips.cat.categories.astype(str)] + [0],
+                      dtype=np.int16)
+    # Code -1 (missing address) picks the trailing 0.
+    return pd.Series(octets[ips.cat.codes.to_numpy()], index=ips.index)
+
+
+def add_fingerprint_columns(df: pd.DataFrame, column: str = "query_info", n_jobs: int = 1) -> pd.DataFrame:
+    """Return ``df`` with the fingerprint columns attached (existing ones replaced)."""
+    fingerprints = fingerprint_series(df[column], n_jobs=n_jobs)
+    df = df.drop(columns=[c for c in FINGERPRINT_COLUMNS if c in df.columns])
+    return pd.concat([df, fingerprints], axis=1)
+
+
+def cache_info():
+    """Expose LRU statistics of the template memo (hits, misses, currsize)."""
+    return fingerprint_query.cache_info()
@@ -0,0 +1,804 @@
+"""Long-running scorer for new tracker events (tail a log or poll a table).
+
+The stage scripts score a finished export. This daemon scores events as they
+are written, with the model bundle of the registry (``models/registry``):
+
+    source ──► queue (bounded) ──► micro-batch ──► parse → featurize →
+                                                   scale → LOF novelty score
+                                                        │
+                  checkpoint (offset + state) ◄── artifact store
+                                                  (tracker_scored, tracker_alerts,
+                                                   tracker_alert_bursts)
+
+* **Sources.** :class:`FileTailSource` follows a growing tracker log
+  (``timestamp<TAB>query_info<TAB>user_id`` as in ``tracker januar5000i.csv``)
+  by byte offset and only hands over complete lines; a truncated or replaced
+  file (new inode) is read again from the start. :class:`TablePollSource`
+  polls an audit table for rows with a timestamp after the last one seen.
+* **Backpressure.** The reader puts chunks on a bounded ``asyncio.Queue``.
+  While scoring falls behind, ``put`` waits, so the reader stops reading and
+  the log file itself is the buffer; memory stays bounded.
+* **Micro-batches.** A batch is closed after ``flush_ms`` from its first
+  chunk or at ``max_batch`` rows, whichever comes first, and is scored in a
+  worker thread so the event loop keeps serving metrics.
+* **Features.** :class:`StreamFeaturizer` produces the model's feature
+  columns causally: calendar fields and operation one-hot from the event,
+  per-user profiles from :class:`~pipeline.user_profiles.ProfileStore`,
+  sliding windows from :class:`~pipeline.window_features.WindowFeatureEngine`
+  the table profile from the bundle's projector with
+  :class:`~pipeline.sparse_features.SparseBlockStream` and login sessions
+  from :class:`~pipeline.sessions.SessionTracker`. Aggregates that stage 03
+  takes over a whole session or day are the values *so far* here, because
+  the rest has not happened yet. Columns that cannot be computed (e.g. a
+  bundle without a table-profile projector) are imputed with the scaler
+  mean, i.e. they contribute 0 after scaling, and are listed in the metrics
+  as ``imputed_features``.
+* **Alerts.** Because the so-far aggregates shift the score distribution
+  away from the training one, a percentile rule is applied to the scores of
+  the stream itself (a :class:`~pipeline.score_threshold.ScoreThreshold`
+  sketch that is checkpointed with the rest of the state); no alerts are
+  raised before ``calibration_min`` events. An absolute score rule in the
+  bundle is used as is. Alerts of the same user, IP and statement
+  fingerprint are also rolled up into one row per burst by
+  :class:`~pipeline.alert_bursts.BurstAggregator` (``tracker_alert_bursts``).
+* **Checkpoints.** After a batch is written, the source position and the
+  featurizer/threshold state are saved (state first, then offsets, each with an
+  atomic rename). A restart continues after the last written batch; a crash
+  between writing a batch and its checkpoint re-scores that one batch
+  (at-least-once).
+* **Metrics.** ``GET /metrics`` on ``--port`` returns JSON with counters,
+  throughput (overall and last minute), event latency from read to written
+  (p50/p99), batch processing time and queue depth. ``GET /healthz`` answers
+  503 once the reader or scorer has failed; the daemon then stops and
+  re-raises the error, so the process exits non-zero.
+
+Run against a local file fed by the built-in replay writer::
+
+    python -m pipeline.tail_daemon --file data/stream/tracker.log \\
+        --replay "tracker januar5000i.csv" --replay-rate 2000 --port 8765
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
+from datetime import datetime
+from pathlib import Path
+from typing import AsyncIterator, NamedTuple, Optional, Sequence
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from pipeline.alert_bursts import DEFAULT_GAP, DEFAULT_MAX_KEYS, DEFAULT_MAX_SPAN, BurstAggregator
+from pipeline.artifact_store import ArtifactStore
+from pipeline.model_registry import ModelBundle, ModelRegistry
+from pipeline.score_threshold import ScoreThreshold
+from pipeline.sessions import SESSION_FEATURE_COLUMNS, SessionTracker
+from pipeline.sparse_features import BlockProjector, SparseBlockStream
+from pipeline.sql_fingerprint import extract_fields, fingerprint_series
+from pipeline.timeparse import WORK_END, WORK_START, calendar_fields, combine_date_time, epoch_seconds, parse_timestamps
+from pipeline.user_profiles import PROFILE_STORE_PATH, ProfileStore
+from pipeline.window_features import WindowFeatureEngine
+
+
+RAW_COLUMNS = ["timestamp", "query_info", "user_id"]
+CHECKPOINT_DIR = "data/stream/checkpoint"
+SCORED_DATASET = "tracker_scored"
+ALERTS_DATASET = "tracker_alerts"
+BURSTS_DATASET = "tracker_alert_bursts"
+PROFILE_DATASET = "tracker_stream"   # kept apart from the batch profiles of stage 03
+DEFAULT_FLUSH_MS = 500
+DEFAULT_MAX_BATCH = 5_000
+DEFAULT_QUEUE_CHUNKS = 64
+DEFAULT_READ_BYTES = 1 << 20
+DEFAULT_CALIBRATION_MIN = 500        # stream scores needed before the percentile rule raises alerts
+METRICS_WINDOW = 4096                # batches kept for latency percentiles
+THROUGHPUT_WINDOW_S = 60.0
+
+TEMPORAL_FEATURES = ["hour", "day_of_week", "month", "day_of_month", "IsOutsideWorkHours", "IsWeekend", "NightShift"]
+PROFILE_FEATURES = {
+    "frekuensi_aktivitas_per_user": "events",
+    "jumlah_tipe_operasi_unik": "distinct_ops",
+    "rasio_operasi_modifikasi": "modification_ratio",
+    "pola_waktu_akses": "hour_std",
+}
+
+
+class SourceChunk(NamedTuple):
+    frame: pd.DataFrame    # RAW_COLUMNS as strings
+    position: dict         # source position after this chunk
+    rejected: int          # lines that could not be split into RAW_COLUMNS
+    read_at: float         # time.monotonic() when the chunk was read
+
+
+def parse_lines(lines: Sequence[str]) -> tuple[pd.DataFrame, int]:
+    """Split raw tracker log lines into RAW_COLUMNS; returns the frame and the rejected count.
+
+    The user id is the last field and the timestamp the first, so a tab
+    inside the SQL text stays in ``query_info``.
+    """
+    rows = []
+    for line in lines:
+        head, sep, user = line.rstrip("\r\n").rpartition("\t")
+        timestamp, sep2, query = head.partition("\t")
+        if sep and sep2:
+            rows.append((timestamp, query, user))
+    return pd.DataFrame(rows, columns=RAW_COLUMNS, dtype=object), len(lines) - len(rows)
+
+
+# ------------------------------------------------------------------ sources
+class FileTailSource:
+    """Complete new lines of a growing log file, resumable by byte offset.
+
+    Args:
+        path: Log file (may not exist yet)
+        poll_interval: Seconds to wait when there is nothing new
+        read_bytes: Largest read per chunk
+    """
+
+    kind = "file"
+
+    def __init__(self, path, poll_interval: float = 0.2, read_bytes: int = DEFAULT_READ_BYTES,
+                 encoding: str = "utf-8"):
+        self.path = Path(path)
+        self.poll_interval = poll_interval
+        self.read_bytes = read_bytes
+        self.encoding = encoding
+        self.inode: Optional[int] = None
+        self.offset = 0
+
+    def position(self) -> dict:
+        return {"kind": self.kind, "path": str(self.path), "inode": self.inode, "offset": self.offset}
+
+    def restore(self, position: dict) -> None:
+        if position.get("kind") == self.kind and position.get("path") == str(self.path):
+            self.inode = position.get("inode")
+            self.offset = int(position.get("offset", 0))
+
+    def _read(self) -> Optional[SourceChunk]:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        if stat.st_ino != self.inode or stat.st_size < self.offset:
+            # First read, rotation or truncation: (re)start at the beginning
+            self.inode, self.offset = stat.st_ino, 0
+        if stat.st_size == self.offset:
+            return None
+
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            data = f.read(self.read_bytes)
+        end = data.rfind(b"\n")
+        if end < 0:
+            if len(data) == self.read_bytes:
+                raise ValueError(f"{self.path}: line at byte {self.offset} is longer than {self.read_bytes} bytes")
+            return None   # the writer is in the middle of a line
+        data = data[:end + 1]
+        self.offset += len(data)
+        frame, rejected = parse_lines(data.decode(self.encoding, errors="replace").splitlines())
+        return SourceChunk(frame, self.position(), rejected, time.monotonic())
+
+    async def chunks(self) -> AsyncIterator[SourceChunk]:
+        while True:
+            chunk = await asyncio.to_thread(self._read)
+            if chunk is None:
+                await asyncio.sleep(self.poll_interval)
+            else:
+                yield chunk
+
+
+class TablePollSource:
+    """Rows of an audit table with a timestamp after the last one seen.
+
+    Rows are fetched in timestamp order, ``limit`` at a time. The position
+    is the last timestamp read and how many rows of it were delivered; the
+    next poll starts at that timestamp and skips those rows (``OFFSET``), so
+    a second with more than ``limit`` rows (an alert storm) is drained over
+    several polls instead of being cut off. Rows that are inserted later
+    with a timestamp before the last one seen are not picked up.
+
+    Args:
+        dsn: SQLAlchemy DSN (see :mod:`pipeline.db_ingest`)
+        table: Audit table name (``schema.table`` allowed)
+        time_col / query_col / user_col: Its columns for RAW_COLUMNS
+
+    Raises:
+        ValueError: when a table or column name is not a plain identifier
+    """
+
+    kind = "table"
+
+    def __init__(self, dsn, table: str, time_col: str = "timestamp", query_col: str = "query_info",
+                 user_col: str = "user_id", poll_interval: float = 1.0, limit: int = DEFAULT_MAX_BATCH):
+        from pipeline.db_ingest import get_engine, quote_identifier
+
+        self.dsn = dsn
+        self.table = table
+        self.poll_interval = poll_interval
+        self.limit = limit
+        self.since = "1970-01-01 00:00:00"
+        self.skip = 0   # rows at ``since`` already delivered
+        engine = get_engine(dsn)
+        table = quote_identifier(engine, table, "table", qualified=True)
+        time_col, query_col, user_col = (quote_identifier(engine, col) for col in (time_col, query_col, user_col))
+        self.query = (
+            f"SELECT {time_col} AS timestamp, {query_col} AS query_info, {user_col} AS user_id "
+            f"FROM {table} WHERE {time_col} >= :since ORDER BY {time_col} LIMIT {int(limit)} OFFSET :skip"
+        )
+
+    def position(self) -> dict:
+        return {"kind": self.kind, "table": self.table, "since": self.since, "skip": self.skip}
+
+    def restore(self, position: dict) -> None:
+        if position.get("kind") == self.kind and position.get("table") == self.table:
+            self.since = position["since"]
+            self.skip = position.get("skip", 0)
+
+    def _read(self) -> Optional[SourceChunk]:
+        from pipeline.db_ingest import iter_query
+
+        chunks = list(iter_query(self.dsn, self.query, params={"since": self.since, "skip": self.skip}))
+        frame = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=RAW_COLUMNS)
+        if frame.empty:
+            return None
+        frame = frame.astype({col: str for col in RAW_COLUMNS})
+        last = frame["timestamp"].iloc[-1]
+        same_second = int((frame["timestamp"] == last).sum())
+        self.skip = self.skip + same_second if last == self.since else same_second
+        self.since = last
+        return SourceChunk(frame[RAW_COLUMNS], self.position(), 0, time.monotonic())
+
+    async def chunks(self) -> AsyncIterator[SourceChunk]:
+        while True:
+            chunk = await asyncio.to_thread(self._read)
+            if chunk is None:
+                await asyncio.sleep(self.poll_interval)
+            else:
+                yield chunk
+
+
+# -------------------------------------------------------------- featurizing
+class StreamFeaturizer:
+    """Model feature columns for raw tracker rows, using only earlier events.
+
+    Args:
+        feature_columns: Columns of the model bundle, in order
+        table_profile: The bundle's BlockProjector for ``profil_tabel_*``
+        logins: Staff logins (``user_id``, ``datetime``) for the session features
+        profile_path / profile_dataset: Where the per-user profiles live
+        session_max_duration: As ``SESSION_MAX_DURATION`` in stage 03
+    """
+
+    def __init__(
+        self,
+        feature_columns: Sequence[str],
+        table_profile: Optional[BlockProjector] = None,
+        logins: Optional[pd.DataFrame] = None,
+        profile_path=PROFILE_STORE_PATH,
+        profile_dataset: str = PROFILE_DATASET,
+        session_max_duration: str = "12h",
+    ):
+        self.feature_columns = list(feature_columns)
+        self.profile_path = profile_path
+        self.profile_dataset = profile_dataset
+        self.windows = WindowFeatureEngine()
+        self.sessions = SessionTracker(logins, max_duration=session_max_duration)
+        self.tables = SparseBlockStream(table_profile, token_col="sql_table") if table_profile is not None else None
+        self._profiles: Optional[ProfileStore] = None
+
+        computed = set(TEMPORAL_FEATURES) | set(PROFILE_FEATURES) | set(self.windows.columns) | set(SESSION_FEATURE_COLUMNS)
+        if self.tables is not None:
+            computed |= set(self.tables.columns)
+        self.imputed = [col for col in self.feature_columns if col not in computed and not col.startswith("op_")]
+
+    @property
+    def profiles(self) -> ProfileStore:
+        # Opened on first use, i.e. in the thread that scores (sqlite3 connections are per thread)
+        if self._profiles is None:
+            self._profiles = ProfileStore(self.profile_path)
+        return self._profiles
+
+    def transform(self, raw: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+        """(events with metadata columns, features aligned with them); unparseable rows are dropped."""
+        events = raw.copy()
+        events["datetime"] = parse_timestamps(events["timestamp"], source="tracker")
+        events["user_id"] = pd.to_numeric(events["user_id"], errors="coerce")
+        events = events[events["datetime"].notna() & events["user_id"].notna()].reset_index(drop=True)
+        events["user_id"] = events["user_id"].astype(np.int64)
+        if events.empty:
+            return events.assign(epoch_s=0, ip=None, query_type=None, sql_table=None).iloc[:0], \
+                pd.DataFrame(columns=self.feature_columns, dtype=np.float64)
+        events["epoch_s"] = epoch_seconds(events["datetime"])
+        fields = extract_fields(events["query_info"])
+        for col in ("ip", "query_type", "sql_table"):
+            events[col] = fields[col].astype(object).to_numpy()
+
+        features = pd.DataFrame(index=events.index)
+        calendar = calendar_fields(events["epoch_s"])
+        for col in ("hour", "day_of_week", "month", "day_of_month"):
+            features[col] = calendar[col].astype(np.int64)
+        features["IsOutsideWorkHours"] = ((features["hour"] < WORK_START) | (features["hour"] >= WORK_END)).astype(int)
+        features["IsWeekend"] = features["day_of_week"].isin([5, 6]).astype(int)
+        features["NightShift"] = ((features["hour"] >= 21) | (features["hour"] < 6)).astype(int)
+        for col in self.feature_columns:
+            if col.startswith("op_"):
+                features[col] = events["query_type"].eq(col[3:]).astype(int)
+
+        self.profiles.update(self.profile_dataset, events[["user_id", "epoch_s", "query_info", "query_type", "sql_table"]],
+                             skip_seen=False)
+        profiles = self.profiles.features(self.profile_dataset, events["user_id"])
+        for col, source in PROFILE_FEATURES.items():
+            features[col] = profiles[source].to_numpy(dtype=np.float64)
+
+        blocks = [features, self.windows.update(events[["user_id", "datetime"]]), self.sessions.update(events)]
+        if self.tables is not None:
+            blocks.append(self.tables.update(events))
+        return events, pd.concat(blocks, axis=1).reindex(columns=self.feature_columns)
+
+    def close(self) -> None:
+        if self._profiles is not None:
+            self._profiles.close()
+            self._profiles = None
+
+    def expire(self, now) -> None:
+        self.windows.expire(now)
+        self.sessions.expire(now)
+        if self.tables is not None:
+            self.tables.expire(now)
+
+    def state(self) -> dict:
+        return {"windows": self.windows, "sessions": self.sessions, "tables": self.tables}
+
+    def restore(self, state: dict) -> None:
+        self.windows = state["windows"]
+        self.sessions = state["sessions"]
+        self.tables = state["tables"]
+
+
+class Checkpoint:
+    """Source position (``offsets.json``) and featurizer state (``state.joblib``)."""
+
+    def __init__(self, directory=CHECKPOINT_DIR):
+        self.dir = Path(directory)
+        self.offsets_path = self.dir / "offsets.json"
+        self.state_path = self.dir / "state.joblib"
+
+    def load(self) -> tuple[Optional[dict], Optional[dict]]:
+        if not self.offsets_path.exists():
+            return None, None
+        saved = json.loads(self.offsets_path.read_text(encoding="utf-8"))
+        state = joblib.load(self.state_path) if self.state_path.exists() else None
+        return saved, state
+
+    def save(self, position: dict, state: dict, stats: Optional[dict] = None) -> None:
+        self.dir.mkdir(parents=True, exist_ok=True)
+        tmp_state = self.state_path.with_suffix(".tmp")
+        joblib.dump(state, tmp_state)
+        os.replace(tmp_state, self.state_path)
+        tmp_offsets = self.offsets_path.with_suffix(".tmp")
+        tmp_offsets.write_text(json.dumps({"position": position, "stats": stats or {},
+                                           "updated": datetime.now().isoformat(timespec="seconds")}, indent=2),
+                               encoding="utf-8")
+        os.replace(tmp_offsets, self.offsets_path)
+
+    def reset(self) -> None:
+        for path in (self.offsets_path, self.state_path):
+            path.unlink(missing_ok=True)
+
+
+# ------------------------------------------------------------------ metrics
+def _weighted_percentiles(values: np.ndarray, weights: np.ndarray, percentiles=(50, 99)) -> dict:
+    if len(values) == 0 or weights.sum() == 0:
+        return {f"p{p}": None for p in percentiles}
+    order = np.argsort(values)
+    cumulative = np.cumsum(weights[order]) / weights.sum()
+    return {f"p{p}": float(values[order][min(np.searchsorted(cumulative, p / 100), len(values) - 1)])
+            for p in percentiles}
+
+
+class DaemonMetrics:
+    """Counters plus recent per-batch latencies for ``GET /metrics``."""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.lines_read = 0
+        self.rejected = 0
+        self.dropped = 0
+        self.events_scored = 0
+        self.alerts = 0
+        self.batches = 0
+        self.backpressure_waits = 0
+        self.queue_depth = 0
+        self.position: Optional[dict] = None
+        self._latency = deque(maxlen=METRICS_WINDOW)   # (seconds from read to written, events)
+        self._batch_seconds = deque(maxlen=METRICS_WINDOW)
+        self._recent = deque()                           # (finished at, events)
+
+    def record_batch(self, chunks: Sequence[SourceChunk], events: int, alerts: int, seconds: float) -> None:
+        now = time.monotonic()
+        self.batches += 1
+        self.dropped += sum(len(chunk.frame) for chunk in chunks) - events
+        self.events_scored += events
+        self.alerts += alerts
+        self._batch_seconds.append(seconds)
+        for chunk in chunks:
+            self._latency.append((now - chunk.read_at, len(chunk.frame)))
+        self._recent.append((now, events))
+        while self._recent and self._recent[0][0] < now - THROUGHPUT_WINDOW_S:
+            self._recent.popleft()
+        self.position = chunks[-1].position
+
+    def snapshot(self) -> dict:
+        uptime = time.monotonic() - self.started
+        latency = np.array(self._latency, dtype=np.float64).reshape(-1, 2)
+        batch = np.array(self._batch_seconds, dtype=np.float64)
+        recent_span = min(uptime, THROUGHPUT_WINDOW_S)
+        return {
+            "uptime_s": round(uptime, 1),
+            "lines_read": self.lines_read,
+            "rejected_lines": self.rejected,
+            "dropped_rows": self.dropped,        # no valid timestamp or user id
+            "events_scored": self.events_scored,
+            "alerts": self.alerts,
+            "batches": self.batches,
+            "throughput_eps": round(self.events_scored / uptime, 1) if uptime else 0.0,
+            "throughput_eps_1m": round(sum(n for _, n in self._recent) / recent_span, 1) if recent_span else 0.0,
+            "latency_ms": {k: None if v is None else round(v * 1000, 1)
+                           for k, v in _weighted_percentiles(latency[:, 0], latency[:, 1]).items()},
+            "batch_ms": {k: None if v is None else round(v * 1000, 1)
+                         for k, v in _weighted_percentiles(batch, np.ones(len(batch))).items()},
+            "queue_depth": self.queue_depth,
+            "backpressure_waits": self.backpressure_waits,
+            "position": self.position,
+        }
+
+
+# ------------------------------------------------------------------- daemon
+class TailDaemon:
+    """Source -> bounded queue -> micro-batches -> score -> artifact store.
+
+    Args:
+        source: :class:`FileTailSource` or :class:`TablePollSource`
+        bundle: Model bundle with a scaler, LOF reference data and threshold
+        featurizer: Defaults to a :class:`StreamFeaturizer` for the bundle
+        store: Artifact store receiving SCORED_DATASET and ALERTS_DATASET
+        checkpoint: Where positions and state are saved (restored on start)
+        flush_ms / max_batch: Micro-batch limits
+        queue_chunks: Chunks the reader may run ahead of the scorer
+        calibration_min: Stream scores needed before percentile alerts
+        bursts: Aggregator for the alerts (default: BurstAggregator())
+        metrics_port: Serve ``GET /metrics`` on this port (None = off)
+    """
+
+    def __init__(
+        self,
+        source,
+        bundle: ModelBundle,
+        featurizer: Optional[StreamFeaturizer] = None,
+        store: Optional[ArtifactStore] = None,
+        checkpoint: Optional[Checkpoint] = None,
+        flush_ms: int = DEFAULT_FLUSH_MS,
+        max_batch: int = DEFAULT_MAX_BATCH,
+        queue_chunks: int = DEFAULT_QUEUE_CHUNKS,
+        calibration_min: int = DEFAULT_CALIBRATION_MIN,
+        bursts: Optional[BurstAggregator] = None,
+        metrics_port: Optional[int] = None,
+        metrics_host: str = "127.0.0.1",
+    ):
+        if bundle.lof is None or bundle.scaler is None:
+            raise ValueError(f"Bundle {bundle.name} v{bundle.version} needs a scaler and LOF reference data")
+        self.source = source
+        self.bundle = bundle
+        self.featurizer = featurizer or StreamFeaturizer(bundle.feature_columns, table_profile=bundle.table_profile)
+        self.store = store or ArtifactStore()
+        self.checkpoint = checkpoint or Checkpoint()
+        self.flush_ms = flush_ms
+        self.max_batch = max_batch
+        self.queue_chunks = queue_chunks
+        self.calibration_min = calibration_min
+        self.bursts = bursts if bursts is not None else BurstAggregator()   # empty aggregators are falsy
+        self.metrics_port = metrics_port
+        self.metrics_host = metrics_host
+        self.metrics = DaemonMetrics()
+
+        rule = bundle.threshold or ScoreThreshold()
+        self.threshold = ScoreThreshold(percentile=rule.percentile, score=rule.score)
+        self._calibration = (None, 0)
+        self._impute = np.asarray(bundle.scaler.mean_, dtype=np.float64)
+        self._writers = {dataset: self.store.open_writer(dataset)
+                         for dataset in (SCORED_DATASET, ALERTS_DATASET, BURSTS_DATASET)}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tail-score")
+        self._tasks: dict = {}
+
+        position, state = self.checkpoint.load()
+        if position is not None:
+            self.source.restore(position["position"])
+            if state is not None:
+                self.featurizer.restore(state["featurizer"])
+                self.threshold = state["threshold"]
+                self.bursts = state["bursts"]
+
+    @property
+    def cutoff(self) -> float:
+        """Current LOF cutoff (inf while the stream sketch is still calibrating)."""
+        if self.threshold.rule == "percentile" and self.threshold.sketch.n < self.calibration_min:
+            return float("inf")
+        return self.threshold.cutoff()
+
+    # ---------------------------------------------------------------- scoring
+    def score_frame(self, raw: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+        """Scored events and the alerts among them for raw rows (RAW_COLUMNS)."""
+        events, features = self.featurizer.transform(raw)
+        X = features.to_numpy(dtype=np.float64)
+        X = np.where(np.isnan(X), self._impute, X)
+        scores = self.bundle.lof.score_samples(self.bundle.scaler.transform(X)) if len(X) else np.zeros(0)
+        self.threshold.fit(scores)
+        cutoff = self.cutoff
+        # describe() runs on the event loop: hand it a snapshot instead of the live sketch
+        self._calibration = (cutoff if np.isfinite(cutoff) else None, self.threshold.sketch.n)
+
+        scored = events[["timestamp", "datetime", "user_id", "ip", "query_type", "sql_table", "query_info"]].copy()
+        scored["lof_score"] = scores
+        scored["is_anomaly"] = (scores > cutoff).astype(int)
+        scored["model_version"] = self.bundle.version
+        scored["scored_at"] = pd.Timestamp.now()
+        alerts = scored[scored["is_anomaly"] == 1].copy()
+        alerts["score_percentile"] = [self.threshold.percentile_of(s) for s in alerts["lof_score"]]
+        alerts["fingerprint_id"] = fingerprint_series(alerts["query_info"])["fingerprint_id"].to_numpy()
+        return scored, alerts
+
+    def _process(self, chunks: list[SourceChunk]) -> tuple[int, int, float]:
+        started = time.perf_counter()
+        raw = pd.concat([chunk.frame for chunk in chunks], ignore_index=True)
+        scored, alerts = self.score_frame(raw)
+        self._writers[SCORED_DATASET].write(scored)
+        self._writers[ALERTS_DATASET].write(alerts)
+        bursts = [self.bursts.update(alerts)]
+        if not scored.empty:
+            self.featurizer.expire(scored["datetime"].max())
+            bursts.append(self.bursts.expire(scored["datetime"].max()))
+        self._writers[BURSTS_DATASET].write(pd.concat(bursts, ignore_index=True))
+        self.checkpoint.save(chunks[-1].position,
+                             {"featurizer": self.featurizer.state(), "threshold": self.threshold, "bursts": self.bursts},
+                             stats={"events_scored": self.metrics.events_scored + len(scored)})
+        return len(scored), len(alerts), time.perf_counter() - started
+
+    # ------------------------------------------------------------------ loop
+    async def _produce(self, queue: asyncio.Queue) -> None:
+        async for chunk in self.source.chunks():
+            self.metrics.lines_read += len(chunk.frame) + chunk.rejected
+            self.metrics.rejected += chunk.rejected
+            if queue.full():
+                self.metrics.backpressure_waits += 1
+            await queue.put(chunk)   # waits while the scorer is behind
+            self.metrics.queue_depth = queue.qsize()
+
+    async def _consume(self, queue: asyncio.Queue) -> None:
+        loop = asyncio.get_running_loop()
+        done = False
+        while not done:
+            first = await queue.get()
+            if first is None:
+                break
+            batch, rows = [first], len(first.frame)
+            deadline = loop.time() + self.flush_ms / 1000
+            while rows < self.max_batch:
+                try:
+                    item = await asyncio.wait_for(queue.get(), max(deadline - loop.time(), 0))
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    done = True
+                    break
+                batch.append(item)
+                rows += len(item.frame)
+            self.metrics.queue_depth = queue.qsize()
+            events, alerts, seconds = await loop.run_in_executor(self._executor, self._process, batch)
+            self.metrics.record_batch(batch, events, alerts, seconds)
+
+    async def _serve_metrics(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request = (await reader.readline()).decode("latin-1").split()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            path = request[1] if len(request) > 1 else "/"
+            if path in ("/", "/metrics"):
+                status, body = "200 OK", self.describe()
+            elif path == "/healthz":
+                failure = self.failure()
+                status, body = ("200 OK", {"status": "ok"}) if failure is None else \
+                    ("503 Service Unavailable", {"status": "failed", "error": failure})
+            else:
+                status, body = "404 Not Found", {"error": f"unknown path {path}"}
+            payload = json.dumps(body, default=str).encode("utf-8")
+            writer.write(f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+                         f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode("latin-1") + payload)
+            await writer.drain()
+        finally:
+            writer.close()
+
+    def failure(self) -> Optional[str]:
+        """Why the reader or scorer stopped (None while both run)."""
+        for name, task in self._tasks.items():
+            if not task.done():
+                continue
+            if not task.cancelled() and task.exception() is not None:
+                return f"{name}: {task.exception()!r}"
+            if name == "consumer":
+                return "consumer: stopped"
+        return None
+
+    def describe(self) -> dict:
+        return {
+            **self.metrics.snapshot(),
+            "model": {"name": self.bundle.name, "version": self.bundle.version},
+            "bursts": {"open": len(self.bursts), **self.bursts.stats},
+            "threshold": {"rule": self.threshold.rule, "percentile": self.threshold.percentile,
+                          "cutoff": self._calibration[0], "calibrated_on": self._calibration[1]},
+            "imputed_features": self.featurizer.imputed,
+            "flush_ms": self.flush_ms,
+            "max_batch": self.max_batch,
+            "queue_chunks": self.queue_chunks,
+        }
+
+    async def run(self, stop: Optional[asyncio.Event] = None) -> dict:
+        """Score until ``stop`` is set; the queued chunks are scored before returning."""
+        stop = stop or asyncio.Event()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_chunks)
+        server = None
+        if self.metrics_port is not None:
+            server = await asyncio.start_server(self._serve_metrics, self.metrics_host, self.metrics_port)
+        producer = asyncio.create_task(self._produce(queue))
+        consumer = asyncio.create_task(self._consume(queue))
+        stopped = asyncio.create_task(stop.wait())
+        self._tasks = {"producer": producer, "consumer": consumer}
+        try:
+            await asyncio.wait([stopped, producer, consumer], return_when=asyncio.FIRST_COMPLETED)
+            producer.cancel()
+            with suppress(asyncio.CancelledError):
+                await producer
+            if not consumer.done():
+                # A scorer failing now would leave the queue full and the sentinel unqueued
+                closing = asyncio.create_task(queue.put(None))
+                await asyncio.wait([closing, consumer], return_when=asyncio.FIRST_COMPLETED)
+                closing.cancel()
+            await consumer   # re-raises a scorer failure
+        finally:
+            stopped.cancel()
+            consumer.cancel()
+            if server is not None:
+                server.close()
+                await server.wait_closed()
+            self._executor.submit(self.featurizer.close).result()   # the connection belongs to the worker thread
+            self._executor.shutdown(wait=True)
+        return self.describe()
+
+
+# ------------------------------------------------------------------ helpers
+async def replay_log(source, target, rate: float = 1000.0, chunk_lines: int = 100) -> int:
+    """Append the lines of ``source`` to ``target`` at about ``rate`` lines/s.
+
+    A local stand-in for the application writing its tracker log, used to
+    exercise the daemon. Returns the number of lines written.
+    """
+    lines = [line if line.endswith("\n") else line + "\n"
+             for line in Path(source).read_text(encoding="utf-8").splitlines()]
+    Path(target).parent.mkdir(parents=True, exist_ok=True)
+    with open(target, "a", encoding="utf-8") as f:
+        for start in range(0, len(lines), chunk_lines):
+            f.writelines(lines[start:start + chunk_lines])
+            f.flush()
+            await asyncio.sleep(chunk_lines / rate)
+    return len(lines)
+
+
+def load_logins(path) -> Optional[pd.DataFrame]:
+    """Staff logins from ``data/cleaned/staff_cleaned.csv`` (None if the file is missing)."""
+    if not Path(path).exists():
+        return None
+    logins = pd.read_csv(path, usecols=["user_id", "date", "timestamp"])
+    logins["datetime"] = combine_date_time(logins["date"], logins["timestamp"], source="staff")
+    return logins[["user_id", "datetime"]]
+
+
+def build_daemon(args: argparse.Namespace) -> TailDaemon:
+    bundle = ModelRegistry(args.registry).load(args.model, args.version)
+    if args.table:
+        source = TablePollSource(args.dsn, args.table, time_col=args.time_col, query_col=args.query_col,
+                                 user_col=args.user_col, poll_interval=args.poll_interval, limit=args.max_batch)
+    else:
+        source = FileTailSource(args.file, poll_interval=args.poll_interval)
+    checkpoint = Checkpoint(args.checkpoint_dir)
+    store = ArtifactStore(args.store)
+    featurizer = StreamFeaturizer(bundle.feature_columns, table_profile=bundle.table_profile,
+                                  logins=load_logins(args.logins), profile_path=args.profile_store)
+    if args.reset:
+        checkpoint.reset()
+        profiles = ProfileStore(args.profile_store)
+        if args.seed_profiles:
+            profiles.copy(args.seed_profiles, PROFILE_DATASET)
+        else:
+            profiles.reset(PROFILE_DATASET)
+        profiles.close()
+        for dataset in (SCORED_DATASET, ALERTS_DATASET, BURSTS_DATASET):
+            store.reset(dataset)
+    return TailDaemon(source, bundle, featurizer=featurizer, store=store, checkpoint=checkpoint,
+                      flush_ms=args.flush_ms, max_batch=args.max_batch, queue_chunks=args.queue_chunks,
+                      calibration_min=args.calibration_min, metrics_port=args.port,
+                      bursts=BurstAggregator(gap=args.burst_gap, max_span=args.burst_max_span,
+                                             max_keys=args.burst_max_keys))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--file", default="data/stream/tracker.log", help="Tracker log to tail")
+    parser.add_argument("--table", help="Poll this audit table instead of tailing --file")
+    parser.add_argument("--dsn", help="SQLAlchemy DSN for --table")
+    parser.add_argument("--time-col", default="timestamp")
+    parser.add_argument("--query-col", default="query_info")
+    parser.add_argument("--user-col", default="user_id")
+    parser.add_argument("--model", default="tracker")
+    parser.add_argument("--version", type=int, help="Bundle version (default: latest)")
+    parser.add_argument("--registry", default="models/registry")
+    parser.add_argument("--store", default="data/store")
+    parser.add_argument("--profile-store", default=PROFILE_STORE_PATH)
+    parser.add_argument("--logins", default="data/cleaned/staff_cleaned.csv")
+    parser.add_argument("--checkpoint-dir", default=CHECKPOINT_DIR)
+    parser.add_argument("--flush-ms", type=int, default=DEFAULT_FLUSH_MS)
+    parser.add_argument("--max-batch", type=int, default=DEFAULT_MAX_BATCH)
+    parser.add_argument("--queue-chunks", type=int, default=DEFAULT_QUEUE_CHUNKS)
+    parser.add_argument("--calibration-min", type=int, default=DEFAULT_CALIBRATION_MIN)
+    parser.add_argument("--burst-gap", default=DEFAULT_GAP, help="Largest pause inside an alert burst")
+    parser.add_argument("--burst-max-span", default=DEFAULT_MAX_SPAN)
+    parser.add_argument("--burst-max-keys", type=int, default=DEFAULT_MAX_KEYS)
+    parser.add_argument("--poll-interval", type=float, default=0.2)
+    parser.add_argument("--port", type=int, default=8765, help="Metrics port (0 = off)")
+    parser.add_argument("--reset", action="store_true", help="Drop checkpoint, stream profiles and outputs first")
+    parser.add_argument("--seed-profiles", help="With --reset: start from the profiles of this dataset "
+                                                "(e.g. 'tracker' from stage 03) instead of empty ones")
+    parser.add_argument("--replay", help="Append this tracker export to --file while running (local test writer)")
+    parser.add_argument("--replay-rate", type=float, default=1000.0, help="Replay lines per second")
+    args = parser.parse_args()
+    args.port = args.port or None
+    if args.table and not args.dsn:
+        parser.error("--table needs --dsn")
+
+    async def run() -> dict:
+        daemon = build_daemon(args)
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            with suppress(NotImplementedError):   # not available on Windows
+                loop.add_signal_handler(sig, stop.set)
+        source = args.table or args.file
+        print(f"✓ Model {daemon.bundle.name} v{daemon.bundle.version}, sumber: {source}, "
+              f"posisi awal: {daemon.source.position()}")
+        if daemon.featurizer.imputed:
+            print(f"  Fitur diisi rata-rata scaler (tidak tersedia online): {daemon.featurizer.imputed}")
+        if args.port:
+            print(f"  Metrik: http://127.0.0.1:{args.port}/metrics")
+        if args.replay:
+            async def replay_then_stop():
+                await replay_log(args.replay, args.file, rate=args.replay_rate)
+                end = os.path.getsize(args.file)
+                while (daemon.metrics.position or {}).get("offset", 0) < end:
+                    await asyncio.sleep(0.1)
+                stop.set()
+            asyncio.create_task(replay_then_stop())
+        return await daemon.run(stop)
+
+    summary = asyncio.run(run())
+    print(f"\n✓ Daemon berhenti: {summary['events_scored']} event diskor, {summary['alerts']} alert "
+          f"({summary['bursts']['bursts']} burst ditutup, {summary['bursts']['open']} masih terbuka), "
+          f"latensi p50/p99 {summary['latency_ms']['p50']}/{summary['latency_ms']['p99']} ms")
+
+
+if __name__ == "__main__":
+    main()
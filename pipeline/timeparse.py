@@ -0,0 +1,187 @@
+"""Fixed-format timestamp parsing with a per-source format cache.
+
+``pd.to_datetime`` without ``format`` re-infers the layout on every call (and
+falls back to per-element parsing when inference fails), and the staff path
+used to build ``date + ' ' + timestamp`` strings just to parse them again.
+Here the format of each source (``"tracker"``, ``"staff:date"``, ...) is
+detected once on a small sample, cached, and then every parse runs with that
+explicit format. Date and time-of-day columns are parsed separately and
+combined as integer nanosecond offsets, with no temporary strings.
+
+Stages store the result as an int64 ``epoch_s`` column (seconds since
+1970-01-01, naive local time as logged) and derive calendar fields from it
+with integer arithmetic (:func:`calendar_fields`) instead of ``.dt``
+accessors.
+
+A cached format is only a fast path: values it does not parse (a source that
+mixes ``2025-01-02 10:46:35`` and ``2025-01-02T10:46:35.123``) are parsed
+again per element, and values that still do not parse are reported with a
+``RuntimeWarning`` that counts them, instead of silently becoming NaT.
+"""
+
+import warnings
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+
+EPOCH_COLUMN = "epoch_s"
+
+# Working hours of 03_feature_engineering.py: an hour < WORK_START or >= WORK_END is outside them
+WORK_START = 8
+WORK_END = 19
+
+DATETIME_FORMATS = (
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%d %H:%M:%S.%f",
+    "%Y-%m-%dT%H:%M:%S",
+    "%Y-%m-%d %H:%M",
+    "%Y/%m/%d %H:%M:%S",
+    "%d/%m/%Y %H:%M:%S",
+    "%d-%m-%Y %H:%M:%S",
+    "%Y-%m-%d",
+    "%d/%m/%Y",
+)
+TIME_FORMATS = ("%H:%M:%S", "%H:%M:%S.%f", "%H:%M")
+
+_SAMPLE_SIZE = 200
+_SECONDS_PER_DAY = 86_400
+_format_cache: dict[str, Optional[str]] = {}
+
+
+def detect_format(values: pd.Series, candidates=DATETIME_FORMATS) -> Optional[str]:
+    """First candidate format that parses every value of a non-null sample."""
+    sample = values.dropna().astype(str).head(_SAMPLE_SIZE)
+    if sample.empty:
+        return None
+    for fmt in candidates:
+        if pd.to_datetime(sample, format=fmt, errors="coerce").notna().all():
+            return fmt
+    return None
+
+
+def cached_format(source: str, values: pd.Series, candidates=DATETIME_FORMATS) -> Optional[str]:
+    """Format for ``source``, detected on first use and reused afterwards."""
+    if source not in _format_cache:
+        _format_cache[source] = detect_format(values, candidates)
+    return _format_cache[source]
+
+
+def clear_format_cache() -> None:
+    _format_cache.clear()
+
+
+def parse_timestamps(values: pd.Series, source: Optional[str] = None, fmt: Optional[str] = None) -> pd.Series:
+    """Parse date-time strings with one explicit format; invalid values become NaT.
+
+    Args:
+        values: Strings (or already-parsed datetimes, returned as-is)
+        source: Cache key; the format is detected once per source
+        fmt: Explicit format, skips detection
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.astype("datetime64[ns]")
+    cached = fmt is None and source is not None
+    if fmt is None:
+        fmt = cached_format(source, values) if source else detect_format(values)
+    if fmt is None:  # no fixed layout found: per-element parsing as a last resort
+        parsed = pd.to_datetime(values, errors="coerce", format="mixed")
+        _warn_unparsed(values, parsed, source)
+        return parsed.astype("datetime64[ns]")
+    parsed = pd.to_datetime(values, format=fmt, errors="coerce")
+    failed = parsed.isna() & _present(values)
+    if cached and failed.any() and failed.sum() == _present(values).sum():
+        # The source changed layout since the format was cached: detect again
+        _format_cache.pop(source, None)
+        return parse_timestamps(values, source=source)
+    return _fallback(values, parsed, failed, source).astype("datetime64[ns]")
+
+
+def _present(values: pd.Series) -> pd.Series:
+    """Non-null values that are not blank strings (those are meant to be missing)."""
+    return values.notna() & (values.astype(str).str.strip() != "")
+
+
+def _fallback(values: pd.Series, parsed: pd.Series, failed: pd.Series, source: Optional[str]) -> pd.Series:
+    """Parse the values the fixed format missed per element, and warn about the rest."""
+    if failed.any():
+        parsed = parsed.copy()
+        parsed[failed] = pd.to_datetime(values[failed].astype(str), errors="coerce", format="mixed")
+        _warn_unparsed(values, parsed, source)
+    return parsed
+
+
+def _warn_unparsed(values: pd.Series, parsed: pd.Series, source: Optional[str]) -> None:
+    unparsed = parsed.isna() & _present(values)
+    if unparsed.any():
+        example = values[unparsed].iloc[0]
+        warnings.warn(
+            f"{int(unparsed.sum())} of {len(values)} timestamps{f' of {source!r}' if source else ''} "
+            f"could not be parsed (e.g. {example!r}); they are NaT",
+            RuntimeWarning, stacklevel=3,
+        )
+
+
+def _time_of_day_ns(times: pd.Series, source: Optional[str]) -> np.ndarray:
+    """Nanoseconds since midnight (int64, NaT -> min int64)."""
+    if pd.api.types.is_timedelta64_dtype(times):
+        return times.to_numpy(dtype="timedelta64[ns]").astype(np.int64)
+    fmt = cached_format(f"{source}:time", times, TIME_FORMATS) if source else detect_format(times, TIME_FORMATS)
+    parsed = pd.to_datetime(times.astype(str), format=fmt or "mixed", errors="coerce")
+    parsed = _fallback(times, parsed, parsed.isna() & _present(times), source).where(times.notna())
+    ns = parsed.to_numpy(dtype="datetime64[ns]").astype(np.int64)
+    midnight = parsed.dt.normalize().to_numpy(dtype="datetime64[ns]").astype(np.int64)
+    return np.where(parsed.isna().to_numpy(), np.iinfo(np.int64).min, ns - midnight)
+
+
+def combine_date_time(dates: pd.Series, times: pd.Series, source: Optional[str] = None) -> pd.Series:
+    """``date`` + ``time of day`` as datetime64, added as integer offsets."""
+    day = parse_timestamps(dates, source=f"{source}:date" if source else None)
+    day_ns = day.dt.normalize().to_numpy(dtype="datetime64[ns]").astype(np.int64)
+    offset_ns = _time_of_day_ns(times, source)
+    invalid = day.isna().to_numpy() | (offset_ns == np.iinfo(np.int64).min)
+    combined = np.where(invalid, np.iinfo(np.int64).min, day_ns + offset_ns).view("datetime64[ns]")
+    return pd.Series(combined, index=dates.index, name="datetime")
+
+
+def epoch_seconds(datetimes: pd.Series) -> pd.Series:
+    """int64 seconds since the epoch (nullable ``Int64`` if there are NaT values)."""
+    datetimes = parse_timestamps(datetimes)
+    ns = datetimes.to_numpy(dtype="datetime64[ns]").astype(np.int64)
+    seconds = pd.Series(ns // 1_000_000_000, index=datetimes.index, name=EPOCH_COLUMN)
+    if datetimes.isna().any():
+        return seconds.astype("Int64").mask(datetimes.isna())
+    return seconds
+
+
+def _civil_from_days(days: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(year, month, day) from days since 1970-01-01 (H. Hinnant's algorithm)."""
+    z = days + 719_468
+    era = np.floor_divide(z, 146_097)
+    doe = z - era * 146_097
+    yoe = (doe - doe // 1460 + doe // 36_524 - doe // 146_096) // 365
+    doy = doe - (365 * yoe + yoe // 4 - yoe // 100)
+    mp = (5 * doy + 2) // 153
+    day = doy - (153 * mp + 2) // 5 + 1
+    month = np.where(mp < 10, mp + 3, mp - 9)
+    year = yoe + era * 400 + (month <= 2)
+    return year, month, day
+
+
+def calendar_fields(epoch_s) -> pd.DataFrame:
+    """hour, day_of_week (0=Monday), day_of_month, month, day_index from ``epoch_s``.
+
+    ``epoch_s`` must not contain missing values.
+    """
+    index = epoch_s.index if isinstance(epoch_s, pd.Series) else None
+    seconds = np.asarray(epoch_s, dtype=np.int64)
+    days = np.floor_divide(seconds, _SECONDS_PER_DAY)
+    _, month, day = _civil_from_days(days)
+    return pd.DataFrame({
+        "hour": (seconds - days * _SECONDS_PER_DAY) // 3600,
+        "day_of_week": (days + 3) % 7,  # 1970-01-01 was a Thursday
+        "day_of_month": day,
+        "month": month,
+        "day_index": days,
+    }, index=index).astype({"hour": np.int8, "day_of_week": np.int8, "day_of_month": np.int8, "month": np.int8})
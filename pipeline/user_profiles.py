@@ -0,0 +1,416 @@
+"""Persistent per-user behavioral profiles with mergeable statistics.
+
+Stages 03 and 06 used to rebuild every per-user statistic
+(``frekuensi_aktivitas_per_user``, ``pola_waktu_login``,
+``user_avg_daily_activity``, ...) from the full history on every run and
+drop them afterwards. :class:`ProfileStore` keeps them in one SQLite table
+keyed by ``(dataset, user_id)`` (a ``WITHOUT ROWID`` primary key, so one
+user is one index lookup). Every field is a sufficient statistic that merges
+by addition, min/max or register-wise max:
+
+* event count, first/last event (epoch seconds), weekend events;
+* sum and sum of squares of the hour of day, plus a 24-bin hour histogram;
+* counts per operation type (``QUERY_TYPES``);
+* HyperLogLog sketches of the distinct operation types and tables;
+* a bitmap of active days (exact, one bit per day since the first one).
+
+:meth:`ProfileStore.update` aggregates a batch per user with vectorised
+group operations and merges it into the stored rows in one transaction.
+Batches are expected in event-time order, as the logs are append-only. Rows
+at or before the stored watermark (the last ``epoch_s`` applied) are skipped.
+Rows exactly at the watermark second are matched by row digest, so
+re-running a stage over the same history does not count anything twice.
+Rows without a timestamp cannot be placed and are skipped.
+
+:meth:`ProfileStore.features` turns profiles into the per-user feature
+columns (mean/std of the hour, ratios, distinct counts, events per active day).
+"""
+
+import json
+import sqlite3
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from pipeline.dedup import hash_rows
+from pipeline.sql_fingerprint import QUERY_TYPES
+from pipeline.timeparse import calendar_fields
+
+
+PROFILE_STORE_PATH = "data/profiles/user_profiles.sqlite"
+HLL_PRECISION = 10   # 2^10 one-byte registers per sketch, ~3% standard error
+MODIFYING_TYPES = ("INSERT", "UPDATE", "DELETE")
+_SQL_CHUNK = 500     # user ids per IN (...) query
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS profiles (
+    dataset TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    events INTEGER NOT NULL,
+    epoch_min INTEGER,
+    epoch_max INTEGER,
+    weekend_events INTEGER NOT NULL,
+    hour_sum REAL NOT NULL,
+    hour_sumsq REAL NOT NULL,
+    hour_hist BLOB NOT NULL,
+    op_counts BLOB NOT NULL,
+    hll_ops BLOB NOT NULL,
+    hll_tables BLOB NOT NULL,
+    day_origin INTEGER,
+    day_bits BLOB NOT NULL,
+    PRIMARY KEY (dataset, user_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS watermarks (
+    dataset TEXT PRIMARY KEY,
+    epoch_s INTEGER NOT NULL,
+    boundary_digests TEXT NOT NULL,
+    rows_applied INTEGER NOT NULL,
+    updated_at TEXT NOT NULL
+);
+"""
+_PROFILE_COLUMNS = ["events", "epoch_min", "epoch_max", "weekend_events", "hour_sum", "hour_sumsq",
+                    "hour_hist", "op_counts", "hll_ops", "hll_tables", "day_origin", "day_bits"]
+
+
+# ---------------------------------------------------------------- HyperLogLog
+def _bit_length(x: np.ndarray) -> np.ndarray:
+    """Bit length of each uint64 (0 for 0), by binary search over shifts."""
+    x = x.copy()
+    length = np.zeros(len(x), dtype=np.int64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        high = x >= (np.uint64(1) << np.uint64(shift))
+        length[high] += shift
+        x[high] >>= np.uint64(shift)
+    return length + (x > 0)
+
+
+def hll_registers(groups: np.ndarray, n_groups: int, values, p: int = HLL_PRECISION) -> np.ndarray:
+    """HyperLogLog registers (n_groups x 2^p, uint8) of ``values`` grouped by ``groups``.
+
+    Missing values are ignored.
+    """
+    registers = np.zeros((n_groups, 1 << p), dtype=np.uint8)
+    values = pd.Series(values)
+    keep = values.notna().to_numpy()
+    if not keep.any():
+        return registers
+    hashes = pd.util.hash_array(values[keep].astype(str).to_numpy(dtype=object))
+    index = (hashes >> np.uint64(64 - p)).astype(np.int64)
+    rest = hashes & np.uint64((1 << (64 - p)) - 1)
+    rank = ((64 - p) - _bit_length(rest) + 1).astype(np.uint8)
+    np.maximum.at(registers, (np.asarray(groups)[keep], index), rank)
+    return registers
+
+
+def hll_count(registers: np.ndarray) -> float:
+    """Cardinality estimate of one register array (linear counting when small)."""
+    m = len(registers)
+    alpha = 0.7213 / (1 + 1.079 / m)
+    estimate = alpha * m * m / np.sum(np.ldexp(1.0, -registers.astype(np.int64)))
+    zeros = int(np.count_nonzero(registers == 0))
+    if estimate <= 2.5 * m and zeros:
+        return m * np.log(m / zeros)
+    return float(estimate)
+
+
+# --------------------------------------------------------------- day bitmaps
+def _days_to_bitmap(days: np.ndarray) -> tuple[Optional[int], bytes]:
+    if len(days) == 0:
+        return None, b""
+    origin = int(days.min())
+    bits = np.zeros(int(days.max()) - origin + 1, dtype=bool)
+    bits[days - origin] = True
+    return origin, np.packbits(bits).tobytes()
+
+
+def _bitmap_to_days(origin: Optional[int], bitmap: bytes) -> np.ndarray:
+    if origin is None or not bitmap:
+        return np.zeros(0, dtype=np.int64)
+    return np.flatnonzero(np.unpackbits(np.frombuffer(bitmap, dtype=np.uint8))) + origin
+
+
+# ------------------------------------------------------------------- profile
+@dataclass
+class UserProfile:
+    """Sufficient statistics of one user's events (all fields merge)."""
+
+    events: int = 0
+    epoch_min: Optional[int] = None
+    epoch_max: Optional[int] = None
+    weekend_events: int = 0
+    hour_sum: float = 0.0
+    hour_sumsq: float = 0.0
+    hour_hist: np.ndarray = field(default_factory=lambda: np.zeros(24, dtype=np.int64))
+    op_counts: np.ndarray = field(default_factory=lambda: np.zeros(len(QUERY_TYPES), dtype=np.int64))
+    hll_ops: np.ndarray = field(default_factory=lambda: np.zeros(1 << HLL_PRECISION, dtype=np.uint8))
+    hll_tables: np.ndarray = field(default_factory=lambda: np.zeros(1 << HLL_PRECISION, dtype=np.uint8))
+    days: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int64))
+
+    def merge(self, other: "UserProfile") -> "UserProfile":
+        def bound(fn, a, b):
+            return b if a is None else a if b is None else fn(a, b)
+
+        return UserProfile(
+            events=self.events + other.events,
+            epoch_min=bound(min, self.epoch_min, other.epoch_min),
+            epoch_max=bound(max, self.epoch_max, other.epoch_max),
+            weekend_events=self.weekend_events + other.weekend_events,
+            hour_sum=self.hour_sum + other.hour_sum,
+            hour_sumsq=self.hour_sumsq + other.hour_sumsq,
+            hour_hist=self.hour_hist + other.hour_hist,
+            op_counts=self.op_counts + other.op_counts,
+            hll_ops=np.maximum(self.hll_ops, other.hll_ops),
+            hll_tables=np.maximum(self.hll_tables, other.hll_tables),
+            days=np.union1d(self.days, other.days),
+        )
+
+    def features(self) -> dict:
+        """Per-user feature values (the same definitions as the stage scripts)."""
+        n = self.events
+        ops = dict(zip(QUERY_TYPES, self.op_counts.tolist()))
+        hour_var = (self.hour_sumsq - self.hour_sum ** 2 / n) / (n - 1) if n > 1 else 0.0
+        return {
+            "events": n,
+            "distinct_ops": int(round(hll_count(self.hll_ops))),
+            "distinct_tables": int(round(hll_count(self.hll_tables))),
+            "modification_ratio": sum(ops[t] for t in MODIFYING_TYPES) / n if n else 0.0,
+            "delete_count": ops["DELETE"],
+            "hour_mean": self.hour_sum / n if n else 0.0,
+            "hour_std": float(np.sqrt(max(hour_var, 0.0))),
+            "weekend_ratio": self.weekend_events / n if n else 0.0,
+            "active_days": len(self.days),
+            "avg_daily_activity": n / len(self.days) if len(self.days) else 0.0,
+            "first_seen": self.epoch_min,
+            "last_seen": self.epoch_max,
+        }
+
+    def to_row(self) -> tuple:
+        origin, bitmap = _days_to_bitmap(self.days)
+        return (self.events, self.epoch_min, self.epoch_max, self.weekend_events, self.hour_sum, self.hour_sumsq,
+                self.hour_hist.astype(np.int64).tobytes(), self.op_counts.astype(np.int64).tobytes(),
+                self.hll_ops.tobytes(), self.hll_tables.tobytes(), origin, bitmap)
+
+    @classmethod
+    def from_row(cls, row: Sequence) -> "UserProfile":
+        (events, epoch_min, epoch_max, weekend, hour_sum, hour_sumsq,
+         hour_hist, op_counts, hll_ops, hll_tables, day_origin, day_bits) = row
+        return cls(
+            events=events, epoch_min=epoch_min, epoch_max=epoch_max, weekend_events=weekend,
+            hour_sum=hour_sum, hour_sumsq=hour_sumsq,
+            hour_hist=np.frombuffer(hour_hist, dtype=np.int64).copy(),
+            op_counts=np.frombuffer(op_counts, dtype=np.int64).copy(),
+            hll_ops=np.frombuffer(hll_ops, dtype=np.uint8).copy(),
+            hll_tables=np.frombuffer(hll_tables, dtype=np.uint8).copy(),
+            days=_bitmap_to_days(day_origin, day_bits),
+        )
+
+
+def user_keys(user_ids) -> pd.Series:
+    """Store keys for user ids: integral numbers without a trailing '.0'."""
+    ids = pd.Series(user_ids)
+    if pd.api.types.is_numeric_dtype(ids) and (ids.dropna() % 1 == 0).all():
+        ids = ids.astype("Int64")
+    return ids.astype("string")
+
+
+def aggregate_batch(df: pd.DataFrame, user_col: str = "user_id", epoch_col: str = "epoch_s",
+                    type_col: Optional[str] = "query_type", table_col: Optional[str] = "sql_table") -> dict:
+    """Per-user profiles of one batch (rows with a timestamp only)."""
+    df = df[df[epoch_col].notna()]
+    codes, users = pd.factorize(user_keys(df[user_col]).to_numpy())
+    n_users = len(users)
+    epoch = df[epoch_col].to_numpy(dtype=np.int64)
+    calendar = calendar_fields(epoch)
+    hour = calendar["hour"].to_numpy(dtype=np.int64)
+    weekend = (calendar["day_of_week"].to_numpy() >= 5).astype(np.int64)
+
+    hour_hist = np.zeros((n_users, 24), dtype=np.int64)
+    np.add.at(hour_hist, (codes, hour), 1)
+    op_counts = np.zeros((n_users, len(QUERY_TYPES)), dtype=np.int64)
+    if type_col and type_col in df.columns:
+        type_codes = pd.Categorical(df[type_col].astype("string"), categories=QUERY_TYPES).codes
+        known = type_codes >= 0
+        np.add.at(op_counts, (codes[known], type_codes[known]), 1)
+    missing = [None] * len(df)
+    hll_ops = hll_registers(codes, n_users, df[type_col] if type_col and type_col in df.columns else missing)
+    hll_tables = hll_registers(codes, n_users, df[table_col] if table_col and table_col in df.columns else missing)
+
+    grouped = pd.DataFrame({"user": codes, "epoch": epoch, "day": calendar["day_index"].to_numpy()}).groupby("user")
+    epoch_min, epoch_max = grouped["epoch"].min(), grouped["epoch"].max()
+    days = grouped["day"].unique()
+    weekend_events = np.bincount(codes, weights=weekend, minlength=n_users).astype(np.int64)
+    hours = np.arange(24)
+
+    return {
+        user: UserProfile(
+            events=int(hour_hist[i].sum()),
+            epoch_min=int(epoch_min[i]),
+            epoch_max=int(epoch_max[i]),
+            weekend_events=int(weekend_events[i]),
+            hour_sum=float(hour_hist[i] @ hours),
+            hour_sumsq=float(hour_hist[i] @ hours ** 2),
+            hour_hist=hour_hist[i],
+            op_counts=op_counts[i],
+            hll_ops=hll_ops[i],
+            hll_tables=hll_tables[i],
+            days=np.sort(days[i].astype(np.int64)),
+        )
+        for i, user in enumerate(users)
+    }
+
+
+class ProfileStore:
+    """SQLite-backed per-user profiles (see module docstring).
+
+    Args:
+        path: SQLite file (created with its tables if missing)
+    """
+
+    def __init__(self, path=PROFILE_STORE_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def reset(self, dataset: str) -> None:
+        with self.conn:
+            self.conn.execute("DELETE FROM profiles WHERE dataset = ?", (dataset,))
+            self.conn.execute("DELETE FROM watermarks WHERE dataset = ?", (dataset,))
+
+    def copy(self, source: str, target: str) -> int:
+        """Replace the profiles and watermark of ``target`` with those of ``source``."""
+        columns = ", ".join(_PROFILE_COLUMNS)
+        with self.conn:
+            self.conn.execute("DELETE FROM profiles WHERE dataset = ?", (target,))
+            self.conn.execute("DELETE FROM watermarks WHERE dataset = ?", (target,))
+            copied = self.conn.execute(
+                f"INSERT INTO profiles (dataset, user_id, {columns}) "
+                f"SELECT ?, user_id, {columns} FROM profiles WHERE dataset = ?",
+                (target, source),
+            ).rowcount
+            self.conn.execute(
+                "INSERT INTO watermarks SELECT ?, epoch_s, boundary_digests, rows_applied, updated_at "
+                "FROM watermarks WHERE dataset = ?",
+                (target, source),
+            )
+        return copied
+
+    # --------------------------------------------------------------- reads
+    def get(self, dataset: str, user_id) -> Optional[UserProfile]:
+        """One user's profile (primary-key lookup), or None."""
+        key = user_keys([user_id]).iloc[0]
+        row = self.conn.execute(
+            f"SELECT {', '.join(_PROFILE_COLUMNS)} FROM profiles WHERE dataset = ? AND user_id = ?",
+            (dataset, key),
+        ).fetchone()
+        return UserProfile.from_row(row) if row else None
+
+    def get_many(self, dataset: str, user_ids) -> dict:
+        """Profiles by store key for the distinct ``user_ids`` that have one."""
+        keys = list(dict.fromkeys(user_keys(user_ids).dropna()))
+        profiles = {}
+        for start in range(0, len(keys), _SQL_CHUNK):
+            chunk = keys[start:start + _SQL_CHUNK]
+            rows = self.conn.execute(
+                f"SELECT user_id, {', '.join(_PROFILE_COLUMNS)} FROM profiles "
+                f"WHERE dataset = ? AND user_id IN ({', '.join('?' * len(chunk))})",
+                (dataset, *chunk),
+            )
+            profiles.update({row[0]: UserProfile.from_row(row[1:]) for row in rows})
+        return profiles
+
+    def features(self, dataset: str, user_ids) -> pd.DataFrame:
+        """Feature values for every entry of ``user_ids`` (aligned, NaN if unknown)."""
+        keys = user_keys(user_ids)
+        profiles = self.get_many(dataset, keys)
+        table = pd.DataFrame.from_dict({key: p.features() for key, p in profiles.items()}, orient="index")
+        return table.reindex(keys.to_numpy()).set_index(pd.Series(user_ids).index)
+
+    def watermark(self, dataset: str) -> Optional[int]:
+        row = self.conn.execute("SELECT epoch_s FROM watermarks WHERE dataset = ?", (dataset,)).fetchone()
+        return row[0] if row else None
+
+    # -------------------------------------------------------------- update
+    def _unseen(self, dataset: str, df: pd.DataFrame, epoch_col: str, key_cols: list[str], skip_seen: bool = True):
+        """Rows after the watermark, the new watermark and its boundary digests."""
+        df = df[df[epoch_col].notna()]
+        epoch = df[epoch_col].to_numpy(dtype=np.int64)
+        digests = hash_rows(df, key_cols)
+        row = self.conn.execute(
+            "SELECT epoch_s, boundary_digests FROM watermarks WHERE dataset = ?", (dataset,)
+        ).fetchone()
+        if row is None:
+            old_mark, old_boundary = None, set()
+        else:
+            old_mark, old_boundary = row[0], {int(d) for d in json.loads(row[1])}
+        keep = np.ones(len(df), dtype=bool)
+        if skip_seen and old_mark is not None:
+            at_mark = epoch == old_mark
+            keep = (epoch > old_mark) | (at_mark & ~np.isin(digests, np.fromiter(old_boundary, np.uint64,
+                                                                                   len(old_boundary))))
+
+        new_epoch = epoch[keep]
+        mark = int(new_epoch.max()) if len(new_epoch) else old_mark
+        if old_mark is not None and mark < old_mark:   # only late rows (skip_seen=False)
+            return df[keep], old_mark, old_boundary
+        boundary = {int(d) for d in digests[keep][new_epoch == mark]} if len(new_epoch) else set()
+        if mark == old_mark:
+            boundary |= old_boundary
+        return df[keep], mark, boundary
+
+    def update(
+        self,
+        dataset: str,
+        df: pd.DataFrame,
+        user_col: str = "user_id",
+        epoch_col: str = "epoch_s",
+        type_col: Optional[str] = "query_type",
+        table_col: Optional[str] = "sql_table",
+        key_cols: Optional[list[str]] = None,
+        skip_seen: bool = True,
+    ) -> int:
+        """Fold the rows of ``df`` after the watermark into the stored profiles.
+
+        Args:
+            dataset: Profile namespace ('tracker', 'staff')
+            df: Batch with ``user_col`` and ``epoch_col`` (epoch seconds);
+                ``type_col`` / ``table_col`` are optional
+            key_cols: Columns identifying a row at the watermark second
+                (default: every column of ``df``)
+            skip_seen: Skip rows at or before the watermark. Pass False when
+                the caller already delivers every row exactly once in
+                arrival order (e.g. the tail daemon's byte offsets) and
+                late rows must still be counted
+
+        Returns:
+            Number of rows applied
+        """
+        key_cols = key_cols or list(df.columns)
+        fresh, mark, boundary = self._unseen(dataset, df, epoch_col, key_cols, skip_seen)
+        if fresh.empty:
+            return 0
+
+        batch = aggregate_batch(fresh, user_col, epoch_col, type_col, table_col)
+        stored = self.get_many(dataset, list(batch))
+        rows = [(dataset, key, *(stored[key].merge(profile) if key in stored else profile).to_row())
+                for key, profile in batch.items()]
+        applied = self.conn.execute("SELECT rows_applied FROM watermarks WHERE dataset = ?", (dataset,)).fetchone()
+        with self.conn:
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO profiles (dataset, user_id, {', '.join(_PROFILE_COLUMNS)}) "
+                f"VALUES ({', '.join('?' * (len(_PROFILE_COLUMNS) + 2))})",
+                rows,
+            )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO watermarks VALUES (?, ?, ?, ?, ?)",
+                (dataset, mark, json.dumps(sorted(boundary)), (applied[0] if applied else 0) + len(fresh),
+                 datetime.now().isoformat(timespec="seconds")),
+            )
+        return len(fresh)
@@ -0,0 +1,24 @@
+import pandas as pd
+from streamlit.errors import StreamlitAPIException
+from streamlit.runtime.download_data_util import convert_data_to_bytes_and_infer_mime
+
+from pipeline.anomaly_store import AnomalyFilter, AnomalyStore
+
+
+def test_csv_download_goes_through_streamlits_conversion(tmp_path):
+    source = tmp_path / "tracker_anomalies_clustered.csv"
+    pd.DataFrame({
+        "timestamp": ["2025-01-02 10:00:00", "2025-01-02 11:00:00", "2025-01-03 09:30:00"],
+        "user_id": [1, 2, 1],
+        "lof_score": [2.5, 1.9, 3.1],
+        "is_anomaly": [1, 1, 1],
+        "cluster": [0, 1, 0],
+    }).to_csv(source, index=False)
+    store = AnomalyStore(tmp_path / "anomalies.sqlite")
+    store.load("tracker", source)
+
+    export = store.csv_download("tracker", AnomalyFilter(cluster=0))
+    data, _ = convert_data_to_bytes_and_infer_mime(export(), StreamlitAPIException("unsupported"))
+    lines = data.decode("utf-8").splitlines()
+    assert lines[0] == "timestamp,user_id,lof_score,is_anomaly,cluster"
+    assert [line.split(",")[2] for line in lines[1:]] == ["3.1", "2.5"]
@@ -0,0 +1,66 @@
+"""IncrementalLOF must give the same scores as a batch LocalOutlierFactor fit.
+
+Continuous random features, so there are no distance ties (sklearn's order
+among equal distances is undefined).
+"""
+
+import numpy as np
+import pytest
+from sklearn.neighbors import LocalOutlierFactor
+
+from pipeline.incremental_lof import IncrementalLOF
+
+K = 10
+RTOL = 1e-9
+
+
+def batch_scores(X: np.ndarray) -> np.ndarray:
+    return -LocalOutlierFactor(n_neighbors=K).fit(X).negative_outlier_factor_
+
+
+@pytest.fixture
+def X() -> np.ndarray:
+    rng = np.random.default_rng(42)
+    # Two dense groups plus scattered points, so some LOF values are well above 1
+    return np.vstack([
+        rng.normal(0.0, 1.0, size=(150, 4)),
+        rng.normal(6.0, 0.5, size=(100, 4)),
+        rng.uniform(-10.0, 15.0, size=(20, 4)),
+    ])[rng.permutation(270)]
+
+
+def test_insert_one_by_one_matches_batch(X):
+    engine = IncrementalLOF(n_neighbors=K)
+    engine.insert_many(X)
+    np.testing.assert_allclose(engine.scores(), batch_scores(X), rtol=RTOL)
+
+
+def test_fit_matches_batch(X):
+    np.testing.assert_allclose(IncrementalLOF(n_neighbors=K).fit(X).scores(), batch_scores(X), rtol=RTOL)
+
+
+def test_delete_matches_batch_on_remaining_points(X):
+    engine = IncrementalLOF(n_neighbors=K)
+    engine.insert_many(X)
+    removed = np.random.default_rng(0).choice(len(X), size=60, replace=False)
+    for point_id in removed:
+        engine.delete(point_id)
+    keep = np.setdiff1d(np.arange(len(X)), removed)
+    np.testing.assert_array_equal(engine.ids, keep)
+    np.testing.assert_allclose(engine.scores(), batch_scores(X[keep]), rtol=RTOL)
+
+
+def test_sliding_window_matches_batch_on_last_points(X):
+    window = 80
+    engine = IncrementalLOF(n_neighbors=K, window_size=window)
+    for start in (0, 100, 200):
+        engine.insert_many(X[start:start + 100] if start < 200 else X[start:])
+    assert len(engine) == window
+    np.testing.assert_allclose(engine.scores(), batch_scores(X[-window:]), rtol=RTOL)
+
+
+def test_delete_unknown_point_raises(X):
+    engine = IncrementalLOF(n_neighbors=K).fit(X[:50])
+    engine.delete(3)
+    with pytest.raises(KeyError):
+        engine.delete(3)
@@ -0,0 +1,49 @@
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+from pipeline.score_api import EventFeaturizer, _time_error
+from pipeline.timeparse import clear_format_cache
+
+
+@pytest.fixture
+def featurizer(tmp_path):
+    clear_format_cache()
+    bundle = SimpleNamespace(name="tracker", feature_columns=["hour"], kmeans_feature_columns=None)
+    yield EventFeaturizer(bundle, profile_path=tmp_path / "profiles.sqlite")
+    clear_format_cache()
+
+
+def times_of(featurizer, events):
+    return featurizer.times(pd.DataFrame.from_records(events))
+
+
+def test_date_and_time_are_combined_per_event(featurizer):
+    events = [{"timestamp": "2025-01-02 22:46:35"}, {"date": "2025-01-03", "timestamp": "07:15:00"}]
+    times, unparsed = times_of(featurizer, events)
+    assert times.tolist() == [pd.Timestamp("2025-01-02 22:46:35"), pd.Timestamp("2025-01-03 07:15:00")]
+    assert not unparsed.any()
+    for event, expected in zip(events, times):
+        alone, _ = times_of(featurizer, [event])
+        assert alone.iloc[0] == expected
+
+
+def test_unparseable_timestamps_are_marked_not_imputed(featurizer):
+    events = [{"timestamp": "not a time"}, {"date": "2025-01-04", "timestamp": "25:99"}, {"user_id": 3},
+              {"timestamp": "2025-01-02 22:46:35"}]
+    times, unparsed = times_of(featurizer, events)
+    assert unparsed.tolist() == [True, True, False, False]
+    assert times.isna().tolist() == [True, True, True, False]
+
+
+def test_numeric_timestamps_are_marked_not_read_as_nanoseconds(featurizer):
+    events = [{"timestamp": 12345}, {"date": 20250102, "timestamp": "07:15:00"}, {"timestamp": "2025-01-02 22:46:35"}]
+    times, unparsed = times_of(featurizer, events)
+    assert unparsed.tolist() == [True, True, False]
+    assert times.isna().tolist() == [True, True, False]
+
+
+def test_time_errors_name_the_rejected_value():
+    assert _time_error({"date": None, "timestamp": 12345}) == "timestamp must be a string, got 12345"
+    assert _time_error({"date": "2025-01-04", "timestamp": "25:99"}) == "timestamp does not parse: '2025-01-04' '25:99'"
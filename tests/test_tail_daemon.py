@@ -0,0 +1,42 @@
+import sqlite3
+
+import pytest
+
+from pipeline.tail_daemon import TablePollSource
+
+
+@pytest.fixture
+def audit_db(tmp_path):
+    path = tmp_path / "audit.db"
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE audit (timestamp TEXT, query_info TEXT, user_id INTEGER)")
+        rows = [("2025-01-02 10:00:00", f"select {i}", i) for i in range(12)]
+        rows += [("2025-01-02 10:00:05", "delete from x", 99)]
+        conn.executemany("INSERT INTO audit VALUES (?, ?, ?)", rows)
+    return f"sqlite:///{path}"
+
+
+def drain(source):
+    rows = []
+    while (chunk := source._read()) is not None:
+        rows += chunk.frame["query_info"].tolist()
+    return rows
+
+
+def test_a_second_larger_than_the_limit_is_drained_over_several_polls(audit_db):
+    rows = drain(TablePollSource(audit_db, "audit", limit=5))
+    assert rows == [f"select {i}" for i in range(12)] + ["delete from x"]
+
+
+def test_restored_position_continues_inside_a_second(audit_db):
+    source = TablePollSource(audit_db, "audit", limit=5)
+    first = source._read().frame["query_info"].tolist()
+    resumed = TablePollSource(audit_db, "audit", limit=5)
+    resumed.restore(source.position())
+    assert first + drain(resumed) == [f"select {i}" for i in range(12)] + ["delete from x"]
+
+
+@pytest.mark.parametrize("kwargs", [{"table": "audit; drop table audit"}, {"table": "audit", "time_col": "ts--"}])
+def test_table_and_column_names_must_be_identifiers(audit_db, kwargs):
+    with pytest.raises(ValueError, match="Invalid"):
+        TablePollSource(audit_db, **kwargs)
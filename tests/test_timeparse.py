@@ -0,0 +1,34 @@
+import warnings
+
+import pandas as pd
+import pytest
+
+from pipeline.timeparse import clear_format_cache, combine_date_time, parse_timestamps
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache():
+    clear_format_cache()
+    yield
+    clear_format_cache()
+
+
+def test_values_outside_the_cached_format_are_parsed_per_element():
+    parse_timestamps(pd.Series(["2025-01-02 10:46:35"]), source="api:tracker")
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        parsed = parse_timestamps(pd.Series(["2025-01-02T10:46:35.123", "2025-01-02 10:46:36"]),
+                                  source="api:tracker")
+    assert parsed.tolist() == [pd.Timestamp("2025-01-02 10:46:35.123"), pd.Timestamp("2025-01-02 10:46:36")]
+
+
+def test_unparseable_values_are_counted_in_a_warning():
+    with pytest.warns(RuntimeWarning, match="1 of 3 timestamps"):
+        parsed = parse_timestamps(pd.Series(["2025-01-02 10:46:35", "not a time", None]), source="tracker")
+    assert parsed.isna().tolist() == [False, True, True]
+
+
+def test_combine_date_time_with_mixed_time_layouts():
+    combined = combine_date_time(pd.Series(["2025-01-02", "2025-01-03"]), pd.Series(["10:00:00", "10:00:01.5"]),
+                                 source="staff")
+    assert combined.tolist() == [pd.Timestamp("2025-01-02 10:00:00"), pd.Timestamp("2025-01-03 10:00:01.5")]